@@ -0,0 +1,193 @@
+"""Detección del banco de un estado de cuenta a partir de su primera página.
+
+Sólo se leen los metadatos del PDF y el inicio del texto de la página 1
+(con PyMuPDF si está instalado, que tarda milisegundos; si no, pdfplumber).
+Ese texto se compara contra una tabla de huellas por banco armada con los
+tokens que ya usan los extractores: la marca dentro de ``footer_prefixes``
+o ``FOOTER_PREFIXES`` al inicio de línea, ``PERIODO_RANGE_RX`` de HSBC,
+``RE_ANIO_1``/``RE_ANIO_2`` de Banamex, el encabezado de columnas de BBVA...
+
+El nombre del banco en el encabezado o en los metadatos pesa más que cada
+huella de formato; más abajo casi siempre es la contraparte de un SPEI y
+pesa poco. El primero que aparece suma un punto extra. La clave regresada
+es la de ``core.statement_batch.EXTRACTORS``.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+import io
+import re
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from .keyword_classifier import KeywordClassifier
+
+try:
+    import pymupdf  # type: ignore
+except ImportError:  # pragma: no cover - dependencia opcional
+    pymupdf = None
+
+import pdfplumber
+
+# Caracteres de la página 1 que se revisan; el encabezado cabe de sobra.
+FIRST_CHUNK_CHARS = 4000
+# Inicio del texto donde va el encabezado; más abajo el nombre de un banco
+# suele ser la contraparte de un movimiento.
+HEADER_CHARS = 800
+METADATA_KEYS = ("title", "author", "subject", "creator", "producer", "keywords")
+
+BRAND_WEIGHT = 3
+BRAND_BODY_WEIGHT = 1
+LAYOUT_WEIGHT = 2
+LEFTMOST_BONUS = 1
+
+BANK_NAMES = KeywordClassifier(
+    {
+        "BASE": ("BANCO BASE",),
+        "BBVA": ("BBVA", "BANCOMER"),
+        "Banamex": ("BANAMEX",),
+        "Santander": ("SANTANDER",),
+        "Scotiabank": ("SCOTIABANK",),
+        "Inbursa": ("INBURSA",),
+        "HSBC": ("HSBC",),
+        "Banorte": ("BANORTE",),
+        "BanBajio": ("BANBAJIO", "BANCO DEL BAJIO", "BANBAJÍO", "BANCO DEL BAJÍO"),
+        # "AMEX" no: también está dentro de "BANAMEX".
+        "American_Express": ("AMERICAN EXPRESS",),
+    }
+)
+
+ACCOUNT_RX = re.compile(
+    r"(?:N[UÚ]MERO\s+DE\s+CUENTA|NO\.?\s*DE\s*CUENTA|CUENTA|CONTRATO|CLABE)\D{0,25}?(\d[\d\- ]{6,22}\d)",
+    re.IGNORECASE,
+)
+CLABE_RX = re.compile(r"\b\d{18}\b")
+
+Fingerprint = Tuple[Pattern[str], int]
+
+
+def _brand_prefixes(bank: str, prefixes: Tuple[str, ...]) -> Tuple[str, ...]:
+    """Prefijos de pie de página que nombran al propio banco."""
+
+    return tuple(p for p in prefixes if BANK_NAMES.hits(p) == {bank})
+
+
+def _line_start(token: str) -> Pattern[str]:
+    return re.compile(r"^\s*" + re.escape(token) + r"\b", re.MULTILINE)
+
+
+@lru_cache(maxsize=1)
+def fingerprint_table() -> Dict[str, Tuple[Fingerprint, ...]]:
+    """Huellas por banco; se compila una vez por proceso al primer uso."""
+
+    from extractor import RE_ANIO_1, RE_ANIO_2
+
+    from .extractor_american_express import PROFILE as AMEX_PROFILE
+    from .extractor_base import PROFILE as BASE_PROFILE
+    from .extractor_hsbc import FOOTER_PREFIXES as HSBC_FOOTER_PREFIXES, PERIODO_RANGE_RX
+    from .extractor_inbursa import DATE_START_RX
+    from .extractor_santander import PROFILE as SANTANDER_PROFILE
+    from .extractor_scotiabank import PROFILE as SCOTIABANK_PROFILE
+
+    footers = {
+        "BASE": BASE_PROFILE.footer_prefixes,
+        "Santander": SANTANDER_PROFILE.footer_prefixes,
+        "Scotiabank": SCOTIABANK_PROFILE.footer_prefixes,
+        "American_Express": AMEX_PROFILE.footer_prefixes,
+        "HSBC": HSBC_FOOTER_PREFIXES,
+    }
+    layout: Dict[str, List[Pattern[str]]] = {
+        "HSBC": [PERIODO_RANGE_RX],
+        "Banamex": [RE_ANIO_1, RE_ANIO_2],
+        "BBVA": [re.compile(r"FECHA\s+OPER(?:ACION)?\b.{0,20}?LIQ", re.IGNORECASE)],
+        "Inbursa": [re.compile(DATE_START_RX.pattern, re.IGNORECASE | re.MULTILINE)],
+        "Banorte": [re.compile(r"MONTO\s+DEL\s+DEPOSITO\s+MONTO\s+DEL\s+RETIRO", re.IGNORECASE)],
+    }
+
+    table: Dict[str, Tuple[Fingerprint, ...]] = {}
+    for bank in BANK_NAMES.categories:
+        # Una línea que empieza con la marca es encabezado o pie del propio banco.
+        prints: List[Fingerprint] = [
+            (_line_start(p), LAYOUT_WEIGHT) for p in _brand_prefixes(bank, footers.get(bank, ()))
+        ]
+        prints += [(rx, LAYOUT_WEIGHT) for rx in layout.get(bank, ())]
+        table[bank] = tuple(prints)
+    return table
+
+
+def first_page(pdf_bytes: bytes) -> Tuple[str, str]:
+    """``(metadatos, texto)`` de la página 1; cadenas vacías si no se puede leer."""
+
+    if pymupdf is not None:
+        try:
+            with pymupdf.open(stream=pdf_bytes, filetype="pdf") as doc:
+                meta = doc.metadata or {}
+                text = doc.load_page(0).get_text() if doc.page_count else ""
+        except Exception:
+            return "", ""
+    else:
+        try:
+            with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+                meta = {str(k).lower(): v for k, v in (pdf.metadata or {}).items()}
+                text = (pdf.pages[0].extract_text() or "") if pdf.pages else ""
+        except Exception:
+            return "", ""
+    metadata = " ".join(str(meta.get(key) or "") for key in METADATA_KEYS)
+    return metadata, text
+
+
+def score_banks(text: str, metadata: str = "") -> Dict[str, int]:
+    """Puntaje de cada banco con huellas presentes en el texto/metadatos."""
+
+    chunk = (text or "")[:FIRST_CHUNK_CHARS].upper()
+    scores: Dict[str, int] = {bank: BRAND_BODY_WEIGHT for bank in BANK_NAMES.hits(chunk)}
+    for bank in BANK_NAMES.hits(chunk[:HEADER_CHARS]) | BANK_NAMES.hits((metadata or "").upper()):
+        scores[bank] = BRAND_WEIGHT
+    leftmost = BANK_NAMES.leftmost(chunk[:HEADER_CHARS])
+    if leftmost:
+        scores[leftmost] = scores.get(leftmost, 0) + LEFTMOST_BONUS
+    for bank, prints in fingerprint_table().items():
+        for rx, weight in prints:
+            if rx.search(chunk):
+                scores[bank] = scores.get(bank, 0) + weight
+    return scores
+
+
+def detect_bank_text(text: str, metadata: str = "") -> Optional[str]:
+    """Banco con más puntaje; en empate gana el orden de :data:`BANK_NAMES`."""
+
+    scores = score_banks(text, metadata)
+    if not scores:
+        return None
+    best = max(scores.values())
+    return BANK_NAMES.pick(bank for bank, score in scores.items() if score == best)
+
+
+def detect_bank(pdf_bytes: bytes) -> Optional[str]:
+    """Clave del banco o None si la primera página no lo identifica (p. ej. escaneada)."""
+
+    metadata, text = first_page(pdf_bytes)
+    return detect_bank_text(text, metadata)
+
+
+def detect_account(text: str) -> str:
+    """Dígitos de la cuenta (o CLABE) que aparece en el texto; "" si no hay."""
+
+    match = ACCOUNT_RX.search(text or "")
+    if match:
+        digits = re.sub(r"\D", "", match.group(1))
+        if len(digits) >= 8:
+            return digits
+    match = CLABE_RX.search(text or "")
+    return match.group(0) if match else ""
+
+
+__all__ = [
+    "BANK_NAMES",
+    "detect_account",
+    "detect_bank",
+    "detect_bank_text",
+    "fingerprint_table",
+    "first_page",
+    "score_banks",
+]
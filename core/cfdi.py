@@ -0,0 +1,339 @@
+"""Modelo CFDI 3.3 / 4.0 de una sola pasada compartido por los módulos fiscales."""
+
+from __future__ import annotations
+
+import io
+import xml.etree.ElementTree as ET
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+Attrs = Dict[str, str]
+
+_EMPTY: Attrs = {}
+
+
+def _local_name(tag: Any) -> str:
+    if not isinstance(tag, str):
+        return ""
+    return tag.rsplit("}", 1)[-1] if "}" in tag else tag
+
+
+def to_decimal(value: Optional[str]) -> Decimal:
+    try:
+        return Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        return Decimal("0")
+
+
+def to_float(value: Optional[str]) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+# ============================================================
+# Registros compactos
+# ============================================================
+class Impuestos:
+    """Nodo ``Impuestos`` (global o por concepto) con sus traslados y retenciones."""
+
+    __slots__ = ("attrs", "traslados", "retenciones")
+
+    def __init__(self) -> None:
+        self.attrs: Attrs = _EMPTY
+        self.traslados: List[Attrs] = []
+        self.retenciones: List[Attrs] = []
+
+
+class Concepto:
+    __slots__ = ("attrs", "impuestos", "cuenta_predial")
+
+    def __init__(self, attrs: Attrs) -> None:
+        self.attrs = attrs
+        self.impuestos = Impuestos()
+        self.cuenta_predial: Optional[Attrs] = None
+
+
+class Nomina:
+    """Complemento de nómina 1.2 (acepta prefijos ``nomina``, ``nomina12``, etc.)."""
+
+    __slots__ = ("attrs", "receptor", "percepciones", "deducciones", "otros_pagos")
+
+    def __init__(self, attrs: Attrs) -> None:
+        self.attrs = attrs
+        self.receptor: Attrs = _EMPTY
+        self.percepciones: List[Attrs] = []
+        self.deducciones: List[Attrs] = []
+        # (OtroPago, SubsidioAlEmpleo | None)
+        self.otros_pagos: List[Tuple[Attrs, Optional[Attrs]]] = []
+
+
+class DoctoRelacionado:
+    """Documento pagado dentro de un ``Pago``; en Pagos 2.0 trae sus impuestos ``*DR``."""
+
+    __slots__ = ("attrs", "impuestos")
+
+    def __init__(self, attrs: Attrs) -> None:
+        self.attrs = attrs
+        self.impuestos = Impuestos()
+
+
+class Pago:
+    """Nodo ``Pago`` del complemento de pagos 1.0 / 2.0."""
+
+    __slots__ = ("attrs", "doctos")
+
+    def __init__(self, attrs: Attrs) -> None:
+        self.attrs = attrs
+        self.doctos: List[DoctoRelacionado] = []
+
+
+class Comprobante:
+    """CFDI completo leído con un solo ``ET.fromstring``; el árbol se descarta al terminar."""
+
+    __slots__ = (
+        "header",
+        "emisor",
+        "receptor",
+        "timbre",
+        "impuestos",
+        "conceptos",
+        "traslados_locales",
+        "nomina",
+        "pagos",
+    )
+
+    def __init__(self, header: Attrs) -> None:
+        self.header = header
+        self.emisor: Attrs = _EMPTY
+        self.receptor: Attrs = _EMPTY
+        self.timbre: Attrs = _EMPTY
+        self.impuestos = Impuestos()
+        self.conceptos: List[Concepto] = []
+        self.traslados_locales: List[Attrs] = []
+        self.nomina: Optional[Nomina] = None
+        self.pagos: List[Pago] = []
+
+    @property
+    def uuid(self) -> str:
+        return self.timbre.get("UUID", "")
+
+    def attr(self, name: str) -> str:
+        """Atributo del encabezado sin espacios ("" si no existe)."""
+        return (self.header.get(name) or "").strip()
+
+    def iter_retenciones(self) -> Iterator[Attrs]:
+        """Retenciones globales seguidas de las de cada concepto."""
+        yield from self.impuestos.retenciones
+        for concepto in self.conceptos:
+            yield from concepto.impuestos.retenciones
+
+
+# ============================================================
+# Parser
+# ============================================================
+def _fill_impuestos(target: Impuestos, node: ET.Element, suffix: str = "") -> None:
+    """``suffix`` es ``"DR"`` para los impuestos de un documento relacionado de pagos."""
+
+    target.attrs = node.attrib
+    for group in node:
+        name = _local_name(group.tag)
+        if name == "Traslados" + suffix:
+            target.traslados.extend(child.attrib for child in group if _local_name(child.tag) == "Traslado" + suffix)
+        elif name == "Retenciones" + suffix:
+            target.retenciones.extend(child.attrib for child in group if _local_name(child.tag) == "Retencion" + suffix)
+
+
+def _parse_concepto(node: ET.Element) -> Concepto:
+    concepto = Concepto(node.attrib)
+    for child in node:
+        name = _local_name(child.tag)
+        if name == "Impuestos":
+            _fill_impuestos(concepto.impuestos, child)
+        elif name == "CuentaPredial":
+            concepto.cuenta_predial = child.attrib
+    return concepto
+
+
+def _parse_nomina(node: ET.Element) -> Nomina:
+    nomina = Nomina(node.attrib)
+    for child in node:
+        name = _local_name(child.tag)
+        if name == "Receptor":
+            nomina.receptor = child.attrib
+        elif name == "Percepciones":
+            nomina.percepciones.extend(p.attrib for p in child if _local_name(p.tag) == "Percepcion")
+        elif name == "Deducciones":
+            nomina.deducciones.extend(d.attrib for d in child if _local_name(d.tag) == "Deduccion")
+        elif name == "OtrosPagos":
+            for otro in child:
+                if _local_name(otro.tag) != "OtroPago":
+                    continue
+                subsidio = None
+                for sub in otro:
+                    if _local_name(sub.tag) == "SubsidioAlEmpleo":
+                        subsidio = sub.attrib
+                        break
+                nomina.otros_pagos.append((otro.attrib, subsidio))
+    return nomina
+
+
+def _parse_pagos(node: ET.Element) -> List[Pago]:
+    pagos: List[Pago] = []
+    for pago_node in node:
+        if _local_name(pago_node.tag) != "Pago":
+            continue
+        pago = Pago(pago_node.attrib)
+        for child in pago_node:
+            if _local_name(child.tag) != "DoctoRelacionado":
+                continue
+            docto = DoctoRelacionado(child.attrib)
+            for sub in child:
+                if _local_name(sub.tag) == "ImpuestosDR":
+                    _fill_impuestos(docto.impuestos, sub, "DR")
+            pago.doctos.append(docto)
+        pagos.append(pago)
+    return pagos
+
+
+def _parse_complemento(comp: Comprobante, node: ET.Element) -> None:
+    for child in node:
+        name = _local_name(child.tag)
+        if name == "TimbreFiscalDigital":
+            comp.timbre = child.attrib
+        elif name == "ImpuestosLocales":
+            comp.traslados_locales.extend(
+                loc.attrib for loc in child if _local_name(loc.tag) == "TrasladosLocales"
+            )
+        elif comp.nomina is None and name.lower().startswith("nomina"):
+            comp.nomina = _parse_nomina(child)
+        elif name == "Pagos":
+            comp.pagos.extend(_parse_pagos(child))
+
+
+def parse_comprobante(data: bytes) -> Comprobante:
+    """Construye el árbol una sola vez y lo reduce a un :class:`Comprobante`.
+
+    Lanza ``ET.ParseError`` si el XML no es válido.
+    """
+
+    root = ET.fromstring(data)
+    comp = Comprobante(root.attrib)
+    for child in root:
+        name = _local_name(child.tag)
+        if name == "Emisor":
+            comp.emisor = child.attrib
+        elif name == "Receptor":
+            comp.receptor = child.attrib
+        elif name == "Conceptos":
+            comp.conceptos.extend(_parse_concepto(c) for c in child if _local_name(c.tag) == "Concepto")
+        elif name == "Impuestos":
+            _fill_impuestos(comp.impuestos, child)
+        elif name == "Complemento":
+            _parse_complemento(comp, child)
+    return comp
+
+
+def parse_header(data: bytes) -> Comprobante:
+    """Sólo encabezado y ``Emisor``: deja de leer al llegar al nodo ``Emisor``.
+
+    Para índices de ZIP grandes que no necesitan conceptos ni complementos;
+    el resto del :class:`Comprobante` queda vacío, así que no debe guardarse
+    en ``core.cfdi_store``. Lanza ``ET.ParseError`` si el XML no es válido
+    antes del ``Emisor``.
+    """
+
+    comp: Optional[Comprobante] = None
+    for _, node in ET.iterparse(io.BytesIO(data), events=("start",)):
+        if comp is None:
+            comp = Comprobante(node.attrib)
+        elif _local_name(node.tag).lower() == "emisor":
+            comp.emisor = node.attrib
+            break
+    if comp is None:
+        raise ET.ParseError("no element found")
+    return comp
+
+
+def parse_many(files: Iterable[Tuple[str, bytes]]) -> List[Tuple[str, Comprobante]]:
+    """Parsea cada ``(nombre, bytes)`` y omite los XML inválidos."""
+
+    parsed: List[Tuple[str, Comprobante]] = []
+    for name, blob in files:
+        try:
+            parsed.append((name, parse_comprobante(blob)))
+        except ET.ParseError:
+            continue
+    return parsed
+
+
+# ============================================================
+# Vistas tabulares compartidas
+# ============================================================
+def resumen_row(comp: Comprobante) -> Dict[str, Any]:
+    """Fila resumen usada por Riesgos fiscales (importe de conceptos y traslados)."""
+
+    total_concepto = sum(to_decimal(c.attrs.get("Importe")) for c in comp.conceptos)
+
+    traslados = comp.impuestos.traslados
+    if not traslados:
+        traslados = [t for c in comp.conceptos for t in c.impuestos.traslados]
+    total_traslados = sum(to_decimal(t.get("Importe")) for t in traslados)
+
+    return {
+        "Fecha": comp.header.get("Fecha", ""),
+        "RFC Emisor": comp.emisor.get("Rfc", ""),
+        "Nombre Emisor": comp.emisor.get("Nombre", ""),
+        "UUID": comp.uuid,
+        "cfdi:Concepto Importe": float(total_concepto),
+        "cfdi:Traslado Importe": float(total_traslados),
+        "RegimenFiscalReceptor": comp.receptor.get("RegimenFiscalReceptor", ""),
+    }
+
+
+def conceptos_rows(comp: Comprobante) -> List[Dict[str, Optional[str]]]:
+    """Partidas del CFDI con el primer traslado de cada concepto (hoja "Conceptos")."""
+
+    uuid = comp.timbre.get("UUID")
+    rows: List[Dict[str, Optional[str]]] = []
+    for concepto in comp.conceptos:
+        c_at = concepto.attrs
+        traslados = concepto.impuestos.traslados
+        tr = traslados[0] if traslados else _EMPTY
+        rows.append(
+            {
+                "UUID": uuid,
+                "ClaveProdServ": c_at.get("ClaveProdServ"),
+                "NoIdentificacion": c_at.get("NoIdentificacion"),
+                "Descripcion": c_at.get("Descripcion"),
+                "Cantidad": c_at.get("Cantidad"),
+                "ClaveUnidad": c_at.get("ClaveUnidad"),
+                "Unidad": c_at.get("Unidad"),
+                "ValorUnitario": c_at.get("ValorUnitario"),
+                "Importe": c_at.get("Importe"),
+                "Descuento": c_at.get("Descuento"),
+                "ObjetoImp": c_at.get("ObjetoImp"),
+                "IVA_Base": tr.get("Base"),
+                "IVA_TasaOCuota": tr.get("TasaOCuota"),
+                "IVA_Importe": tr.get("Importe"),
+            }
+        )
+    return rows
+
+
+__all__ = [
+    "Comprobante",
+    "Concepto",
+    "DoctoRelacionado",
+    "Impuestos",
+    "Nomina",
+    "Pago",
+    "conceptos_rows",
+    "parse_comprobante",
+    "parse_header",
+    "parse_many",
+    "resumen_row",
+    "to_decimal",
+    "to_float",
+]
@@ -0,0 +1,237 @@
+"""Ingesta paralela de ZIP con CFDI.
+
+Los miembros ``.xml`` se reparten en bloques a un ``ProcessPoolExecutor``;
+cada proceso lee, calcula SHA-1 y parsea (``core.cfdi``) su bloque y los
+resultados regresan en el orden original del ZIP. Sólo hay ``max_pending``
+bloques en vuelo a la vez, así que la memoria queda acotada sin importar
+el tamaño del ZIP.
+
+Con ``store_path`` los procesos omiten el parseo de los SHA-1 que ya viven
+en ``core.cfdi_store``. El proceso principal prepara el esquema antes de
+arrancar el pool, recupera del almacén los conocidos y guarda los nuevos,
+de modo que reprocesar un ZIP sólo parsea lo nuevo.
+
+Con ``header_only`` cada XML se lee sólo hasta el ``Emisor``
+(:func:`core.cfdi.parse_header`); esos comprobantes parciales no pasan por
+el almacén.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import hashlib
+import io
+import multiprocessing
+import os
+from pathlib import Path
+from typing import BinaryIO, Callable, Deque, Iterator, List, Optional, Sequence, Tuple, Union
+import xml.etree.ElementTree as ET
+import zipfile
+
+from .cfdi import Comprobante, parse_comprobante, parse_header
+from .cfdi_store import init_store, known_sha1, load_many, save_many
+
+ZipSource = Union[bytes, str, Path, BinaryIO]
+StorePath = Optional[Union[str, Path]]
+ProgressCallback = Callable[[int, int], None]
+
+DEFAULT_CHUNK_SIZE = 256
+
+
+class IngestCancelled(RuntimeError):
+    """Se solicitó cancelar la ingesta (``should_cancel`` regresó True)."""
+
+
+class IngestedXml:
+    """Resultado por miembro del ZIP.
+
+    ``comp`` es None si el miembro está vacío o no se pudo leer; en el segundo
+    caso ``error`` trae el detalle del parser. ``cached`` indica que el
+    comprobante salió de ``core.cfdi_store`` en lugar de parsearse.
+    """
+
+    __slots__ = ("filename", "sha1", "comp", "error", "cached")
+
+    def __init__(
+        self,
+        filename: str,
+        sha1: str,
+        comp: Optional[Comprobante],
+        error: Optional[str],
+        cached: bool = False,
+    ) -> None:
+        self.filename = filename
+        self.sha1 = sha1
+        self.comp = comp
+        self.error = error
+        self.cached = cached
+
+
+# Funciones de nivel módulo: deben poder serializarse hacia los procesos hijos.
+def _parse_payload_chunk(
+    payload: Sequence[Tuple[str, bytes]],
+    store_path: StorePath = None,
+    header_only: bool = False,
+) -> List[IngestedXml]:
+    parse = parse_header if header_only else parse_comprobante
+    hashed = [(name, raw, hashlib.sha1(raw).hexdigest()) for name, raw in payload]
+    known = known_sha1(store_path, [sha for _, _, sha in hashed]) if store_path else set()
+    out: List[IngestedXml] = []
+    for name, raw, sha in hashed:
+        if sha in known:
+            out.append(IngestedXml(name, sha, None, None, cached=True))
+        elif not raw:
+            out.append(IngestedXml(name, sha, None, None))
+        else:
+            try:
+                out.append(IngestedXml(name, sha, parse(raw), None))
+            except ET.ParseError as exc:
+                out.append(IngestedXml(name, sha, None, str(exc)))
+    return out
+
+
+def _parse_zip_chunk(
+    zip_path: str,
+    names: Sequence[str],
+    store_path: StorePath = None,
+    header_only: bool = False,
+) -> List[IngestedXml]:
+    with zipfile.ZipFile(zip_path) as zf:
+        payload = [(name, zf.read(name)) for name in names]
+    return _parse_payload_chunk(payload, store_path, header_only)
+
+
+def _sync_store(store_path: StorePath, results: List[IngestedXml]) -> List[IngestedXml]:
+    """Completa los ``cached`` desde el almacén y guarda los recién parseados."""
+
+    if not store_path:
+        return results
+    cached = load_many(store_path, [doc.sha1 for doc in results if doc.cached])
+    for doc in results:
+        if doc.cached:
+            doc.comp = cached.get(doc.sha1)
+    save_many(store_path, ((doc.sha1, doc.comp) for doc in results if doc.comp is not None and not doc.cached))
+    return results
+
+
+def list_xml_members(zf: zipfile.ZipFile) -> List[str]:
+    return [i.filename for i in zf.infolist() if (not i.is_dir()) and i.filename.lower().endswith(".xml")]
+
+
+def _chunks(items: Sequence[str], size: int) -> Iterator[Sequence[str]]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def default_workers() -> int:
+    env = os.getenv("CFDI_INGEST_WORKERS", "").strip()
+    if env.isdigit() and int(env) > 0:
+        return int(env)
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def iter_zip_cfdi(
+    zip_source: ZipSource,
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_workers: Optional[int] = None,
+    max_pending: Optional[int] = None,
+    progress_cb: Optional[ProgressCallback] = None,
+    should_cancel: Optional[Callable[[], bool]] = None,
+    store_path: StorePath = None,
+    header_only: bool = False,
+) -> Iterator[List[IngestedXml]]:
+    """Genera bloques de :class:`IngestedXml` en el orden del ZIP.
+
+    ``progress_cb(procesados, total)`` se invoca tras cada bloque; si lanza una
+    excepción (como hace ``_zip_job_*`` al cancelar) la ingesta se detiene y los
+    bloques pendientes se descartan. ``should_cancel`` se consulta antes de
+    enviar cada bloque y provoca :class:`IngestCancelled`. Con ``header_only``
+    se ignora ``store_path``.
+    """
+
+    chunk_size = max(1, int(chunk_size))
+    if header_only:
+        store_path = None
+    elif store_path:
+        # Se crea o migra aquí, una vez: los procesos hijos sólo consultan.
+        init_store(store_path)
+    workers = max_workers if max_workers is not None else default_workers()
+
+    zip_path: Optional[str] = None
+    stream: Optional[BinaryIO] = None
+    if isinstance(zip_source, (str, Path)):
+        zip_path = str(zip_source)
+    elif isinstance(zip_source, bytes):
+        stream = io.BytesIO(zip_source)
+    else:
+        stream = zip_source
+        try:
+            stream.seek(0)
+        except Exception:
+            pass
+
+    with zipfile.ZipFile(zip_path if zip_path is not None else stream) as zf:
+        names = list_xml_members(zf)
+        total = len(names)
+        processed = 0
+
+        def _payload(chunk: Sequence[str]) -> List[Tuple[str, bytes]]:
+            return [(name, zf.read(name)) for name in chunk]
+
+        def _check_cancel() -> None:
+            if should_cancel is not None and should_cancel():
+                raise IngestCancelled()
+
+        # ZIP pequeño o un solo núcleo: levantar procesos cuesta más que parsear.
+        if workers <= 1 or total <= chunk_size:
+            for chunk in _chunks(names, chunk_size):
+                _check_cancel()
+                results = _sync_store(store_path, _parse_payload_chunk(_payload(chunk), store_path, header_only))
+                processed += len(results)
+                yield results
+                if progress_cb:
+                    progress_cb(processed, total)
+            return
+
+        in_flight = max(1, max_pending or workers * 2)
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        pending: Deque[Future] = deque()
+        chunk_iter = _chunks(names, chunk_size)
+
+        def _submit_next() -> bool:
+            chunk = next(chunk_iter, None)
+            if chunk is None:
+                return False
+            _check_cancel()
+            if zip_path is not None:
+                pending.append(pool.submit(_parse_zip_chunk, zip_path, list(chunk), store_path, header_only))
+            else:
+                pending.append(pool.submit(_parse_payload_chunk, _payload(chunk), store_path, header_only))
+            return True
+
+        try:
+            while len(pending) < in_flight and _submit_next():
+                pass
+            while pending:
+                results = _sync_store(store_path, pending.popleft().result())
+                _submit_next()
+                processed += len(results)
+                yield results
+                if progress_cb:
+                    progress_cb(processed, total)
+        finally:
+            for fut in pending:
+                fut.cancel()
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+__all__ = [
+    "DEFAULT_CHUNK_SIZE",
+    "IngestCancelled",
+    "IngestedXml",
+    "default_workers",
+    "iter_zip_cfdi",
+    "list_xml_members",
+]
@@ -0,0 +1,225 @@
+"""Almacén persistente de CFDI ya parseados, indexado por SHA-1 y UUID.
+
+Cada XML se parsea una sola vez en la vida del almacén: Riesgos fiscales,
+Descarga masiva (XML y nómina) y la Lista negra consultan aquí antes de
+volver a construir el árbol. El :class:`~core.cfdi.Comprobante` completo
+(incluidos conceptos y nómina) se guarda serializado junto con columnas
+indexadas para consultas rápidas.
+
+El módulo no importa ``core.config`` para que los procesos de
+``core.cfdi_ingest`` puedan usarlo sin cargar Streamlit; quien llama pasa
+la ruta (normalmente ``CFDI_STORE_PATH``).
+"""
+
+from __future__ import annotations
+
+from contextlib import closing
+import hashlib
+from pathlib import Path
+import pickle
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+import xml.etree.ElementTree as ET
+
+from .cfdi import Comprobante, parse_comprobante
+
+PathLike = Union[str, Path]
+
+# Subir cuando cambie la forma de Comprobante: invalida los registros serializados.
+STORE_VERSION = 2
+
+_SQL_CHUNK = 800
+_READY: Set[str] = set()
+
+
+def _connect(db_path: PathLike) -> sqlite3.Connection:
+    con = sqlite3.connect(str(db_path), timeout=30)
+    con.execute("PRAGMA journal_mode = WAL;")
+    return con
+
+
+def _chunked(items: Sequence[str], size: int = _SQL_CHUNK) -> Iterable[Sequence[str]]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def sha1_bytes(raw: bytes) -> str:
+    return hashlib.sha1(raw).hexdigest()
+
+
+def init_store(db_path: PathLike) -> None:
+    """Crea el esquema; si la versión cambió descarta los registros previos."""
+
+    path = Path(db_path)
+    if str(path) in _READY and path.exists():
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with closing(_connect(path)) as con:
+        version = con.execute("PRAGMA user_version").fetchone()[0]
+        if version != STORE_VERSION:
+            con.execute("DROP TABLE IF EXISTS cfdi_docs")
+        con.execute(
+            """CREATE TABLE IF NOT EXISTS cfdi_docs(
+                sha1 TEXT PRIMARY KEY,
+                uuid TEXT,
+                tipo TEXT,
+                fecha TEXT,
+                emisor_rfc TEXT,
+                emisor_nombre TEXT,
+                receptor_rfc TEXT,
+                total TEXT,
+                moneda TEXT,
+                payload BLOB NOT NULL)"""
+        )
+        con.execute("CREATE INDEX IF NOT EXISTS idx_cfdi_docs_uuid ON cfdi_docs(uuid)")
+        con.execute("CREATE INDEX IF NOT EXISTS idx_cfdi_docs_emisor ON cfdi_docs(emisor_rfc)")
+        con.execute("CREATE INDEX IF NOT EXISTS idx_cfdi_docs_receptor ON cfdi_docs(receptor_rfc)")
+        con.execute("CREATE INDEX IF NOT EXISTS idx_cfdi_docs_fecha ON cfdi_docs(fecha)")
+        con.execute(f"PRAGMA user_version = {STORE_VERSION}")
+        con.commit()
+    _READY.add(str(path))
+
+
+def known_sha1(db_path: PathLike, shas: Sequence[str]) -> Set[str]:
+    """Subconjunto de ``shas`` que ya está en el almacén.
+
+    Sólo lee: no crea ni migra el esquema, porque la llaman en paralelo los
+    procesos de ``core.cfdi_ingest``. El proceso principal llama a
+    :func:`init_store` antes de repartir el trabajo; un almacén de otra
+    versión se trata como vacío.
+    """
+
+    if not shas or not Path(db_path).exists():
+        return set()
+    found: Set[str] = set()
+    with closing(sqlite3.connect(str(db_path), timeout=30)) as con:
+        if con.execute("PRAGMA user_version").fetchone()[0] != STORE_VERSION:
+            return set()
+        for batch in _chunked(list(shas)):
+            placeholders = ",".join("?" for _ in batch)
+            try:
+                rows = con.execute(f"SELECT sha1 FROM cfdi_docs WHERE sha1 IN ({placeholders})", batch)
+            except sqlite3.OperationalError:
+                return set()
+            found.update(r[0] for r in rows)
+    return found
+
+
+def load_many(db_path: PathLike, shas: Sequence[str]) -> Dict[str, Comprobante]:
+    if not shas or not Path(db_path).exists():
+        return {}
+    init_store(db_path)
+    out: Dict[str, Comprobante] = {}
+    with closing(sqlite3.connect(str(db_path), timeout=30)) as con:
+        for batch in _chunked(list(shas)):
+            placeholders = ",".join("?" for _ in batch)
+            try:
+                rows = con.execute(f"SELECT sha1, payload FROM cfdi_docs WHERE sha1 IN ({placeholders})", batch)
+            except sqlite3.OperationalError:
+                return {}
+            for sha, payload in rows:
+                out[sha] = pickle.loads(payload)
+    return out
+
+
+def save_many(db_path: PathLike, docs: Iterable[Tuple[str, Comprobante]]) -> int:
+    """Inserta ``(sha1, comprobante)``; los SHA ya presentes se ignoran."""
+
+    rows = []
+    for sha, comp in docs:
+        header = comp.header
+        rows.append(
+            (
+                sha,
+                comp.uuid.upper() or None,
+                header.get("TipoDeComprobante"),
+                header.get("Fecha"),
+                (comp.emisor.get("Rfc") or "").strip().upper() or None,
+                comp.emisor.get("Nombre"),
+                (comp.receptor.get("Rfc") or "").strip().upper() or None,
+                header.get("Total"),
+                header.get("Moneda"),
+                pickle.dumps(comp, protocol=pickle.HIGHEST_PROTOCOL),
+            )
+        )
+    if not rows:
+        return 0
+    init_store(db_path)
+    with closing(_connect(db_path)) as con:
+        cur = con.executemany(
+            "INSERT OR IGNORE INTO cfdi_docs(sha1,uuid,tipo,fecha,emisor_rfc,emisor_nombre,receptor_rfc,total,moneda,payload)"
+            " VALUES(?,?,?,?,?,?,?,?,?,?)",
+            rows,
+        )
+        con.commit()
+        return cur.rowcount or 0
+
+
+def load_by_uuid(db_path: PathLike, uuids: Sequence[str]) -> Dict[str, Comprobante]:
+    keys = [u.strip().upper() for u in uuids if u and u.strip()]
+    if not keys or not Path(db_path).exists():
+        return {}
+    init_store(db_path)
+    out: Dict[str, Comprobante] = {}
+    with closing(sqlite3.connect(str(db_path), timeout=30)) as con:
+        for batch in _chunked(keys):
+            placeholders = ",".join("?" for _ in batch)
+            for uuid, payload in con.execute(
+                f"SELECT uuid, payload FROM cfdi_docs WHERE uuid IN ({placeholders})", batch
+            ):
+                out.setdefault(uuid, pickle.loads(payload))
+    return out
+
+
+def resolve_bytes(
+    db_path: Optional[PathLike],
+    files: Iterable[Tuple[str, bytes]],
+) -> List[Tuple[str, Optional[Comprobante]]]:
+    """Regresa ``(nombre, comprobante)`` parseando sólo los XML que no estén en el almacén.
+
+    Los XML inválidos regresan ``None``. Sin ``db_path`` se comporta como un
+    parseo directo.
+    """
+
+    items = [(name, raw, sha1_bytes(raw)) for name, raw in files]
+    cached = load_many(db_path, [sha for _, _, sha in items]) if db_path else {}
+    out: List[Tuple[str, Optional[Comprobante]]] = []
+    new_docs: Dict[str, Comprobante] = {}
+    for name, raw, sha in items:
+        comp = cached.get(sha) or new_docs.get(sha)
+        if comp is None:
+            try:
+                comp = parse_comprobante(raw)
+            except ET.ParseError:
+                out.append((name, None))
+                continue
+            new_docs[sha] = comp
+        out.append((name, comp))
+    if db_path and new_docs:
+        save_many(db_path, new_docs.items())
+    return out
+
+
+def doc_count(db_path: PathLike) -> int:
+    if not Path(db_path).exists():
+        return 0
+    init_store(db_path)
+    with closing(sqlite3.connect(str(db_path), timeout=30)) as con:
+        try:
+            n = con.execute("SELECT COUNT(*) FROM cfdi_docs").fetchone()[0]
+        except sqlite3.OperationalError:
+            return 0
+    return int(n or 0)
+
+
+__all__ = [
+    "STORE_VERSION",
+    "doc_count",
+    "init_store",
+    "known_sha1",
+    "load_by_uuid",
+    "load_many",
+    "resolve_bytes",
+    "save_many",
+    "sha1_bytes",
+]
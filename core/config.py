@@ -24,6 +24,9 @@ BASE_DIR = Path(__file__).resolve().parents[1]
 db_env = os.getenv("DB_PATH", "").strip()
 DB_PATH = Path(db_env).expanduser() if db_env else BASE_DIR / "db" / "tolls.db"
 
+maps_cache_env = os.getenv("MAPS_CACHE_PATH", "").strip()
+MAPS_CACHE_PATH = Path(maps_cache_env).expanduser() if maps_cache_env else DB_PATH.parent / "maps_cache.db"
+
 DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
 PORTAL_DATABASE_URL = os.getenv("PORTAL_DATABASE_URL", "").strip() or DATABASE_URL
 
@@ -33,6 +36,21 @@ if verified_routes_env:
 else:
     VERIFIED_ROUTES_XLSX = BASE_DIR / "data" / "CASETAS TRAFICO TOLUCA.xlsx"
 
+cfdi_store_env = os.getenv("CFDI_STORE_PATH", "").strip()
+CFDI_STORE_PATH = Path(cfdi_store_env).expanduser() if cfdi_store_env else BASE_DIR / "data" / "cfdi_store.db"
+
+ocr_cache_env = os.getenv("OCR_CACHE_DIR", "").strip()
+OCR_CACHE_DIR = Path(ocr_cache_env).expanduser() if ocr_cache_env else BASE_DIR / "data" / "ocr_cache"
+ocr_cache_mb = os.getenv("OCR_CACHE_MAX_MB", "").strip()
+OCR_CACHE_MAX_BYTES = (int(ocr_cache_mb) if ocr_cache_mb.isdigit() else 256) * 1024 * 1024
+
+statement_cache_env = os.getenv("STATEMENT_CACHE_DIR", "").strip()
+STATEMENT_CACHE_DIR = (
+    Path(statement_cache_env).expanduser() if statement_cache_env else BASE_DIR / "data" / "statement_cache"
+)
+statement_cache_mb = os.getenv("STATEMENT_CACHE_MAX_MB", "").strip()
+STATEMENT_CACHE_MAX_BYTES = (int(statement_cache_mb) if statement_cache_mb.isdigit() else 512) * 1024 * 1024
+
 tariffs_env = os.getenv("TARIFFS_XLSX", "").strip()
 if tariffs_env:
     TARIFFS_XLSX = Path(tariffs_env).expanduser()
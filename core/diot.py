@@ -0,0 +1,376 @@
+"""Conversión de la batería DIOT (Excel/CSV) al TXT de carga del SAT.
+
+El TXT une las columnas de cada fila con ``|`` y agrega columnas vacías en
+las posiciones que piden :data:`OPS` (``(n, "||")`` = dos campos vacíos
+justo después de la barra ``n``). En lugar de reinsertar texto línea por
+línea, las posiciones finales se calculan una sola vez con
+:func:`column_layout` y el archivo se arma con un ``str.cat`` por columnas.
+
+La batería también puede salir directamente de los CFDI recibidos
+(:func:`build_battery`): cada CFDI de egreso pagado y cada documento de un
+complemento de pagos se reduce a movimientos ``(proveedor, columna,
+importe)`` y la batería es un ``groupby`` sobre ese DataFrame.
+"""
+
+from __future__ import annotations
+
+import csv
+from dataclasses import dataclass
+import io
+from typing import BinaryIO, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .cfdi import Attrs, Comprobante, to_float
+
+FIRST_DATA_ROW = 3
+CSV_DELIMITERS = ",;|\t"
+# latin-1 decodifica cualquier byte: es el último recurso.
+CSV_ENCODINGS = ("utf-8-sig", "cp1252", "latin-1")
+_SNIFF_CHARS = 64 * 1024
+
+OPS: List[Tuple[int, str]] = [
+    (3, "||||"),
+    (8, "|"),
+    (10, "|"),
+    (12, "|||||"),
+    (18, "|"),
+    (20, "|"),
+    (22, "|||||||||||||||||||||||||"),  # 25 barras
+    (48, "|"),
+    (51, "||"),
+]
+
+Source = Union[bytes, BinaryIO]
+
+# Columnas de la batería (Excel desde la fila 3) antes de aplicar OPS.
+BATTERY_COLUMNS: Tuple[str, ...] = (
+    "Tipo de tercero",
+    "Tipo de operación",
+    "RFC",
+    "Actos pagados 8% región norte",
+    "Actos pagados 8% región sur",
+    "Actos pagados 16%",
+    "IVA acreditable 8% región norte",
+    "IVA acreditable 8% región sur",
+    "IVA acreditable 16%",
+    "IVA retenido",
+    "Actos exentos",
+    "Actos tasa 0%",
+    "Efectos fiscales",
+)
+AMOUNT_COLUMNS: Tuple[str, ...] = BATTERY_COLUMNS[3:12]
+MOVEMENT_COLUMNS: Tuple[str, ...] = (
+    "UUID",
+    "Fecha de pago",
+    "Tipo de tercero",
+    "Tipo de operación",
+    "RFC",
+    "Nombre",
+    "Columna",
+    "Importe",
+)
+
+TERCERO_NACIONAL = "04"
+TERCERO_EXTRANJERO = "05"
+RFC_EXTRANJERO = "XEXX010101000"
+OPERACION_OTROS = "85"
+OPERACION_SERVICIOS_PROFESIONALES = "03"
+OPERACION_ARRENDAMIENTO = "06"
+IVA = "002"
+_TASA_TOLERANCIA = 1e-4
+
+
+def column_layout(ncols: int, ops: Sequence[Tuple[int, str]] = OPS) -> List[Optional[int]]:
+    """Columna de origen de cada campo del TXT; None para los campos vacíos.
+
+    Una inserción sólo aplica si la línea ya tiene ``n`` barras, igual que al
+    insertar texto sobre la línea armada.
+    """
+
+    layout: List[Optional[int]] = list(range(ncols))
+    for nth, chunk in ops:
+        if len(layout) - 1 >= nth:
+            layout[nth:nth] = [None] * chunk.count("|")
+    return layout
+
+
+def frame_to_txt(df: pd.DataFrame, ops: Sequence[Tuple[int, str]] = OPS) -> str:
+    """Filas de ``df`` (todas texto) unidas con ``|`` según :func:`column_layout`."""
+
+    if df.empty:
+        return ""
+    columns = [df.iloc[:, idx].astype(str) for idx in range(df.shape[1])]
+    blank = pd.Series("", index=df.index)
+    fields = [blank if source is None else columns[source] for source in column_layout(len(columns), ops)]
+    lines = fields[0].str.cat(fields[1:], sep="|") if len(fields) > 1 else fields[0]
+    return "\n".join(lines.tolist())
+
+
+def _sniff_delimiter(sample: str) -> str:
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=CSV_DELIMITERS).delimiter
+    except csv.Error:
+        return ","
+
+
+def read_csv_source(data: bytes) -> pd.DataFrame:
+    """CSV sin encabezado, todo como texto; el separador se detecta con la muestra inicial."""
+
+    for encoding in CSV_ENCODINGS:
+        try:
+            text = data.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    return pd.read_csv(
+        io.StringIO(text),
+        header=None,
+        dtype=str,
+        sep=_sniff_delimiter(text[:_SNIFF_CHARS]),
+        skip_blank_lines=False,
+    )
+
+
+def read_source(source: Source, filename: str = "") -> pd.DataFrame:
+    """Filas de datos (desde :data:`FIRST_DATA_ROW`) del Excel o CSV, sin NaN."""
+
+    data = source if isinstance(source, bytes) else source.read()
+    if filename.lower().endswith((".csv", ".txt")):
+        df = read_csv_source(data)
+    else:
+        df = pd.read_excel(io.BytesIO(data), header=None, dtype=str)
+    return df.iloc[FIRST_DATA_ROW - 1 :].fillna("")
+
+
+def excel_to_txt_with_rules(source: Source, filename: str = "") -> str:
+    """TXT DIOT a partir del Excel (o CSV si ``filename`` termina en ``.csv``)."""
+
+    return frame_to_txt(read_source(source, filename))
+
+
+# ============================================================
+# Batería desde CFDI
+# ============================================================
+@dataclass(frozen=True)
+class DiotParams:
+    """``rfc`` del contribuyente (receptor); ``mes`` None toma todo el ejercicio."""
+
+    rfc: str
+    ejercicio: int
+    mes: Optional[int] = None
+    region_8: str = "norte"
+    efectos_fiscales: str = "01"
+
+    @property
+    def periodo(self) -> str:
+        """Prefijo ``AAAA`` o ``AAAA-MM`` de las fechas de pago incluidas."""
+
+        return f"{self.ejercicio:04d}" if self.mes is None else f"{self.ejercicio:04d}-{self.mes:02d}"
+
+
+Movement = Tuple[str, str, str, str, str, str, str, float]
+# Motivos de los documentos que no entran a la batería (``pendientes``).
+PENDIENTE_PAGO_SIN_CFDI = "Pagos 1.0 cuyo CFDI no viene en el lote"
+PENDIENTE_EGRESO_PPD = "Egresos PPD: sin complemento de pago que los ubique en el periodo"
+
+
+def _columnas_tasa(attrs: Attrs, suffix: str, region_8: str) -> Optional[Tuple[str, Optional[str]]]:
+    """``(columna de actos, columna de IVA)`` que corresponde a un traslado de IVA."""
+
+    if (attrs.get("Impuesto" + suffix) or "").strip() != IVA:
+        return None
+    if (attrs.get("TipoFactor" + suffix) or "").strip() == "Exento":
+        return "Actos exentos", None
+    tasa = to_float(attrs.get("TasaOCuota" + suffix))
+    if abs(tasa - 0.16) < _TASA_TOLERANCIA:
+        return "Actos pagados 16%", "IVA acreditable 16%"
+    if abs(tasa - 0.08) < _TASA_TOLERANCIA:
+        return f"Actos pagados 8% región {region_8}", f"IVA acreditable 8% región {region_8}"
+    if abs(tasa) < _TASA_TOLERANCIA:
+        return "Actos tasa 0%", None
+    return None
+
+
+def _traslado_amounts(traslados: Iterable[Attrs], suffix: str, region_8: str) -> List[Tuple[str, float]]:
+    out: List[Tuple[str, float]] = []
+    for attrs in traslados:
+        columnas = _columnas_tasa(attrs, suffix, region_8)
+        if columnas is None:
+            continue
+        actos, iva = columnas
+        out.append((actos, to_float(attrs.get("Base" + suffix))))
+        if iva is not None:
+            out.append((iva, to_float(attrs.get("Importe" + suffix))))
+    return out
+
+
+def _iva_retenido(retenciones: Iterable[Attrs], suffix: str = "") -> float:
+    return sum(to_float(r.get("Importe" + suffix)) for r in retenciones if (r.get("Impuesto" + suffix) or "").strip() == IVA)
+
+
+def _cfdi_amounts(comp: Comprobante, region_8: str) -> List[Tuple[str, float]]:
+    """Actos, IVA y retenciones del CFDI en su moneda, por columna de la batería."""
+
+    # Los traslados por concepto traen Base también en CFDI 3.3; los globales no.
+    traslados = [t for c in comp.conceptos for t in c.impuestos.traslados] or comp.impuestos.traslados
+    amounts = _traslado_amounts(traslados, "", region_8)
+    # Las retenciones globales resumen las de los conceptos: no se suman ambas.
+    retenciones = comp.impuestos.retenciones or [r for c in comp.conceptos for r in c.impuestos.retenciones]
+    retenido = _iva_retenido(retenciones)
+    if retenido:
+        amounts.append(("IVA retenido", retenido))
+    return amounts
+
+
+def _tipo_cambio(value: Optional[str]) -> float:
+    rate = to_float(value)
+    return rate if rate > 0 else 1.0
+
+
+def _tipo_tercero(rfc: str) -> str:
+    return TERCERO_EXTRANJERO if rfc == RFC_EXTRANJERO else TERCERO_NACIONAL
+
+
+def _tipo_operacion(comp: Comprobante, amounts: Sequence[Tuple[str, float]]) -> str:
+    regimen = (comp.emisor.get("RegimenFiscal") or "").strip()
+    if regimen == "606":
+        return OPERACION_ARRENDAMIENTO
+    if regimen == "612" and any(col == "IVA retenido" for col, _ in amounts):
+        return OPERACION_SERVICIOS_PROFESIONALES
+    return OPERACION_OTROS
+
+
+def collect_movements(
+    comps: Iterable[Comprobante], params: DiotParams
+) -> Tuple[pd.DataFrame, List[Tuple[str, str]]]:
+    """Movimientos pagados en el periodo y ``(UUID, motivo)`` de lo que se omitió.
+
+    - Ingreso/Egreso PUE: cuenta en su ``Fecha``; los egresos (notas de crédito)
+      restan.
+    - Ingreso PPD: cuenta con cada ``DoctoRelacionado`` de un complemento de
+      pagos. Pagos 2.0 trae los impuestos del documento; en Pagos 1.0 se
+      prorratea el CFDI original (``ImpPagado / Total``), que debe venir en
+      el mismo lote; si no viene, queda en ``pendientes``.
+    - Egreso PPD: los complementos de pago sólo relacionan ingresos, así que
+      no hay fecha de pago que lo ubique; se reporta en ``pendientes`` si su
+      ``Fecha`` cae en el periodo.
+    """
+
+    rfc = params.rfc.strip().upper()
+    region = params.region_8
+    records: List[Movement] = []
+    ppd: Dict[str, Tuple[Comprobante, List[Tuple[str, float]], str]] = {}
+    pagos: List[Comprobante] = []
+    pendientes: List[Tuple[str, str]] = []
+
+    def _add(comp: Comprobante, fecha: str, operacion: str, amounts: Iterable[Tuple[str, float]], factor: float) -> None:
+        emisor = (comp.emisor.get("Rfc") or "").strip().upper()
+        nombre = comp.emisor.get("Nombre") or ""
+        tercero = _tipo_tercero(emisor)
+        records.extend(
+            (comp.uuid, fecha, tercero, operacion, emisor, nombre, col, value * factor) for col, value in amounts
+        )
+
+    for comp in comps:
+        if rfc and (comp.receptor.get("Rfc") or "").strip().upper() != rfc:
+            continue
+        tipo = comp.attr("TipoDeComprobante").upper()
+        if tipo == "P":
+            pagos.append(comp)
+            continue
+        if tipo not in ("I", "E"):
+            continue
+        amounts = _cfdi_amounts(comp, region)
+        operacion = _tipo_operacion(comp, amounts)
+        if comp.attr("MetodoPago").upper() == "PPD":
+            if tipo == "I" and comp.uuid:
+                ppd[comp.uuid.upper()] = (comp, amounts, operacion)
+            elif tipo == "E" and comp.attr("Fecha").startswith(params.periodo):
+                pendientes.append((comp.uuid, PENDIENTE_EGRESO_PPD))
+            continue
+        factor = _tipo_cambio(comp.attr("TipoCambio")) * (-1.0 if tipo == "E" else 1.0)
+        _add(comp, comp.attr("Fecha")[:10], operacion, amounts, factor)
+
+    for comp in pagos:
+        for pago in comp.pagos:
+            fecha = (pago.attrs.get("FechaPago") or "")[:10]
+            tc_pago = _tipo_cambio(pago.attrs.get("TipoCambioP"))
+            for docto in pago.doctos:
+                uuid_dr = (docto.attrs.get("IdDocumento") or "").strip().upper()
+                original = ppd.get(uuid_dr)
+                # Importes en la moneda del documento: a la del pago y luego a MXN.
+                equivalencia = docto.attrs.get("EquivalenciaDR") or docto.attrs.get("TipoCambioDR")
+                factor = tc_pago / _tipo_cambio(equivalencia)
+                if docto.impuestos.traslados or docto.impuestos.retenciones:
+                    amounts = _traslado_amounts(docto.impuestos.traslados, "DR", region)
+                    retenido = _iva_retenido(docto.impuestos.retenciones, "DR")
+                    if retenido:
+                        amounts.append(("IVA retenido", retenido))
+                    operacion = original[2] if original else _tipo_operacion(comp, amounts)
+                    _add(comp, fecha, operacion, amounts, factor)
+                elif original is not None:
+                    doc, amounts, operacion = original
+                    total = to_float(doc.attr("Total"))
+                    if total > 0:
+                        _add(comp, fecha, operacion, amounts, factor * to_float(docto.attrs.get("ImpPagado")) / total)
+                elif (docto.attrs.get("ObjetoImpDR") or "").strip() != "01":
+                    pendientes.append((uuid_dr or comp.uuid, PENDIENTE_PAGO_SIN_CFDI))
+
+    frame = pd.DataFrame.from_records(records, columns=list(MOVEMENT_COLUMNS))
+    if not frame.empty:
+        frame = frame[frame["Fecha de pago"].str.startswith(params.periodo)].reset_index(drop=True)
+    return frame, pendientes
+
+
+def battery_from_movements(movements: pd.DataFrame, efectos_fiscales: str = "01") -> pd.DataFrame:
+    """Batería (:data:`BATTERY_COLUMNS`, todo texto) agrupando por tercero, operación y RFC.
+
+    Los importes van en pesos enteros; los ceros quedan vacíos y se omiten
+    los proveedores sin ningún importe.
+    """
+
+    keys = ["Tipo de tercero", "Tipo de operación", "RFC"]
+    if movements.empty:
+        return pd.DataFrame(columns=list(BATTERY_COLUMNS))
+    totals = (
+        movements.groupby(keys + ["Columna"], sort=True)["Importe"]
+        .sum()
+        .unstack("Columna", fill_value=0.0)
+        .reindex(columns=list(AMOUNT_COLUMNS), fill_value=0.0)
+    )
+    pesos = np.floor(totals.to_numpy(dtype=float).clip(min=0) + 0.5).astype(np.int64)
+    keep = pesos.any(axis=1)
+    battery = totals.index.to_frame(index=False)[keep]
+    amounts = pd.DataFrame(pesos[keep], columns=list(AMOUNT_COLUMNS), index=battery.index).astype(str)
+    battery = pd.concat([battery, amounts.mask(amounts == "0", "")], axis=1)
+    battery["Efectos fiscales"] = efectos_fiscales
+    return battery[list(BATTERY_COLUMNS)].reset_index(drop=True)
+
+
+def build_battery(comps: Iterable[Comprobante], params: DiotParams) -> Tuple[pd.DataFrame, pd.DataFrame, List[str]]:
+    """``(batería, movimientos, pendientes)`` a partir de los CFDI recibidos."""
+
+    movements, pendientes = collect_movements(comps, params)
+    return battery_from_movements(movements, params.efectos_fiscales), movements, pendientes
+
+
+__all__ = [
+    "AMOUNT_COLUMNS",
+    "BATTERY_COLUMNS",
+    "DiotParams",
+    "FIRST_DATA_ROW",
+    "MOVEMENT_COLUMNS",
+    "OPS",
+    "PENDIENTE_EGRESO_PPD",
+    "PENDIENTE_PAGO_SIN_CFDI",
+    "battery_from_movements",
+    "build_battery",
+    "collect_movements",
+    "column_layout",
+    "excel_to_txt_with_rules",
+    "frame_to_txt",
+    "read_csv_source",
+    "read_source",
+]
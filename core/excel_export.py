@@ -0,0 +1,193 @@
+"""Exportación a Excel en flujo, con memoria constante.
+
+``pd.ExcelWriter`` arma en memoria el libro completo (con openpyxl, un objeto
+por celda) y varias páginas además recorrían ``ws.cell(...)`` fila por fila
+para poner el formato de fecha. Aquí se usa xlsxwriter en modo
+``constant_memory``: cada fila se escribe a un archivo temporal en cuanto se
+termina, y los formatos de columna se declaran antes de escribir datos.
+
+El DataFrame se recorre en bloques de :data:`CHUNK_ROWS` filas, así que la
+conversión a valores de Python tampoco duplica el frame completo.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date, datetime
+import io
+import math
+import numbers
+import re
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Set
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+CHUNK_ROWS = 5000
+MAX_COLUMN_WIDTH = 50
+
+DATE_FORMAT = "DD/MM/YYYY"
+# Mismos formatos que usa pandas por defecto al escribir fechas.
+DEFAULT_DATE_FORMAT = "YYYY-MM-DD"
+DEFAULT_DATETIME_FORMAT = "YYYY-MM-DD HH:MM:SS"
+
+HEADER_STYLE = {"bold": True, "border": 1, "align": "center", "valign": "top"}
+TITLE_STYLE = {"bold": True, "font_size": 14, "align": "center"}
+
+_SHEET_INVALID = re.compile(r"[\[\]:*?/\\]")
+
+
+@dataclass(frozen=True)
+class SheetSpec:
+    """Una hoja del libro: datos, formatos por columna y adornos opcionales."""
+
+    name: str
+    frame: pd.DataFrame
+    column_formats: Mapping[str, str] = field(default_factory=dict)
+    title: Optional[str] = None
+    freeze_header: bool = False
+    autofilter: bool = False
+    autofit: bool = False
+
+
+def safe_sheet_name(name: str, used: Set[str]) -> str:
+    """Nombre válido para Excel (≤31, sin ``[]:*?/\\``) y único dentro de ``used``."""
+
+    base = _SHEET_INVALID.sub("-", str(name)).strip()[:31] or "Hoja"
+    candidate = base
+    counter = 2
+    while candidate.lower() in used:
+        suffix = f" ({counter})"
+        candidate = base[: 31 - len(suffix)] + suffix
+        counter += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def _column_width(series: pd.Series, header: str) -> int:
+    lengths = series.astype(str).str.len()
+    longest = int(lengths.max()) if len(lengths) else 0
+    return min(max(longest, len(str(header))) + 2, MAX_COLUMN_WIDTH)
+
+
+def _cell_values(series: pd.Series) -> List[Any]:
+    """Valores listos para xlsxwriter; ``None`` para los vacíos."""
+
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        if getattr(series.dt, "tz", None) is not None:
+            series = series.dt.tz_localize(None)
+        return [None if v is pd.NaT else v.to_pydatetime() for v in series]
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return [None if pd.isna(v) else bool(v) for v in series]
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        values = series.to_numpy(dtype="float64", na_value=np.nan)
+        return [None if math.isnan(v) or math.isinf(v) else v for v in values.tolist()]
+    return series.tolist()
+
+
+def _writer_for(ws, fmt, default_formats: Dict[type, Any]) -> Callable[[int, int, Any], None]:
+    def write(row: int, col: int, value: Any) -> None:
+        if value is None or value is pd.NA or value is pd.NaT:
+            if fmt is not None:
+                ws.write_blank(row, col, None, fmt)
+            return
+        if isinstance(value, str):
+            ws.write_string(row, col, value, fmt)
+        elif isinstance(value, (bool, np.bool_)):
+            ws.write_boolean(row, col, bool(value), fmt)
+        elif isinstance(value, numbers.Number) and not isinstance(value, complex):
+            number = float(value)
+            if math.isnan(number) or math.isinf(number):
+                return
+            ws.write_number(row, col, number, fmt)
+        elif isinstance(value, pd.Timestamp):
+            ws.write_datetime(row, col, value.tz_localize(None).to_pydatetime(), fmt or default_formats[datetime])
+        elif isinstance(value, datetime):
+            ws.write_datetime(row, col, value.replace(tzinfo=None), fmt or default_formats[datetime])
+        elif isinstance(value, date):
+            ws.write_datetime(row, col, value, fmt or default_formats[date])
+        else:
+            ws.write_string(row, col, str(value), fmt)
+
+    return write
+
+
+def _write_sheet(workbook, spec: SheetSpec, used: Set[str], header_fmt, title_fmt, default_formats) -> None:
+    df = spec.frame
+    ws = workbook.add_worksheet(safe_sheet_name(spec.name, used))
+    columns = [str(c) for c in df.columns]
+    ncols = max(1, len(columns))
+
+    # En constant_memory todo lo que afecta a columnas va antes de la primera fila.
+    col_formats = []
+    for idx, column in enumerate(columns):
+        num_format = spec.column_formats.get(column)
+        fmt = workbook.add_format({"num_format": num_format}) if num_format else None
+        col_formats.append(fmt)
+        width = _column_width(df.iloc[:, idx], column) if spec.autofit else None
+        if width is not None or fmt is not None:
+            ws.set_column(idx, idx, width, fmt)
+
+    row = 0
+    if spec.title:
+        if ncols > 1:
+            ws.merge_range(0, 0, 0, ncols - 1, spec.title, title_fmt)
+        else:
+            ws.write_string(0, 0, spec.title, title_fmt)
+        row = 2
+    header_row = row
+    for idx, column in enumerate(columns):
+        ws.write_string(header_row, idx, column, header_fmt)
+    row += 1
+
+    writers = [_writer_for(ws, fmt, default_formats) for fmt in col_formats]
+    for start in range(0, len(df), CHUNK_ROWS):
+        block = df.iloc[start : start + CHUNK_ROWS]
+        values = [_cell_values(block.iloc[:, idx]) for idx in range(len(columns))]
+        for offset in range(len(block)):
+            for idx, write in enumerate(writers):
+                write(row, idx, values[idx][offset])
+            row += 1
+
+    if spec.freeze_header:
+        ws.freeze_panes(header_row + 1, 0)
+    if spec.autofilter and columns:
+        ws.autofilter(header_row, 0, max(header_row, row - 1), len(columns) - 1)
+
+
+def write_workbook(sheets: Iterable[SheetSpec]) -> bytes:
+    """Libro ``.xlsx`` con una hoja por :class:`SheetSpec`, en el orden dado."""
+
+    buffer = io.BytesIO()
+    workbook = xlsxwriter.Workbook(buffer, {"constant_memory": True})
+    try:
+        header_fmt = workbook.add_format(HEADER_STYLE)
+        title_fmt = workbook.add_format(TITLE_STYLE)
+        default_formats = {
+            date: workbook.add_format({"num_format": DEFAULT_DATE_FORMAT}),
+            datetime: workbook.add_format({"num_format": DEFAULT_DATETIME_FORMAT}),
+        }
+        used: Set[str] = set()
+        for spec in sheets:
+            _write_sheet(workbook, spec, used, header_fmt, title_fmt, default_formats)
+        if not used:
+            workbook.add_worksheet()
+    finally:
+        workbook.close()
+    return buffer.getvalue()
+
+
+def frame_to_xlsx(df: pd.DataFrame, sheet_name: str = "Hoja1", **options: Any) -> bytes:
+    """Atajo para un libro de una sola hoja; ``options`` van a :class:`SheetSpec`."""
+
+    return write_workbook([SheetSpec(sheet_name, df, **options)])
+
+
+__all__ = [
+    "DATE_FORMAT",
+    "SheetSpec",
+    "frame_to_xlsx",
+    "safe_sheet_name",
+    "write_workbook",
+]
@@ -7,7 +7,34 @@ import re
 from typing import List, Tuple
 
 import pandas as pd
-import pdfplumber
+
+from .keyword_classifier import KeywordClassifier
+from .pdf_pages import extract_page_texts
+
+# Reglas de beneficiario en orden de prioridad (texto en minúsculas).
+BENEFICIARIO_KW = KeywordClassifier(
+    {
+        "traspaso": ("traspaso entre cuentas",),
+        "intereses": ("intereses exento",),
+        "capital": ("pago de capital",),
+        "comisiones": ("pago de iva", "pago de comisiones"),
+        "comision_orden": ("comision orden de pago", "i.v.a. orden de pago"),
+        "por_comprobar": ("ret otros 96531", "retiro dep. electronico"),
+        "comision_bonif": ("depositos de nomina bonif comision", "bonif iva bonif comision"),
+        "comision_memb": ("com memb p.m.", "iva memb p.m."),
+    }
+)
+BENEFICIARIO_LABELS = {
+    "traspaso": "Traspaso entre cuentas",
+    "intereses": "INTERESES EXENTO",
+    "capital": "PAGO DE CAPITAL",
+    "comisiones": "COMISIONES",
+    "comision_orden": "COMISION",
+    "por_comprobar": "POR COMPROBAR",
+    "comision_bonif": "COMISION",
+    "comision_memb": "COMISION",
+}
+MOVIMIENTO_KW = KeywordClassifier({"retiro": ("RETIRO",), "recibido": ("SPEI RECIBIDO", "ABONO")})
 
 
 def _patron_fecha() -> re.Pattern[str]:
@@ -23,9 +50,8 @@ def _patron_exclusion() -> re.Pattern[str]:
     )
 
 
-def _extraer_anio_periodo(pdf: pdfplumber.PDF) -> str:
-    for page in pdf.pages:
-        text = page.extract_text()
+def _extraer_anio_periodo(page_texts: List[str]) -> str:
+    for text in page_texts:
         if not text:
             continue
         match = re.search(r"\b20\d{2}\b", text)
@@ -65,31 +91,14 @@ def _extraer_campos(texto: str, anio_periodo: str) -> dict[str, str]:
     match_benef = re.search(r"BENEF:\s*(.+?)(?:\(|$|\n|\r|\-)", descripcion, re.IGNORECASE)
     if match_benef:
         beneficiario = match_benef.group(1).strip()
-    elif registro == "MCL2306166R8" or "traspaso entre cuentas" in descripcion_lower:
+    elif registro == "MCL2306166R8":
         beneficiario = "Traspaso entre cuentas"
-    elif "intereses exento" in descripcion_lower:
-        beneficiario = "INTERESES EXENTO"
-    elif "pago de capital" in descripcion_lower:
-        beneficiario = "PAGO DE CAPITAL"
-    elif "pago de iva" in descripcion_lower or "pago de comisiones" in descripcion_lower:
-        beneficiario = "COMISIONES"
-    elif any(token in descripcion_lower for token in ["comision orden de pago", "i.v.a. orden de pago"]):
-        beneficiario = "COMISION"
-    elif any(token in descripcion_lower for token in ["ret otros 96531", "retiro dep. electronico"]):
-        beneficiario = "POR COMPROBAR"
-    elif any(token in descripcion_lower for token in ["depositos de nomina bonif comision", "bonif iva bonif comision"]):
-        beneficiario = "COMISION"
-    elif any(token in descripcion_lower for token in ["com memb p.m.", "iva memb p.m."]):
-        beneficiario = "COMISION"
     else:
-        beneficiario = ""
+        beneficiario = BENEFICIARIO_LABELS.get(BENEFICIARIO_KW.first(descripcion_lower), "")
 
     cargo = ""
     abono = ""
-    texto_upper = texto.upper()
-    if "RETIRO" in texto_upper:
-        abono = monto_unico
-    elif "SPEI RECIBIDO" in texto_upper or "ABONO" in texto_upper:
+    if MOVIMIENTO_KW.first(texto.upper()) == "recibido":
         cargo = monto_unico
     else:
         abono = monto_unico
@@ -105,41 +114,39 @@ def _extraer_campos(texto: str, anio_periodo: str) -> dict[str, str]:
     }
 
 
-def procesar_pdf(path_pdf: str) -> Tuple[str, pd.DataFrame]:
+def extraer_banorte(pdf_file) -> pd.DataFrame:
     movimientos: List[str] = []
     movimiento_actual: List[str] = []
 
     fecha_pat = _patron_fecha()
     exclusion_pat = _patron_exclusion()
 
-    with pdfplumber.open(path_pdf) as pdf:
-        anio_periodo = _extraer_anio_periodo(pdf)
+    page_texts = extract_page_texts(pdf_file)
+    anio_periodo = _extraer_anio_periodo(page_texts)
 
-    with pdfplumber.open(path_pdf) as pdf:
-        capturando = False
-        for pagina in pdf.pages:
-            texto = pagina.extract_text()
-            if not texto:
+    capturando = False
+    for texto in page_texts:
+        if not texto:
+            continue
+        lineas = texto.split("\n")
+        for linea in lineas:
+            if "DETALLE DE MOVIMIENTOS (PESOS)" in linea:
+                capturando = True
+                continue
+            if any(fin in linea for fin in ["INVERSION ENLACE", "COMPROBANTE FISCAL", "OTROS▼", "GAT", "Cadena original", "Versión CFDI"]):
+                capturando = False
                 continue
-            lineas = texto.split("\n")
-            for linea in lineas:
-                if "DETALLE DE MOVIMIENTOS (PESOS)" in linea:
-                    capturando = True
-                    continue
-                if any(fin in linea for fin in ["INVERSION ENLACE", "COMPROBANTE FISCAL", "OTROS▼", "GAT", "Cadena original", "Versión CFDI"]):
-                    capturando = False
-                    continue
-                if not capturando or exclusion_pat.search(linea):
-                    continue
-
-                if fecha_pat.match(linea.strip()[:9]):
-                    if movimiento_actual:
-                        movimientos.append("\n".join(movimiento_actual))
-                        movimiento_actual = []
-                movimiento_actual.append(linea.strip())
-
-        if movimiento_actual:
-            movimientos.append("\n".join(movimiento_actual))
+            if not capturando or exclusion_pat.search(linea):
+                continue
+
+            if fecha_pat.match(linea.strip()[:9]):
+                if movimiento_actual:
+                    movimientos.append("\n".join(movimiento_actual))
+                    movimiento_actual = []
+            movimiento_actual.append(linea.strip())
+
+    if movimiento_actual:
+        movimientos.append("\n".join(movimiento_actual))
 
     datos = [_extraer_campos(mov, anio_periodo) for mov in movimientos]
     df = pd.DataFrame(datos)
@@ -150,7 +157,10 @@ def procesar_pdf(path_pdf: str) -> Tuple[str, pd.DataFrame]:
     df["Fecha"] = pd.to_datetime(df["Fecha"], format="%d-%b-%y", errors="coerce").dt.strftime("%d/%m/%Y")
 
     columnas = ["Fecha", "Beneficiario", "CLABE", "Registro", "Cargo", "Abono", "Descripción"]
-    df = df[columnas]
+    return df[columnas]
 
+
+def procesar_pdf(path_pdf: str) -> Tuple[str, pd.DataFrame]:
+    df = extraer_banorte(path_pdf)
     path_excel = _guardar_excel(df, path_pdf)
     return path_excel, df
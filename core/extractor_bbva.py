@@ -7,9 +7,11 @@ from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 import pandas as pd
-import pdfplumber
 from dateutil import parser as dateparser
 
+from .keyword_classifier import KeywordClassifier
+from .pdf_pages import map_pages
+
 EXTRA_JOINER = "\n"
 COLUMNS = [
     "Fecha_Operación",
@@ -106,10 +108,27 @@ def _parse_date_token(token: Optional[str], year_hint: Optional[int]) -> Optiona
         return None
 
 
+# Mismos parámetros en todos los pasos: con ``PageCache`` el layout se calcula una vez.
+WORD_KWARGS = dict(keep_blank_chars=False, x_tolerance=2, y_tolerance=2, use_text_flow=False)
+# Respaldo por líneas de la tabla; ``PageCache.extract_tables`` lo memoiza con esta llave.
+# Los ajustes de texto llevan el prefijo ``text_`` (pdfplumber >= 0.10 rechaza los sueltos).
+LINE_TABLE_SETTINGS = {
+    "vertical_strategy": "lines",
+    "horizontal_strategy": "lines",
+    "intersection_tolerance": 5,
+    "snap_tolerance": 3,
+    "min_words_vertical": 1,
+    "min_words_horizontal": 1,
+    "text_keep_blank_chars": False,
+    "text_x_tolerance": 2,
+    "text_y_tolerance": 2,
+}
+
+
 def _detect_columns_x(page, prev_meta: Optional[Dict[str, float]] = None) -> Dict[str, Optional[float]]:
     cargo_x = abono_x = None
     try:
-        words = page.extract_words(keep_blank_chars=False, x_tolerance=2, y_tolerance=2, use_text_flow=False) or []
+        words = page.extract_words(**WORD_KWARGS) or []
         for word in words:
             text = _strip_accents_upper(word.get("text", ""))
             if text == "CARGOS":
@@ -162,7 +181,7 @@ def _find_table_top_y(words: List[Dict[str, Any]]) -> float:
 def _words_to_rows(page, prev_meta: Optional[Dict[str, float]], gap_x: float = 22.0, row_tol: float = 3.0) -> List[Dict[str, Any]]:
     meta = _detect_columns_x(page, prev_meta=prev_meta)
     try:
-        words = page.extract_words(keep_blank_chars=False, x_tolerance=2, y_tolerance=2, use_text_flow=False) or []
+        words = page.extract_words(**WORD_KWARGS) or []
     except Exception:
         words = []
     if not words:
@@ -250,18 +269,7 @@ def _extract_rows_by_lines(page, prev_meta: Optional[Dict[str, float]]) -> List[
     meta = _detect_columns_x(page, prev_meta=prev_meta)
     rows: List[Dict[str, Any]] = []
     try:
-        tables = page.extract_tables(
-            {
-                "vertical_strategy": "lines",
-                "horizontal_strategy": "lines",
-                "intersection_tolerance": 5,
-                "snap_tolerance": 3,
-                "min_words_vertical": 1,
-                "min_words_horizontal": 1,
-                "keep_blank_chars": False,
-                "text_tolerance": 2,
-            }
-        )
+        tables = page.extract_tables(LINE_TABLE_SETTINGS)
     except Exception:
         tables = None
     if not tables:
@@ -342,9 +350,16 @@ ABONO_CODES = {"T20", "T22", "N17"}
 CARGO_CODES = {"T17", "N02", "P14", "S39", "S40", "X01", "G00", "G30", "P31"}
 
 
+MOVIMIENTO_KW = KeywordClassifier(
+    {
+        "abono": ("INTERESES GANADOS", "RECIBID", "DEVUELT", "DEVOLUCION"),
+        "cargo": ("ENVIADO", "PAGO", "SERV", "TELCEL", "IMSS", "SAT", "SEGUROS", "COBRO"),
+    }
+)
+MOVIMIENTO_NORM_KW = KeywordClassifier({"abono": ("INT GANADOS",)})
+
+
 def _classify_by_code_or_text(codigo: Optional[str], descripcion: str, concepto: Optional[str] = None) -> Optional[str]:
-    up = _strip_accents_upper(descripcion)
-    norm = _normalize_for_match(descripcion)
     code = (codigo or "").upper().strip()
 
     if code in ABONO_CODES:
@@ -353,47 +368,45 @@ def _classify_by_code_or_text(codigo: Optional[str], descripcion: str, concepto:
         return "cargo"
     if concepto and _strip_accents_upper(concepto) == "INTERESES":
         return "abono"
-    if "INTERESES GANADOS" in up or "INT GANADOS" in norm:
-        return "abono"
-    if any(token in up for token in ["RECIBID", "DEVUELT", "DEVOLUCION"]):
-        return "abono"
-    if any(token in up for token in ["ENVIADO", "PAGO", "SERV", "TELCEL", "IMSS", "SAT", "SEGUROS", "COBRO"]):
-        return "cargo"
-    return None
+    hits = MOVIMIENTO_KW.hits(_strip_accents_upper(descripcion))
+    hits = hits | MOVIMIENTO_NORM_KW.hits(_normalize_for_match(descripcion))
+    return MOVIMIENTO_KW.pick(hits)
+
+
+# Etiquetas en orden de prioridad; la primera con algún token gana.
+CONCEPTO_KW = KeywordClassifier(
+    {
+        "Comisión": ("IVA PENALIZ", "PENALIZ", "IVA COM", "SERV BANCA"),
+        "Impuestos SAT": ("SAT", "IMPUEST"),
+        "Pago devuelto": ("DEVUELT", "DEPOSITO ERR"),
+        "Entre Cuentas": ("PAGO TARJETA DE CREDITO", "PAGO TARJETA CREDITO"),
+        "IMSS": ("IMSS", "INFONAVIT", "SIPARE"),
+        "Pago Nomina": ("PAGO DE NOMINA", "PAGO NOMINA"),
+        "Pase Servicios Electrónicos": ("PASE",),
+        "AXA Seguros": ("AXA",),
+        "Intereses": ("INTERESES GANADOS",),
+        "ISR Retenido por Intereses": ("I.S.R. RETENIDO", "ISR RETENIDO"),
+        "Préstamo": ("PREST.",),
+        "Radio Móvil Dipsa": ("TELCEL",),
+        "Crédito Covalto": ("BANCO FINTERRA",),
+        "BBVA Seguros México": ("RECIBO NO",),
+    }
+)
+# Variantes que sólo aparecen con la puntuación ya normalizada.
+CONCEPTO_NORM_KW = KeywordClassifier(
+    {
+        "Entre Cuentas": ("DISP T NEGOCIOS",),
+        "ISR Retenido por Intereses": ("I S R RETENIDO",),
+    }
+)
 
 
 def _compute_concepto(block_no_dates: str, lineas: List[str]) -> Optional[str]:
-    up = _strip_accents_upper(block_no_dates)
-    norm = _normalize_for_match(block_no_dates)
-
-    if any(token in up for token in ["IVA PENALIZ", "PENALIZ", "IVA COM", "SERV BANCA"]):
-        return "Comisión"
-    if "SAT" in up or "IMPUEST" in up:
-        return "Impuestos SAT"
-    if "DEVUELT" in up or "DEPOSITO ERR" in up:
-        return "Pago devuelto"
-    if "DISP T NEGOCIOS" in norm or "PAGO TARJETA DE CREDITO" in up or "PAGO TARJETA CREDITO" in up:
-        return "Entre Cuentas"
-    if any(token in up for token in ["IMSS", "INFONAVIT", "SIPARE"]):
-        return "IMSS"
-    if "PAGO DE NOMINA" in up or "PAGO NOMINA" in up:
-        return "Pago Nomina"
-    if "PASE" in up:
-        return "Pase Servicios Electrónicos"
-    if "AXA" in up:
-        return "AXA Seguros"
-    if "INTERESES GANADOS" in up:
-        return "Intereses"
-    if "I.S.R. RETENIDO" in up or "ISR RETENIDO" in up or "I S R RETENIDO" in norm:
-        return "ISR Retenido por Intereses"
-    if "PREST." in up:
-        return "Préstamo"
-    if "TELCEL" in up:
-        return "Radio Móvil Dipsa"
-    if "BANCO FINTERRA" in up:
-        return "Crédito Covalto"
-    if "RECIBO NO." in up or "RECIBO NO " in up or "RECIBO NO" in up:
-        return "BBVA Seguros México"
+    hits = CONCEPTO_KW.hits(_strip_accents_upper(block_no_dates))
+    hits = hits | CONCEPTO_NORM_KW.hits(_normalize_for_match(block_no_dates))
+    label = CONCEPTO_KW.pick(hits)
+    if label:
+        return label
     if len(lineas) >= 5:
         return lineas[4] or None
     return None
@@ -511,10 +524,6 @@ def _row_to_record(row: Dict[str, Any], year_hint: Optional[int]) -> Optional[Di
                     decided = "abono" if abs(ac - ax) <= abs(ac - cx) else "cargo"
             if decided is None:
                 decided = _classify_by_code_or_text(codigo, descripcion, concepto)
-            if decided is None and any(
-                token in _strip_accents_upper(descripcion) for token in ["RECIBID", "DEVUELT", "DEVOLUCION", "INTERESES GANADOS"]
-            ):
-                decided = "abono"
             if decided == "abono":
                 cargos, abonos = 0.0, (val or 0.0)
             else:
@@ -583,25 +592,12 @@ def _post_clean(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def _as_filelike(pdf_input: Union[str, bytes, io.BytesIO, Any]) -> io.BytesIO:
-    if isinstance(pdf_input, io.BytesIO):
-        return pdf_input
-    if isinstance(pdf_input, bytes):
-        return io.BytesIO(pdf_input)
-    if isinstance(pdf_input, str):
-        return None
-    if hasattr(pdf_input, "read"):
-        return io.BytesIO(pdf_input.read())
-    raise TypeError("Tipo de entrada no soportado para el PDF.")
+_DEFAULT_META: Dict[str, Optional[float]] = {"cargo_x": None, "abono_x": None, "tol": 60.0}
 
 
-def _detect_period_year(pdf: pdfplumber.PDF) -> Optional[int]:
+def _detect_period_year(texts: List[str]) -> Optional[int]:
     year = None
-    for page in pdf.pages[:3]:
-        try:
-            text = page.extract_text() or ""
-        except Exception:
-            text = ""
+    for text in texts[:3]:
         match = re.search(
             r"(?:Periodo\s+DEL.*?(\d{4}))|(?:Fecha\s+de\s+Corte\s+.*?(\d{4}))",
             text,
@@ -617,35 +613,51 @@ def _detect_period_year(pdf: pdfplumber.PDF) -> Optional[int]:
     return year
 
 
+def _page_rows(page) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Optional[float]]], str]:
+    """Fase paralela: filas y columnas detectadas en la página, sin estado previo.
+
+    Las primeras páginas también regresan su texto para detectar el periodo.
+    """
+    text = ""
+    if page.page_number <= 3:
+        try:
+            text = page.extract_text() or ""
+        except Exception:
+            text = ""
+    try:
+        rows, meta = _extract_rows_from_page(page, prev_meta=None)
+    except Exception as exc:
+        _dbg("Error en extracción de página:", exc)
+        return [], None, text
+    return rows, (meta if rows else None), text
+
+
 def extract_bbva_pdf_to_df(pdf_input: Union[str, bytes, io.BytesIO, Any]) -> pd.DataFrame:
-    filelike = _as_filelike(pdf_input)
     try:
-        if filelike is None and isinstance(pdf_input, str):
-            pdf_obj = pdfplumber.open(pdf_input)
-        else:
-            pdf_obj = pdfplumber.open(filelike)
+        pages = map_pages(pdf_input, _page_rows)
     except Exception as exc:
         raise RuntimeError(f"No se pudo abrir el PDF: {exc}")
 
     records: List[Dict[str, Any]] = []
-    with pdf_obj as pdf:
-        year_hint = _detect_period_year(pdf) or datetime.now().year
-        order = 0
-        last_meta: Optional[Dict[str, float]] = None
-        for page in pdf.pages:
-            try:
-                rows, last_meta = _extract_rows_from_page(page, prev_meta=last_meta)
-            except Exception as exc:
-                _dbg("Error en extracción de página:", exc)
-                rows = []
-            if not rows:
-                continue
-            grouped_rows = _group_rows_with_continuations(rows)
-            for row in grouped_rows:
-                rec = _row_to_record(row, year_hint=year_hint)
-                if rec:
-                    rec["_order"] = order
-                    order += 1
-                    records.append(rec)
+    year_hint = _detect_period_year([text for _, _, text in pages]) or datetime.now().year
+    order = 0
+    last_meta: Dict[str, Optional[float]] = dict(_DEFAULT_META)
+    for rows, meta, _ in pages:
+        if not rows:
+            continue
+        # Fase secuencial: columnas no detectadas en la página se heredan de la anterior.
+        for key in ("cargo_x", "abono_x"):
+            if meta.get(key) is None:
+                meta[key] = last_meta.get(key)
+        for row in rows:
+            row["meta"] = meta
+        last_meta = meta
+        grouped_rows = _group_rows_with_continuations(rows)
+        for row in grouped_rows:
+            rec = _row_to_record(row, year_hint=year_hint)
+            if rec:
+                rec["_order"] = order
+                order += 1
+                records.append(rec)
     df = pd.DataFrame.from_records(records) if records else pd.DataFrame(columns=COLUMNS)
     return _post_clean(df)
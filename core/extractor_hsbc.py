@@ -2,45 +2,29 @@
 
 from __future__ import annotations
 
-import io
-import os
 import re
 from pathlib import Path
 from datetime import datetime
 from typing import BinaryIO, Dict, List, Optional, Tuple, Union
 
 import pandas as pd
-import pdfplumber
 
-try:
-    import fitz  # type: ignore
-except ImportError:  # pragma: no cover - dependencia opcional
-    fitz = None
+from .config import OCR_CACHE_DIR
+from .keyword_classifier import KeywordClassifier
+from .pdf_ocr import ocr_pages
+from .pdf_pages import extract_page_texts
 
 try:
     import pytesseract
 except ImportError:  # pragma: no cover - dependencia opcional
     pytesseract = None
 
-try:
-    from PIL import Image, ImageFilter, ImageOps
-except ImportError:  # pragma: no cover - dependencia opcional
-    Image = None
-
 if pytesseract is not None:
-    tesseract_cmd = os.getenv("TESSERACT_CMD")
-    if tesseract_cmd:
-        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd  # type: ignore[attr-defined]
-
     DIGIT_CHAR_MAP = str.maketrans({"O": "0", "o": "0", "I": "1", "l": "1", "S": "5", "B": "8"})
 else:
     DIGIT_CHAR_MAP = {}
 
 
-class OCRUnavailableError(RuntimeError):
-    """Se lanza cuando se requiere OCR pero falta una dependencia."""
-
-
 PDFSource = Union[str, Path, bytes, bytearray, BinaryIO]
 
 AMOUNT_RX = re.compile(r"\(?-?\d{1,3}(?:,\d{3})*(?:\.\d{2})\)?")
@@ -139,6 +123,9 @@ FOOTER_PREFIXES = (
     "CENTRO DE ATENCION",
 )
 
+MOVEMENT_KW = KeywordClassifier({"abono": ABONO_KEYWORDS, "cargo": CARGO_KEYWORDS})
+FOOTER_KW = KeywordClassifier.of(FOOTER_PREFIXES, prefix=True)
+
 
 def _ensure_pdf_bytes(pdf_file: PDFSource) -> bytes:
     if isinstance(pdf_file, (bytes, bytearray)):
@@ -155,68 +142,6 @@ def _ensure_pdf_bytes(pdf_file: PDFSource) -> bytes:
     raise TypeError("Origen de PDF no soportado para la extracción.")
 
 
-def _init_ocr_doc(pdf_bytes: bytes) -> Tuple[Optional["fitz.Document"], Optional[str]]:
-    missing: list[str] = []
-    if fitz is None:
-        missing.append("PyMuPDF (pymupdf)")
-    if pytesseract is None:
-        missing.append("pytesseract")
-    if Image is None:
-        missing.append("Pillow")
-    if missing:
-        return None, f"Instala {', '.join(missing)} para habilitar el OCR en PDFs escaneados."
-    try:
-        return fitz.open(stream=pdf_bytes, filetype="pdf"), None  # type: ignore[union-attr]
-    except Exception as exc:  # pragma: no cover - error ajeno a la lógica
-        return None, f"No se pudo inicializar el motor OCR: {exc}"
-
-
-def _pixmap_to_image(pixmap: "fitz.Pixmap"):
-    if Image is None:
-        raise OCRUnavailableError("Pillow es requerido para convertir las páginas a imagen.")
-    if hasattr(pixmap, "pil_image"):
-        return pixmap.pil_image()  # PyMuPDF >= 1.22
-    mode = "RGBA" if pixmap.alpha else "RGB"
-    return Image.frombytes(mode, [pixmap.width, pixmap.height], pixmap.samples)
-
-
-def _preprocess_image(image: "Image.Image") -> "Image.Image":
-    gray = image.convert("L")
-    gray = ImageOps.autocontrast(gray)
-    gray = gray.filter(ImageFilter.MedianFilter(size=3))
-    gray = gray.filter(ImageFilter.UnsharpMask(radius=1, percent=150, threshold=3))
-    threshold = int(os.getenv("OCR_THRESHOLD", "150"))
-    bw = gray.point(lambda x: 0 if x < threshold else 255, "1")  # type: ignore[arg-type]
-    return bw.convert("L")
-
-
-def _deskew_image(image: "Image.Image") -> "Image.Image":
-    if pytesseract is None:
-        return image
-    try:
-        osd = pytesseract.image_to_osd(image, config="--psm 0")
-    except Exception:
-        return image
-    match = re.search(r"Rotate: (\d+)", osd or "")
-    if not match:
-        return image
-    angle = int(match.group(1)) % 360
-    if not angle:
-        return image
-    return image.rotate(-angle, expand=True)
-
-
-def _prepare_image_for_ocr(pixmap: "fitz.Pixmap") -> "Image.Image":
-    image = _pixmap_to_image(pixmap)
-    try:
-        image = _preprocess_image(image)
-        image = _deskew_image(image)
-    except Exception:
-        # Ante cualquier fallo en el preprocesamiento, regresamos la imagen original.
-        pass
-    return image
-
-
 def _normalize_numeric_candidates(text: str) -> str:
     if not DIGIT_CHAR_MAP:
         return text
@@ -435,7 +360,7 @@ def _apply_transfer_labels(
                 if benef:
                     return f"Transferencia a {benef}"
             upper = concepto.upper()
-            if any(token in upper for token in TRANSFER_KEYWORDS):
+            if TRANSFER_KW.matches(upper):
                 for key, entries in lookup_env.items():
                     if key in norm or norm in key:
                         benef = _select_entry(entries, fecha_ts, cargo)
@@ -448,7 +373,7 @@ def _apply_transfer_labels(
                 if benef:
                     return f"Transferencia recibida de {benef}"
             upper = concepto.upper()
-            if any(token in upper for token in ("RECIB", "DEPOSITO", "DEPÓSITO", "DEPOSITO", "RECIBIDO")):
+            if RECEIVED_KW.matches(upper):
                 for key, entries in lookup_rec.items():
                     if key in norm or norm in key:
                         benef = _select_entry(entries, fecha_ts, abono)
@@ -460,35 +385,6 @@ def _apply_transfer_labels(
     return df
 
 
-def _ocr_page_text(doc: "fitz.Document", page_index: int) -> str:
-    if fitz is None or pytesseract is None:
-        raise OCRUnavailableError("El OCR no está disponible por falta de dependencias.")
-    try:
-        page = doc.load_page(page_index)
-        pixmap = page.get_pixmap(dpi=300)
-    except Exception as exc:  # pragma: no cover - dependencias externas
-        raise RuntimeError(f"No se pudo preparar la página para OCR: {exc}") from exc
-
-    image = _prepare_image_for_ocr(pixmap)
-    lang = os.getenv("TESSERACT_LANG", "spa+eng")
-    config = os.getenv("TESSERACT_CONFIG", "--psm 6 --oem 1")
-    try:
-        text = pytesseract.image_to_string(image, lang=lang, config=config)  # type: ignore[arg-type]
-    except pytesseract.TesseractNotFoundError as exc:  # type: ignore[attr-defined]
-        raise OCRUnavailableError("Tesseract OCR no está instalado o no se encuentra en el PATH.") from exc
-    except pytesseract.TesseractError as exc:
-        # Reintenta con idioma por defecto cuando fallan los paquetes de idioma.
-        if lang != "":
-            try:
-                text = pytesseract.image_to_string(image, config=config)  # type: ignore[arg-type]
-                return _normalize_ocr_block(text)
-            except Exception:
-                pass
-        raise RuntimeError(f"OCR falló al procesar la página: {exc}") from exc
-
-    return _normalize_ocr_block(text or "")
-
-
 def _norm_spaces(text: str) -> str:
     return re.sub(r"\s+", " ", (text or "").strip())
 
@@ -570,10 +466,10 @@ def _extract_reference(text: str) -> str:
 
 
 def _classify_by_keywords(text: str, amount: float) -> tuple[float, float]:
-    upper = text.upper()
-    if any(token in upper for token in ABONO_KEYWORDS):
+    kind = MOVEMENT_KW.first(text.upper())
+    if kind == "abono":
         return 0.0, amount
-    if any(token in upper for token in CARGO_KEYWORDS):
+    if kind == "cargo":
         return amount, 0.0
     if amount < 0:
         return abs(amount), 0.0
@@ -643,8 +539,6 @@ def extraer_hsbc(pdf_file: PDFSource) -> pd.DataFrame:
     month_hint: Optional[int] = None
 
     pdf_bytes = _ensure_pdf_bytes(pdf_file)
-    pdf_stream = io.BytesIO(pdf_bytes)
-    ocr_doc, ocr_error = _init_ocr_doc(pdf_bytes)
     spei_sections: List[Tuple[str, List[str]]] = []
     current_section: Optional[str] = None
     spei_buffer: List[str] = []
@@ -664,159 +558,146 @@ def extraer_hsbc(pdf_file: PDFSource) -> pd.DataFrame:
                 flush_spei()
             current_section = section
 
-    try:
-        with pdfplumber.open(pdf_stream) as pdf:
-            pages = list(pdf.pages)
-            if month_hint is None or year_hint is None:
-                for page in pages:
-                    head_text = page.extract_text() or ""
-                    match_period = PERIODO_RANGE_RX.search(head_text)
-                    if match_period:
-                        period_start = (
-                            int(match_period.group("dia1")),
-                            int(match_period.group("mes1")),
-                            int(match_period.group("anio1")),
-                        )
-                        period_end = (
-                            int(match_period.group("dia2")),
-                            int(match_period.group("mes2")),
-                            int(match_period.group("anio2")),
-                        )
-                        month_hint = month_hint or int(match_period.group("mes1"))
-                        year_hint = year_hint or int(match_period.group("anio1"))
-                        break
-            for page_index, page in enumerate(pages):
-                raw_text = page.extract_text() or ""
-                used_ocr = False
-                if not raw_text:
-                    if ocr_doc is None:
-                        raise OCRUnavailableError(
-                            ocr_error or "Se requiere OCR para procesar este PDF escaneado."
-                        )
-                    raw_text = _ocr_page_text(ocr_doc, page_index)
-                    used_ocr = True
-                else:
-                    raw_text = _normalize_ocr_block(raw_text)
-
-                page_text = _normalize_ocr_block(raw_text)
-                line_source = page_text.splitlines()
-                if month_hint is None or year_hint is None:
-                    date_hint = re.search(r"\b(\d{1,2})/(\d{1,2})/(20\d{2})\b", page_text)
-                    if date_hint:
-                        if month_hint is None:
-                            month_hint = int(date_hint.group(2))
-                        if year_hint is None:
-                            year_hint = int(date_hint.group(3))
-
-                for raw_line in line_source:
-                    normalized_line = _normalize_ocr_line(raw_line)
-                    line = _norm_spaces(normalized_line)
-                    if not line:
-                        continue
-
-                    upper = line.upper()
-                    if any(keyword.upper() in upper for keyword in DETAIL_END_PATTERNS):
-                        set_section(None)
-                        continue
-                    if DETAIL_HEADER_RX.search(upper):
-                        set_section("detalle")
-                        continue
-                    if SPEI_HEADER_ENVIADOS_RX.search(upper):
-                        set_section("spei_enviados")
-                        spei_buffer = []
-                        continue
-                    if SPEI_HEADER_RECIBIDOS_RX.search(upper):
-                        set_section("spei_recibidos")
-                        spei_buffer = []
-                        continue
+    page_texts = extract_page_texts(pdf_bytes)
+    if month_hint is None or year_hint is None:
+        for head_text in page_texts:
+            match_period = PERIODO_RANGE_RX.search(head_text)
+            if match_period:
+                period_start = (
+                    int(match_period.group("dia1")),
+                    int(match_period.group("mes1")),
+                    int(match_period.group("anio1")),
+                )
+                period_end = (
+                    int(match_period.group("dia2")),
+                    int(match_period.group("mes2")),
+                    int(match_period.group("anio2")),
+                )
+                month_hint = month_hint or int(match_period.group("mes1"))
+                year_hint = year_hint or int(match_period.group("anio1"))
+                break
+    # Las páginas sin capa de texto se reconocen juntas (en paralelo y con caché).
+    scanned = [index for index, text in enumerate(page_texts) if not text]
+    ocr_texts = ocr_pages(pdf_bytes, scanned, cache_dir=OCR_CACHE_DIR) if scanned else {}
+    for page_index, raw_text in enumerate(page_texts):
+        raw_text = _normalize_ocr_block(raw_text or ocr_texts[page_index])
+
+        page_text = _normalize_ocr_block(raw_text)
+        line_source = page_text.splitlines()
+        if month_hint is None or year_hint is None:
+            date_hint = re.search(r"\b(\d{1,2})/(\d{1,2})/(20\d{2})\b", page_text)
+            if date_hint:
+                if month_hint is None:
+                    month_hint = int(date_hint.group(2))
+                if year_hint is None:
+                    year_hint = int(date_hint.group(3))
+
+        for raw_line in line_source:
+            normalized_line = _normalize_ocr_line(raw_line)
+            line = _norm_spaces(normalized_line)
+            if not line:
+                continue
+
+            upper = line.upper()
+            if DETAIL_END_KW.matches(upper):
+                set_section(None)
+                continue
+            if DETAIL_HEADER_RX.search(upper):
+                set_section("detalle")
+                continue
+            if SPEI_HEADER_ENVIADOS_RX.search(upper):
+                set_section("spei_enviados")
+                spei_buffer = []
+                continue
+            if SPEI_HEADER_RECIBIDOS_RX.search(upper):
+                set_section("spei_recibidos")
+                spei_buffer = []
+                continue
+
+            if year_hint is None:
+                match_year = YEAR_RX.search(line)
+                if match_year:
+                    year_hint = int(match_year.group(1))
 
+            if month_hint is None or year_hint is None:
+                periodo = PERIODO_RX.search(line)
+                if periodo:
+                    month_hint = int(periodo.group('mes'))
                     if year_hint is None:
-                        match_year = YEAR_RX.search(line)
-                        if match_year:
-                            year_hint = int(match_year.group(1))
-
-                    if month_hint is None or year_hint is None:
-                        periodo = PERIODO_RX.search(line)
-                        if periodo:
-                            month_hint = int(periodo.group('mes'))
-                            if year_hint is None:
-                                year_hint = int(periodo.group('anio')[-4:])
-
-                    if current_section in {"spei_enviados", "spei_recibidos"}:
-                        spei_buffer.append(line)
-                        continue
+                        year_hint = int(periodo.group('anio')[-4:])
 
-                    if current_section != "detalle":
+            if current_section in {"spei_enviados", "spei_recibidos"}:
+                spei_buffer.append(line)
+                continue
+
+            if current_section != "detalle":
+                continue
+
+            match = _match_date(line)
+            if match:
+                if pending:
+                    row = _finalize_entry(pending, prev_saldo)
+                    if row:
+                        movimientos.append(row)
+                        prev_saldo = row['Saldo']
+                group = match.groupdict()
+                if month_hint is None:
+                    if group.get('mes'):
+                        month_hint = int(group['mes'])
+                    elif group.get('mes_txt'):
+                        month_hint = MONTHS.get(group['mes_txt'].upper(), month_hint)
+                fecha = _format_date(match, year_hint, month_hint)
+                rest = _norm_spaces(line[match.end():])
+                pending = {
+                    'fecha': fecha,
+                    'dia': group.get('dia', '').zfill(2) if group.get('dia') else None,
+                    'text': rest,
+                    'is_balance': 'SALDO' in rest.upper(),
+                    'raw_lines': [raw_line],
+                }
+            else:
+                day_info = _extract_day_only(line)
+                if day_info and (month_hint is not None or year_hint is not None):
+                    if pending:
+                        row = _finalize_entry(pending, prev_saldo)
+                        if row:
+                            movimientos.append(row)
+                            prev_saldo = row['Saldo']
+                    dia, rest = day_info
+                    if month_hint is None:
+                        month_hint = 1
+                    if year_hint is None:
+                        year_hint = datetime.now().year
+                    fecha = f"{year_hint:04d}-{month_hint:02d}-{dia}"
+                    pending = {
+                        'fecha': fecha,
+                        'dia': dia,
+                        'text': rest,
+                        'is_balance': 'SALDO' in rest.upper(),
+                        'raw_lines': [raw_line],
+                    }
+                elif pending:
+                    if FOOTER_KW.matches(upper):
                         continue
+                    pending['text'] = _norm_spaces(f"{pending['text']} {line}")
+                    if 'SALDO' in upper:
+                        pending['is_balance'] = True
+                    pending.setdefault('raw_lines', []).append(raw_line)
+                else:
+                    continue
 
-                    match = _match_date(line)
-                    if match:
-                        if pending:
-                            row = _finalize_entry(pending, prev_saldo)
-                            if row:
-                                movimientos.append(row)
-                                prev_saldo = row['Saldo']
-                        group = match.groupdict()
-                        if month_hint is None:
-                            if group.get('mes'):
-                                month_hint = int(group['mes'])
-                            elif group.get('mes_txt'):
-                                month_hint = MONTHS.get(group['mes_txt'].upper(), month_hint)
-                        fecha = _format_date(match, year_hint, month_hint)
-                        rest = _norm_spaces(line[match.end():])
-                        pending = {
-                            'fecha': fecha,
-                            'dia': group.get('dia', '').zfill(2) if group.get('dia') else None,
-                            'text': rest,
-                            'is_balance': 'SALDO' in rest.upper(),
-                            'raw_lines': [raw_line],
-                        }
-                    else:
-                        day_info = _extract_day_only(line)
-                        if day_info and (month_hint is not None or year_hint is not None):
-                            if pending:
-                                row = _finalize_entry(pending, prev_saldo)
-                                if row:
-                                    movimientos.append(row)
-                                    prev_saldo = row['Saldo']
-                            dia, rest = day_info
-                            if month_hint is None:
-                                month_hint = 1
-                            if year_hint is None:
-                                year_hint = datetime.now().year
-                            fecha = f"{year_hint:04d}-{month_hint:02d}-{dia}"
-                            pending = {
-                                'fecha': fecha,
-                                'dia': dia,
-                                'text': rest,
-                                'is_balance': 'SALDO' in rest.upper(),
-                                'raw_lines': [raw_line],
-                            }
-                        elif pending:
-                            if any(upper.startswith(prefix) for prefix in FOOTER_PREFIXES):
-                                continue
-                            pending['text'] = _norm_spaces(f"{pending['text']} {line}")
-                            if 'SALDO' in upper:
-                                pending['is_balance'] = True
-                            pending.setdefault('raw_lines', []).append(raw_line)
-                        else:
-                            continue
-
-                    if pending:
-                        amount_count = len(AMOUNT_RX.findall(pending['text']))
-                        should_finalize = amount_count >= 2 or (
-                            pending.get('is_balance') and amount_count >= 1
-                        )
-                        if should_finalize:
-                            row = _finalize_entry(pending, prev_saldo)
-                            if row:
-                                movimientos.append(row)
-                                prev_saldo = row['Saldo']
-                            pending = None
-        flush_spei()
-    finally:
-        if ocr_doc is not None:
-            ocr_doc.close()
+            if pending:
+                amount_count = len(AMOUNT_RX.findall(pending['text']))
+                should_finalize = amount_count >= 2 or (
+                    pending.get('is_balance') and amount_count >= 1
+                )
+                if should_finalize:
+                    row = _finalize_entry(pending, prev_saldo)
+                    if row:
+                        movimientos.append(row)
+                        prev_saldo = row['Saldo']
+                    pending = None
+    flush_spei()
 
     if pending:
         row = _finalize_entry(pending, prev_saldo)
@@ -851,6 +732,8 @@ def extraer_hsbc(pdf_file: PDFSource) -> pd.DataFrame:
     df.attrs["period_label"] = period_label
     return df
 TRANSFER_KEYWORDS = ("TRANSFERENCIA", "TRASPASO", "SPEI", "BPI")
+TRANSFER_KW = KeywordClassifier.of(TRANSFER_KEYWORDS)
+RECEIVED_KW = KeywordClassifier.of(("RECIB", "DEPOSITO", "DEPÓSITO", "RECIBIDO"))
 PARTICIPANT_TOKENS = {
     "BANORTE",
     "BANCOMER",
@@ -889,3 +772,4 @@ DETAIL_END_PATTERNS = (
     "PASEO DE LA REFORMA",
     "CARGOS OBJETADOS POR EL CLIENTE",
 )
+DETAIL_END_KW = KeywordClassifier.of(p.upper() for p in DETAIL_END_PATTERNS)
@@ -0,0 +1,107 @@
+"""Clasificador de palabras clave compartido por los extractores de estados de cuenta.
+
+Cada banco describe sus reglas como una tabla ``categoría -> tokens``
+(abono/cargo, encabezados, pies de página, comisiones...). La tabla se
+compila en una sola expresión regular y una pasada sobre la línea entrega
+*todas* las categorías presentes, en lugar de un ``any(token in upper ...)``
+por lista. La prioridad entre categorías la decide el orden de la tabla.
+
+La búsqueda es un lookahead en cada posición, así que encuentra tokens que
+se traslapan; a cada token se le asignan además las categorías de los
+tokens contenidos en él (``"PAGO RECIBIDO"`` también cuenta como ``"PAGO"``).
+El texto se compara tal cual: quien llama decide si va en mayúsculas o
+normalizado.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, FrozenSet, Iterable, Mapping, Optional, Pattern, Tuple
+
+_EMPTY: FrozenSet[str] = frozenset()
+
+
+class KeywordClassifier:
+    """Tabla de palabras clave compilada; ``prefix`` compara sólo al inicio."""
+
+    __slots__ = ("categories", "prefix", "_rx", "_labels", "_owners")
+
+    def __init__(self, table: Mapping[str, Iterable[str]], *, prefix: bool = False) -> None:
+        self.categories: Tuple[str, ...] = tuple(table)
+        self.prefix = prefix
+
+        owners: Dict[str, set] = {}
+        for category, tokens in table.items():
+            for token in tokens:
+                if token:
+                    owners.setdefault(token, set()).add(category)
+
+        # Un token "arrastra" las categorías de los tokens que contiene.
+        labels: Dict[str, FrozenSet[str]] = {}
+        for token in owners:
+            found = set()
+            for other, cats in owners.items():
+                if (token.startswith(other) if prefix else other in token):
+                    found |= cats
+            labels[token] = frozenset(found)
+        self._labels = labels
+        self._owners = {token: frozenset(cats) for token, cats in owners.items()}
+
+        if not owners:
+            self._rx: Optional[Pattern[str]] = None
+            return
+        body = "|".join(re.escape(t) for t in sorted(owners, key=len, reverse=True))
+        self._rx = re.compile(f"(?:{body})" if prefix else f"(?=({body}))")
+
+    @classmethod
+    def of(cls, tokens: Iterable[str], *, prefix: bool = False) -> "KeywordClassifier":
+        """Una sola categoría; útil para pruebas de sí/no (encabezados, pies)."""
+
+        return cls({"match": tuple(tokens)}, prefix=prefix)
+
+    def matches(self, text: str) -> bool:
+        if self._rx is None:
+            return False
+        if self.prefix:
+            return self._rx.match(text) is not None
+        return self._rx.search(text) is not None
+
+    def hits(self, text: str) -> FrozenSet[str]:
+        """Todas las categorías con al menos un token en ``text``."""
+
+        if self._rx is None:
+            return _EMPTY
+        if self.prefix:
+            match = self._rx.match(text)
+            return self._labels[match.group(0)] if match else _EMPTY
+        found: FrozenSet[str] = _EMPTY
+        for match in self._rx.finditer(text):
+            found = found | self._labels[match.group(1)]
+            if len(found) == len(self.categories):
+                break
+        return found
+
+    def leftmost(self, text: str) -> Optional[str]:
+        """Categoría del token que aparece primero en ``text`` (el más largo si empatan)."""
+
+        if self._rx is None:
+            return None
+        match = self._rx.match(text) if self.prefix else self._rx.search(text)
+        if not match:
+            return None
+        return self.pick(self._owners[match.group(0) if self.prefix else match.group(1)])
+
+    def pick(self, hits: Iterable[str]) -> Optional[str]:
+        """La categoría de mayor prioridad (orden de la tabla) entre ``hits``."""
+
+        hits = hits if isinstance(hits, (set, frozenset)) else set(hits)
+        for category in self.categories:
+            if category in hits:
+                return category
+        return None
+
+    def first(self, text: str) -> Optional[str]:
+        return self.pick(self.hits(text))
+
+
+__all__ = ["KeywordClassifier"]
@@ -6,9 +6,15 @@ from dataclasses import dataclass
 from typing import Any, Dict, Iterable, List, MutableMapping, Optional, Sequence, Tuple
 import json
 import math
+
+import numpy as np
 import requests
 
 from .config import GOOGLE_MAPS_API_KEY
+from .maps_cache import MapsCacheStore
+
+# Parámetros que no cambian la respuesta; fuera de la llave no se persiste la API key.
+_UNKEYED_PARAMS = frozenset({"key", "sessiontoken"})
 
 
 class GoogleMapsError(RuntimeError):
@@ -36,7 +42,7 @@ def _cache_set(cache: Optional[MutableMapping[str, Any]], key: str, value: Any)
 
 
 def _make_cache_key(endpoint: str, params: Dict[str, Any]) -> str:
-    frozen = _freeze(params)
+    frozen = _freeze({k: v for k, v in params.items() if k not in _UNKEYED_PARAMS})
     return f"{endpoint}:{json.dumps(frozen, ensure_ascii=False)}"
 
 
@@ -93,6 +99,20 @@ def haversine_km(p1: Tuple[float, float], p2: Tuple[float, float]) -> float:
     return r * c
 
 
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km_many(lat1: Any, lon1: Any, lat2: Any, lon2: Any) -> np.ndarray:
+    """Vectorized haversine distance in kilometres; arguments broadcast like NumPy arrays."""
+
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(lon2, dtype=float) - np.asarray(lon1, dtype=float))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
 @dataclass
 class RouteSummary:
     distance_m: float
@@ -109,12 +129,19 @@ class RouteSummary:
 class GoogleMapsClient:
     base_url = "https://maps.googleapis.com/maps/api"
 
-    def __init__(self, api_key: str | None = None, timeout: int = 10) -> None:
+    def __init__(
+        self,
+        api_key: str | None = None,
+        timeout: int = 10,
+        store: Optional[MapsCacheStore] = None,
+    ) -> None:
         self.api_key = (api_key or GOOGLE_MAPS_API_KEY or "").strip()
         if not self.api_key:
             raise GoogleMapsError("Google Maps API key is not configured. Define GOOGLE_MAPS_API_KEY in el entorno.")
         self.timeout = timeout
         self.session = requests.Session()
+        # Second-level cache shared across sessions and processes (see core.maps_cache).
+        self.store = store
 
     def _request(
         self,
@@ -129,6 +156,11 @@ class GoogleMapsClient:
         cached = _cache_get(cache, cache_key)
         if cached is not None:
             return cached
+        if self.store is not None:
+            cached = self.store.get(cache_key)
+            if cached is not None:
+                _cache_set(cache, cache_key, cached)
+                return cached
 
         url = f"{self.base_url}/{endpoint}"
         response = self.session.get(url, params=params, timeout=self.timeout)
@@ -145,6 +177,8 @@ class GoogleMapsClient:
             raise GoogleMapsError(f"Google Maps API error ({status}): {error_message}")
 
         _cache_set(cache, cache_key, data)
+        if self.store is not None and status == "OK":
+            self.store.set(endpoint, cache_key, data)
         return data
 
     def autocomplete(
@@ -272,4 +306,5 @@ __all__ = [
     "RouteSummary",
     "decode_polyline",
     "haversine_km",
+    "haversine_km_many",
 ]
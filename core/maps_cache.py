@@ -0,0 +1,146 @@
+"""Caché persistente de respuestas de Google Maps compartida entre sesiones y procesos.
+
+``GoogleMapsClient._request`` consulta primero el dict de la sesión y después
+este almacén SQLite (``MAPS_CACHE_PATH``, junto a ``DB_PATH``), con la misma
+llave de ``_make_cache_key``. Cada endpoint tiene su vigencia
+(:data:`ENDPOINT_TTL`): la geometría de un ``place_id`` no caduca, las rutas
+duran días. La conexión se abre por operación y en modo WAL, así que varios
+workers pueden leer y escribir a la vez.
+"""
+
+from __future__ import annotations
+
+from contextlib import closing
+import json
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Set, Union
+
+from .config import MAPS_CACHE_PATH
+
+PathLike = Union[str, Path]
+
+DAY_S = 24 * 60 * 60
+# Segundos de vigencia por endpoint; None = no caduca.
+ENDPOINT_TTL: Dict[str, Optional[float]] = {
+    "place/details/json": None,
+    "place/autocomplete/json": 30 * DAY_S,
+    "directions/json": 7 * DAY_S,
+}
+DEFAULT_TTL_S: Optional[float] = DAY_S
+
+_READY: Set[str] = set()
+_READY_LOCK = threading.Lock()
+
+
+def _connect(db_path: PathLike) -> sqlite3.Connection:
+    con = sqlite3.connect(str(db_path), timeout=30)
+    con.execute("PRAGMA journal_mode = WAL;")
+    return con
+
+
+def ttl_for(endpoint: str) -> Optional[float]:
+    return ENDPOINT_TTL.get(endpoint, DEFAULT_TTL_S)
+
+
+def init_store(db_path: PathLike) -> None:
+    """Crea la tabla y descarta lo caducado (una vez por proceso)."""
+
+    path = Path(db_path)
+    with _READY_LOCK:
+        if str(path) in _READY and path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(_connect(path)) as con:
+            con.execute(
+                """CREATE TABLE IF NOT EXISTS maps_cache(
+                    cache_key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    expires_at REAL,
+                    payload TEXT NOT NULL)"""
+            )
+            con.execute("DELETE FROM maps_cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+            con.commit()
+        _READY.add(str(path))
+
+
+class MapsCacheStore:
+    """Almacén SQLite de respuestas JSON; los errores de disco o de SQLite se tratan como fallo de caché."""
+
+    __slots__ = ("db_path",)
+
+    def __init__(self, db_path: PathLike) -> None:
+        self.db_path = Path(db_path)
+
+    def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        try:
+            init_store(self.db_path)
+            with closing(sqlite3.connect(str(self.db_path), timeout=30)) as con:
+                row = con.execute(
+                    "SELECT payload FROM maps_cache WHERE cache_key = ? AND (expires_at IS NULL OR expires_at >= ?)",
+                    (cache_key, time.time()),
+                ).fetchone()
+        except (sqlite3.Error, OSError):
+            return None
+        if row is None:
+            return None
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return None
+
+    def set(self, endpoint: str, cache_key: str, data: Dict[str, Any]) -> None:
+        ttl = ttl_for(endpoint)
+        expires_at = None if ttl is None else time.time() + ttl
+        try:
+            payload = json.dumps(data, ensure_ascii=False)
+            init_store(self.db_path)
+            with closing(_connect(self.db_path)) as con:
+                con.execute(
+                    "INSERT OR REPLACE INTO maps_cache(cache_key, endpoint, expires_at, payload) VALUES(?,?,?,?)",
+                    (cache_key, endpoint, expires_at, payload),
+                )
+                con.commit()
+        except (sqlite3.Error, OSError, TypeError, ValueError):
+            return
+
+    def purge(self, endpoint: Optional[str] = None) -> int:
+        """Borra lo caducado (o todo ``endpoint`` si se indica); regresa cuántas filas."""
+
+        try:
+            init_store(self.db_path)
+            with closing(_connect(self.db_path)) as con:
+                if endpoint is None:
+                    cur = con.execute(
+                        "DELETE FROM maps_cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)
+                    )
+                else:
+                    cur = con.execute("DELETE FROM maps_cache WHERE endpoint = ?", (endpoint,))
+                con.commit()
+                return cur.rowcount or 0
+        except (sqlite3.Error, OSError):
+            return 0
+
+
+_STORES: Dict[str, MapsCacheStore] = {}
+
+
+def shared_store(db_path: PathLike = MAPS_CACHE_PATH) -> MapsCacheStore:
+    """Almacén del proceso para ``db_path`` (por defecto ``MAPS_CACHE_PATH``)."""
+
+    key = str(Path(db_path))
+    store = _STORES.get(key)
+    if store is None:
+        store = _STORES.setdefault(key, MapsCacheStore(db_path))
+    return store
+
+
+__all__ = [
+    "ENDPOINT_TTL",
+    "MapsCacheStore",
+    "init_store",
+    "shared_store",
+    "ttl_for",
+]
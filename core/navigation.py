@@ -314,6 +314,7 @@ PAGE_PARAM_NAMES: dict[str, str] = {
     "pages/20_Admin_login.py": "Acceso super administrador",
     "pages/24_Admin_productos.py": "Administrar productos",
     "pages/22_DIOT_excel_txt.py": "DIOT",
+    "pages/22_DIOT_cfdi.py": "DIOT - Desde CFDI",
     "pages/23_DIOT_login.py": "DIOT - Acceso",
     "pages/Descarga_masiva_login.py": "Descarga masiva - Acceso",
     "pages/Descarga_masiva_xml.py": "Descarga masiva de XML",
@@ -378,6 +379,11 @@ PARAMETROS_ACTIONS: tuple[DropdownAction, ...] = (
     DropdownAction("Eliminar", "parametros_eliminar", "pages/13_Parametros_eliminar.py"),
 )
 
+DIOT_TOOL_ACTIONS: tuple[DropdownAction, ...] = (
+    DropdownAction("Excel -> TXT", "diot_excel_txt", "pages/22_DIOT_excel_txt.py"),
+    DropdownAction("Desde CFDI", "diot_cfdi", "pages/22_DIOT_cfdi.py"),
+)
+
 DIOT_ACTIONS: tuple[DropdownAction, ...] = (
     TARIFAS_ACTIONS
     + TRASLADOS_ACTIONS
@@ -614,6 +620,24 @@ def _build_nav_items(
         )
         return items
 
+    if mode == "diot":
+        return [
+            _dropdown_html(
+                label="DIOT",
+                actions=DIOT_TOOL_ACTIONS,
+                active_top=active_top,
+                active_child=active_child,
+                top_key="diot",
+            ),
+            _root_link_html(
+                label="Cerrar sesion",
+                target_page="pages/0_Inicio.py",
+                top_key="logout",
+                active_top=active_top,
+                extra={"logout": "1"},
+            ),
+        ]
+
     if mode == "monitoreo":
         return [
             _root_link_html(
@@ -0,0 +1,334 @@
+"""OCR de páginas escaneadas con caché en disco y procesos en paralelo.
+
+Tesseract usa un solo hilo por llamada, así que las páginas se reparten en
+un ``ProcessPoolExecutor``. Cada proceso recibe los bytes del PDF una sola
+vez (``initializer``) y abre el documento con PyMuPDF al primer uso.
+
+El texto reconocido se guarda en disco con la llave
+``sha256(pdf) + ajustes de OCR + página``: volver a subir el mismo estado de
+cuenta, o reintentar el parseo, no vuelve a llamar a Tesseract. Cambiar
+resolución, umbral, idioma o ``config`` produce otra llave. El directorio se
+mantiene por debajo de ``OCR_CACHE_MAX_BYTES`` borrando las páginas leídas
+hace más tiempo, igual que ``core.statement_cache``.
+
+La detección de orientación (``image_to_osd``) sólo corre cuando la página
+renderizada viene apaisada o cuando el texto reconocido no parece un estado
+de cuenta derecho (sin importes ni palabras de encabezado).
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import astuple, dataclass
+import hashlib
+import multiprocessing
+import os
+from pathlib import Path
+import re
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from .config import OCR_CACHE_MAX_BYTES
+from .pdf_pages import default_workers
+
+try:
+    import fitz  # type: ignore
+except ImportError:  # pragma: no cover - dependencia opcional
+    fitz = None
+
+try:
+    import pytesseract
+except ImportError:  # pragma: no cover - dependencia opcional
+    pytesseract = None
+
+try:
+    from PIL import Image, ImageFilter, ImageOps
+except ImportError:  # pragma: no cover - dependencia opcional
+    Image = None
+
+if pytesseract is not None:
+    tesseract_cmd = os.getenv("TESSERACT_CMD")
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd  # type: ignore[attr-defined]
+
+# Súbelo cuando cambie el preprocesamiento para invalidar la caché.
+OCR_CACHE_VERSION = 1
+
+UPRIGHT_RX = re.compile(r"\d[.,]\d{2}\b|SALDO|FECHA|CUENTA|PAGINA|TOTAL", re.IGNORECASE)
+
+
+class OCRUnavailableError(RuntimeError):
+    """Se lanza cuando se requiere OCR pero falta una dependencia."""
+
+
+@dataclass(frozen=True)
+class OcrSettings:
+    dpi: int = 300
+    threshold: int = 150
+    lang: str = "spa+eng"
+    config: str = "--psm 6 --oem 1"
+    deskew: bool = True
+
+    @classmethod
+    def from_env(cls) -> "OcrSettings":
+        return cls(
+            threshold=int(os.getenv("OCR_THRESHOLD", "150")),
+            lang=os.getenv("TESSERACT_LANG", "spa+eng"),
+            config=os.getenv("TESSERACT_CONFIG", "--psm 6 --oem 1"),
+        )
+
+    @property
+    def fingerprint(self) -> str:
+        raw = repr((OCR_CACHE_VERSION, *astuple(self)))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def unavailable_reason() -> Optional[str]:
+    """Mensaje para el usuario si falta alguna dependencia del OCR."""
+
+    missing: List[str] = []
+    if fitz is None:
+        missing.append("PyMuPDF (pymupdf)")
+    if pytesseract is None:
+        missing.append("pytesseract")
+    if Image is None:
+        missing.append("Pillow")
+    if missing:
+        return f"Instala {', '.join(missing)} para habilitar el OCR en PDFs escaneados."
+    return None
+
+
+# ---- imagen y Tesseract ----
+def _pixmap_to_image(pixmap: "fitz.Pixmap"):
+    if Image is None:
+        raise OCRUnavailableError("Pillow es requerido para convertir las páginas a imagen.")
+    if hasattr(pixmap, "pil_image"):
+        return pixmap.pil_image()  # PyMuPDF >= 1.22
+    mode = "RGBA" if pixmap.alpha else "RGB"
+    return Image.frombytes(mode, [pixmap.width, pixmap.height], pixmap.samples)
+
+
+def _preprocess_image(image: "Image.Image", threshold: int) -> "Image.Image":
+    gray = image.convert("L")
+    gray = ImageOps.autocontrast(gray)
+    gray = gray.filter(ImageFilter.MedianFilter(size=3))
+    gray = gray.filter(ImageFilter.UnsharpMask(radius=1, percent=150, threshold=3))
+    bw = gray.point(lambda x: 0 if x < threshold else 255, "1")  # type: ignore[arg-type]
+    return bw.convert("L")
+
+
+def _osd_rotation(image: "Image.Image") -> int:
+    try:
+        osd = pytesseract.image_to_osd(image, config="--psm 0")
+    except Exception:
+        return 0
+    match = re.search(r"Rotate: (\d+)", osd or "")
+    return int(match.group(1)) % 360 if match else 0
+
+
+def _image_to_string(image: "Image.Image", settings: OcrSettings) -> str:
+    try:
+        return pytesseract.image_to_string(image, lang=settings.lang, config=settings.config) or ""  # type: ignore[arg-type]
+    except pytesseract.TesseractNotFoundError as exc:  # type: ignore[attr-defined]
+        raise OCRUnavailableError("Tesseract OCR no está instalado o no se encuentra en el PATH.") from exc
+    except pytesseract.TesseractError as exc:
+        # Reintenta con idioma por defecto cuando fallan los paquetes de idioma.
+        if settings.lang != "":
+            try:
+                return pytesseract.image_to_string(image, config=settings.config) or ""  # type: ignore[arg-type]
+            except Exception:
+                pass
+        raise RuntimeError(f"OCR falló al procesar la página: {exc}") from exc
+
+
+def ocr_page(doc: "fitz.Document", page_index: int, settings: OcrSettings) -> str:
+    """Texto crudo de Tesseract para una página ya abierta con PyMuPDF."""
+
+    if fitz is None or pytesseract is None:
+        raise OCRUnavailableError("El OCR no está disponible por falta de dependencias.")
+    try:
+        page = doc.load_page(page_index)
+        pixmap = page.get_pixmap(dpi=settings.dpi)
+    except Exception as exc:  # pragma: no cover - dependencias externas
+        raise RuntimeError(f"No se pudo preparar la página para OCR: {exc}") from exc
+
+    image = _pixmap_to_image(pixmap)
+    try:
+        image = _preprocess_image(image, settings.threshold)
+    except Exception:
+        # Ante cualquier fallo en el preprocesamiento, se usa la imagen original tal cual.
+        return _image_to_string(image, settings)
+
+    if not settings.deskew:
+        return _image_to_string(image, settings)
+
+    text = ""
+    if image.height >= image.width:
+        # Página vertical: la orientación sólo se consulta si el texto sale ilegible.
+        text = _image_to_string(image, settings)
+        if UPRIGHT_RX.search(text):
+            return text
+    angle = _osd_rotation(image)
+    if not angle:
+        return text or _image_to_string(image, settings)
+    return _image_to_string(image.rotate(-angle, expand=True), settings)
+
+
+# ---- caché en disco ----
+def pdf_digest(pdf_bytes: bytes) -> str:
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def _cache_file(cache_dir: Path, digest: str, settings: OcrSettings, page_index: int) -> Path:
+    return cache_dir / digest[:2] / f"{digest}_{settings.fingerprint}_{page_index:04d}.txt"
+
+
+def _read_cached(path: Path) -> Optional[str]:
+    try:
+        text = path.read_text(encoding="utf-8")
+    except OSError:
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return text
+
+
+def _write_cached(path: Path, text: str) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(text, encoding="utf-8")
+        tmp.replace(path)
+    except OSError:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+
+
+_EVICT_LOCK = threading.Lock()
+
+
+def evict(cache_dir: Path, max_bytes: int) -> int:
+    """Borra las páginas menos usadas hasta quedar bajo ``max_bytes``; regresa cuántas."""
+
+    with _EVICT_LOCK:
+        entries = []
+        for path in cache_dir.glob("*/*.txt"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            try:
+                path.parent.rmdir()
+            except OSError:
+                pass
+        return removed
+
+
+# ---- procesos ----
+_WORKER_PDF: Optional[bytes] = None
+_WORKER_DOC = None
+
+
+def _init_worker(pdf_bytes: bytes) -> None:
+    global _WORKER_PDF, _WORKER_DOC
+    _WORKER_PDF = pdf_bytes
+    _WORKER_DOC = None
+
+
+def _worker_ocr(page_index: int, settings: OcrSettings) -> str:
+    global _WORKER_DOC
+    if _WORKER_DOC is None:
+        _WORKER_DOC = fitz.open(stream=_WORKER_PDF, filetype="pdf")
+    return ocr_page(_WORKER_DOC, page_index, settings)
+
+
+def _ocr_serial(pdf_bytes: bytes, indices: Sequence[int], settings: OcrSettings) -> Dict[int, str]:
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        return {index: ocr_page(doc, index, settings) for index in indices}
+    finally:
+        doc.close()
+
+
+def ocr_pages(
+    pdf_bytes: bytes,
+    page_indices: Sequence[int],
+    *,
+    settings: Optional[OcrSettings] = None,
+    cache_dir: Optional[Path] = None,
+    max_workers: Optional[int] = None,
+    max_bytes: int = OCR_CACHE_MAX_BYTES,
+) -> Dict[int, str]:
+    """Texto crudo de Tesseract para ``page_indices`` (``{página: texto}``).
+
+    Las páginas ya reconocidas se leen de ``cache_dir``; el resto se procesa
+    en paralelo y se guarda, y la caché se recorta a ``max_bytes``. Sin
+    ``cache_dir`` no se usa caché.
+    """
+
+    settings = settings or OcrSettings.from_env()
+    results: Dict[int, str] = {}
+    digest = pdf_digest(pdf_bytes) if cache_dir is not None else ""
+    pending: List[int] = []
+    for index in dict.fromkeys(page_indices):
+        cached = _read_cached(_cache_file(cache_dir, digest, settings, index)) if cache_dir is not None else None
+        if cached is None:
+            pending.append(index)
+        else:
+            results[index] = cached
+    if not pending:
+        return results
+
+    reason = unavailable_reason()
+    if reason:
+        raise OCRUnavailableError(reason)
+
+    workers = max_workers if max_workers is not None else default_workers()
+    if workers <= 1 or len(pending) == 1 or multiprocessing.parent_process() is not None:
+        fresh = _ocr_serial(pdf_bytes, pending, settings)
+    else:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(pending)),
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(pdf_bytes,),
+        ) as pool:
+            futures = {index: pool.submit(_worker_ocr, index, settings) for index in pending}
+            fresh = {index: fut.result() for index, fut in futures.items()}
+
+    for index, text in fresh.items():
+        if cache_dir is not None:
+            _write_cached(_cache_file(cache_dir, digest, settings, index), text)
+        results[index] = text
+    if cache_dir is not None and fresh:
+        evict(cache_dir, max_bytes)
+    return results
+
+
+__all__ = [
+    "OCRUnavailableError",
+    "OCR_CACHE_VERSION",
+    "OcrSettings",
+    "evict",
+    "ocr_page",
+    "ocr_pages",
+    "pdf_digest",
+    "unavailable_reason",
+]
@@ -0,0 +1,197 @@
+"""Extracción paralela por página para los extractores de estados de cuenta.
+
+El análisis de layout de pdfplumber es lo caro y cada página es
+independiente, así que se divide en dos fases:
+
+1. :func:`map_pages` reparte rangos de páginas a un ``ProcessPoolExecutor``;
+   cada proceso abre el PDF una vez y aplica una función de nivel módulo a
+   sus páginas (texto, palabras, filas ya armadas...).
+2. El extractor recorre los resultados en orden y arrastra su estado
+   (``prev_saldo``, ``year_hint``, movimiento pendiente) de una página a la
+   siguiente, igual que antes.
+
+PDFs cortos, un solo núcleo o llamadas desde un proceso hijo se resuelven
+en el proceso actual.
+
+La función recibe cada página envuelta en :class:`PageCache`, que memoiza
+``extract_words`` / ``extract_text`` por juego de parámetros: los pasos de
+un extractor que piden las mismas palabras (detección de columnas, armado
+de filas, respaldo por tablas) comparten un solo análisis de layout.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import io
+import multiprocessing
+import os
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Hashable, List, Optional, Tuple, TypeVar, Union
+
+import pdfplumber
+
+PDFSource = Union[str, Path, bytes, bytearray, BinaryIO]
+T = TypeVar("T")
+
+# Debajo de este número de páginas levantar procesos cuesta más que extraer.
+PARALLEL_MIN_PAGES = 8
+
+
+def default_workers() -> int:
+    env = os.getenv("PDF_EXTRACT_WORKERS", "").strip()
+    if env.isdigit() and int(env) > 0:
+        return int(env)
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def _kwargs_key(kwargs: Dict[str, Any]) -> Hashable:
+    return tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in kwargs.items()))
+
+
+class PageCache:
+    """Página de pdfplumber que calcula palabras, texto y tablas una sola vez por parámetros.
+
+    Los demás atributos (``page_number``, ``crop``...) se delegan a la página
+    original. Las listas regresadas son copias superficiales; los diccionarios
+    de palabra y los renglones de tabla son compartidos y no deben modificarse.
+    """
+
+    __slots__ = ("page", "_words", "_texts", "_tables")
+
+    def __init__(self, page) -> None:
+        self.page = page
+        self._words: Dict[Hashable, List[Dict[str, Any]]] = {}
+        self._texts: Dict[Hashable, str] = {}
+        self._tables: Dict[Hashable, List[List[List[Optional[str]]]]] = {}
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.page, name)
+
+    @property
+    def chars(self) -> List[Dict[str, Any]]:
+        return self.page.chars
+
+    def extract_words(self, **kwargs) -> List[Dict[str, Any]]:
+        key = _kwargs_key(kwargs)
+        words = self._words.get(key)
+        if words is None:
+            words = self._words[key] = self.page.extract_words(**kwargs) or []
+        return list(words)
+
+    def extract_text(self, **kwargs) -> str:
+        key = _kwargs_key(kwargs)
+        text = self._texts.get(key)
+        if text is None:
+            text = self._texts[key] = self.page.extract_text(**kwargs) or ""
+        return text
+
+    def extract_tables(self, table_settings: Optional[Dict[str, Any]] = None) -> List[List[List[Optional[str]]]]:
+        key = _kwargs_key(table_settings or {})
+        tables = self._tables.get(key)
+        if tables is None:
+            tables = self._tables[key] = self.page.extract_tables(table_settings) or []
+        return list(tables)
+
+
+def _apply(fn: Callable[[Any], T], page) -> T:
+    try:
+        return fn(PageCache(page))
+    finally:
+        # Libera los objetos de layout que pdfplumber guarda en la página.
+        page.flush_cache()
+
+
+def _normalize_source(pdf_source: PDFSource) -> Union[str, bytes]:
+    """Ruta o bytes: lo único que se puede mandar a otro proceso."""
+
+    if isinstance(pdf_source, (str, Path)):
+        return str(pdf_source)
+    if isinstance(pdf_source, (bytes, bytearray)):
+        return bytes(pdf_source)
+    if hasattr(pdf_source, "getvalue"):
+        return pdf_source.getvalue()
+    try:
+        pdf_source.seek(0)
+    except Exception:
+        pass
+    return pdf_source.read()
+
+
+def _open(source: Union[str, bytes]) -> pdfplumber.PDF:
+    return pdfplumber.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def _run_range(source: Union[str, bytes], fn: Callable[[Any], T], start: int, stop: int) -> List[T]:
+    with _open(source) as pdf:
+        return [_apply(fn, page) for page in pdf.pages[start:stop]]
+
+
+def _ranges(total: int, parts: int) -> List[Tuple[int, int]]:
+    step, extra = divmod(total, parts)
+    out: List[Tuple[int, int]] = []
+    start = 0
+    for i in range(parts):
+        stop = start + step + (1 if i < extra else 0)
+        if stop > start:
+            out.append((start, stop))
+        start = stop
+    return out
+
+
+def map_pages(
+    pdf_source: PDFSource,
+    fn: Callable[[Any], T],
+    *,
+    max_workers: Optional[int] = None,
+    min_pages: int = PARALLEL_MIN_PAGES,
+) -> List[T]:
+    """Aplica ``fn(page)`` a cada página y regresa los resultados en orden.
+
+    ``fn`` recibe un :class:`PageCache`; debe ser serializable (función de
+    nivel módulo o ``partial``) y regresar datos serializables; no puede
+    conservar el objeto ``page``.
+    """
+
+    source = _normalize_source(pdf_source)
+    with _open(source) as pdf:
+        total = len(pdf.pages)
+        workers = max_workers if max_workers is not None else default_workers()
+        # Dentro de un proceso hijo (p. ej. el lote del convertidor) no se anidan pools.
+        if workers <= 1 or total < min_pages or multiprocessing.parent_process() is not None:
+            return [_apply(fn, page) for page in pdf.pages]
+
+    workers = min(workers, total)
+    # Varios rangos por proceso para repartir mejor páginas de costo desigual.
+    ranges = _ranges(total, min(total, workers * 2))
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = [pool.submit(_run_range, source, fn, start, stop) for start, stop in ranges]
+        results: List[T] = []
+        for fut in futures:
+            results.extend(fut.result())
+    return results
+
+
+def _page_text(page, **kwargs) -> str:
+    try:
+        return page.extract_text(**kwargs) or ""
+    except Exception:
+        return ""
+
+
+def extract_page_texts(pdf_source: PDFSource, *, max_workers: Optional[int] = None, **kwargs) -> List[str]:
+    """``page.extract_text(**kwargs)`` de cada página ("" si falla o está vacía)."""
+
+    fn = partial(_page_text, **kwargs) if kwargs else _page_text
+    return map_pages(pdf_source, fn, max_workers=max_workers)
+
+
+__all__ = [
+    "PARALLEL_MIN_PAGES",
+    "PDFSource",
+    "PageCache",
+    "default_workers",
+    "extract_page_texts",
+    "map_pages",
+]
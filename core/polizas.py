@@ -0,0 +1,603 @@
+"""Motor declarativo para los generadores de pólizas (Dr, Eg, Ig).
+
+Cada página describe su póliza con una :class:`PolizaTemplate`: tipo,
+concepto y día del encabezado, y la lista de :class:`Partida` con la cuenta,
+la descripción y de qué columnas de la fila fuente salen el cargo y el abono.
+Una partida puede ser opcional (``when``) y sus importes pueden ser
+:class:`Formula` que apuntan a otras partidas del mismo bloque por su
+``key``; el número de fila se resuelve al escribir.
+
+El archivo fuente se lee en modo ``read_only`` (fila por fila) y la salida
+se escribe con xlsxwriter en ``constant_memory``, con la misma forma que
+antes: encabezado en la columna A, partidas en B–G y ``FIN_PARTIDAS`` al
+cierre de cada bloque, a partir de la fila 3.
+
+Entre el armado y la escritura los bloques pueden pasar por filtros como
+:func:`drop_zero_lines`; filtrar antes de escribir es una pasada lineal, en
+lugar de borrar filas de la hoja ya escrita (``delete_rows`` recorre todas
+las celdas siguientes en cada borrado).
+
+Los mismos bloques pueden salir como TXT (:func:`write_txt`) sin armar el
+libro: las fórmulas se calculan aquí y el formato del renglón lo da un
+:class:`TxtLayout` (delimitado o de ancho fijo). Ninguno de los dos sigue
+el layout oficial de importación de CONTPAQi o Aspel; son las mismas
+columnas de la hoja, para revisarlas o adaptarlas al sistema destino.
+"""
+
+from __future__ import annotations
+
+import ast
+from dataclasses import dataclass, replace
+from datetime import date, datetime
+from functools import lru_cache
+import io
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from openpyxl import load_workbook
+from openpyxl.utils import column_index_from_string
+import xlsxwriter
+
+FIN_PARTIDAS = "FIN_PARTIDAS"
+AMOUNT_FORMAT = "0.00"
+START_ROW = 3
+DATETIME_FORMAT = "yyyy-mm-dd h:mm:ss"
+# Los TXT salen en ANSI de Windows con fin de línea CRLF.
+TXT_ENCODING = "cp1252"
+TXT_NEWLINE = "\r\n"
+
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+_CELL_REF = re.compile(r"([A-G])\{(\w+)\}")
+_TXT_UNSAFE = re.compile(r"[\r\n\t]+")
+_ARITHMETIC = (ast.Add, ast.Sub, ast.Mult, ast.Div)
+
+
+@lru_cache(maxsize=None)
+def _col_index(letter: str) -> int:
+    return column_index_from_string(letter) - 1
+
+
+class SourceRow:
+    """Fila del Excel fuente con acceso por letra de columna (``row["E"]``)."""
+
+    __slots__ = ("values", "number")
+
+    def __init__(self, values: Sequence[Any], number: int) -> None:
+        self.values = values
+        self.number = number
+
+    def __getitem__(self, letter: str) -> Any:
+        idx = _col_index(letter)
+        return self.values[idx] if idx < len(self.values) else None
+
+    def text(self, letter: str) -> str:
+        value = self[letter]
+        return "" if value is None else str(value)
+
+
+RowPredicate = Callable[[SourceRow], bool]
+
+
+@dataclass(frozen=True)
+class Col:
+    """Valor de una columna de la fila fuente, opcionalmente convertido."""
+
+    letter: str
+    convert: Optional[Callable[[Any], Any]] = None
+
+    def __call__(self, row: SourceRow) -> Any:
+        value = row[self.letter]
+        return self.convert(value) if self.convert else value
+
+
+@dataclass(frozen=True)
+class Formula:
+    """Fórmula con ``{key}`` en lugar del número de fila de otra partida."""
+
+    template: str
+
+    def resolve(self, rows: Dict[str, int]) -> str:
+        try:
+            return _PLACEHOLDER.sub(lambda m: str(rows[m.group(1)]), self.template)
+        except KeyError as exc:
+            raise ValueError(f"La fórmula {self.template!r} apunta a una partida que no existe: {exc}") from None
+
+
+Value = Union[Col, Formula, Callable[[SourceRow], Any], Any]
+
+
+def _evaluate(value: Value, row: SourceRow) -> Any:
+    if isinstance(value, Formula):
+        return value
+    if callable(value):
+        return value(row)
+    return value
+
+
+@dataclass(frozen=True)
+class Partida:
+    """Una línea de la póliza: B=cuenta, C=0, D=descripción, E=1, F=cargo, G=abono."""
+
+    cuenta: Value
+    descripcion: Value
+    cargo: Value = 0
+    abono: Value = 0
+    key: Optional[str] = None
+    when: Optional[RowPredicate] = None
+    cargo_format: Optional[str] = None
+    abono_format: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class PolizaTemplate:
+    """Bloque de póliza que se repite por cada fila fuente aceptada por ``include``."""
+
+    tipo: str
+    concepto: Value
+    dia: Value
+    partidas: Tuple[Partida, ...]
+    include: Optional[RowPredicate] = None
+    fin_partidas: Union[bool, RowPredicate] = True
+
+
+class Line:
+    """Fila de salida (A–G) con formatos numéricos opcionales por columna."""
+
+    __slots__ = ("cells", "formats", "key")
+
+    def __init__(self, cells: List[Any], formats: Optional[Dict[int, str]] = None, key: Optional[str] = None) -> None:
+        self.cells = cells
+        self.formats = formats
+        self.key = key
+
+
+Block = List[Line]
+
+
+# ---- lectura ----
+def read_rows(src_bytes: bytes, *, data_only: bool = True, min_row: int = 2) -> Iterator[SourceRow]:
+    """Filas de la hoja activa desde ``min_row``, sin cargar todo el libro.
+
+    La dimensión guardada en la hoja puede estar desactualizada (otros
+    programas no la reescriben); se descarta para recorrer todas las filas.
+    """
+
+    wb = load_workbook(io.BytesIO(src_bytes), read_only=True, data_only=data_only)
+    try:
+        ws = wb.active
+        ws.reset_dimensions()
+        for number, values in enumerate(ws.iter_rows(min_row=min_row, values_only=True), start=min_row):
+            yield SourceRow(values, number)
+    finally:
+        wb.close()
+
+
+def read_header(src_bytes: bytes) -> Tuple[Any, ...]:
+    """Valores de la fila 1 de la hoja activa."""
+
+    wb = load_workbook(io.BytesIO(src_bytes), read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        ws.reset_dimensions()
+        for values in ws.iter_rows(min_row=1, max_row=1, values_only=True):
+            return tuple(values)
+        return ()
+    finally:
+        wb.close()
+
+
+def is_blank(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and value.strip() == "")
+
+
+def has_data(*letters: str, blank_strings: bool = True) -> RowPredicate:
+    """Predicado: alguna de las columnas trae valor (``""`` cuenta como vacío si ``blank_strings``)."""
+
+    empty = is_blank if blank_strings else (lambda v: v is None)
+    return lambda row: not all(empty(row[letter]) for letter in letters)
+
+
+# ---- armado de bloques ----
+def render_block(template: PolizaTemplate, row: SourceRow, consecutivo: int) -> Block:
+    block: Block = [
+        Line([template.tipo, consecutivo, _evaluate(template.concepto, row), _evaluate(template.dia, row), None, None, None])
+    ]
+    for partida in template.partidas:
+        if partida.when is not None and not partida.when(row):
+            continue
+        formats: Optional[Dict[int, str]] = None
+        if partida.cargo_format or partida.abono_format:
+            formats = {}
+            if partida.cargo_format:
+                formats[5] = partida.cargo_format
+            if partida.abono_format:
+                formats[6] = partida.abono_format
+        block.append(
+            Line(
+                [
+                    None,
+                    _evaluate(partida.cuenta, row),
+                    0,
+                    _evaluate(partida.descripcion, row),
+                    1,
+                    _evaluate(partida.cargo, row),
+                    _evaluate(partida.abono, row),
+                ],
+                formats,
+                partida.key,
+            )
+        )
+    fin = template.fin_partidas
+    if fin is True or (callable(fin) and fin(row)):
+        block.append(Line([None, FIN_PARTIDAS, None, None, None, None, None]))
+    return block
+
+
+def render_blocks(
+    template: PolizaTemplate,
+    rows: Iterable[SourceRow],
+    consecutivo_inicial: int,
+) -> Iterator[Block]:
+    """Un bloque por fila fuente aceptada; el consecutivo sube de uno en uno."""
+
+    consecutivo = int(consecutivo_inicial)
+    for row in rows:
+        if template.include is not None and not template.include(row):
+            continue
+        yield render_block(template, row, consecutivo)
+        consecutivo += 1
+
+
+# ---- filtros previos a la escritura ----
+def is_zero_like(value: Any) -> bool:
+    """Vacío o numéricamente cero; textos y fórmulas no cuentan como cero."""
+
+    if value is None:
+        return True
+    if isinstance(value, (int, float)):
+        return abs(value) < 1e-9
+    return False
+
+
+def is_zero_line(line: Line, preserve_prefix: str = "") -> bool:
+    """Fila sin encabezado con cargo y abono en cero (``FIN_PARTIDAS`` incluido).
+
+    Las cuentas que empiezan con ``preserve_prefix`` se conservan siempre.
+    """
+
+    cells = line.cells
+    if cells[0] is not None:
+        return False
+    cuenta = cells[1]
+    if preserve_prefix and isinstance(cuenta, str) and cuenta.startswith(preserve_prefix):
+        return False
+    return is_zero_like(cells[5]) and is_zero_like(cells[6])
+
+
+def drop_zero_lines(blocks: Iterable[Block], preserve_prefix: str = "") -> Iterator[Block]:
+    """Bloques sin las filas que marca :func:`is_zero_line`."""
+
+    for block in blocks:
+        yield [line for line in block if not is_zero_line(line, preserve_prefix)]
+
+
+# ---- escritura ----
+class _SheetWriter:
+    def __init__(self, workbook, ws) -> None:
+        self.workbook = workbook
+        self.ws = ws
+        self._formats: Dict[str, Any] = {}
+
+    def fmt(self, num_format: Optional[str]):
+        if not num_format:
+            return None
+        cached = self._formats.get(num_format)
+        if cached is None:
+            cached = self._formats[num_format] = self.workbook.add_format({"num_format": num_format})
+        return cached
+
+    def write(self, row: int, col: int, value: Any, num_format: Optional[str]) -> None:
+        if value is None:
+            return
+        cell_format = self.fmt(num_format)
+        if isinstance(value, str) and value.startswith("="):
+            self.ws.write_formula(row, col, value, cell_format)
+        elif isinstance(value, (datetime, date)):
+            self.ws.write_datetime(row, col, value, cell_format or self.fmt(DATETIME_FORMAT))
+        elif isinstance(value, bool):
+            self.ws.write_boolean(row, col, value, cell_format)
+        elif isinstance(value, (int, float)):
+            self.ws.write_number(row, col, value, cell_format)
+        elif value == "":
+            # openpyxl guardaba "" como celda vacía (sólo con su formato, si lo hay).
+            self.ws.write_blank(row, col, None, cell_format)
+        elif isinstance(value, str):
+            self.ws.write_string(row, col, value, cell_format)
+        else:
+            self.ws.write(row, col, value, cell_format)
+
+
+def write_blocks(
+    blocks: Iterable[Block],
+    *,
+    sheet_title: str = "Hoja1",
+    start_row: int = START_ROW,
+) -> Tuple[bytes, int]:
+    """Escribe los bloques uno tras otro; regresa ``(xlsx, bloques escritos)``."""
+
+    buffer = io.BytesIO()
+    workbook = xlsxwriter.Workbook(buffer, {"constant_memory": True, "strings_to_urls": False})
+    count = 0
+    try:
+        writer = _SheetWriter(workbook, workbook.add_worksheet(sheet_title[:31] or "Hoja1"))
+        excel_row = start_row
+        for block in blocks:
+            rows_by_key = {line.key: excel_row + offset for offset, line in enumerate(block) if line.key}
+            for line in block:
+                formats = line.formats or {}
+                for col, value in enumerate(line.cells):
+                    if isinstance(value, Formula):
+                        value = value.resolve(rows_by_key)
+                    writer.write(excel_row - 1, col, value, formats.get(col))
+                excel_row += 1
+            count += 1
+    finally:
+        workbook.close()
+    return buffer.getvalue(), count
+
+
+# ---- TXT para importar ----
+def _check_arithmetic(node: ast.AST) -> None:
+    if isinstance(node, ast.Expression):
+        return _check_arithmetic(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return None
+    if isinstance(node, ast.Name) and node.id.startswith("_"):
+        return None
+    if isinstance(node, ast.BinOp) and isinstance(node.op, _ARITHMETIC):
+        _check_arithmetic(node.left)
+        return _check_arithmetic(node.right)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        return _check_arithmetic(node.operand)
+    raise ValueError("Sólo se calculan fórmulas aritméticas entre partidas.")
+
+
+@lru_cache(maxsize=None)
+def _compile_formula(template: str):
+    """``(referencias, código)``: cada ``F{key}`` se vuelve la variable ``_n``."""
+
+    refs: List[Tuple[int, str]] = []
+
+    def name(match: "re.Match[str]") -> str:
+        refs.append((ord(match.group(1)) - ord("A"), match.group(2)))
+        return f"_{len(refs) - 1}"
+
+    tree = ast.parse(_CELL_REF.sub(name, template.lstrip("=")), mode="eval")
+    _check_arithmetic(tree)
+    return tuple(refs), compile(tree, "<formula>", "eval")
+
+
+def _as_number(value: Any) -> float:
+    if value is None:
+        return 0.0
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value.strip().replace(",", "") or 0)
+        except ValueError:
+            pass
+    raise ValueError(f"Valor no numérico en una fórmula: {value!r}")
+
+
+def block_values(block: Block) -> List[List[Any]]:
+    """Celdas del bloque con las :class:`Formula` ya calculadas."""
+
+    lines = {line.key: line for line in block if line.key}
+    cache: Dict[Tuple[int, int], float] = {}
+
+    def value_of(line: Line, col: int) -> Any:
+        value = line.cells[col]
+        if not isinstance(value, Formula):
+            return value
+        slot = (id(line), col)
+        if slot not in cache:
+            refs, code = _compile_formula(value.template)
+            names = {}
+            for idx, (ref_col, key) in enumerate(refs):
+                target = lines.get(key)
+                if target is None:
+                    raise ValueError(f"La fórmula {value.template!r} apunta a una partida que no existe.")
+                names[f"_{idx}"] = _as_number(value_of(target, ref_col))
+            cache[slot] = eval(code, {"__builtins__": {}}, names)
+        return cache[slot]
+
+    return [[value_of(line, col) for col in range(len(line.cells))] for line in block]
+
+
+@dataclass(frozen=True)
+class TxtLayout:
+    """Renglones del TXT.
+
+    Sin campos, cada renglón son las siete celdas A–G unidas por
+    ``delimiter`` (lo mismo que trae la hoja). Con ``header_fields`` y
+    ``line_fields`` —tuplas ``(columna 0–6, ancho, alineación)``— el renglón
+    es de ancho fijo, con ``header_prefix``/``line_prefix`` como tipo de
+    registro. Las columnas F y G llevan ``decimals`` decimales, también
+    cuando el importe viene como texto de la fuente (``"1,160.00"``).
+    """
+
+    delimiter: str = "|"
+    header_prefix: str = ""
+    line_prefix: str = ""
+    header_fields: Tuple[Tuple[int, int, str], ...] = ()
+    line_fields: Tuple[Tuple[int, int, str], ...] = ()
+    fin_partidas: bool = True
+    decimals: int = 2
+
+    def text(self, value: Any, col: int) -> str:
+        if value is None:
+            return ""
+        if col in (5, 6) and isinstance(value, str):
+            if not value.strip():
+                return ""
+            try:
+                value = _as_number(value)
+            except ValueError:
+                raise ValueError(f"Importe no numérico: {value!r}") from None
+        if isinstance(value, bool):
+            return "1" if value else "0"
+        if isinstance(value, (int, float)):
+            if col in (5, 6):
+                return f"{value:.{self.decimals}f}"
+            if isinstance(value, float) and value.is_integer():
+                return str(int(value))
+            return str(value)
+        if isinstance(value, (datetime, date)):
+            return value.strftime("%d/%m/%Y")
+        text = _TXT_UNSAFE.sub(" ", str(value))
+        return text.replace(self.delimiter, " ") if self.delimiter else text
+
+    def _fixed(self, prefix: str, fields, cells: List[Any]) -> str:
+        parts = [prefix] if prefix else []
+        for col, width, align in fields:
+            parts.append(format(self.text(cells[col], col)[:width], f"{align}{width}"))
+        return self.delimiter.join(parts)
+
+    def record(self, cells: List[Any]) -> Optional[str]:
+        """Renglón para las celdas de una fila, o None si el formato la omite."""
+
+        if cells[1] == FIN_PARTIDAS and cells[0] is None and not self.fin_partidas:
+            return None
+        if not (self.header_fields or self.line_fields):
+            return self.delimiter.join(self.text(value, col) for col, value in enumerate(cells))
+        if cells[0] is not None:
+            return self._fixed(self.header_prefix, self.header_fields, cells)
+        return self._fixed(self.line_prefix, self.line_fields, cells)
+
+
+PIPE_LAYOUT = TxtLayout()
+# Registro P (póliza) y M (movimiento) de ancho fijo separados por espacio:
+# P tipo número día concepto / M cuenta depto. concepto t.c. cargo abono.
+# Es un layout propio, no el de importación de CONTPAQi/Aspel.
+FIXED_LAYOUT = TxtLayout(
+    delimiter=" ",
+    header_prefix="P",
+    line_prefix="M",
+    header_fields=((0, 4, "<"), (1, 9, ">"), (3, 2, ">"), (2, 100, "<")),
+    line_fields=((1, 30, "<"), (2, 4, ">"), (3, 100, "<"), (4, 4, ">"), (5, 16, ">"), (6, 16, ">")),
+    fin_partidas=False,
+)
+
+
+def write_txt(
+    blocks: Iterable[Block],
+    layout: TxtLayout = PIPE_LAYOUT,
+    *,
+    encoding: str = TXT_ENCODING,
+) -> Tuple[bytes, int]:
+    """TXT con un renglón por fila de cada bloque; regresa ``(txt, bloques escritos)``."""
+
+    buffer = io.BytesIO()
+    out = io.TextIOWrapper(buffer, encoding=encoding, errors="replace", newline=TXT_NEWLINE)
+    count = 0
+    for block in blocks:
+        try:
+            records = [layout.record(cells) for cells in block_values(block)]
+        except ValueError as exc:
+            raise ValueError(f"Póliza {block[0].cells[1]}: {exc}") from None
+        for record in records:
+            if record is not None:
+                out.write(record)
+                out.write("\n")
+        count += 1
+    out.flush()
+    data = buffer.getvalue()
+    out.detach()
+    return data, count
+
+
+# ---- salida ----
+OUTPUT_FORMATS = {
+    "xlsx": "Excel (.xlsx)",
+    "txt": "TXT delimitado por |",
+    "txt_fijo": "TXT de ancho fijo (P/M, layout propio)",
+}
+TXT_LAYOUTS = {"txt": PIPE_LAYOUT, "txt_fijo": FIXED_LAYOUT}
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def write_output(
+    blocks: Iterable[Block],
+    formato: str = "xlsx",
+    *,
+    sheet_title: str = "Hoja1",
+    start_row: int = START_ROW,
+    decimals: Optional[int] = None,
+) -> Tuple[bytes, int]:
+    """Escribe en el formato de :data:`OUTPUT_FORMATS`; el TXT no arma libro.
+
+    ``decimals`` cambia los decimales de los importes del TXT.
+    """
+
+    if formato == "xlsx":
+        return write_blocks(blocks, sheet_title=sheet_title, start_row=start_row)
+    if formato not in TXT_LAYOUTS:
+        raise ValueError(f"Formato de salida no soportado: {formato}")
+    layout = TXT_LAYOUTS[formato]
+    if decimals is not None:
+        layout = replace(layout, decimals=int(decimals))
+    return write_txt(blocks, layout)
+
+
+def output_file(stem: str, formato: str = "xlsx") -> Tuple[str, str]:
+    """``(nombre de archivo, mime)`` para el botón de descarga."""
+
+    if formato == "xlsx":
+        return f"{stem}.xlsx", XLSX_MIME
+    return f"{stem}.txt", "text/plain"
+
+
+def build_polizas(
+    template: PolizaTemplate,
+    rows: Iterable[SourceRow],
+    consecutivo_inicial: int,
+    *,
+    sheet_title: str = "Hoja1",
+    formato: str = "xlsx",
+) -> Tuple[bytes, int]:
+    """Atajo: arma y escribe todas las pólizas de ``rows``."""
+
+    return write_output(render_blocks(template, rows, consecutivo_inicial), formato, sheet_title=sheet_title)
+
+
+__all__ = [
+    "AMOUNT_FORMAT",
+    "Block",
+    "FIXED_LAYOUT",
+    "OUTPUT_FORMATS",
+    "PIPE_LAYOUT",
+    "START_ROW",
+    "Col",
+    "FIN_PARTIDAS",
+    "Formula",
+    "Line",
+    "Partida",
+    "PolizaTemplate",
+    "SourceRow",
+    "TxtLayout",
+    "block_values",
+    "build_polizas",
+    "drop_zero_lines",
+    "has_data",
+    "is_blank",
+    "is_zero_like",
+    "is_zero_line",
+    "output_file",
+    "read_header",
+    "read_rows",
+    "render_blocks",
+    "write_blocks",
+    "write_output",
+    "write_txt",
+]
@@ -0,0 +1,281 @@
+"""Motor declarativo de reglas para Riesgos fiscales.
+
+Cada CFDI se reduce una sola vez a una fila de atributos (``FEATURES``) y
+todas las reglas (``RULES``) se evalúan como máscaras de pandas sobre el
+mismo DataFrame. Agregar una regla cuesta una columna, no otro parseo.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+import re
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .cfdi import Comprobante, resumen_row
+
+BASE_COLS: Tuple[str, ...] = (
+    "Fecha",
+    "RFC Emisor",
+    "Nombre Emisor",
+    "UUID",
+    "cfdi:Concepto Importe",
+    "cfdi:Traslado Importe",
+    "RegimenFiscalReceptor",
+)
+ID_COLS: Tuple[str, ...] = BASE_COLS[:6]
+TC_COLS: Tuple[str, ...] = (
+    "Moneda",
+    "TipoCambioXML",
+    "TipoCambioDOF",
+    "TipoCambioDOFAnterior",
+    "Diferencia",
+)
+
+
+def fecha_solo_dia(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+    s = str(value).strip()
+    if not s:
+        return s
+    if "T" in s:
+        return s.split("T", 1)[0]
+    m = re.match(r"^(\d{4}-\d{2}-\d{2})", s)
+    if m:
+        return m.group(1)
+    for fmt in ("%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d"):
+        try:
+            dt = datetime.strptime(s[:10], fmt)
+            return dt.strftime("%Y-%m-%d")
+        except Exception:
+            continue
+    return s[:10]
+
+
+def _retenciones(comp: Comprobante) -> str:
+    impuestos = {(r.get("Impuesto") or "").strip() for r in comp.iter_retenciones()}
+    impuestos.discard("")
+    return ", ".join(sorted(impuestos))
+
+
+# ===================== Atributos extraídos por CFDI =====================
+# Columna -> extractor. Se ejecutan todos en un solo recorrido del registro.
+FEATURES: Dict[str, Callable[[Comprobante], Any]] = {
+    "RegimenFiscalEmisor": lambda c: (c.emisor.get("RegimenFiscal") or "").strip(),
+    "CuentaPredial": lambda c: any(con.cuenta_predial is not None for con in c.conceptos),
+    "FormaPago": lambda c: c.attr("FormaPago"),
+    "MetodoPago": lambda c: c.attr("MetodoPago").upper(),
+    "TipoDeComprobante": lambda c: c.attr("TipoDeComprobante").upper(),
+    "DomicilioFiscalReceptor": lambda c: (c.receptor.get("DomicilioFiscalReceptor") or "").strip(),
+    "UsoCFDI": lambda c: (c.receptor.get("UsoCFDI") or "").strip().upper(),
+    "Moneda": lambda c: c.attr("Moneda").upper(),
+    "TipoCambioRaw": lambda c: c.attr("TipoCambio"),
+    "RetencionesSet": _retenciones,
+}
+
+
+@dataclass(frozen=True)
+class RiskParams:
+    regimen_fiscal_correcto: str = ""
+    cp: str = ""
+    tc_series: Optional[pd.Series] = None
+
+
+@dataclass(frozen=True)
+class RiskRule:
+    """Hoja del reporte: ``mask`` selecciona filas y ``columns`` las proyecta."""
+
+    sheet: str
+    title: str
+    columns: Tuple[str, ...]
+    mask: Callable[[pd.DataFrame, RiskParams], pd.Series]
+    rename: Mapping[str, str] = field(default_factory=dict)
+
+    @property
+    def output_columns(self) -> List[str]:
+        return [self.rename.get(c, c) for c in self.columns]
+
+    def evaluate(self, frame: pd.DataFrame, params: RiskParams) -> pd.DataFrame:
+        if frame.empty:
+            return pd.DataFrame(columns=self.output_columns)
+        selected = frame.loc[self.mask(frame, params).to_numpy(dtype=bool), list(self.columns)]
+        return selected.rename(columns=dict(self.rename)).reset_index(drop=True)
+
+
+RULES: List[RiskRule] = []
+
+
+def register_rule(rule: RiskRule) -> RiskRule:
+    RULES.append(rule)
+    return rule
+
+
+# ===================== Construcción del DataFrame =====================
+def _norm(series: pd.Series) -> pd.Series:
+    return series.astype(str).str.strip().str.upper()
+
+
+def _add_tc_columns(frame: pd.DataFrame, tc_series: Optional[pd.Series]) -> None:
+    xml_tc = pd.to_numeric(frame["TipoCambioRaw"].str.replace(",", "", regex=False), errors="coerce")
+    frame["TipoCambioXML"] = xml_tc
+    ref = pd.Series(np.nan, index=frame.index)
+    prev = pd.Series(np.nan, index=frame.index)
+    if tc_series is not None and not tc_series.empty:
+        fechas = pd.to_datetime(frame["Fecha"], format="%Y-%m-%d", errors="coerce")
+        tc_index = pd.DatetimeIndex(pd.to_datetime(pd.Index(tc_series.index)))
+        tc_values = tc_series.to_numpy(dtype=float)
+        valid = fechas.notna().to_numpy()
+        if valid.any():
+            ref.loc[valid] = pd.Series(tc_values, index=tc_index).reindex(fechas[valid]).to_numpy()
+            pos = tc_index.searchsorted(fechas[valid], side="left") - 1
+            prev.loc[valid] = np.where(pos >= 0, tc_values[np.clip(pos, 0, None)], np.nan)
+    frame["TipoCambioDOF"] = ref
+    frame["TipoCambioDOFAnterior"] = prev
+    frame["Diferencia"] = (xml_tc - ref).round(6)
+
+
+def build_frame(comps: Iterable[Comprobante], params: RiskParams) -> pd.DataFrame:
+    """Un renglón por CFDI con las columnas base más todos los ``FEATURES``."""
+
+    records: List[Dict[str, Any]] = []
+    for comp in comps:
+        row = resumen_row(comp)
+        row["Fecha"] = fecha_solo_dia(row["Fecha"])
+        for name, extractor in FEATURES.items():
+            row[name] = extractor(comp)
+        records.append(row)
+
+    columns = list(BASE_COLS) + list(FEATURES)
+    frame = pd.DataFrame(records, columns=columns)
+    if frame.empty:
+        return frame
+
+    frame["Régimen fiscal correcto"] = params.regimen_fiscal_correcto
+    frame["CP"] = params.cp
+    frame["Total"] = pd.to_numeric(frame["cfdi:Concepto Importe"], errors="coerce").fillna(0) + pd.to_numeric(
+        frame["cfdi:Traslado Importe"], errors="coerce"
+    ).fillna(0)
+    frame["FormaPagoNorm"] = frame["FormaPago"].str.replace(r"^0+", "", regex=True).replace("", "0")
+    frame["Retenciones"] = frame["RetencionesSet"].where(frame["RetencionesSet"] != "", "SIN RETENCIONES")
+    frame["RetieneISRoIVA"] = frame["RetencionesSet"].str.contains(r"\b00[12]\b", regex=True)
+    _add_tc_columns(frame, params.tc_series)
+    return frame
+
+
+def evaluate(frame: pd.DataFrame, params: RiskParams, rules: Sequence[RiskRule] = ()) -> List[Tuple[RiskRule, pd.DataFrame]]:
+    return [(rule, rule.evaluate(frame, params)) for rule in (rules or RULES)]
+
+
+# ===================== Reglas =====================
+def _false(frame: pd.DataFrame) -> pd.Series:
+    return pd.Series(False, index=frame.index)
+
+
+def _tc_distinto(f: pd.DataFrame, p: RiskParams) -> pd.Series:
+    usd = f["Moneda"] == "USD"
+    ref = f["TipoCambioDOF"].notna()
+    xml = f["TipoCambioXML"].notna()
+    return usd & ref & (~xml | ((f["TipoCambioXML"] - f["TipoCambioDOF"]).abs() > 1e-6))
+
+
+register_rule(
+    RiskRule(
+        "No Coinciden",
+        "CFDI con diferente régimen fiscal",
+        BASE_COLS + ("Régimen fiscal correcto",),
+        lambda f, p: (_norm(f["RegimenFiscalReceptor"]) != _norm(f["Régimen fiscal correcto"]))
+        if p.regimen_fiscal_correcto.strip()
+        else _false(f),
+    )
+)
+register_rule(
+    RiskRule(
+        "Arrendamiento sin Predial",
+        "CFDI de arrendamiento sin cuenta predial",
+        BASE_COLS,
+        lambda f, p: (f["RegimenFiscalEmisor"] == "606") & ~f["CuentaPredial"].astype(bool),
+    )
+)
+register_rule(
+    RiskRule(
+        "Efectivo > 2000",
+        "CFDI con gasto total en efectivo mayor de 2000 pesos",
+        ID_COLS + ("FormaPago",),
+        lambda f, p: (f["FormaPago"] == "01") & (f["Total"] > 2000),
+    )
+)
+register_rule(
+    RiskRule(
+        "Domicilio vs CP",
+        "CFDI con diferente domicilio fiscal",
+        ID_COLS + ("DomicilioFiscalReceptor", "CP"),
+        lambda f, p: (_norm(f["DomicilioFiscalReceptor"]) != _norm(f["CP"])) if p.cp.strip() else _false(f),
+    )
+)
+register_rule(
+    RiskRule(
+        "Sin Retenciones 001-002 (626)",
+        "Régimen 626 sin retenciones",
+        ID_COLS + ("RegimenFiscalEmisor", "Retenciones"),
+        lambda f, p: (f["RegimenFiscalEmisor"] == "626") & ~f["RetieneISRoIVA"],
+    )
+)
+register_rule(
+    RiskRule(
+        "Uso CFDI S01 no deducible",
+        "Uso CFDI S01 no deducible",
+        ID_COLS + ("UsoCFDI",),
+        lambda f, p: f["UsoCFDI"] == "S01",
+    )
+)
+register_rule(
+    RiskRule(
+        "Tipo de Cambio Diferente",
+        "Tipo de cambio diferente",
+        ID_COLS + TC_COLS,
+        _tc_distinto,
+    )
+)
+register_rule(
+    RiskRule(
+        "USD (Todos)",
+        "CFDI en USD — Tipo de Cambio DOF",
+        ID_COLS + TC_COLS,
+        lambda f, p: f["Moneda"] == "USD",
+    )
+)
+register_rule(
+    RiskRule(
+        "NC ≠ Condonación - PUE",
+        "Notas de crédito con método de pago diferente a condonación y PUE",
+        ID_COLS + ("TipoDeComprobante", "FormaPagoNorm", "MetodoPago"),
+        lambda f, p: (f["TipoDeComprobante"] == "E") & ((f["FormaPagoNorm"] != "15") | (f["MetodoPago"] != "PUE")),
+        rename={"FormaPagoNorm": "FormaPago"},
+    )
+)
+register_rule(
+    RiskRule(
+        "PUE FP 99",
+        "PUE con forma de pago por definir",
+        ID_COLS + ("FormaPagoNorm", "MetodoPago"),
+        lambda f, p: (f["TipoDeComprobante"] == "I") & (f["MetodoPago"] == "PUE") & (f["FormaPagoNorm"] == "99"),
+        rename={"FormaPagoNorm": "FormaPago"},
+    )
+)
+
+
+__all__ = [
+    "BASE_COLS",
+    "FEATURES",
+    "RULES",
+    "RiskParams",
+    "RiskRule",
+    "build_frame",
+    "evaluate",
+    "fecha_solo_dia",
+    "register_rule",
+]
@@ -1,13 +1,28 @@
 from __future__ import annotations
 
+from contextlib import closing
+from dataclasses import dataclass, field
+from functools import lru_cache
+import math
 from pathlib import Path
-from typing import Any, Iterable, MutableMapping, Optional, Sequence
+import pickle
+import sqlite3
+import threading
+from typing import Any, Iterable, Mapping, MutableMapping, Optional, Sequence
 
+import numpy as np
 import pandas as pd
 
-from .config import VERIFIED_ROUTES_XLSX
+from .config import DB_PATH, VERIFIED_ROUTES_XLSX
 from .utils import normalize_name
-from .maps import GoogleMapsClient, GoogleMapsError, haversine_km
+from .maps import GoogleMapsClient, GoogleMapsError, haversine_km_many
+
+# Celda de la rejilla de casetas en grados (~11 km de latitud).
+GRID_CELL_DEG = 0.1
+KM_PER_DEG_LAT = 111.195
+
+# Los nombres de casetas se repiten en cada consulta; normalizar cuesta varias regex.
+_norm = lru_cache(maxsize=8192)(normalize_name)
 
 def _load_routes_from_excel(path: Path) -> dict[str, list[str]]:
     """Read verified routes from the supplemental Excel workbook."""
@@ -52,36 +67,138 @@ def _load_routes_from_excel(path: Path) -> dict[str, list[str]]:
     return routes
 
 
-def load_routes() -> dict[str, list[str]]:
-    """Lee únicamente las rutas verificadas del Excel."""
-    routes = _load_routes_from_excel(Path(VERIFIED_ROUTES_XLSX))
-    if not routes:
-        routes = {
-            "TOLUCA-NUEVO LAREDO": [
-                "EL DORADO","ATLACOMULCO SUR","CHICHIMEQUILLAS",
-                "LIB. OTE. S.L.P.","LIB. MATEHUALA","LOS CHORROS","LINCOLN","SABINAS","NVO LAREDO KM26",
-            ],
-            "NVO LAREDO-PANINDICUARO": [
-                "NVO LAREDO PINFRA","SABINAS","LINCOLN","LOS CHORROS","LIB. MATEHUALA",
-                "VENTURA - EL PEYOTE","LIB. OTE. S.L.P.","SAN FELIPE","MENDOZA","LA CINTA","PANINDICUARO",
-            ]
-        }
+class RouteCatalog(dict):
+    """Rutas verificadas (nombre -> casetas) con su índice por caseta normalizada.
+
+    ``index[caseta]`` es la lista de ``(ruta, posición)`` en el orden de las
+    rutas, con la primera aparición de la caseta en cada una. Se arma al
+    construir el catálogo; trátalo como de sólo lectura.
+    """
+
+    __slots__ = ("index", "catalog")
+
+    def __init__(self, routes: Mapping[str, Sequence[str]] = ()) -> None:
+        super().__init__(routes)
+        index: dict[str, list[tuple[str, int]]] = {}
+        for name, seq in self.items():
+            seen: set[str] = set()
+            for pos, plaza in enumerate(seq):
+                key = _norm(plaza)
+                if key not in seen:
+                    seen.add(key)
+                    index.setdefault(key, []).append((name, pos))
+        self.index = index
+        self.catalog = sorted({p for lista in self.values() for p in lista})
+
+
+def route_catalog(routes: Mapping[str, Sequence[str]]) -> RouteCatalog:
+    return routes if isinstance(routes, RouteCatalog) else RouteCatalog(routes)
+
+
+# Súbelo si cambia lo que se guarda en la copia ``*_rutas.pkl``.
+ROUTES_SNAPSHOT_VERSION = 1
+DEFAULT_ROUTES: dict[str, list[str]] = {
+    "TOLUCA-NUEVO LAREDO": [
+        "EL DORADO","ATLACOMULCO SUR","CHICHIMEQUILLAS",
+        "LIB. OTE. S.L.P.","LIB. MATEHUALA","LOS CHORROS","LINCOLN","SABINAS","NVO LAREDO KM26",
+    ],
+    "NVO LAREDO-PANINDICUARO": [
+        "NVO LAREDO PINFRA","SABINAS","LINCOLN","LOS CHORROS","LIB. MATEHUALA",
+        "VENTURA - EL PEYOTE","LIB. OTE. S.L.P.","SAN FELIPE","MENDOZA","LA CINTA","PANINDICUARO",
+    ]
+}
+
+_ROUTES: dict[str, tuple[Optional[tuple[int, int]], RouteCatalog]] = {}
+_ROUTES_LOCK = threading.Lock()
+
+
+def _file_signature(path: Path) -> Optional[tuple[int, int]]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def routes_snapshot_path(path: Path) -> Path:
+    return path.with_name(f"{path.stem}_rutas.pkl")
+
+
+def _read_snapshot(path: Path, signature: tuple[int, int]) -> Optional[dict[str, list[str]]]:
+    try:
+        with routes_snapshot_path(path).open("rb") as fh:
+            version, saved_signature, routes = pickle.load(fh)
+    except Exception:
+        return None
+    if version != ROUTES_SNAPSHOT_VERSION or tuple(saved_signature) != signature or not isinstance(routes, dict):
+        return None
     return routes
 
+
+def _write_snapshot(path: Path, signature: tuple[int, int], routes: dict[str, list[str]]) -> None:
+    target = routes_snapshot_path(path)
+    tmp = target.with_name(target.name + ".tmp")
+    try:
+        with tmp.open("wb") as fh:
+            pickle.dump((ROUTES_SNAPSHOT_VERSION, signature, routes), fh, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(target)
+    except OSError:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+
+
+def load_routes() -> RouteCatalog:
+    """Lee únicamente las rutas verificadas del Excel.
+
+    El catálogo se comparte en el proceso y sólo se vuelve a leer cuando cambia
+    el ``mtime``/tamaño del libro. Tras leer el Excel se deja una copia
+    ``*_rutas.pkl`` a su lado para que un arranque en frío no lo vuelva a
+    parsear. El resultado es compartido: no se debe modificar.
+    """
+
+    path = Path(VERIFIED_ROUTES_XLSX)
+    signature = _file_signature(path)
+    with _ROUTES_LOCK:
+        cached = _ROUTES.get(str(path))
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        routes: Optional[dict[str, list[str]]] = None
+        if signature is not None:
+            routes = _read_snapshot(path, signature)
+            if routes is None:
+                routes = _load_routes_from_excel(path)
+                if routes:
+                    _write_snapshot(path, signature, routes)
+        catalog = RouteCatalog(routes or DEFAULT_ROUTES)
+        _ROUTES[str(path)] = (signature, catalog)
+        return catalog
+
 def plazas_catalog(routes: dict[str, list[str]]) -> list[str]:
-    return sorted({p for lista in routes.values() for p in lista})
+    return list(route_catalog(routes).catalog)
 
 def find_subsequence_between(routes: dict[str, list[str]], a: str, b: str):
-    a_norm, b_norm = normalize_name(a), normalize_name(b)
+    """Tramo más corto de ``a`` a ``b`` dentro de una misma ruta (en el sentido de la consulta)."""
+
+    index = route_catalog(routes).index
+    starts = dict(index.get(_norm(a), ()))
+    if not starts:
+        return None
     best = None
-    for name, seq in routes.items():
-        norm = [normalize_name(x) for x in seq]
-        if a_norm in norm and b_norm in norm:
-            ia, ib = norm.index(a_norm), norm.index(b_norm)
-            sub = seq[ia:ib+1] if ia <= ib else list(reversed(seq[ib:ia+1]))
-            if (best is None) or (len(sub) < len(best[1])):
-                best = (name, sub)
-    return best
+    best_len = 0
+    for name, ib in index.get(_norm(b), ()):
+        ia = starts.get(name)
+        if ia is None:
+            continue
+        length = abs(ib - ia) + 1
+        if best is None or length < best_len:
+            best, best_len = (name, ia, ib), length
+    if best is None:
+        return None
+    name, ia, ib = best
+    seq = routes[name]
+    return name, (seq[ia:ib + 1] if ia <= ib else list(reversed(seq[ib:ia + 1])))
 
 
 # Palabras clave adicionales para mapear búsquedas de Google a nuestras casetas
@@ -137,6 +254,183 @@ def _combine_segments(segments: list[tuple[str, list[str]]]) -> Optional[tuple[s
     return title or segments[0][0], combined
 
 
+def geocode_plaza(
+    maps_client: GoogleMapsClient,
+    plaza: str,
+    *,
+    session_token: Optional[str] = None,
+    plaza_lookup: Optional[MutableMapping[str, str]] = None,
+    autocomplete_cache: Optional[MutableMapping[str, Any]] = None,
+    details_cache: Optional[MutableMapping[str, Any]] = None,
+) -> Optional[tuple[float, float]]:
+    """Busca la caseta en Places (autocompletado + detalles) y regresa ``(lat, lon)``."""
+
+    plaza_lookup = plaza_lookup if plaza_lookup is not None else {}
+    place_id = plaza_lookup.get(plaza)
+    if not place_id:
+        query = f"Caseta {plaza}" if "caseta" not in normalize_name(plaza) else plaza
+        try:
+            predictions = maps_client.autocomplete(
+                query,
+                session_token=session_token,
+                cache=autocomplete_cache,
+            )
+        except GoogleMapsError:
+            predictions = []
+        normalized_plaza = normalize_name(plaza)
+        for pred in predictions:
+            if normalize_name(pred.get("description", "")) and normalized_plaza in normalize_name(pred.get("description", "")):
+                place_id = pred.get("place_id")
+                break
+        if not place_id and predictions:
+            place_id = predictions[0].get("place_id")
+        if place_id:
+            plaza_lookup[plaza] = place_id
+
+    if not place_id:
+        return None
+
+    try:
+        details = maps_client.place_details(
+            place_id,
+            cache=details_cache,
+            session_token=session_token,
+        )
+    except GoogleMapsError:
+        return None
+
+    location = details.get("result", {}).get("geometry", {}).get("location")
+    if not location:
+        return None
+    return (float(location.get("lat")), float(location.get("lng")))
+
+
+@dataclass(frozen=True)
+class PlazaCoordinates:
+    """Coordenadas precalculadas de las casetas (``plazas.lat/lon``).
+
+    ``names`` son nombres normalizados y ``points`` el arreglo ``(n, 2)`` de
+    lat/lon en el mismo orden.
+    """
+
+    names: tuple[str, ...] = ()
+    points: np.ndarray = field(default_factory=lambda: np.empty((0, 2)))
+    _index: Mapping[str, int] = field(default_factory=dict, repr=False)
+    # Rejilla (celda lat, celda lon) -> índices. Se arma completa al construir
+    # porque la instancia se comparte entre los hilos de todas las sesiones.
+    _grid: Mapping[tuple[int, int], tuple[int, ...]] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        grid: dict[tuple[int, int], list[int]] = {}
+        if len(self.points):
+            cells = np.floor(self.points / GRID_CELL_DEG).astype(np.int64)
+            for idx, cell in enumerate(map(tuple, cells.tolist())):
+                grid.setdefault(cell, []).append(idx)
+        object.__setattr__(self, "_grid", {cell: tuple(idxs) for cell, idxs in grid.items()})
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple[str, float, float]]) -> "PlazaCoordinates":
+        index: dict[str, int] = {}
+        coords: list[tuple[float, float]] = []
+        for nombre, lat, lon in rows:
+            key = _norm(str(nombre or ""))
+            if key and key not in index and lat is not None and lon is not None:
+                index[key] = len(coords)
+                coords.append((float(lat), float(lon)))
+        points = np.array(coords, dtype=float).reshape(-1, 2)
+        return cls(tuple(index), points, index)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def get(self, plaza: str) -> Optional[tuple[float, float]]:
+        idx = self._index.get(_norm(plaza))
+        if idx is None:
+            return None
+        lat, lon = self.points[idx]
+        return (float(lat), float(lon))
+
+    def near(self, points: Sequence[tuple[float, float]], threshold_km: float) -> frozenset[str]:
+        """Nombres (normalizados) de las casetas a ``threshold_km`` o menos de algún punto.
+
+        Sólo se miden las casetas de las celdas vecinas a las de los puntos, y
+        de ésas sólo los pares dentro de la caja lat/lon del umbral.
+        """
+
+        pts = np.asarray(points, dtype=float).reshape(-1, 2)
+        if not len(self) or not len(pts):
+            return frozenset()
+
+        dlat = threshold_km / KM_PER_DEG_LAT
+        max_lat = min(89.0, float(np.abs(pts[:, 0]).max()) + dlat)
+        dlon = dlat / math.cos(math.radians(max_lat))
+        reach_lat = math.ceil(dlat / GRID_CELL_DEG)
+        reach_lon = math.ceil(dlon / GRID_CELL_DEG)
+
+        grid = self._grid
+        candidates: set[int] = set()
+        for i, j in np.unique(np.floor(pts / GRID_CELL_DEG).astype(np.int64), axis=0).tolist():
+            for di in range(-reach_lat, reach_lat + 1):
+                for dj in range(-reach_lon, reach_lon + 1):
+                    hit = grid.get((i + di, j + dj))
+                    if hit:
+                        candidates.update(hit)
+        if not candidates:
+            return frozenset()
+
+        cand = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        plazas = self.points[cand]
+        in_box = (np.abs(plazas[:, None, 0] - pts[None, :, 0]) <= dlat) & (
+            np.abs(plazas[:, None, 1] - pts[None, :, 1]) <= dlon
+        )
+        rows, cols = np.nonzero(in_box)
+        if not len(rows):
+            return frozenset()
+        dist = haversine_km_many(plazas[rows, 0], plazas[rows, 1], pts[cols, 0], pts[cols, 1])
+        hits = np.unique(cand[rows[dist <= threshold_km]])
+        return frozenset(self.names[i] for i in hits.tolist())
+
+
+_COORDS: dict[str, tuple[tuple[int, int], PlazaCoordinates]] = {}
+_COORDS_LOCK = threading.Lock()
+
+
+def _db_signature(db_path: Path) -> tuple[int, int]:
+    """``mtime`` de la base y de su WAL: cambia en cuanto alguien escribe."""
+
+    stamps = []
+    for path in (db_path, db_path.with_name(db_path.name + "-wal")):
+        try:
+            stamps.append(path.stat().st_mtime_ns)
+        except OSError:
+            stamps.append(0)
+    return stamps[0], stamps[1]
+
+
+def load_plaza_coordinates(db_path: Path = DB_PATH) -> PlazaCoordinates:
+    """Coordenadas de ``plazas`` en memoria; se releen sólo si la base cambió."""
+
+    db_path = Path(db_path)
+    signature = _db_signature(db_path)
+    with _COORDS_LOCK:
+        cached = _COORDS.get(str(db_path))
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        rows: list[tuple[str, float, float]] = []
+        if db_path.exists():
+            try:
+                with closing(sqlite3.connect(str(db_path), timeout=30)) as con:
+                    rows = con.execute(
+                        "SELECT nombre, AVG(lat), AVG(lon) FROM plazas "
+                        "WHERE lat IS NOT NULL AND lon IS NOT NULL GROUP BY nombre ORDER BY nombre"
+                    ).fetchall()
+            except sqlite3.Error:
+                rows = []
+        coords = PlazaCoordinates.from_rows(rows)
+        _COORDS[str(db_path)] = (signature, coords)
+        return coords
+
+
 def plazas_from_polyline(
     routes: dict[str, list[str]],
     points: Sequence[tuple[float, float]],
@@ -145,11 +439,21 @@ def plazas_from_polyline(
     cache: Optional[MutableMapping[str, Any]] = None,
     session_token: Optional[str] = None,
     threshold_km: float = 15.0,
+    coordinates: Optional[PlazaCoordinates] = None,
 ) -> Optional[tuple[str, list[str]]]:
-    """Detecta la ruta más probable cruzando puntos intermedios con nuestras casetas."""
+    """Detecta la ruta más probable cruzando puntos intermedios con nuestras casetas.
+
+    Con ``coordinates`` (ver :func:`load_plaza_coordinates`) sólo se consulta
+    Places, vía ``maps_client`` y su caché persistente, por las casetas de las
+    rutas que no tienen coordenadas en la tabla. Sin tabla se conserva la
+    búsqueda en línea de todas.
+    """
 
-    if not points or maps_client is None:
+    if not points:
         return None
+    if not coordinates and maps_client is None:
+        return None
+    routes = route_catalog(routes)
 
     plaza_lookup = cache.setdefault("plaza_lookup", {}) if isinstance(cache, MutableMapping) else {}
     geometry_cache = cache.setdefault("plaza_geometry", {}) if isinstance(cache, MutableMapping) else {}
@@ -159,61 +463,37 @@ def plazas_from_polyline(
     def ensure_geometry(plaza: str) -> Optional[tuple[float, float]]:
         if plaza in geometry_cache:
             return geometry_cache[plaza]
-
-        place_id = plaza_lookup.get(plaza)
-        if not place_id:
-            query = f"Caseta {plaza}" if "caseta" not in normalize_name(plaza) else plaza
-            try:
-                predictions = maps_client.autocomplete(
-                    query,
-                    session_token=session_token,
-                    cache=autocomplete_cache,
-                )
-            except GoogleMapsError:
-                predictions = []
-            normalized_plaza = normalize_name(plaza)
-            for pred in predictions:
-                if normalize_name(pred.get("description", "")) and normalized_plaza in normalize_name(pred.get("description", "")):
-                    place_id = pred.get("place_id")
-                    break
-            if not place_id and predictions:
-                place_id = predictions[0].get("place_id")
-            if place_id:
-                plaza_lookup[plaza] = place_id
-
-        if not place_id:
-            return None
-
-        try:
-            details = maps_client.place_details(
-                place_id,
-                cache=details_cache,
-                session_token=session_token,
-            )
-        except GoogleMapsError:
-            return None
-
-        location = details.get("result", {}).get("geometry", {}).get("location")
-        if not location:
-            return None
-        coords = (float(location.get("lat")), float(location.get("lng")))
-        geometry_cache[plaza] = coords
+        coords = geocode_plaza(
+            maps_client,
+            plaza,
+            session_token=session_token,
+            plaza_lookup=plaza_lookup,
+            autocomplete_cache=autocomplete_cache,
+            details_cache=details_cache,
+        )
+        if coords is not None:
+            geometry_cache[plaza] = coords
         return coords
 
+    if coordinates:
+        pending = [] if maps_client is None else [p for p in plazas_catalog(routes) if coordinates.get(p) is None]
+    else:
+        pending = plazas_catalog(routes)
+    located = []
+    for plaza in pending:
+        coords = ensure_geometry(plaza)
+        if coords:
+            located.append((plaza, coords[0], coords[1]))
+    near = PlazaCoordinates.from_rows(located).near(points, threshold_km)
+    if coordinates:
+        near |= coordinates.near(points, threshold_km)
+    if not near:
+        return None
+
     best_match: Optional[tuple[str, list[str], int]] = None
 
     for route_name, plazas in routes.items():
-        if not plazas:
-            continue
-        nearby: list[str] = []
-        for plaza in plazas:
-            coords = ensure_geometry(plaza)
-            if not coords:
-                continue
-            distance = min(haversine_km(coords, p) for p in points)
-            if distance <= threshold_km:
-                nearby.append(plaza)
-
+        nearby = [plaza for plaza in plazas if _norm(plaza) in near]
         if not nearby:
             continue
 
@@ -237,9 +517,11 @@ def match_plazas_for_route(
     maps_client: Optional[GoogleMapsClient] = None,
     cache: Optional[MutableMapping[str, Any]] = None,
     session_token: Optional[str] = None,
+    coordinates: Optional[PlazaCoordinates] = None,
 ) -> Optional[tuple[str, list[str]]]:
     """Determina la secuencia de casetas más probable para una ruta calculada."""
 
+    routes = route_catalog(routes)
     matched = [sel.get("matched_plaza") for sel in selections if sel and sel.get("matched_plaza")]
 
     segments: list[tuple[str, list[str]]] = []
@@ -261,13 +543,21 @@ def match_plazas_for_route(
         maps_client=maps_client,
         cache=cache,
         session_token=session_token,
+        coordinates=coordinates,
     )
 
 
 __all__ = [
+    "DEFAULT_ROUTES",
+    "PlazaCoordinates",
+    "RouteCatalog",
     "load_routes",
+    "load_plaza_coordinates",
     "plazas_catalog",
+    "route_catalog",
+    "routes_snapshot_path",
     "find_subsequence_between",
+    "geocode_plaza",
     "match_plaza_in_text",
     "plazas_from_polyline",
     "match_plazas_for_route",
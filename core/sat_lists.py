@@ -0,0 +1,257 @@
+"""Listas del SAT (Firmes / Exigibles) como instantáneas en memoria.
+
+Cada lista se lee una sola vez por versión del archivo: la llave es el
+``stored_as`` del ``manifest.json`` más el ``mtime`` del archivo, así que
+los reruns de Streamlit reutilizan el DataFrame y el ``frozenset`` de RFC
+ya normalizados. Al subir una versión nueva, :func:`diff_snapshots`
+entrega los RFC recién listados sin recalcular el cruce completo.
+
+Junto al archivo original se guarda una copia columnar (Feather / Arrow IPC,
+``<nombre>_columnar.feather``) con el RFC ya normalizado; un arranque en
+frío la mapea en memoria en lugar de volver a parsear el CSV/Excel. Sin
+``pyarrow`` instalado se lee siempre el archivo original.
+"""
+
+from __future__ import annotations
+
+from contextlib import closing
+from dataclasses import dataclass
+import json
+from pathlib import Path
+import sqlite3
+import threading
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow.feather as _feather
+except ModuleNotFoundError:  # pragma: no cover - optional dependency
+    _feather = None
+
+_CACHE: Dict[Tuple[str, str, int], "BlacklistSnapshot"] = {}
+_COMBINED: Dict[Tuple[Tuple[str, int], ...], pd.DataFrame] = {}
+_CACHE_LOCK = threading.Lock()
+_TEMP_TABLE = "_blacklist_rfc"
+
+
+@dataclass(frozen=True)
+class BlacklistSnapshot:
+    """Lista vigente: ``frame`` con la columna ``RFC`` normalizada y su conjunto."""
+
+    stored_as: str
+    mtime_ns: int
+    frame: pd.DataFrame
+    rfcs: FrozenSet[str]
+
+    @property
+    def empty(self) -> bool:
+        return not self.rfcs
+
+
+EMPTY_SNAPSHOT = BlacklistSnapshot("", 0, pd.DataFrame(), frozenset())
+
+
+@dataclass(frozen=True)
+class BlacklistDiff:
+    added: Tuple[str, ...]
+    removed: Tuple[str, ...]
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.removed)
+
+
+def normalize_rfc(series: pd.Series) -> pd.Series:
+    return series.astype(str).str.strip().str.upper()
+
+
+def read_manifest(manifest_path: Path) -> Optional[dict]:
+    if manifest_path.exists():
+        try:
+            return json.loads(manifest_path.read_text(encoding="utf-8"))
+        except Exception:
+            return None
+    return None
+
+
+def _parse_source(path: Path) -> pd.DataFrame:
+    try:
+        if path.name.lower().endswith((".xlsx", ".xls")):
+            df = pd.read_excel(path)
+        else:
+            df = pd.read_csv(path, encoding="latin-1")
+    except Exception:
+        return pd.DataFrame()
+    if df.empty or "RFC" not in df.columns:
+        return pd.DataFrame()
+    df["RFC"] = normalize_rfc(df["RFC"])
+    return df
+
+
+def columnar_cache_path(path: Path) -> Path:
+    # Sin el sufijo original: ``_clear_previous_versions`` borra ``*_latest.*``.
+    return path.with_name(f"{path.stem}_columnar.feather")
+
+
+def write_columnar_cache(path: Path, df: Optional[pd.DataFrame] = None) -> Optional[Path]:
+    """Escribe la copia columnar de ``path``; None si no hay ``pyarrow`` o falla."""
+
+    if _feather is None:
+        return None
+    if df is None:
+        df = _parse_source(path)
+    if df.empty:
+        return None
+    out = df.reset_index(drop=True)
+    out.columns = [str(c) for c in out.columns]
+    for col in out.columns:
+        if pd.api.types.is_object_dtype(out[col]):
+            # Arrow exige un tipo por columna; los valores mixtos se guardan como texto.
+            out[col] = out[col].where(out[col].isna(), out[col].astype(str))
+    target = columnar_cache_path(path)
+    tmp = target.with_name(target.name + ".tmp")
+    try:
+        _feather.write_feather(out, str(tmp), compression="uncompressed")
+        tmp.replace(target)
+    except Exception:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        return None
+    return target
+
+
+def _read_columnar_cache(path: Path) -> Optional[pd.DataFrame]:
+    if _feather is None:
+        return None
+    cache = columnar_cache_path(path)
+    try:
+        if cache.stat().st_mtime_ns < path.stat().st_mtime_ns:
+            return None
+        return _feather.read_table(str(cache), memory_map=True).to_pandas()
+    except Exception:
+        return None
+
+
+def read_sat_file(path: Path) -> pd.DataFrame:
+    """Lista del SAT con ``RFC`` normalizado; DataFrame vacío si no trae ``RFC``.
+
+    Usa la copia columnar si está al día; si no, parsea el original y la regenera.
+    """
+
+    df = _read_columnar_cache(path)
+    if df is not None:
+        return df
+    df = _parse_source(path)
+    if not df.empty:
+        write_columnar_cache(path, df)
+    return df
+
+
+def _build_snapshot(path: Path, stored_as: str, mtime_ns: int) -> BlacklistSnapshot:
+    frame = read_sat_file(path)
+    rfcs = frozenset(frame["RFC"].dropna().unique()) if not frame.empty else frozenset()
+    rfcs = rfcs - {"", "NAN"}
+    return BlacklistSnapshot(stored_as, mtime_ns, frame, rfcs)
+
+
+def load_snapshot(manifest_path: Path, base_dir: Path) -> BlacklistSnapshot:
+    """Instantánea de la lista referida por ``manifest_path`` (memoizada por versión)."""
+
+    manifest = read_manifest(manifest_path)
+    stored_as = (manifest or {}).get("stored_as", "")
+    if not stored_as:
+        return EMPTY_SNAPSHOT
+    path = base_dir / stored_as
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except OSError:
+        return EMPTY_SNAPSHOT
+
+    key = (str(base_dir.resolve()), stored_as, mtime_ns)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    snapshot = _build_snapshot(path, stored_as, mtime_ns)
+    with _CACHE_LOCK:
+        # Una sola versión viva por directorio.
+        for stale in [k for k in _CACHE if k[0] == key[0]]:
+            _CACHE.pop(stale, None)
+        _CACHE[key] = snapshot
+    return snapshot
+
+
+def diff_snapshots(old: BlacklistSnapshot, new: BlacklistSnapshot) -> BlacklistDiff:
+    return BlacklistDiff(
+        added=tuple(sorted(new.rfcs - old.rfcs)),
+        removed=tuple(sorted(old.rfcs - new.rfcs)),
+    )
+
+
+def combine_snapshots(*snapshots: BlacklistSnapshot) -> pd.DataFrame:
+    """Concatena las listas vigentes; el resultado se reutiliza mientras no cambien."""
+
+    live = [s for s in snapshots if not s.empty]
+    if not live:
+        return pd.DataFrame()
+    key = tuple((s.stored_as, s.mtime_ns) for s in live)
+    with _CACHE_LOCK:
+        cached = _COMBINED.get(key)
+    if cached is not None:
+        return cached
+    combined = pd.concat([s.frame for s in live], ignore_index=True)
+    with _CACHE_LOCK:
+        _COMBINED.clear()
+        _COMBINED[key] = combined
+    return combined
+
+
+def stage_rfcs(con: sqlite3.Connection, rfcs: Iterable[str]) -> str:
+    """Carga ``rfcs`` en una tabla temporal con llave primaria y regresa su nombre.
+
+    Permite resolver el cruce con un ``JOIN`` sobre la columna indexada en
+    lugar de mandar miles de parámetros en cláusulas ``IN``.
+    """
+
+    con.execute(f"CREATE TEMP TABLE IF NOT EXISTS {_TEMP_TABLE}(rfc TEXT PRIMARY KEY)")
+    con.execute(f"DELETE FROM {_TEMP_TABLE}")
+    con.executemany(f"INSERT OR IGNORE INTO {_TEMP_TABLE}(rfc) VALUES(?)", ((r,) for r in rfcs if r))
+    return _TEMP_TABLE
+
+
+def stored_cfdi_by_rfc(db_path: Path, rfcs: Iterable[str]) -> Dict[str, int]:
+    """CFDI del almacén (``core.cfdi_store``) emitidos por cada RFC de ``rfcs``."""
+
+    if not Path(db_path).exists():
+        return {}
+    with closing(sqlite3.connect(str(db_path), timeout=30)) as con:
+        try:
+            temp = stage_rfcs(con, rfcs)
+            rows = con.execute(
+                "SELECT d.emisor_rfc, COUNT(*) FROM cfdi_docs d "
+                f"JOIN {temp} b ON b.rfc = d.emisor_rfc GROUP BY d.emisor_rfc"
+            ).fetchall()
+        except sqlite3.OperationalError:
+            return {}
+    return {rfc: int(n) for rfc, n in rows}
+
+
+__all__ = [
+    "BlacklistDiff",
+    "BlacklistSnapshot",
+    "EMPTY_SNAPSHOT",
+    "columnar_cache_path",
+    "combine_snapshots",
+    "diff_snapshots",
+    "load_snapshot",
+    "normalize_rfc",
+    "read_manifest",
+    "read_sat_file",
+    "stage_rfcs",
+    "stored_cfdi_by_rfc",
+    "write_columnar_cache",
+]
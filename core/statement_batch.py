@@ -0,0 +1,286 @@
+"""Conversión por lote de estados de cuenta a un solo libro de Excel.
+
+Cada PDF (suelto o dentro de un ZIP) se manda a un ``ProcessPoolExecutor``:
+el proceso detecta el banco con la primera página (``core.bank_detect``),
+llama al extractor correspondiente a través de la caché de resultados
+(``core.statement_cache``) y regresa el DataFrame. Dentro del proceso los
+extractores no abren otro pool (``core.pdf_pages`` lo evita), así que el
+paralelismo es por archivo y escala con los núcleos.
+
+Los resultados regresan en el orden de entrada; :func:`build_workbook` arma
+una hoja por cuenta (banco + número de cuenta) y una hoja ``Consolidado``
+con columnas homologadas.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import importlib
+import io
+import multiprocessing
+from pathlib import PurePosixPath
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+import zipfile
+
+import pandas as pd
+
+from .bank_detect import detect_account, detect_bank, detect_bank_text, first_page
+from .excel_export import SheetSpec, write_workbook
+from .pdf_pages import default_workers
+from .statement_cache import cached_extract
+
+ProgressCallback = Callable[[int, int], None]
+
+# Banco -> (módulo, función); se importan en el proceso que convierte.
+EXTRACTORS: Dict[str, Tuple[str, str]] = {
+    "BanBajio": ("core.extractor_banbajio", "extraer_movimientos"),
+    "Banorte": ("core.extractor_banorte", "extraer_banorte"),
+    "Santander": ("core.extractor_santander", "extraer_santander"),
+    "BBVA": ("core.extractor_bbva", "extract_bbva_pdf_to_df"),
+    "Banamex": ("extractor", "extraer_datos_banamex_formato_final"),
+    "Scotiabank": ("core.extractor_scotiabank", "extraer_scotiabank"),
+    "Inbursa": ("core.extractor_inbursa", "extraer_inbursa"),
+    "American_Express": ("core.extractor_american_express", "extraer_american_express"),
+    "HSBC": ("core.extractor_hsbc", "extraer_hsbc"),
+    "BASE": ("core.extractor_base", "extraer_base"),
+}
+
+BAD_ZIP_ERROR = "El ZIP está dañado o no se pudo leer."
+
+CONSOLIDATED_COLUMNS = ["Archivo", "Banco", "Cuenta", "Fecha", "Concepto", "Cargo", "Abono", "Saldo"]
+# Nombre de cada columna homologada en los distintos extractores, en orden de preferencia.
+_SOURCE_COLUMNS = {
+    "Fecha": ("Fecha", "Fecha_Operación"),
+    "Concepto": ("Concepto", "Descripción", "Beneficiario", "Detalle"),
+    "Cargo": ("Cargo", "Cargos", "Retiros"),
+    "Abono": ("Abono", "Abonos", "Depósitos"),
+    "Saldo": ("Saldo",),
+}
+
+
+class BatchResult:
+    """Resultado por archivo; ``frame`` es None si ``error`` trae el motivo."""
+
+    __slots__ = ("filename", "bank", "account", "frame", "error")
+
+    def __init__(
+        self,
+        filename: str,
+        bank: Optional[str],
+        account: str,
+        frame: Optional[pd.DataFrame],
+        error: Optional[str] = None,
+    ) -> None:
+        self.filename = filename
+        self.bank = bank
+        self.account = account
+        self.frame = frame
+        self.error = error
+
+    @property
+    def rows(self) -> int:
+        return 0 if self.frame is None else len(self.frame)
+
+
+def resolve_extractor(bank: str) -> Callable:
+    module, func = EXTRACTORS[bank]
+    return getattr(importlib.import_module(module), func)
+
+
+def detect_extractor(pdf_bytes: bytes) -> Optional[Callable]:
+    """Extractor que corresponde al PDF según su primera página, o None."""
+
+    bank = detect_bank(pdf_bytes)
+    return resolve_extractor(bank) if bank in EXTRACTORS else None
+
+
+def iter_pdf_payloads(files: Iterable[Tuple[str, bytes]]) -> Iterator[Tuple[str, Optional[bytes]]]:
+    """PDFs sueltos y los ``.pdf`` dentro de cada ZIP, en orden.
+
+    ``data`` es None para un ZIP (o un miembro) dañado; el lote sigue con el resto.
+    """
+
+    for name, data in files:
+        if not name.lower().endswith(".zip"):
+            yield name, data
+            continue
+        try:
+            zf = zipfile.ZipFile(io.BytesIO(data))
+        except zipfile.BadZipFile:
+            yield name, None
+            continue
+        with zf:
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(".pdf"):
+                    continue
+                try:
+                    member = zf.read(info.filename)
+                except zipfile.BadZipFile:
+                    member = None
+                yield f"{name}/{info.filename}", member
+
+
+def convert_statement(filename: str, data: bytes, bank: Optional[str] = None) -> BatchResult:
+    """Detecta banco y cuenta, y extrae los movimientos de un PDF."""
+
+    metadata, text = first_page(data)
+    bank = bank or detect_bank_text(text, metadata)
+    account = detect_account(text)
+    if bank not in EXTRACTORS:
+        return BatchResult(filename, None, account, None, "No se reconoció el banco en la primera página.")
+    try:
+        frame = cached_extract(data, resolve_extractor(bank))
+    except Exception as exc:
+        return BatchResult(filename, bank, account, None, str(exc) or exc.__class__.__name__)
+    return BatchResult(filename, bank, account, frame)
+
+
+def _unreadable(filename: str) -> BatchResult:
+    return BatchResult(filename, None, "", None, BAD_ZIP_ERROR)
+
+
+def iter_batch(
+    files: Iterable[Tuple[str, bytes]],
+    *,
+    bank: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    progress_cb: Optional[ProgressCallback] = None,
+) -> Iterator[BatchResult]:
+    """Genera un :class:`BatchResult` por PDF, en el orden de entrada.
+
+    ``bank`` fuerza el extractor para todos los archivos en lugar de detectarlo.
+    ``progress_cb(procesados, total)`` se invoca tras cada archivo.
+    """
+
+    payloads = list(iter_pdf_payloads(files))
+    total = len(payloads)
+    workers = max_workers if max_workers is not None else default_workers()
+
+    if workers <= 1 or total <= 1 or multiprocessing.parent_process() is not None:
+        for done, (name, data) in enumerate(payloads, start=1):
+            yield _unreadable(name) if data is None else convert_statement(name, data, bank)
+            if progress_cb:
+                progress_cb(done, total)
+        return
+
+    in_flight = workers * 2
+    pool = ProcessPoolExecutor(max_workers=min(workers, total), mp_context=multiprocessing.get_context("spawn"))
+    pending: Deque[Future] = deque()
+    queue = iter(payloads)
+
+    def _submit_next() -> bool:
+        item = next(queue, None)
+        if item is None:
+            return False
+        name, data = item
+        if data is None:
+            # Resultado ya resuelto en su lugar de la cola: el orden de salida se conserva.
+            failed: Future = Future()
+            failed.set_result(_unreadable(name))
+            pending.append(failed)
+        else:
+            pending.append(pool.submit(convert_statement, name, data, bank))
+        return True
+
+    done = 0
+    try:
+        while len(pending) < in_flight and _submit_next():
+            pass
+        while pending:
+            result = pending.popleft().result()
+            _submit_next()
+            done += 1
+            yield result
+            if progress_cb:
+                progress_cb(done, total)
+    finally:
+        for fut in pending:
+            fut.cancel()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _pick_column(frame: pd.DataFrame, target: str) -> pd.Series:
+    """Primer valor no vacío entre las columnas candidatas, fila por fila.
+
+    BBVA trae ``Concepto`` casi siempre en blanco y la descripción en
+    ``Descripción``; las celdas vacías pasan a la siguiente candidata.
+    """
+
+    picked: Optional[pd.Series] = None
+    for column in _SOURCE_COLUMNS[target]:
+        if column not in frame.columns:
+            continue
+        values = frame[column]
+        if pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+            values = values.mask(values.astype(str).str.strip().eq(""))
+        picked = values if picked is None else picked.combine_first(values)
+        if not picked.isna().any():
+            break
+    if picked is None:
+        return pd.Series([None] * len(frame), index=frame.index, dtype=object)
+    return picked
+
+
+def consolidated_frame(result: BatchResult) -> pd.DataFrame:
+    """Movimientos de un archivo con las columnas de :data:`CONSOLIDATED_COLUMNS`."""
+
+    frame = result.frame if result.frame is not None else pd.DataFrame()
+    out = pd.DataFrame(index=frame.index)
+    out["Archivo"] = result.filename
+    out["Banco"] = result.bank or ""
+    out["Cuenta"] = result.account
+    for target in ("Fecha", "Concepto"):
+        out[target] = _pick_column(frame, target)
+    for target in ("Cargo", "Abono", "Saldo"):
+        out[target] = pd.to_numeric(_pick_column(frame, target), errors="coerce")
+    out[["Cargo", "Abono"]] = out[["Cargo", "Abono"]].fillna(0.0)
+    return out[CONSOLIDATED_COLUMNS].reset_index(drop=True)
+
+
+def account_key(result: BatchResult) -> Tuple[str, str]:
+    """Llave de la hoja: banco + cuenta, o el nombre del archivo si no hay cuenta."""
+
+    if result.account:
+        return (result.bank or "", result.account)
+    return (result.bank or "", PurePosixPath(result.filename).stem)
+
+
+def build_workbook(results: Iterable[BatchResult]) -> bytes:
+    """Libro con ``Consolidado`` y una hoja por cuenta; omite los archivos con error."""
+
+    groups: Dict[Tuple[str, str], List[BatchResult]] = {}
+    for result in results:
+        if result.frame is None or result.frame.empty:
+            continue
+        groups.setdefault(account_key(result), []).append(result)
+
+    consolidated = [consolidated_frame(r) for items in groups.values() for r in items]
+    sheets = [
+        SheetSpec(
+            "Consolidado",
+            pd.concat(consolidated, ignore_index=True) if consolidated else pd.DataFrame(columns=CONSOLIDATED_COLUMNS),
+        )
+    ]
+    for (bank_name, account), items in groups.items():
+        label = f"{bank_name} {account[-4:]}" if items[0].account else f"{bank_name} {account}"
+        frames = [item.frame.assign(Archivo=item.filename) for item in items]
+        sheet = pd.concat(frames, ignore_index=True)
+        sheets.append(SheetSpec(label, sheet[["Archivo", *[c for c in sheet.columns if c != "Archivo"]]]))
+    return write_workbook(sheets)
+
+
+__all__ = [
+    "BAD_ZIP_ERROR",
+    "BatchResult",
+    "CONSOLIDATED_COLUMNS",
+    "EXTRACTORS",
+    "account_key",
+    "build_workbook",
+    "consolidated_frame",
+    "convert_statement",
+    "detect_extractor",
+    "iter_batch",
+    "iter_pdf_payloads",
+    "resolve_extractor",
+]
@@ -0,0 +1,154 @@
+"""Caché en disco de los movimientos extraídos de estados de cuenta.
+
+Cada resultado se guarda como Parquet con la llave
+``<extractor>_<versión>_<sha256 del PDF>``. La versión es un hash del código
+del módulo del extractor y de los módulos compartidos (páginas, OCR, motor
+de estados de cuenta, clasificador), así que cualquier cambio en la lógica
+invalida los resultados viejos sin tener que acordarse de subir un número.
+
+El directorio se mantiene por debajo de ``STATEMENT_CACHE_MAX_BYTES``
+borrando los archivos usados hace más tiempo (el ``mtime`` se actualiza en
+cada lectura). Sin ``pyarrow`` instalado se extrae siempre.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+import hashlib
+import importlib
+import inspect
+import os
+from pathlib import Path
+import threading
+from typing import Callable, Optional
+
+import pandas as pd
+
+from .config import STATEMENT_CACHE_DIR, STATEMENT_CACHE_MAX_BYTES
+
+try:
+    import pyarrow  # noqa: F401
+except ModuleNotFoundError:  # pragma: no cover - optional dependency
+    pyarrow = None
+
+# Súbelo si cambia la forma de guardar (no la lógica de los extractores).
+CACHE_FORMAT = 1
+SHARED_MODULES = (
+    "core.pdf_pages",
+    "core.pdf_ocr",
+    "core.statement_engine",
+    "core.keyword_classifier",
+)
+
+_EVICT_LOCK = threading.Lock()
+
+Extractor = Callable[[bytes], pd.DataFrame]
+
+
+@lru_cache(maxsize=None)
+def _module_source_hash(module_name: str) -> str:
+    try:
+        source = inspect.getsource(importlib.import_module(module_name))
+    except (ImportError, OSError, TypeError):
+        return ""
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+
+def extractor_version(fn: Extractor) -> str:
+    """Hash corto del código que produce el resultado de ``fn``."""
+
+    modules = (fn.__module__, *SHARED_MODULES)
+    raw = "|".join([str(CACHE_FORMAT), *(_module_source_hash(m) for m in modules)])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def cache_path(cache_dir: Path, name: str, version: str, digest: str) -> Path:
+    return cache_dir / f"{name}_{version}_{digest}.parquet"
+
+
+def _read(path: Path) -> Optional[pd.DataFrame]:
+    try:
+        df = pd.read_parquet(path)
+    except Exception:
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return df
+
+
+def _write(path: Path, df: pd.DataFrame) -> bool:
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(tmp)
+        tmp.replace(path)
+    except Exception:
+        # Columnas con tipos mezclados que Arrow no acepta: simplemente no se guarda.
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        return False
+    return True
+
+
+def evict(cache_dir: Path, max_bytes: int) -> int:
+    """Borra los resultados menos usados hasta quedar bajo ``max_bytes``; regresa cuántos."""
+
+    with _EVICT_LOCK:
+        entries = []
+        for path in cache_dir.glob("*.parquet"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+
+def cached_extract(
+    pdf_bytes: bytes,
+    fn: Extractor,
+    *,
+    name: Optional[str] = None,
+    cache_dir: Path = STATEMENT_CACHE_DIR,
+    max_bytes: int = STATEMENT_CACHE_MAX_BYTES,
+) -> pd.DataFrame:
+    """``fn(pdf_bytes)`` leyendo/guardando el resultado en la caché de disco."""
+
+    if pyarrow is None:
+        return fn(pdf_bytes)
+
+    name = name or fn.__name__
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    path = cache_path(Path(cache_dir), name, extractor_version(fn), digest)
+    cached = _read(path) if path.exists() else None
+    if cached is not None:
+        return cached
+
+    df = fn(pdf_bytes)
+    if _write(path, df):
+        evict(Path(cache_dir), max_bytes)
+    return df
+
+
+__all__ = [
+    "CACHE_FORMAT",
+    "cache_path",
+    "cached_extract",
+    "evict",
+    "extractor_version",
+]
@@ -0,0 +1,291 @@
+"""Motor común para estados de cuenta de texto corrido (BASE, Santander, Scotiabank, Amex).
+
+Los bancos sólo difieren en sus tablas de palabras clave, encabezados,
+pies de página y formatos de fecha; eso vive en un :class:`BankProfile`.
+El perfil compila sus tablas con :class:`~core.keyword_classifier.KeywordClassifier`
+(una sola regex en lugar de ``any(token in upper ...)``) y el ciclo de líneas
+tokeniza los importes una sola vez por línea, acumulándolos en el movimiento
+pendiente.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import re
+from typing import Dict, Iterable, List, Mapping, Optional, Pattern, Tuple
+
+import pandas as pd
+
+from .keyword_classifier import KeywordClassifier
+from .pdf_pages import extract_page_texts
+
+AMOUNT_RX = re.compile(r"\(?-?\d{1,3}(?:,\d{3})*(?:\.\d{2})\)?")
+YEAR_RX = re.compile(r"\b(20\d{2})\b")
+SPACES_RX = re.compile(r"\s+")
+
+DATE_PATTERNS: Tuple[Pattern[str], ...] = (
+    re.compile(r"^(?P<dia>\d{1,2})/(?P<mes>\d{1,2})/(?P<anio>\d{2,4})"),
+    re.compile(r"^(?P<dia>\d{1,2})-(?P<mes>\d{1,2})-(?P<anio>\d{2,4})"),
+    re.compile(r"^(?P<dia>\d{1,2})\s+(?P<mes_txt>[A-Z]{3})\s*(?P<anio>\d{2,4})?", re.IGNORECASE),
+    re.compile(r"^(?P<mes_txt>[A-Z]{3})\s+(?P<dia>\d{1,2})\s*(?P<anio>\d{2,4})?", re.IGNORECASE),
+)
+
+MONTHS: Dict[str, int] = {
+    "ENE": 1,
+    "FEB": 2,
+    "MAR": 3,
+    "ABR": 4,
+    "MAY": 5,
+    "JUN": 6,
+    "JUL": 7,
+    "AGO": 8,
+    "SEP": 9,
+    "OCT": 10,
+    "NOV": 11,
+    "DIC": 12,
+}
+
+COLUMNS = ["Fecha", "Referencia", "Concepto", "Cargo", "Abono", "Saldo"]
+
+
+@dataclass(frozen=True)
+class BankProfile:
+    """Tablas propias de un banco; las regex combinadas se compilan al crearlo."""
+
+    name: str
+    abono_keywords: Tuple[str, ...]
+    cargo_keywords: Tuple[str, ...]
+    header_tokens: Tuple[str, ...]
+    footer_prefixes: Tuple[str, ...]
+    ref_min_digits: int = 6
+    balance_tokens: Tuple[str, ...] = ("SALDO",)
+    date_patterns: Tuple[Pattern[str], ...] = DATE_PATTERNS
+    months: Mapping[str, int] = field(default_factory=lambda: dict(MONTHS))
+
+    movement_kw: KeywordClassifier = field(init=False, repr=False, compare=False)
+    header_kw: KeywordClassifier = field(init=False, repr=False, compare=False)
+    footer_kw: KeywordClassifier = field(init=False, repr=False, compare=False)
+    balance_kw: KeywordClassifier = field(init=False, repr=False, compare=False)
+    ref_rx: Pattern[str] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        movement = KeywordClassifier({"abono": self.abono_keywords, "cargo": self.cargo_keywords})
+        object.__setattr__(self, "movement_kw", movement)
+        object.__setattr__(self, "header_kw", KeywordClassifier.of(self.header_tokens))
+        object.__setattr__(self, "footer_kw", KeywordClassifier.of(self.footer_prefixes, prefix=True))
+        object.__setattr__(self, "balance_kw", KeywordClassifier.of(self.balance_tokens))
+        object.__setattr__(self, "ref_rx", re.compile(rf"\b\d{{{self.ref_min_digits},}}\b"))
+
+    # ---- pruebas sobre texto ya en mayúsculas ----
+    def is_header(self, upper: str) -> bool:
+        return self.header_kw.matches(upper)
+
+    def is_footer(self, upper: str) -> bool:
+        return self.footer_kw.matches(upper)
+
+    def is_balance(self, upper: str) -> bool:
+        return self.balance_kw.matches(upper)
+
+    def match_date(self, line: str):
+        for pattern in self.date_patterns:
+            match = pattern.match(line)
+            if match:
+                return match
+        return None
+
+    def format_date(self, match, year_hint: Optional[int]) -> str:
+        info = match.groupdict()
+        dia = info.get("dia")
+        mes = info.get("mes")
+        mes_txt = info.get("mes_txt")
+        anio = info.get("anio")
+
+        if mes_txt and not mes:
+            mes = str(self.months.get(mes_txt.upper(), 1)).zfill(2)
+        elif mes:
+            mes = mes.zfill(2)
+        else:
+            mes = "01"
+
+        dia = dia.zfill(2) if dia else "01"
+
+        if anio:
+            anio = anio.zfill(4) if len(anio) == 4 else f"20{anio[-2:]}"
+        elif year_hint:
+            anio = f"{year_hint:04d}"
+        else:
+            anio = "0000"
+
+        return f"{anio}-{mes}-{dia}"
+
+    def classify(self, text: str, amount: float) -> Tuple[float, float]:
+        """``(cargo, abono)`` por palabras clave cuando no hay saldo previo."""
+
+        kind = self.movement_kw.first(text.upper())
+        if kind == "abono":
+            return 0.0, amount
+        if kind == "cargo":
+            return amount, 0.0
+        if amount < 0:
+            return abs(amount), 0.0
+        return 0.0, amount
+
+
+def norm_spaces(text: str) -> str:
+    return SPACES_RX.sub(" ", (text or "").strip())
+
+
+def clean_amount(value: str) -> float:
+    val = value.strip()
+    neg = val.startswith("(") and val.endswith(")")
+    val = val.strip("()").replace("$", "").replace(",", "")
+    if not val:
+        return 0.0
+    number = float(val)
+    return -number if neg else number
+
+
+class _Pending:
+    """Movimiento en construcción; ``amounts`` crece una vez por línea."""
+
+    __slots__ = ("fecha", "parts", "amounts", "is_balance")
+
+    def __init__(self, fecha: str, rest: str, is_balance: bool) -> None:
+        self.fecha = fecha
+        self.parts: List[str] = [rest] if rest else []
+        self.amounts: List[str] = AMOUNT_RX.findall(rest)
+        self.is_balance = is_balance
+
+    def add_line(self, line: str, is_balance: bool) -> None:
+        self.parts.append(line)
+        self.amounts.extend(AMOUNT_RX.findall(line))
+        if is_balance:
+            self.is_balance = True
+
+    @property
+    def text(self) -> str:
+        return " ".join(self.parts)
+
+
+def _finalize(profile: BankProfile, entry: _Pending, prev_saldo: Optional[float]) -> Optional[Dict[str, object]]:
+    text = entry.text
+    if not text:
+        return None
+
+    amounts = entry.amounts
+    cargo = 0.0
+    abono = 0.0
+    saldo = prev_saldo if prev_saldo is not None else 0.0
+
+    if amounts:
+        saldo = clean_amount(amounts[-1])
+        if len(amounts) >= 3:
+            cargo = abs(clean_amount(amounts[-3]))
+            abono = abs(clean_amount(amounts[-2]))
+        elif len(amounts) == 2:
+            movimiento = abs(clean_amount(amounts[0]))
+            if prev_saldo is not None:
+                if saldo >= prev_saldo:
+                    delta = saldo - prev_saldo
+                    abono = abs(delta) if delta else movimiento
+                else:
+                    delta = prev_saldo - saldo
+                    cargo = abs(delta) if delta else movimiento
+            else:
+                cargo, abono = profile.classify(text, movimiento)
+        elif len(amounts) == 1 and entry.is_balance and prev_saldo is None:
+            saldo = abs(clean_amount(amounts[0]))
+
+    concepto = norm_spaces(AMOUNT_RX.sub(" ", text))
+    match_ref = profile.ref_rx.search(concepto)
+    referencia = match_ref.group(0) if match_ref else ""
+    if referencia:
+        concepto = norm_spaces(concepto.replace(referencia, ""))
+
+    return {
+        "Fecha": entry.fecha,
+        "Referencia": referencia,
+        "Concepto": concepto or "MOVIMIENTO",
+        "Cargo": cargo,
+        "Abono": abono,
+        "Saldo": saldo,
+    }
+
+
+def parse_statement(page_texts: Iterable[str], profile: BankProfile) -> pd.DataFrame:
+    """Recorre el texto de las páginas en orden y arma los movimientos."""
+
+    movimientos: List[Dict[str, object]] = []
+    pending: Optional[_Pending] = None
+    prev_saldo: Optional[float] = None
+    year_hint: Optional[int] = None
+
+    def _emit(entry: _Pending) -> None:
+        nonlocal prev_saldo
+        row = _finalize(profile, entry, prev_saldo)
+        if row:
+            movimientos.append(row)
+            prev_saldo = row["Saldo"]  # type: ignore[assignment]
+
+    for text in page_texts:
+        for raw_line in text.splitlines():
+            line = norm_spaces(raw_line)
+            if not line:
+                continue
+
+            upper = line.upper()
+            if profile.is_header(upper):
+                continue
+
+            if year_hint is None:
+                match_year = YEAR_RX.search(line)
+                if match_year:
+                    year_hint = int(match_year.group(1))
+
+            match = profile.match_date(line)
+            if match:
+                if pending:
+                    _emit(pending)
+                rest = norm_spaces(line[match.end():])
+                pending = _Pending(profile.format_date(match, year_hint), rest, profile.is_balance(rest.upper()))
+            elif pending:
+                if profile.is_footer(upper):
+                    continue
+                pending.add_line(line, profile.is_balance(upper))
+            else:
+                continue
+
+            amount_count = len(pending.amounts)
+            if amount_count >= 2 or (pending.is_balance and amount_count >= 1):
+                _emit(pending)
+                pending = None
+
+    if pending:
+        row = _finalize(profile, pending, prev_saldo)
+        if row:
+            movimientos.append(row)
+
+    df = pd.DataFrame(movimientos, columns=COLUMNS)
+    if df.empty:
+        return df
+    df["Cargo"] = pd.to_numeric(df["Cargo"], errors="coerce").fillna(0.0)
+    df["Abono"] = pd.to_numeric(df["Abono"], errors="coerce").fillna(0.0)
+    df["Saldo"] = pd.to_numeric(df["Saldo"], errors="coerce")
+    df["Concepto"] = df["Concepto"].str.replace(r"\s+", " ", regex=True).str.strip()
+    return df
+
+
+def extract_statement(pdf_file, profile: BankProfile) -> pd.DataFrame:
+    return parse_statement(extract_page_texts(pdf_file), profile)
+
+
+__all__ = [
+    "AMOUNT_RX",
+    "BankProfile",
+    "DATE_PATTERNS",
+    "MONTHS",
+    "clean_amount",
+    "extract_statement",
+    "norm_spaces",
+    "parse_statement",
+]
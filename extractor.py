@@ -3,84 +3,25 @@
 
 from __future__ import annotations
 
-from decimal import Decimal, InvalidOperation
-import xml.etree.ElementTree as ET
 from typing import Any, Dict, Iterable, Tuple, List
 import re
 
 import pandas as pd
-import pdfplumber
+
+from core.cfdi import parse_comprobante, parse_many, resumen_row
+from core.keyword_classifier import KeywordClassifier
+from core.pdf_pages import extract_page_texts
 
 
 # ============================================================
 # CFDI 3.3 / 4.0
 # ============================================================
-def _to_decimal(value: str) -> Decimal:
-    try:
-        return Decimal(value)
-    except (InvalidOperation, TypeError):
-        return Decimal("0")
-
-
-def _detect_cfdi_ns(root: ET.Element) -> str:
-    if root.tag.startswith("{") and "}Comprobante" in root.tag:
-        return root.tag.split("}")[0][1:]
-    return "http://www.sat.gob.mx/cfd/4"
-
-
 def parse_cfdi_bytes(data: bytes) -> Dict[str, Any]:
-    tree = ET.fromstring(data)
-    ns_cfdi = _detect_cfdi_ns(tree)
-    ns = {
-        "cfdi": ns_cfdi,
-        "tfd": "http://www.sat.gob.mx/TimbreFiscalDigital",
-    }
-
-    comprobante = tree
-    fecha = comprobante.attrib.get("Fecha", "")
-
-    emisor = comprobante.find("cfdi:Emisor", ns)
-    rfc_emisor = emisor.attrib.get("Rfc", "") if emisor is not None else ""
-    nombre_emisor = emisor.attrib.get("Nombre", "") if emisor is not None else ""
-
-    receptor = comprobante.find("cfdi:Receptor", ns)
-    regimen_receptor = receptor.attrib.get("RegimenFiscalReceptor", "") if receptor is not None else ""
-
-    timbre = comprobante.find(".//cfdi:Complemento/tfd:TimbreFiscalDigital", ns)
-    uuid = timbre.attrib.get("UUID", "") if timbre is not None else ""
-
-    conceptos = comprobante.findall("cfdi:Conceptos/cfdi:Concepto", ns)
-    total_concepto = sum(_to_decimal(c.attrib.get("Importe")) for c in conceptos)
-
-    traslados_globales = comprobante.findall("cfdi:Impuestos/cfdi:Traslados/cfdi:Traslado", ns)
-    if traslados_globales:
-        total_traslados = sum(_to_decimal(t.attrib.get("Importe")) for t in traslados_globales)
-    else:
-        traslados_concepto = comprobante.findall(
-            "cfdi:Conceptos/cfdi:Concepto/cfdi:Impuestos/cfdi:Traslados/cfdi:Traslado",
-            ns,
-        )
-        total_traslados = sum(_to_decimal(t.attrib.get("Importe")) for t in traslados_concepto)
-
-    return {
-        "Fecha": fecha,
-        "RFC Emisor": rfc_emisor,
-        "Nombre Emisor": nombre_emisor,
-        "UUID": uuid,
-        "cfdi:Concepto Importe": float(total_concepto),
-        "cfdi:Traslado Importe": float(total_traslados),
-        "RegimenFiscalReceptor": regimen_receptor,
-    }
+    return resumen_row(parse_comprobante(data))
 
 
 def parse_cfdi_many(files: Iterable[Tuple[str, bytes]]) -> List[Dict[str, Any]]:
-    rows: List[Dict[str, Any]] = []
-    for _, blob in files:
-        try:
-            rows.append(parse_cfdi_bytes(blob))
-        except Exception:
-            continue
-    return rows
+    return [resumen_row(comp) for _, comp in parse_many(files)]
 
 
 # ============================================================
@@ -169,48 +110,56 @@ def _extraer_beneficiario(texto: str) -> str:
     return ""
 
 
+MOVIMIENTO_KW = KeywordClassifier(
+    {
+        "abono": (
+            "PAGO RECIBIDO",
+            "SPEI RECIBIDO",
+            "DEPOSITO EFECTIVO",
+            "DEPOSITO EN EFECTIVO",
+            "DEP EN EFECTIVO",
+            "DEP EFECTIVO",
+            "DEPOSITO MIXTO",
+            "DEP MIXTO",
+            "DEP CHEQUE",
+            "DEPOSITO CHEQUE",
+            "DEPOSITO DE SUC",
+            "DEPOSITO SUC",
+            "DEPOSITO EN SUC",
+            "DEPOSITO VENTANILLA",
+            "DEP VENTANILLA",
+        ),
+        "cargo": (
+            "PAGO INTERBANCARIO A",
+            "TRANSFERENCIA A",
+            "PAGO A TERCEROS",
+            "PAGO DE SERVICIO",
+            "CARGO GLOBAL",
+            "DOMI ",
+            "DOMICILIAC",
+            "COMPRA",
+            "RETIRO",
+            " AL BENEF",
+            " A BENEF",
+        ),
+        "traspaso": ("TRASPASO",),
+        "de": (" DE ",),
+        "a": (" A ",),
+    }
+)
+RE_DEPOSITO_PALABRA = re.compile(r"\bDEPOSITO\b")
+
+
 def _clasifica_cargo_abono(texto_original: str) -> str:
     texto = _limpia_ruido_concepto(texto_original)
-    abono_tokens = [
-        "PAGO RECIBIDO",
-        "SPEI RECIBIDO",
-        "DEPOSITO EFECTIVO",
-        "DEPOSITO EN EFECTIVO",
-        "DEP EN EFECTIVO",
-        "DEP EFECTIVO",
-        "DEPOSITO MIXTO",
-        "DEP MIXTO",
-        "DEP CHEQUE",
-        "DEPOSITO CHEQUE",
-        "DEPOSITO DE SUC",
-        "DEPOSITO SUC",
-        "DEPOSITO EN SUC",
-        "DEPOSITO VENTANILLA",
-        "DEP VENTANILLA",
-    ]
-    if any(token in texto for token in abono_tokens) or re.search(r"\bDEPOSITO\b", texto):
+    hits = MOVIMIENTO_KW.hits(texto)
+    if "abono" in hits or RE_DEPOSITO_PALABRA.search(texto):
         return "ABONO"
-
-    cargo_tokens = [
-        "PAGO INTERBANCARIO A",
-        "TRANSFERENCIA A",
-        "PAGO A TERCEROS",
-        "PAGO DE SERVICIO",
-        "CARGO GLOBAL",
-        "DOMI ",
-        "DOMICILIAC",
-        "COMPRA",
-        "RETIRO",
-        " AL BENEF",
-        " A BENEF",
-    ]
-    if any(token in texto for token in cargo_tokens):
+    if "cargo" in hits:
         return "CARGO"
 
-    if "TRASPASO" in texto and " DE " in texto and " A " not in texto:
+    if "traspaso" in hits and "de" in hits and "a" not in hits:
         return "ABONO"
-    if "TRASPASO" in texto and " A " in texto and " DE " not in texto:
-        return "CARGO"
     return "CARGO"
 
 
@@ -304,34 +253,32 @@ def extraer_datos_banamex_formato_final(pdf_path: str) -> pd.DataFrame:
     anio_detectado: str | None = None
     saldo_anterior: float | None = None
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            raw_text = page.extract_text() or ""
-            lines = [ln.strip() for ln in raw_text.split("\n") if ln is not None]
-
-            if anio_detectado is None:
-                for ln in lines:
-                    match_anio = RE_ANIO_1.search(ln) or RE_ANIO_2.search(ln)
-                    if match_anio:
-                        anio_detectado = match_anio.group(1)
-                        break
+    for raw_text in extract_page_texts(pdf_path):
+        lines = [ln.strip() for ln in raw_text.split("\n") if ln is not None]
 
-            if saldo_anterior is None:
-                for ln in lines:
-                    if "SALDO ANTERIOR" in ln.upper():
-                        match_saldo = RE_MONTOS_ITER.search(ln)
-                        if match_saldo:
-                            saldo_anterior = float(match_saldo.group(1).replace(",", ""))
-                            break
+        if anio_detectado is None:
+            for ln in lines:
+                match_anio = RE_ANIO_1.search(ln) or RE_ANIO_2.search(ln)
+                if match_anio:
+                    anio_detectado = match_anio.group(1)
+                    break
 
+        if saldo_anterior is None:
             for ln in lines:
-                if RE_FECHA_LINEA.match(ln):
-                    if bloque:
-                        mov = _procesar_bloque_banamex(bloque, anio_detectado)
-                        if mov:
-                            movimientos.append(mov)
-                        bloque = []
-                bloque.append(ln)
+                if "SALDO ANTERIOR" in ln.upper():
+                    match_saldo = RE_MONTOS_ITER.search(ln)
+                    if match_saldo:
+                        saldo_anterior = float(match_saldo.group(1).replace(",", ""))
+                        break
+
+        for ln in lines:
+            if RE_FECHA_LINEA.match(ln):
+                if bloque:
+                    mov = _procesar_bloque_banamex(bloque, anio_detectado)
+                    if mov:
+                        movimientos.append(mov)
+                    bloque = []
+            bloque.append(ln)
 
     if bloque:
         mov = _procesar_bloque_banamex(bloque, anio_detectado)
@@ -1,16 +1,20 @@
 # 15_Lista_negra_Sat.py - ZIP XML automatico + counters poscarga + reset total tras descarga
 from __future__ import annotations
 
-import io, json, time, hashlib, zipfile, sqlite3, shutil, threading
+import time, sqlite3, shutil, threading
 from contextlib import closing
 from pathlib import Path
-from typing import BinaryIO
+from typing import BinaryIO, Iterable
 from uuid import uuid4
-import xml.etree.ElementTree as ET
 
 import pandas as pd
 import streamlit as st
 
+from core.cfdi import Comprobante
+from core.cfdi_ingest import IngestCancelled, iter_zip_cfdi
+from core.excel_export import SheetSpec, write_workbook
+from core.sat_lists import BlacklistSnapshot, combine_snapshots, load_snapshot, normalize_rfc, stage_rfcs
+
 # Ajusta si tu proyecto no usa este helper:
 from pages.components.admin import init_admin_section
 
@@ -49,9 +53,6 @@ h1.titulo{font:700 1.9rem/1.2 ui-sans-serif;text-align:center;margin:0 0 .75rem}
 st.markdown('<h1 class="titulo">Cruce de RFC con Lista Negra del SAT</h1>', unsafe_allow_html=True)
 
 # ------------------ Helpers ------------------
-def _local_tag(tag:str)->str: 
-    return tag.split("}",1)[1] if "}" in tag else tag
-
 def _safe_float(value)->float|None:
     try:
         if value is None:
@@ -76,37 +77,30 @@ def _normalize_status(value:str|None)->str:
         return "Activo"
     return txt
 
-def parse_emisor_from_xml_stream(fp)->tuple[str|None,str|None,str|None,float|None,str]:
-    """Streaming: extrae datos relevantes del comprobante sin cargarlo completo."""
-    try:
-        fecha = None
-        total = None
-        estatus: str | None = None
-        emisor_rfc = None
-        emisor_nombre = None
-        it = ET.iterparse(fp, events=("start",))
-        for _, el in it:
-            tag = _local_tag(el.tag).lower()
-            if tag == "comprobante":
-                if fecha is None:
-                    fecha = el.attrib.get("Fecha") or el.attrib.get("fecha") or el.attrib.get("FechaTimbrado")
-                if total is None:
-                    total = _safe_float(el.attrib.get("Total") or el.attrib.get("total") or el.attrib.get("Monto"))
-                if estatus is None:
-                    estatus = el.attrib.get("Estado") or el.attrib.get("estado") or el.attrib.get("Estatus") or el.attrib.get("estatus")
-            if tag == "emisor":
-                emisor_rfc = el.attrib.get("Rfc") or el.attrib.get("RFC") or el.attrib.get("rfc")
-                emisor_nombre = el.attrib.get("Nombre") or el.attrib.get("NOMBRE") or el.attrib.get("nombre")
-                break
-        return (
-            (emisor_rfc or "").strip() or None,
-            (emisor_nombre or "").strip() or None,
-            fecha.strip() if isinstance(fecha, str) else fecha,
-            total,
-            _normalize_status(estatus),
-        )
-    except ET.ParseError:
+def _first_attr(attrs: dict[str, str], *names: str) -> str | None:
+    for name in names:
+        value = attrs.get(name)
+        if value:
+            return value
+    return None
+
+def emisor_fields(comp: Comprobante | None)->tuple[str|None,str|None,str|None,float|None,str]:
+    """Extrae emisor, fecha, total y estatus del comprobante (ver core.cfdi)."""
+    if comp is None:
         return None, None, None, None, "Activo"
+    header = comp.header
+    fecha = _first_attr(header, "Fecha", "fecha", "FechaTimbrado")
+    total = _safe_float(_first_attr(header, "Total", "total", "Monto"))
+    estatus = _first_attr(header, "Estado", "estado", "Estatus", "estatus")
+    emisor_rfc = _first_attr(comp.emisor, "Rfc", "RFC", "rfc")
+    emisor_nombre = _first_attr(comp.emisor, "Nombre", "NOMBRE", "nombre")
+    return (
+        (emisor_rfc or "").strip().upper() or None,
+        (emisor_nombre or "").strip() or None,
+        fecha.strip() if isinstance(fecha, str) else fecha,
+        total,
+        _normalize_status(estatus),
+    )
 
 def _chunked(iterable, size: int = 500):
     bucket: list[str] = []
@@ -119,7 +113,8 @@ def _chunked(iterable, size: int = 500):
         yield bucket
 
 
-def _load_xml_matches_from_db(db_path: Path, rfcs: list[str]) -> pd.DataFrame:
+def _load_xml_matches_from_db(db_path: Path, rfcs: Iterable[str]) -> pd.DataFrame:
+    """Solo los XML cuyo emisor esta en ``rfcs`` (JOIN sobre ``idx_rfc``)."""
     columns = [
         "Archivo XML",
         "RFC Emisor",
@@ -128,47 +123,50 @@ def _load_xml_matches_from_db(db_path: Path, rfcs: list[str]) -> pd.DataFrame:
         "Total",
         "Estatus",
     ]
-    rfcs = [r.strip() for r in rfcs if isinstance(r, str) and r.strip()]
-    if not rfcs:
+    if not db_path.exists():
         return pd.DataFrame(columns=columns)
 
-    frames: list[pd.DataFrame] = []
     with closing(sqlite3.connect(str(db_path))) as con:
-        for batch in _chunked(rfcs, 800):
-            placeholders = ",".join("?" for _ in batch)
-            query = (
-                "SELECT filename AS 'Archivo XML', rfc AS 'RFC Emisor', nombre AS 'Nombre Emisor', "
-                "fecha AS 'Fecha Timbrado', total AS 'Total', estatus AS 'Estatus' "
-                f"FROM xml_emisores WHERE rfc IN ({placeholders})"
-            )
-            frames.append(pd.read_sql_query(query, con, params=batch))
-
-    if not frames:
-        return pd.DataFrame(columns=columns)
-    return pd.concat(frames, ignore_index=True)
+        temp = stage_rfcs(con, rfcs)
+        query = (
+            "SELECT x.filename AS 'Archivo XML', x.rfc AS 'RFC Emisor', x.nombre AS 'Nombre Emisor', "
+            "x.fecha AS 'Fecha Timbrado', x.total AS 'Total', x.estatus AS 'Estatus' "
+            f"FROM xml_emisores x JOIN {temp} b ON b.rfc = x.rfc"
+        )
+        df = pd.read_sql_query(query, con)
+    return df if not df.empty else pd.DataFrame(columns=columns)
 
 
-def build_excel_bytes(xml_source: pd.DataFrame | Path | str, df_black: pd.DataFrame) -> bytes:
+def build_excel_bytes(
+    xml_source: pd.DataFrame | Path | str,
+    df_black: pd.DataFrame,
+    black_rfcs: frozenset[str] | None = None,
+) -> bytes:
     resumen_columns = ["RFC", "PROVEEDOR", "FECHA (FIRMES)", "IMPORTE"]
     desglose_columns = ["Situacion", "Fecha Timbrado", "RFC Emisor", "Razon Social Emisor", "Total", "Estatus"]
 
-    blk = df_black.copy()
-    if not blk.empty and "RFC" in blk.columns:
-        blk["RFC"] = blk["RFC"].astype(str).str.strip()
-    else:
-        blk = pd.DataFrame(columns=["RFC"])
+    # df_black llega normalizado desde core.sat_lists: no se copia la lista completa.
+    if df_black.empty or "RFC" not in df_black.columns:
+        df_black = pd.DataFrame(columns=["RFC"])
+    if black_rfcs is None:
+        black_rfcs = frozenset(normalize_rfc(df_black["RFC"].dropna()).unique())
 
     if isinstance(xml_source, (str, Path)):
-        xml_df = _load_xml_matches_from_db(Path(xml_source), blk["RFC"].dropna().unique().tolist())
+        xml_df = _load_xml_matches_from_db(Path(xml_source), black_rfcs)
     else:
         xml_df = xml_source.copy()
+        xml_df["RFC Emisor"] = normalize_rfc(xml_df["RFC Emisor"])
+        xml_df = xml_df[xml_df["RFC Emisor"].isin(black_rfcs)]
+
+    blk = df_black[df_black["RFC"].isin(xml_df["RFC Emisor"].unique())] if not xml_df.empty else df_black.iloc[0:0]
 
     if xml_df.empty or blk.empty:
-        out_empty = io.BytesIO()
-        with pd.ExcelWriter(out_empty, engine="xlsxwriter") as w:
-            pd.DataFrame(columns=resumen_columns).to_excel(w, index=False, sheet_name="Coincidencias")
-            pd.DataFrame(columns=desglose_columns).to_excel(w, index=False, sheet_name="Desglose")
-        return out_empty.getvalue()
+        return write_workbook(
+            [
+                SheetSpec("Coincidencias", pd.DataFrame(columns=resumen_columns)),
+                SheetSpec("Desglose", pd.DataFrame(columns=desglose_columns)),
+            ]
+        )
 
     xml_df["RFC Emisor"] = xml_df["RFC Emisor"].astype(str).str.strip()
     xml_df["Total"] = pd.to_numeric(xml_df.get("Total"), errors="coerce").fillna(0.0)
@@ -257,66 +255,30 @@ def build_excel_bytes(xml_source: pd.DataFrame | Path | str, df_black: pd.DataFr
         desglose_df.sort_values(["RFC Emisor", "Fecha Timbrado"], inplace=True, kind="mergesort")
     desglose_df = desglose_df[desglose_columns]
 
-    out = io.BytesIO()
-    with pd.ExcelWriter(out, engine="xlsxwriter") as w:
-        resumen_df.to_excel(w, index=False, sheet_name="Coincidencias")
-        desglose_df.to_excel(w, index=False, sheet_name="Desglose")
-    return out.getvalue()
+    return write_workbook([SheetSpec("Coincidencias", resumen_df), SheetSpec("Desglose", desglose_df)])
 
 # ---- Firmes/Exigibles: solo lectura desde manifest ----
-# ---- Firmes/Exigibles: solo lectura desde manifest ----
-def _read_manifest(manifest_path: Path)->dict|None:
-    if manifest_path.exists():
-        try:
-            return json.loads(manifest_path.read_text(encoding="utf-8"))
-        except Exception:
-            return None
-    return None
-
-def _load_sat_reference(manifest_path: Path, base_dir: Path)->pd.DataFrame:
-    manifest = _read_manifest(manifest_path)
-    if not manifest:
-        return pd.DataFrame()
-    stored_name = manifest.get("stored_as", "")
-    if not stored_name:
-        return pd.DataFrame()
-    p = base_dir / stored_name
-    if not p.exists():
-        return pd.DataFrame()
-    try:
-        name_lower = p.name.lower()
-        if name_lower.endswith(".csv"):
-            df = pd.read_csv(p, encoding="latin-1")
-        elif name_lower.endswith((".xlsx", ".xls")):
-            df = pd.read_excel(p)
-        else:
-            df = pd.read_csv(p, encoding="latin-1")
-    except Exception:
-        return pd.DataFrame()
-    if df.empty or "RFC" not in df.columns:
-        return pd.DataFrame()
-    df["RFC"] = df["RFC"].astype(str).str.strip()
-    return df
+def _load_sat_reference(manifest_path: Path, base_dir: Path)->BlacklistSnapshot:
+    """Instantanea memoizada por ``stored_as`` + mtime (ver core.sat_lists)."""
+    return load_snapshot(manifest_path, base_dir)
 
-def load_firmes_from_disk()->pd.DataFrame:
+def load_firmes_from_disk()->BlacklistSnapshot:
     return _load_sat_reference(FIRMES_MANIFEST_PATH, FIRMES_DIR)
 
-def load_exigibles_from_disk()->pd.DataFrame:
+def load_exigibles_from_disk()->BlacklistSnapshot:
     return _load_sat_reference(EXIGIBLES_MANIFEST_PATH, EXIGIBLES_DIR)
 
 def _has_rfc_column(df: pd.DataFrame | None) -> bool:
     return isinstance(df, pd.DataFrame) and (not df.empty) and ("RFC" in df.columns)
 
-def _combine_blacklists(*dfs: pd.DataFrame)->pd.DataFrame:
-    frames: list[pd.DataFrame] = []
-    for df in dfs:
-        if _has_rfc_column(df):
-            frame = df.copy()
-            frame["RFC"] = frame["RFC"].astype(str).str.strip()
-            frames.append(frame)
-    if not frames:
-        return pd.DataFrame()
-    return pd.concat(frames, ignore_index=True)
+def _refresh_reference_data() -> None:
+    """Toma la version vigente de Firmes/Exigibles; sin costo si no cambiaron."""
+    firmes = load_firmes_from_disk()
+    exigibles = load_exigibles_from_disk()
+    ss["firmes_df"] = firmes.frame
+    ss["exigibles_df"] = exigibles.frame
+    ss["blacklist_df"] = combine_snapshots(firmes, exigibles)
+    ss["blacklist_rfcs"] = firmes.rfcs | exigibles.rfcs
 
 
 
@@ -405,7 +367,13 @@ def _zip_job_worker(job_id: str, zip_path: Path, batch: int) -> None:
 
     try:
         _zip_job_update(job_id, status="running")
-        total, inserted, secs = bulk_index_zip(zip_path, XML_DB_PATH, progress_cb=_progress, batch=batch)
+        total, inserted, secs = bulk_index_zip(
+            zip_path,
+            XML_DB_PATH,
+            progress_cb=_progress,
+            should_cancel=lambda: _zip_job_should_cancel(job_id),
+            batch=batch,
+        )
         _zip_job_update(
             job_id,
             status="done",
@@ -416,7 +384,7 @@ def _zip_job_worker(job_id: str, zip_path: Path, batch: int) -> None:
             seconds=secs,
             finished=time.time(),
         )
-    except _ZipJobCancelled:
+    except (_ZipJobCancelled, IngestCancelled):
         _zip_job_update(job_id, status="cancelled", finished=time.time())
     except Exception as exc:  # pragma: no cover - defensive
         _zip_job_update(job_id, status="error", error=str(exc), finished=time.time())
@@ -460,75 +428,53 @@ def _db_init(db_path:Path):
                     pass
         con.commit()
 
-def _sha1(b:bytes)->str:
-    h=hashlib.sha1(); h.update(b); return h.hexdigest()
-
 def bulk_index_zip(
     zip_source: bytes | str | Path | BinaryIO,
     db_path: Path,
     *,
     progress_cb=None,
+    should_cancel=None,
     batch: int = 200,
 ) -> tuple[int, int, float]:
+    """Indexa el ZIP en paralelo (core.cfdi_ingest); ``batch`` es el tamano de bloque por proceso."""
     _db_init(db_path)
     t0 = time.time()
 
-    stream: BinaryIO
-    close_stream = False
-    if isinstance(zip_source, (str, Path)):
-        stream = open(zip_source, "rb")
-        close_stream = True
-    elif isinstance(zip_source, bytes):
-        stream = io.BytesIO(zip_source)
-    else:
-        stream = zip_source  # se asume tipo archivo
-
     processed = 0
     inserted = 0
     total_files = 0
 
-    try:
-        try:
-            stream.seek(0)
-        except Exception:
-            pass
-
-        with zipfile.ZipFile(stream) as zf, closing(sqlite3.connect(str(db_path))) as con:
-            cur = con.cursor()
-            files = [i for i in zf.infolist() if (not i.is_dir()) and i.filename.lower().endswith(".xml")]
-            total_files = len(files)
-            buf: list[tuple[str, str, str, str, str | None, float | None, str]] = []
-
-            for info in files:
-                with zf.open(info, "r") as fp:
-                    raw = fp.read()
-                sha = _sha1(raw)
-                rfc, nom, fecha, total_xml, estatus = parse_emisor_from_xml_stream(io.BytesIO(raw))
-                buf.append(
-                    (
-                        info.filename,
-                        sha,
-                        (rfc or "").strip(),
-                        (nom or "").strip(),
-                        fecha,
-                        total_xml,
-                        estatus,
-                    )
-                )
+    def _progress(done: int, total: int) -> None:
+        nonlocal total_files
+        total_files = total
+        if progress_cb:
+            progress_cb(done, total, inserted)
 
-                if len(buf) >= batch:
-                    cur.executemany(
-                        "INSERT OR IGNORE INTO xml_emisores(filename,sha1,rfc,nombre,fecha,total,estatus) VALUES(?,?,?,?,?,?,?)",
-                        buf,
+    with closing(sqlite3.connect(str(db_path))) as con:
+        cur = con.cursor()
+        chunks = iter_zip_cfdi(
+            zip_source,
+            chunk_size=batch,
+            progress_cb=_progress,
+            should_cancel=should_cancel,
+            header_only=True,
+        )
+        with closing(chunks):
+            for chunk in chunks:
+                buf: list[tuple[str, str, str, str, str | None, float | None, str]] = []
+                for doc in chunk:
+                    rfc, nom, fecha, total_xml, estatus = emisor_fields(doc.comp)
+                    buf.append(
+                        (
+                            doc.filename,
+                            doc.sha1,
+                            (rfc or "").strip(),
+                            (nom or "").strip(),
+                            fecha,
+                            total_xml,
+                            estatus,
+                        )
                     )
-                    con.commit()
-                    inserted += cur.rowcount or 0
-                    processed += len(buf)
-                    buf.clear()
-                    if progress_cb:
-                        progress_cb(processed, total_files, inserted)
-
-            if buf:
                 cur.executemany(
                     "INSERT OR IGNORE INTO xml_emisores(filename,sha1,rfc,nombre,fecha,total,estatus) VALUES(?,?,?,?,?,?,?)",
                     buf,
@@ -536,15 +482,6 @@ def bulk_index_zip(
                 con.commit()
                 inserted += cur.rowcount or 0
                 processed += len(buf)
-                buf.clear()
-                if progress_cb:
-                    progress_cb(processed, total_files, inserted)
-    finally:
-        if close_stream:
-            try:
-                stream.close()
-            except Exception:
-                pass
 
     duration = time.time() - t0
     if progress_cb:
@@ -620,13 +557,13 @@ def _reset_page_state(keep_reference_data: bool = True):
     ss.pop("parsed_df", None)
     ss.pop("archivos_xml_nombres", None)
 
-    if not keep_reference_data:
+    if keep_reference_data:
+        _refresh_reference_data()
+    else:
         ss["firmes_df"] = pd.DataFrame()
         ss["exigibles_df"] = pd.DataFrame()
-    ss["blacklist_df"] = _combine_blacklists(
-        ss.get("firmes_df"),
-        ss.get("exigibles_df"),
-    )
+        ss["blacklist_df"] = pd.DataFrame()
+        ss["blacklist_rfcs"] = frozenset()
 
     ss["uploader_nonce"] = ss.get("uploader_nonce", 0) + 1
 
@@ -636,17 +573,12 @@ ss = st.session_state
 _zip_job_prune()
 
 if "init_done" not in ss:
-    ss["firmes_df"] = load_firmes_from_disk()
-    ss["exigibles_df"] = load_exigibles_from_disk()
     ss["uploader_nonce"] = 0              # base para key dinamico del uploader
     _clear_xml_index_file()               # contadores = 0; no residuos
     _reset_page_state(keep_reference_data=True)   # sin archivos ni contadores visibles
     ss["init_done"] = True
 
-ss["blacklist_df"] = _combine_blacklists(
-    ss.get("firmes_df"),
-    ss.get("exigibles_df"),
-)
+_refresh_reference_data()
 
 if ss.get("post_download_reset"):
     _clear_xml_index_file()
@@ -844,7 +776,7 @@ if tengo_xml and tengo_blacklist:
                 except Exception:
                     pass
             try:
-                bytes_data = build_excel_bytes(XML_DB_PATH, black)
+                bytes_data = build_excel_bytes(XML_DB_PATH, black, ss.get("blacklist_rfcs"))
                 export_name = f'Cruce_RFC_vs_Lista_Negra_SAT_{int(time.time() * 1000)}.xlsx'
                 export_path = EXPORT_DIR / export_name
                 export_path.write_bytes(bytes_data)
@@ -29,6 +29,7 @@ from core.db import (
 )
 from core.config import GOOGLE_MAPS_API_KEY, INEGI_ROUTING_BASE_URL, INEGI_ROUTING_TOKEN
 from core.rutas import (
+    load_plaza_coordinates,
     load_routes,
     plazas_catalog,
     match_plaza_in_text,
@@ -38,6 +39,7 @@ from core.tarifas import tarifa_por_plaza
 from core.driver_costs import read_trabajadores, costo_diario_trabajador_auto
 from core.params import read_params
 from core.maps import GoogleMapsClient, GoogleMapsError
+from core.maps_cache import shared_store
 from core.inegi_routing import InegiRoutingClient, InegiRoutingError, InegiRouteSummary
 from core.navigation import render_nav
 from core.flash import consume_flash, set_flash
@@ -329,6 +331,7 @@ _enforce_password_change(conn)
 
 ROUTES = load_routes()
 PLAZAS = plazas_catalog(ROUTES)
+PLAZA_COORDS = load_plaza_coordinates()
 
 vid = get_active_version_id(conn)
 if vid is None:
@@ -351,7 +354,7 @@ if maps_api_key:
 
     if maps_client is None:
         try:
-            maps_client = GoogleMapsClient(api_key=maps_api_key)
+            maps_client = GoogleMapsClient(api_key=maps_api_key, store=shared_store())
             st.session_state["gmaps_client"] = maps_client
             st.session_state["gmaps_client_key"] = maps_api_key
         except GoogleMapsError as exc:
@@ -1306,6 +1309,7 @@ def compute_route_data():
         maps_client=maps_client,
         cache=maps_cache,
         session_token=session_token,
+        coordinates=PLAZA_COORDS,
     )
 
     if match:
@@ -10,8 +10,10 @@ import streamlit as st
 
 from core.auth import persist_login
 from core.db import portal_set_password
+from core.sat_lists import BlacklistDiff, diff_snapshots, load_snapshot, write_columnar_cache
 from core.streamlit_compat import rerun
 from pages.components.admin import init_admin_section
+from pages.components.sat_lists import store_upload_once
 
 
 def _enforce_password_change(conn) -> None:
@@ -95,21 +97,28 @@ def _clear_previous_versions(current_suffix: str) -> None:
                 pass
 
 
-def _store_uploaded_file(upload) -> Path:
+def _store_uploaded_file(upload) -> tuple[Path, BlacklistDiff]:
+    previous = load_snapshot(MANIFEST_PATH, EXIGIBLES_DIR)
     suffix = Path(upload.name).suffix.lower() or ".csv"
     target = EXIGIBLES_DIR / f"exigibles_latest{suffix}"
     target.write_bytes(upload.getvalue())
     _clear_previous_versions(suffix)
+    columnar = write_columnar_cache(target)
     manifest = {
         "filename": upload.name,
         "stored_as": target.name,
         "suffix": suffix,
         "updated_at": datetime.now(timezone.utc).isoformat(),
         "size_bytes": str(target.stat().st_size),
+        "columnar": columnar.name if columnar else "",
     }
     _save_manifest(manifest)
+    diff = diff_snapshots(previous, load_snapshot(MANIFEST_PATH, EXIGIBLES_DIR))
+    manifest["rfcs_added"] = str(len(diff.added))
+    manifest["rfcs_removed"] = str(len(diff.removed))
+    _save_manifest(manifest)
     st.session_state["exigibles_manifest"] = manifest
-    return target
+    return target, diff
 
 
 st.title("Actualizar archivo Exigibles")
@@ -141,8 +150,7 @@ uploaded = st.file_uploader(
 )
 
 if uploaded is not None:
-    target_path = _store_uploaded_file(uploaded)
-    st.success(f"Archivo guardado correctamente en {target_path.name}.")
+    store_upload_once(uploaded, "exigibles", _store_uploaded_file)
 
 st.divider()
 st.write(
@@ -0,0 +1,142 @@
+"""DIOT directa desde los CFDI recibidos (XML o ZIP), sin armar la batería a mano."""
+
+from __future__ import annotations
+
+from datetime import date
+from zipfile import BadZipFile
+
+import streamlit as st
+
+from core.cfdi import Comprobante
+from core.cfdi_ingest import iter_zip_cfdi
+from core.cfdi_store import resolve_bytes
+from core.config import CFDI_STORE_PATH
+from core.diot import DiotParams, build_battery, frame_to_txt
+from core.excel_export import SheetSpec, write_workbook
+from pages.components.admin import init_admin_section
+
+MESES = [
+    "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
+    "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre",
+]
+
+
+def _load_comprobantes(uploaded) -> tuple[list[Comprobante], list[str]]:
+    comps: list[Comprobante] = []
+    bad_files: list[str] = []
+    loose_xml: list[tuple[str, bytes]] = []
+    for uf in uploaded:
+        name = uf.name or "archivo"
+        data = uf.getvalue()
+        if name.lower().endswith(".zip"):
+            try:
+                for chunk in iter_zip_cfdi(data, store_path=CFDI_STORE_PATH):
+                    for doc in chunk:
+                        if doc.comp is None:
+                            if doc.error is not None:
+                                bad_files.append(f"{name}:{doc.filename}")
+                            continue
+                        comps.append(doc.comp)
+            except BadZipFile:
+                bad_files.append(name)
+        else:
+            loose_xml.append((name, data))
+    for name, comp in resolve_bytes(CFDI_STORE_PATH, loose_xml):
+        if comp is None:
+            bad_files.append(name)
+        else:
+            comps.append(comp)
+    return comps, bad_files
+
+
+def main() -> None:
+    conn = init_admin_section(
+        page_title="DIOT desde CFDI",
+        active_top="diot",
+        active_child="diot_cfdi",
+        layout="centered",
+        show_inicio=False,
+    )
+    conn.close()
+
+    st.title("🧾 DIOT desde CFDI")
+    st.caption(
+        "Sube los XML recibidos (sueltos o en ZIP), incluidos los complementos de pago. "
+        "Se agrupan por proveedor, tipo de tercero y tasa para generar el TXT de la DIOT."
+    )
+    st.page_link("pages/22_DIOT_excel_txt.py", label="¿Ya tienes la batería en Excel? Conviértela aquí")
+
+    hoy = date.today()
+    rfc = st.text_input("RFC del contribuyente (receptor)", placeholder="ej. ABCD800101XXX").strip().upper()
+    col_ejercicio, col_mes, col_region = st.columns(3)
+    ejercicio = int(col_ejercicio.number_input("Ejercicio", min_value=2000, max_value=2100, value=hoy.year, step=1))
+    mes_label = col_mes.selectbox("Mes", ["Todo el ejercicio", *MESES], index=hoy.month)
+    region = col_region.selectbox("Tasa 8%", ["norte", "sur"], format_func=lambda r: f"Región fronteriza {r}")
+
+    uploaded = st.file_uploader(
+        "Selecciona los XML o ZIP",
+        type=["xml", "zip"],
+        accept_multiple_files=True,
+        key="diot_cfdi_uploader",
+    )
+    if not uploaded:
+        st.info("Esperando archivos .xml o .zip…")
+        return
+    if not rfc:
+        st.warning("Captura el RFC del contribuyente para filtrar los CFDI recibidos.")
+        return
+
+    mes = None if mes_label == "Todo el ejercicio" else MESES.index(mes_label) + 1
+    params = DiotParams(rfc=rfc, ejercicio=ejercicio, mes=mes, region_8=region)
+
+    with st.spinner("Leyendo CFDI…"):
+        comps, bad_files = _load_comprobantes(uploaded)
+        battery, movements, pendientes = build_battery(comps, params)
+
+    if bad_files:
+        st.warning(
+            f"No se pudieron leer {len(bad_files)} archivo(s): "
+            + ", ".join(bad_files[:3])
+            + ("…" if len(bad_files) > 3 else "")
+        )
+    por_motivo: dict[str, list[str]] = {}
+    for uuid, motivo in pendientes:
+        por_motivo.setdefault(motivo, []).append(uuid)
+    for motivo, uuids in por_motivo.items():
+        st.warning(
+            f"{motivo}; se omitieron {len(uuids)} documento(s): "
+            + ", ".join(uuids[:3])
+            + ("…" if len(uuids) > 3 else "")
+        )
+    if battery.empty:
+        st.info(f"No hay CFDI pagados a {rfc} en el periodo {params.periodo}.")
+        return
+
+    st.success(f"{len(battery)} proveedor(es) a partir de {len(comps)} CFDI.")
+    st.dataframe(battery, use_container_width=True, hide_index=True)
+
+    stem = f"DIOT_{rfc}_{params.periodo}"
+    col_txt, col_xlsx = st.columns(2)
+    col_txt.download_button(
+        label="⬇️ Descargar TXT",
+        data=frame_to_txt(battery).encode("utf-8"),
+        file_name=f"{stem}.txt",
+        mime="text/plain",
+        use_container_width=True,
+    )
+    col_xlsx.download_button(
+        label="⬇️ Batería y movimientos (Excel)",
+        data=write_workbook(
+            [
+                SheetSpec("Batería", battery, freeze_header=True, autofit=True),
+                SheetSpec("Movimientos", movements, freeze_header=True, autofilter=True, autofit=True),
+            ]
+        ),
+        file_name=f"{stem}.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        use_container_width=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
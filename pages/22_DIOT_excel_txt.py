@@ -3,54 +3,15 @@
 from __future__ import annotations
 
 import html
-import io
 import json
 
-import pandas as pd
 import streamlit as st
 import streamlit.components.v1 as components
 
+from core.diot import excel_to_txt_with_rules
 from pages.components.admin import init_admin_section
 
 
-def insert_after_nth_bar(line: str, n: int, chunk: str) -> str:
-    """Insert `chunk` immediately after the nth '|' if present; otherwise return line unchanged."""
-
-    count = 0
-    for idx, ch in enumerate(line):
-        if ch == "|":
-            count += 1
-            if count == n:
-                return line[: idx + 1] + chunk + line[idx + 1 :]
-    return line
-
-
-OPS: list[tuple[int, str]] = [
-    (3, "||||"),
-    (8, "|"),
-    (10, "|"),
-    (12, "|||||"),
-    (18, "|"),
-    (20, "|"),
-    (22, "|||||||||||||||||||||||||"),  # 25 barras
-    (48, "|"),
-    (51, "||"),
-]
-
-
-def excel_to_txt_with_rules(buffer: io.BytesIO | io.BufferedReader) -> str:
-    df = pd.read_excel(buffer, header=None, dtype=str).fillna("")
-    df = df.iloc[2:]  # datos desde la fila 3
-    lines = ["|".join(row.astype(str).tolist()) for _, row in df.iterrows()]
-
-    result: list[str] = []
-    for line in lines:
-        for nth, chunk in OPS:
-            line = insert_after_nth_bar(line, nth, chunk)
-        result.append(line)
-    return "\n".join(result)
-
-
 def main() -> None:
     conn = init_admin_section(
         page_title="Excel -> TXT (DIOT)",
@@ -63,19 +24,20 @@ def main() -> None:
 
     st.title("📄 Excel -> TXT (DIOT)")
     st.caption(
-        "Sube tu Excel y generamos un TXT con el formato y las inserciones solicitadas "
+        "Sube tu Excel (o CSV) y generamos un TXT con el formato y las inserciones solicitadas "
         "(a partir de la **fila 3**)."
     )
+    st.page_link("pages/22_DIOT_cfdi.py", label="¿No tienes la batería? Genera la DIOT desde tus XML")
 
     # Oculta el uploader nativo y despliega una UI personalizada.
     st.markdown('<div class="diot-native-wrapper">', unsafe_allow_html=True)
     uploaded = st.file_uploader(
-        "Selecciona un archivo Excel",
-        type=["xlsx"],
+        "Selecciona un archivo Excel o CSV",
+        type=["xlsx", "csv"],
         key="diot_native_uploader",
         label_visibility="collapsed",
         help=(
-            "Limite de 200 MB por archivo. Solo XLSX. Las filas 1 y 2 se ignoran; "
+            "Limite de 200 MB por archivo. XLSX o CSV. Las filas 1 y 2 se ignoran; "
             "el TXT se genera desde la fila 3."
         ),
     )
@@ -151,8 +113,8 @@ def main() -> None:
     <div class="diot-dropzone-left">
       <div class="diot-icon">📁</div>
       <div class="diot-text">
-        <p class="diot-title">Arrastra y suelta tu archivo Excel aquí</p>
-        <p class="diot-subtitle">Límite de 200 MB por archivo - XLSX</p>
+        <p class="diot-title">Arrastra y suelta tu archivo Excel o CSV aquí</p>
+        <p class="diot-subtitle">Límite de 200 MB por archivo - XLSX o CSV</p>
       </div>
     </div>
     <button class="diot-button" type="button" id="diot-trigger">Seleccionar archivo</button>
@@ -347,11 +309,11 @@ def main() -> None:
     )
 
     if uploaded is None:
-        st.info("Esperando un archivo .xlsx…")
+        st.info("Esperando un archivo .xlsx o .csv…")
         return
 
     try:
-        txt_data = excel_to_txt_with_rules(io.BytesIO(uploaded.read()))
+        txt_data = excel_to_txt_with_rules(uploaded.getvalue(), uploaded.name)
     except Exception as exc:
         st.error(f"Ocurrió un error procesando el archivo: {exc}")
         return
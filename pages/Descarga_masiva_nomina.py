@@ -2,10 +2,7 @@
 
 from __future__ import annotations
 
-from datetime import datetime
-from io import BytesIO
 import unicodedata
-import xml.etree.ElementTree as ET
 from urllib.parse import urlencode
 
 import pandas as pd
@@ -13,6 +10,10 @@ import streamlit as st
 
 from core.theme import apply_theme
 from core.auth import ensure_session_from_token, auth_query_params
+from core.cfdi import Comprobante, conceptos_rows, to_float
+from core.cfdi_store import resolve_bytes
+from core.config import CFDI_STORE_PATH
+from core.excel_export import DATE_FORMAT, SheetSpec, write_workbook
 from core.custom_nav import handle_logout_request, render_brand_logout_nav
 
 
@@ -162,34 +163,6 @@ NUMERIC_PAYROLL_COLUMNS: tuple[str, ...] = (
 DATE_COLUMNS: tuple[str, ...] = ("FechaPago", "FechaInicialPago", "FechaFinalPago", "FechaTimbrado")
 
 
-def _to_decimal(value: str | None) -> float:
-    try:
-        return float(value)
-    except (TypeError, ValueError):
-        return 0.0
-
-
-def _local_name(tag: str | None) -> str:
-    if not tag:
-        return ""
-    return tag.rsplit("}", 1)[-1] if "}" in tag else tag
-
-
-def _find_child(parent: ET.Element | None, local_name: str) -> ET.Element | None:
-    if parent is None:
-        return None
-    for child in parent:
-        if _local_name(child.tag) == local_name:
-            return child
-    return None
-
-
-def _iter_children(parent: ET.Element | None, local_name: str) -> list[ET.Element]:
-    if parent is None:
-        return []
-    return [child for child in parent if _local_name(child.tag) == local_name]
-
-
 def _normalize_text(text: str | None) -> str:
     if not text:
         return ""
@@ -197,14 +170,14 @@ def _normalize_text(text: str | None) -> str:
     return "".join(ch for ch in normalized if not unicodedata.combining(ch)).lower()
 
 
-def _resolve_perception_label(percepcion: ET.Element) -> str | None:
-    tipo = percepcion.attrib.get("TipoPercepcion")
+def _resolve_perception_label(percepcion: dict[str, str]) -> str | None:
+    tipo = percepcion.get("TipoPercepcion")
     if tipo:
         tipo = tipo.strip().zfill(3)
     label = PERCEPCION_LABELS.get(tipo)
     if label:
         return label
-    concepto = _normalize_text(percepcion.attrib.get("Concepto"))
+    concepto = _normalize_text(percepcion.get("Concepto"))
     if "comision" in concepto:
         return "Comisiones"
     if "asimil" in concepto:
@@ -216,26 +189,12 @@ def _resolve_perception_label(percepcion: ET.Element) -> str | None:
     return None
 
 
-def parse_cfdi_xml(file_bytes: bytes) -> tuple[dict[str, str | float | None], list[dict[str, str | None]]]:
-    """Parsea un CFDI 4.0 y regresa encabezado y conceptos."""
-
-    root = ET.fromstring(file_bytes)
+def cfdi_rows(comp: Comprobante) -> tuple[dict[str, str | float | None], list[dict[str, str | None]]]:
+    """Convierte un CFDI de nómina ya parseado en encabezado y conceptos."""
 
-    receptor_node = _find_child(root, "Receptor")
-    receptor = receptor_node.attrib if receptor_node is not None else {}
-
-    complemento_node = _find_child(root, "Complemento")
-    tfd_node = _find_child(complemento_node, "TimbreFiscalDigital")
-    tfd = tfd_node.attrib if tfd_node is not None else {}
-
-    nomina_node = _find_child(complemento_node, "Nomina")
-    if nomina_node is None and complemento_node is not None:
-        # Compatibilidad con prefijos distintos (nomina, nomina12, etc.)
-        for child in complemento_node:
-            if _local_name(child.tag).lower().startswith("nomina"):
-                nomina_node = child
-                break
-    nomina_receptor = _find_child(nomina_node, "Receptor")
+    receptor = comp.receptor
+    tfd = comp.timbre
+    nomina = comp.nomina
 
     payroll_row: dict[str, str | float | None] = {col: None for col in PAYROLL_COLUMNS}
     payroll_row["RFC_Receptor"] = receptor.get("Rfc")
@@ -243,53 +202,47 @@ def parse_cfdi_xml(file_bytes: bytes) -> tuple[dict[str, str | float | None], li
     payroll_row["UUID"] = tfd.get("UUID")
     payroll_row["FechaTimbrado"] = tfd.get("FechaTimbrado")
 
-    if nomina_node is not None:
-        payroll_row["TipoNomina"] = nomina_node.attrib.get("TipoNomina")
-        payroll_row["FechaPago"] = nomina_node.attrib.get("FechaPago")
-        payroll_row["FechaInicialPago"] = nomina_node.attrib.get("FechaInicialPago")
-        payroll_row["FechaFinalPago"] = nomina_node.attrib.get("FechaFinalPago")
-        payroll_row["DiasPagados"] = nomina_node.attrib.get("NumDiasPagados")
-        payroll_row["TotalPercepciones"] = nomina_node.attrib.get("TotalPercepciones")
-        payroll_row["TotalDeducciones"] = nomina_node.attrib.get("TotalDeducciones")
-        payroll_row["TotalOtrosPagos"] = nomina_node.attrib.get("TotalOtrosPagos")
-
-        if nomina_receptor is not None:
-            payroll_row["CURP"] = nomina_receptor.attrib.get("Curp")
-            payroll_row["NSS"] = nomina_receptor.attrib.get("NumSeguridadSocial")
-            payroll_row["Puesto"] = nomina_receptor.attrib.get("Puesto")
-            payroll_row["Departamento"] = nomina_receptor.attrib.get("Departamento")
-            payroll_row["NumEmpleado"] = nomina_receptor.attrib.get("NumEmpleado")
+    if nomina is not None:
+        payroll_row["TipoNomina"] = nomina.attrs.get("TipoNomina")
+        payroll_row["FechaPago"] = nomina.attrs.get("FechaPago")
+        payroll_row["FechaInicialPago"] = nomina.attrs.get("FechaInicialPago")
+        payroll_row["FechaFinalPago"] = nomina.attrs.get("FechaFinalPago")
+        payroll_row["DiasPagados"] = nomina.attrs.get("NumDiasPagados")
+        payroll_row["TotalPercepciones"] = nomina.attrs.get("TotalPercepciones")
+        payroll_row["TotalDeducciones"] = nomina.attrs.get("TotalDeducciones")
+        payroll_row["TotalOtrosPagos"] = nomina.attrs.get("TotalOtrosPagos")
+
+        if nomina.receptor:
+            payroll_row["CURP"] = nomina.receptor.get("Curp")
+            payroll_row["NSS"] = nomina.receptor.get("NumSeguridadSocial")
+            payroll_row["Puesto"] = nomina.receptor.get("Puesto")
+            payroll_row["Departamento"] = nomina.receptor.get("Departamento")
+            payroll_row["NumEmpleado"] = nomina.receptor.get("NumEmpleado")
 
         percepcion_totals = {label: 0.0 for label in PERCEPTION_COLUMNS}
-        percepciones_node = _find_child(nomina_node, "Percepciones")
-        if percepciones_node is not None:
-            for percepcion in _iter_children(percepciones_node, "Percepcion"):
-                total = _to_decimal(percepcion.attrib.get("ImporteGravado")) + _to_decimal(
-                    percepcion.attrib.get("ImporteExento")
-                )
-                label = _resolve_perception_label(percepcion)
-                if label:
-                    percepcion_totals[label] += total
+        for percepcion in nomina.percepciones:
+            total = to_float(percepcion.get("ImporteGravado")) + to_float(percepcion.get("ImporteExento"))
+            label = _resolve_perception_label(percepcion)
+            if label:
+                percepcion_totals[label] += total
         for label, value in percepcion_totals.items():
             payroll_row[label] = value
 
         ded_isr_regular = ded_isr_aguinaldo = ded_imss = ded_infonavit = 0.0
-        deducciones_node = _find_child(nomina_node, "Deducciones")
-        if deducciones_node is not None:
-            for deduccion in _iter_children(deducciones_node, "Deduccion"):
-                tipo = (deduccion.attrib.get("TipoDeduccion") or "").strip()
-                concepto = (deduccion.attrib.get("Concepto") or "").lower()
-                importe = _to_decimal(deduccion.attrib.get("Importe"))
-                if tipo == "002" or "isr" in concepto or "retencion" in concepto:
-                    if "aguinaldo" in concepto:
-                        ded_isr_aguinaldo += importe
-                    else:
-                        ded_isr_regular += importe
-                if tipo == "001" or "imss" in concepto:
-                    ded_imss += importe
-                if tipo in INFONAVIT_TYPES or "infonavit" in concepto:
-                    ded_infonavit += importe
-        asimilado_total = _to_decimal(payroll_row.get("Asimilado a salario"))
+        for deduccion in nomina.deducciones:
+            tipo = (deduccion.get("TipoDeduccion") or "").strip()
+            concepto = (deduccion.get("Concepto") or "").lower()
+            importe = to_float(deduccion.get("Importe"))
+            if tipo == "002" or "isr" in concepto or "retencion" in concepto:
+                if "aguinaldo" in concepto:
+                    ded_isr_aguinaldo += importe
+                else:
+                    ded_isr_regular += importe
+            if tipo == "001" or "imss" in concepto:
+                ded_imss += importe
+            if tipo in INFONAVIT_TYPES or "infonavit" in concepto:
+                ded_infonavit += importe
+        asimilado_total = to_float(payroll_row.get("Asimilado a salario"))
         ret_isr_value = 0.0 if ded_isr_aguinaldo != 0 else ded_isr_regular
         isr_asimilados_val = ret_isr_value if asimilado_total != 0 else 0.0
         if isr_asimilados_val:
@@ -304,19 +257,16 @@ def parse_cfdi_xml(file_bytes: bytes) -> tuple[dict[str, str | float | None], li
         subsidio_causado = 0.0
         ajuste_subsidio_entregado = 0.0
         ajuste_subsidio_causado = 0.0
-        otros_pagos_node = _find_child(nomina_node, "OtrosPagos")
-        if otros_pagos_node is not None:
-            for otro in _iter_children(otros_pagos_node, "OtroPago"):
-                tipo_otro = otro.attrib.get("TipoOtroPago")
-                importe_otro = _to_decimal(otro.attrib.get("Importe"))
-                if tipo_otro == "007":
-                    ajuste_subsidio_entregado += importe_otro
-                elif tipo_otro == "008":
-                    ajuste_subsidio_causado += importe_otro
-                subsidio_node = _find_child(otro, "SubsidioAlEmpleo")
-                if subsidio_node is not None:
-                    subsidio_entregado += _to_decimal(subsidio_node.attrib.get("SubsidioEntregado"))
-                    subsidio_causado += _to_decimal(subsidio_node.attrib.get("SubsidioCausado"))
+        for otro, subsidio in nomina.otros_pagos:
+            tipo_otro = otro.get("TipoOtroPago")
+            importe_otro = to_float(otro.get("Importe"))
+            if tipo_otro == "007":
+                ajuste_subsidio_entregado += importe_otro
+            elif tipo_otro == "008":
+                ajuste_subsidio_causado += importe_otro
+            if subsidio is not None:
+                subsidio_entregado += to_float(subsidio.get("SubsidioEntregado"))
+                subsidio_causado += to_float(subsidio.get("SubsidioCausado"))
         payroll_row["SubsidioEntregado"] = subsidio_entregado
         payroll_row[
             "Ajuste en Subsidio para el empleo (efectivamente entregado al trabajador)"
@@ -324,41 +274,7 @@ def parse_cfdi_xml(file_bytes: bytes) -> tuple[dict[str, str | float | None], li
         payroll_row["Ajuste al Subsidio Causado"] = ajuste_subsidio_causado
         payroll_row["SubsidioCausado"] = subsidio_causado
 
-    conceptos_rows: list[dict[str, str | None]] = []
-    conceptos_node = _find_child(root, "Conceptos")
-    if conceptos_node is not None:
-        for concepto in _iter_children(conceptos_node, "Concepto"):
-            datos = concepto.attrib.copy()
-            iva_base = iva_tasa = iva_importe = None
-            impuestos_concepto = _find_child(concepto, "Impuestos")
-            if impuestos_concepto is not None:
-                traslados = _find_child(impuestos_concepto, "Traslados")
-                traslado = _find_child(traslados, "Traslado")
-                if traslado is not None:
-                    iva_base = traslado.attrib.get("Base")
-                    iva_tasa = traslado.attrib.get("TasaOCuota")
-                    iva_importe = traslado.attrib.get("Importe")
-
-            conceptos_rows.append(
-                {
-                    "UUID": tfd.get("UUID"),
-                    "ClaveProdServ": datos.get("ClaveProdServ"),
-                    "NoIdentificacion": datos.get("NoIdentificacion"),
-                    "Descripcion": datos.get("Descripcion"),
-                    "Cantidad": datos.get("Cantidad"),
-                    "ClaveUnidad": datos.get("ClaveUnidad"),
-                    "Unidad": datos.get("Unidad"),
-                    "ValorUnitario": datos.get("ValorUnitario"),
-                    "Importe": datos.get("Importe"),
-                    "Descuento": datos.get("Descuento"),
-                    "ObjetoImp": datos.get("ObjetoImp"),
-                    "IVA_Base": iva_base,
-                    "IVA_TasaOCuota": iva_tasa,
-                    "IVA_Importe": iva_importe,
-                }
-            )
-
-    return payroll_row, conceptos_rows
+    return payroll_row, conceptos_rows(comp)
 
 
 ensure_session_from_token()
@@ -401,14 +317,16 @@ if xml_files:
     registros_conceptos: list[dict[str, str | None]] = []
     errores: list[str] = []
 
-    for uploaded in xml_files:
+    for name, comp in resolve_bytes(CFDI_STORE_PATH, ((f.name, f.getvalue()) for f in xml_files)):
+        if comp is None:
+            errores.append(f"{name}: XML inválido")
+            continue
         try:
-            file_bytes = uploaded.read()
-            resumen_nomina, conceptos = parse_cfdi_xml(file_bytes)
+            resumen_nomina, conceptos = cfdi_rows(comp)
             registros_nomina.append(resumen_nomina)
             registros_conceptos.extend(conceptos)
         except Exception as exc:  # pragma: no cover - retroalimentación visual
-            errores.append(f"{uploaded.name}: {exc}")
+            errores.append(f"{name}: {exc}")
 
     if errores:
         st.warning("Algunos archivos no se pudieron procesar:\n- " + "\n- ".join(errores), icon="⚠️")
@@ -439,26 +357,18 @@ if xml_files:
         else:
             st.info("Los XML cargados no contienen conceptos para mostrar.")
 
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            df_nomina.to_excel(writer, index=False, sheet_name="Nomina")
-            df_conceptos.to_excel(writer, index=False, sheet_name="Conceptos")
-
-            ws_nomina = writer.sheets["Nomina"]
-            for date_col in DATE_COLUMNS:
-                if date_col in df_nomina.columns:
-                    col_idx = df_nomina.columns.get_loc(date_col) + 1
-                    for row_idx in range(2, len(df_nomina) + 2):
-                        cell = ws_nomina.cell(row=row_idx, column=col_idx)
-                        if isinstance(cell.value, pd.Timestamp):
-                            cell.value = cell.value.to_pydatetime().date()
-                        elif isinstance(cell.value, datetime):
-                            cell.value = cell.value.date()
-                        cell.number_format = "DD/MM/YYYY"
+        date_cols = [col for col in DATE_COLUMNS if col in df_nomina.columns]
+        df_excel = df_nomina.assign(**{col: df_nomina[col].dt.normalize() for col in date_cols})
+        excel_bytes = write_workbook(
+            [
+                SheetSpec("Nomina", df_excel, column_formats={col: DATE_FORMAT for col in date_cols}),
+                SheetSpec("Conceptos", df_conceptos),
+            ]
+        )
 
         st.download_button(
             label="Descargar Excel de nómina",
-            data=output.getvalue(),
+            data=excel_bytes,
             file_name="nomina_cfdi.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             use_container_width=True,
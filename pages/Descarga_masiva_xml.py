@@ -1,9 +1,6 @@
 # pages/Descarga_masiva_xml.py — Exportar CFDI (XML) a Excel
 from __future__ import annotations
 
-from datetime import datetime
-from io import BytesIO
-import xml.etree.ElementTree as ET
 
 import pandas as pd
 import streamlit as st
@@ -12,6 +9,10 @@ from urllib.parse import urlencode
 
 # Núcleo
 from core.auth import ensure_session_from_token, auth_query_params
+from core.cfdi import Comprobante, conceptos_rows
+from core.cfdi_store import resolve_bytes
+from core.config import CFDI_STORE_PATH
+from core.excel_export import DATE_FORMAT, SheetSpec, write_workbook
 from core.db import get_conn
 from core.custom_nav import handle_logout_request, render_brand_logout_nav
 
@@ -130,62 +131,42 @@ render_brand_logout_nav(
 # -----------------------------------------------------------------------------
 # === Parser CFDI (tu lógica) ===
 # -----------------------------------------------------------------------------
-def parse_cfdi_xml(file_bytes: bytes):
-    ns = {
-        "cfdi": "http://www.sat.gob.mx/cfd/4",
-        "tfd": "http://www.sat.gob.mx/TimbreFiscalDigital",
-        "implocal": "http://www.sat.gob.mx/implocal",
-    }
-    root = ET.fromstring(file_bytes)
-
-    comp = root.attrib
-    emisor_node = root.find("cfdi:Emisor", ns)
-    emisor = emisor_node.attrib if emisor_node is not None else {}
-    receptor_node = root.find("cfdi:Receptor", ns)
-    receptor = receptor_node.attrib if receptor_node is not None else {}
-    complemento_node = root.find("cfdi:Complemento", ns)
-
-    tfd_node = complemento_node.find("tfd:TimbreFiscalDigital", ns) if complemento_node is not None else None
-    tfd = tfd_node.attrib if tfd_node is not None else {}
+def cfdi_rows(comp: Comprobante):
+    comp_at = comp.header
+    emisor = comp.emisor
+    receptor = comp.receptor
+    tfd = comp.timbre
 
-    impuestos_node = root.find("cfdi:Impuestos", ns)
     total_impuestos_trasladados = retencion_001 = retencion_002 = iva_8 = ish_importe = None
-    if impuestos_node is not None:
-        total_impuestos_trasladados = impuestos_node.attrib.get("TotalImpuestosTrasladados")
-        rs = impuestos_node.find("cfdi:Retenciones", ns)
-        if rs is not None:
-            for ret in rs.findall("cfdi:Retencion", ns):
-                imp = ret.attrib.get("Impuesto"); imp_importe = ret.attrib.get("Importe")
-                if imp == "001": retencion_001 = imp_importe
-                elif imp == "002": retencion_002 = imp_importe
-        ts = impuestos_node.find("cfdi:Traslados", ns)
-        if ts is not None:
-            for tras in ts.findall("cfdi:Traslado", ns):
-                imp = tras.attrib.get("Impuesto"); tasa = tras.attrib.get("TasaOCuota"); importe_tras = tras.attrib.get("Importe")
-                if imp == "002" and tasa and tasa.startswith("0.08"): iva_8 = importe_tras
-
-    if complemento_node is not None:
-        il = complemento_node.find("implocal:ImpuestosLocales", ns)
-        if il is not None:
-            for loc_tr in il.findall("implocal:TrasladosLocales", ns):
-                if loc_tr.attrib.get("ImpLocTrasladado") == "ISH":
-                    ish_importe = loc_tr.attrib.get("Importe"); break
+    if comp.impuestos.attrs:
+        total_impuestos_trasladados = comp.impuestos.attrs.get("TotalImpuestosTrasladados")
+    for ret in comp.impuestos.retenciones:
+        imp = ret.get("Impuesto"); imp_importe = ret.get("Importe")
+        if imp == "001": retencion_001 = imp_importe
+        elif imp == "002": retencion_002 = imp_importe
+    for tras in comp.impuestos.traslados:
+        imp = tras.get("Impuesto"); tasa = tras.get("TasaOCuota"); importe_tras = tras.get("Importe")
+        if imp == "002" and tasa and tasa.startswith("0.08"): iva_8 = importe_tras
+
+    for loc_tr in comp.traslados_locales:
+        if loc_tr.get("ImpLocTrasladado") == "ISH":
+            ish_importe = loc_tr.get("Importe"); break
 
     encabezado_dict = {
-        "Version": comp.get("Version"),
-        "TipoDeComprobante": comp.get("TipoDeComprobante"),
-        "Fecha": comp.get("Fecha"),
+        "Version": comp_at.get("Version"),
+        "TipoDeComprobante": comp_at.get("TipoDeComprobante"),
+        "Fecha": comp_at.get("Fecha"),
         "FechaTimbrado": tfd.get("FechaTimbrado"),
 
         "Emisor_Rfc": emisor.get("Rfc"),
         "Emisor_Nombre": emisor.get("Nombre"),
 
         "UUID": tfd.get("UUID"),
-        "Serie": comp.get("Serie"),
-        "Folio": comp.get("Folio"),
+        "Serie": comp_at.get("Serie"),
+        "Folio": comp_at.get("Folio"),
 
-        "SubTotal": comp.get("SubTotal"),
-        "Descuento": comp.get("Descuento"),
+        "SubTotal": comp_at.get("SubTotal"),
+        "Descuento": comp_at.get("Descuento"),
         "TotalImpuestosTrasladados": total_impuestos_trasladados,
 
         "IVA 8%": iva_8,
@@ -194,20 +175,20 @@ def parse_cfdi_xml(file_bytes: bytes):
         "Retencion_001": retencion_001,
         "Retencion_002": retencion_002,
 
-        "Total": comp.get("Total"),
+        "Total": comp_at.get("Total"),
 
         "Emisor_RegimenFiscal": emisor.get("RegimenFiscal"),
         "Receptor_DomicilioFiscalReceptor": receptor.get("DomicilioFiscalReceptor"),
 
-        "Moneda": comp.get("Moneda"),
-        "FormaPago": comp.get("FormaPago"),
-        "MetodoPago": comp.get("MetodoPago"),
-        "CondicionesDePago": comp.get("CondicionesDePago"),
-        "LugarExpedicion": comp.get("LugarExpedicion"),
-        "Exportacion": comp.get("Exportacion"),
+        "Moneda": comp_at.get("Moneda"),
+        "FormaPago": comp_at.get("FormaPago"),
+        "MetodoPago": comp_at.get("MetodoPago"),
+        "CondicionesDePago": comp_at.get("CondicionesDePago"),
+        "LugarExpedicion": comp_at.get("LugarExpedicion"),
+        "Exportacion": comp_at.get("Exportacion"),
 
         "RfcProvCertif": tfd.get("RfcProvCertif"),
-        "NoCertificado": comp.get("NoCertificado"),
+        "NoCertificado": comp_at.get("NoCertificado"),
 
         "Receptor_Rfc": receptor.get("Rfc"),
         "Receptor_Nombre": receptor.get("Nombre"),
@@ -215,39 +196,7 @@ def parse_cfdi_xml(file_bytes: bytes):
         "Receptor_RegimenFiscalReceptor": receptor.get("RegimenFiscalReceptor"),
     }
 
-    conceptos_rows = []
-    conceptos_node = root.find("cfdi:Conceptos", ns)
-    if conceptos_node is not None:
-        for c in conceptos_node.findall("cfdi:Concepto", ns):
-            c_at = c.attrib.copy()
-            iva_base = iva_tasa = iva_importe = None
-            imp_node = c.find("cfdi:Impuestos", ns)
-            if imp_node is not None:
-                ts = imp_node.find("cfdi:Traslados", ns)
-                if ts is not None:
-                    tr = ts.find("cfdi:Traslado", ns)
-                    if tr is not None:
-                        iva_base = tr.attrib.get("Base")
-                        iva_tasa = tr.attrib.get("TasaOCuota")
-                        iva_importe = tr.attrib.get("Importe")
-
-            conceptos_rows.append({
-                "UUID": encabezado_dict["UUID"],
-                "ClaveProdServ": c_at.get("ClaveProdServ"),
-                "NoIdentificacion": c_at.get("NoIdentificacion"),
-                "Descripcion": c_at.get("Descripcion"),
-                "Cantidad": c_at.get("Cantidad"),
-                "ClaveUnidad": c_at.get("ClaveUnidad"),
-                "Unidad": c_at.get("Unidad"),
-                "ValorUnitario": c_at.get("ValorUnitario"),
-                "Importe": c_at.get("Importe"),
-                "Descuento": c_at.get("Descuento"),
-                "ObjetoImp": c_at.get("ObjetoImp"),
-                "IVA_Base": iva_base,
-                "IVA_TasaOCuota": iva_tasa,
-                "IVA_Importe": iva_importe,
-            })
-    return encabezado_dict, conceptos_rows
+    return encabezado_dict, conceptos_rows(comp)
 
 # -----------------------------------------------------------------------------
 # UI principal (subida múltiple → Excel)
@@ -268,8 +217,11 @@ if xml_files:
     st.success(f"Archivos cargados: {len(xml_files)}")
 
     registros_encabezado, registros_conceptos = [], []
-    for uploaded in xml_files:
-        enc, rows = parse_cfdi_xml(uploaded.read())
+    for name, comp in resolve_bytes(CFDI_STORE_PATH, ((f.name, f.getvalue()) for f in xml_files)):
+        if comp is None:
+            st.warning(f"{name}: XML inválido, se omite.")
+            continue
+        enc, rows = cfdi_rows(comp)
         registros_encabezado.append(enc)
         registros_conceptos.extend(rows)
 
@@ -306,26 +258,20 @@ if xml_files:
     st.dataframe(df_conceptos, height=260, use_container_width=True)
 
     # Excel en memoria
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df_cfdIs.to_excel(writer, index=False, sheet_name="CFDIs")
-        df_conceptos.to_excel(writer, index=False, sheet_name="Conceptos")
-
-        # Formato dd/mm/yyyy para FechaTimbrado
-        ws = writer.sheets["CFDIs"]
-        if "FechaTimbrado" in df_cfdIs.columns:
-            cidx = df_cfdIs.columns.get_loc("FechaTimbrado") + 1
-            for r in range(2, len(df_cfdIs) + 2):
-                cell = ws.cell(row=r, column=cidx)
-                if isinstance(cell.value, pd.Timestamp):  # type: ignore[name-defined]
-                    cell.value = cell.value.to_pydatetime().date()
-                elif isinstance(cell.value, datetime):
-                    cell.value = cell.value.date()
-                cell.number_format = "DD/MM/YYYY"
+    # Formato dd/mm/yyyy para FechaTimbrado (sólo la fecha, sin hora)
+    df_excel = df_cfdIs
+    if "FechaTimbrado" in df_cfdIs.columns:
+        df_excel = df_cfdIs.assign(FechaTimbrado=df_cfdIs["FechaTimbrado"].dt.normalize())
+    excel_bytes = write_workbook(
+        [
+            SheetSpec("CFDIs", df_excel, column_formats={"FechaTimbrado": DATE_FORMAT}),
+            SheetSpec("Conceptos", df_conceptos),
+        ]
+    )
 
     st.download_button(
         "DESCARGAR EXCEL",
-        data=output.getvalue(),
+        data=excel_bytes,
         file_name="CFDIs.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         use_container_width=True,
@@ -3,9 +3,7 @@ from __future__ import annotations
 import base64
 import mimetypes
 import os
-import tempfile
 from datetime import datetime
-from io import BytesIO
 from pathlib import Path
 from urllib.parse import urlencode
 
@@ -16,6 +14,8 @@ from core.theme import apply_theme
 from core.auth import ensure_session_from_token, auth_query_params
 from core.custom_nav import render_brand_logout_nav
 from core.extractor_american_express import extraer_american_express
+from core.excel_export import frame_to_xlsx
+from core.statement_cache import cached_extract
 
 ASSETS_DIR = next((p for p in (Path("Assets"), Path("assets")) if p.exists()), Path("."))
 LEFT_LOGO = ASSETS_DIR / "logo.jpg"
@@ -39,11 +39,7 @@ def _img_to_data_uri(path: Path) -> str | None:
 
 
 def _df_to_excel_bytes(df: pd.DataFrame) -> bytes:
-    buffer = BytesIO()
-    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-        df.to_excel(writer, sheet_name="Movimientos Amex", index=False)
-    buffer.seek(0)
-    return buffer.getvalue()
+    return frame_to_xlsx(df, "Movimientos Amex")
 
 
 def _totals(df: pd.DataFrame) -> dict[str, float]:
@@ -137,14 +133,9 @@ uploaded_file = st.file_uploader("", type=["pdf"], label_visibility="collapsed")
 if uploaded_file is None:
     st.markdown('<div class="hint">Sube un PDF para comenzar.</div>', unsafe_allow_html=True)
 else:
-    tmp_path = None
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(uploaded_file.read())
-            tmp_path = tmp.name
-
         with st.spinner("Procesando PDF..."):
-            df = extraer_american_express(tmp_path)
+            df = cached_extract(uploaded_file.getvalue(), extraer_american_express)
 
         if df.empty:
             st.warning("No se detectaron movimientos. Verifica que el PDF sea un estado de cuenta legible (no escaneado).")
@@ -178,9 +169,3 @@ else:
             st.caption(f"Archivo guardado también en: {ruta_out}")
     except Exception as exc:
         st.error(f"Ocurrió un error al procesar el PDF: {exc}")
-    finally:
-        if tmp_path and os.path.exists(tmp_path):
-            try:
-                os.remove(tmp_path)
-            except OSError:
-                pass
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import io
 from datetime import datetime
 from pathlib import Path
 from urllib.parse import urlencode
@@ -12,6 +11,8 @@ from core.theme import apply_theme
 from core.auth import ensure_session_from_token, auth_query_params
 from core.custom_nav import render_brand_logout_nav
 from core.extractor_base import extraer_base
+from core.excel_export import frame_to_xlsx
+from core.statement_cache import cached_extract
 
 ASSETS_DIR = next((p for p in (Path("Assets"), Path("assets")) if p.exists()), Path("."))
 LOGO_LEFT = ASSETS_DIR / "logo.jpg"
@@ -74,9 +75,8 @@ if uploaded is None:
     st.info("Sube un PDF para comenzar.")
     st.stop()
 
-uploaded.seek(0)
 with st.spinner("Extrayendo movimientos..."):
-    df = extraer_base(uploaded)
+    df = cached_extract(uploaded.getvalue(), extraer_base)
 
 if df.empty:
     st.warning("No se detectaron movimientos válidos en el documento.")
@@ -93,15 +93,12 @@ tot2.metric("Total abonos", f"${abonos_total:,.2f}")
 with st.expander("Ver movimientos extraídos"):
     st.dataframe(df, use_container_width=True, height=500)
 
-buffer = io.BytesIO()
-with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-    df.to_excel(writer, sheet_name="Banco BASE", index=False)
-buffer.seek(0)
+excel_bytes = frame_to_xlsx(df, "Banco BASE")
 
 filename = f"banco_base_{datetime.now():%Y%m%d_%H%M%S}.xlsx"
 st.download_button(
     "Descargar Excel",
-    data=buffer,
+    data=excel_bytes,
     file_name=filename,
     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
 )
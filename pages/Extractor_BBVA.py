@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import hashlib
-import io
 from datetime import datetime
 from pathlib import Path
 from urllib.parse import urlencode
@@ -13,6 +12,8 @@ from core.theme import apply_theme
 from core.auth import ensure_session_from_token, auth_query_params
 from core.custom_nav import render_brand_logout_nav
 from core.extractor_bbva import extract_bbva_pdf_to_df
+from core.excel_export import frame_to_xlsx
+from core.statement_cache import cached_extract
 
 ASSETS_DIR = next((p for p in (Path("Assets"), Path("assets")) if p.exists()), Path("."))
 LOGO_LEFT = ASSETS_DIR / "logo.jpg"
@@ -126,16 +127,15 @@ def _enrich_with_catalog(df: pd.DataFrame, catalog: pd.DataFrame) -> None:
     df.loc[mask_desc, "Descripción"] = descripcion_fill[mask_desc].fillna(df.loc[mask_desc, "Descripción"])
 
 
-@st.cache_data(show_spinner=False)
 def _run_extraction(file_bytes: bytes) -> pd.DataFrame:
-    return extract_bbva_pdf_to_df(io.BytesIO(file_bytes))
+    return cached_extract(file_bytes, extract_bbva_pdf_to_df)
 
 
 if uploaded:
     st.info(f"Archivo: **{uploaded.name}** · {uploaded.size / 1024:.1f} KB")
     if st.button("Convertir a Excel", type="primary"):
         try:
-            file_bytes = uploaded.read()
+            file_bytes = uploaded.getvalue()
             df = _run_extraction(file_bytes)
             catalog_df = _load_catalog_df(catalogo_cuentas)
             if catalog_df is not None:
@@ -154,17 +154,14 @@ if uploaded:
                 with st.expander("Ver movimientos extraídos"):
                     st.dataframe(df, use_container_width=True, hide_index=True)
 
-                out = io.BytesIO()
-                with pd.ExcelWriter(out, engine="openpyxl") as writer:
-                    df.to_excel(writer, index=False, sheet_name="BBVA")
-                out.seek(0)
+                excel_bytes = frame_to_xlsx(df, "BBVA")
 
                 digest = hashlib.md5(file_bytes).hexdigest()[:8]
                 fname = f"bbva_{datetime.now():%Y%m%d}_{digest}.xlsx"
 
                 st.download_button(
                     "Descargar Excel",
-                    data=out,
+                    data=excel_bytes,
                     file_name=fname,
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 )
@@ -2,9 +2,6 @@ from __future__ import annotations
 
 import base64
 import mimetypes
-import os
-import tempfile
-from io import BytesIO
 from pathlib import Path
 from urllib.parse import urlencode
 
@@ -15,6 +12,8 @@ from core.theme import apply_theme
 from core.auth import ensure_session_from_token, auth_query_params
 from core.custom_nav import render_brand_logout_nav
 from core.extractor_banbajio import extraer_movimientos
+from core.excel_export import SheetSpec, write_workbook
+from core.statement_cache import cached_extract
 
 ASSETS_DIR = next((p for p in (Path("Assets"), Path("assets")) if p.exists()), Path("."))
 LEFT_LOGO_PATH = ASSETS_DIR / "logo.jpg"
@@ -39,17 +38,13 @@ def img_to_data_uri(path: Path) -> str | None:
 
 def excel_por_cuenta_bytes(df: pd.DataFrame) -> bytes:
     """Genera un Excel en memoria con una hoja por cada cuenta."""
-    buffer = BytesIO()
-    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-        if "Cuenta" not in df.columns:
-            df.to_excel(writer, index=False, sheet_name="Movimientos")
-        else:
-            for cuenta, dfc in df.groupby("Cuenta", dropna=False):
-                nombre = str(cuenta).strip() if pd.notna(cuenta) and str(cuenta).strip() else "SIN_CUENTA"
-                hoja = nombre[:31]
-                dfc.drop(columns=["Cuenta", "Detalle"], errors="ignore").to_excel(writer, index=False, sheet_name=hoja)
-    buffer.seek(0)
-    return buffer.getvalue()
+    if "Cuenta" not in df.columns:
+        return write_workbook([SheetSpec("Movimientos", df)])
+    sheets = []
+    for cuenta, dfc in df.groupby("Cuenta", dropna=False):
+        nombre = str(cuenta).strip() if pd.notna(cuenta) and str(cuenta).strip() else "SIN_CUENTA"
+        sheets.append(SheetSpec(nombre, dfc.drop(columns=["Cuenta", "Detalle"], errors="ignore")))
+    return write_workbook(sheets)
 
 
 def _render_nav() -> None:
@@ -154,13 +149,8 @@ uploaded_file = st.file_uploader("", type=["pdf"], label_visibility="collapsed")
 if uploaded_file is None:
     st.markdown('<div class="hint">Sube un PDF para comenzar.</div>', unsafe_allow_html=True)
 else:
-    tmp_path = None
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(uploaded_file.read())
-            tmp_path = tmp.name
-
-        df = extraer_movimientos(tmp_path)
+        df = cached_extract(uploaded_file.getvalue(), extraer_movimientos)
 
         if df.empty:
             st.warning("No se detectaron movimientos en el PDF. Verifica el archivo.")
@@ -185,9 +175,3 @@ else:
             )
     except Exception as exc:
         st.error(f"Ocurrió un error al procesar el PDF: {exc}")
-    finally:
-        if tmp_path and os.path.exists(tmp_path):
-            try:
-                os.remove(tmp_path)
-            except OSError:
-                pass
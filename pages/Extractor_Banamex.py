@@ -2,10 +2,7 @@ from __future__ import annotations
 
 import base64
 import mimetypes
-import os
-import tempfile
 from datetime import datetime
-from io import BytesIO
 from pathlib import Path
 from urllib.parse import urlencode
 
@@ -16,6 +13,8 @@ from core.theme import apply_theme
 from core.auth import ensure_session_from_token, auth_query_params
 from core.custom_nav import render_brand_logout_nav
 from extractor import extraer_datos_banamex_formato_final
+from core.excel_export import frame_to_xlsx
+from core.statement_cache import cached_extract
 
 ASSETS_DIR = next((p for p in (Path("Assets"), Path("assets")) if p.exists()), Path("."))
 LEFT_LOGO = ASSETS_DIR / "logo.jpg"
@@ -41,11 +40,7 @@ def _img_to_data_uri(path: Path) -> str | None:
 
 
 def _df_to_excel_bytes(df: pd.DataFrame) -> bytes:
-    buf = BytesIO()
-    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Banamex")
-    buf.seek(0)
-    return buf.getvalue()
+    return frame_to_xlsx(df, "Banamex")
 
 
 def _totals(df: pd.DataFrame) -> dict[str, float]:
@@ -142,14 +137,9 @@ uploaded_file = st.file_uploader("Sube tu PDF de Banamex", type=["pdf"])
 if uploaded_file is None:
     st.info("👆 Sube un PDF para comenzar.")
 else:
-    tmp_path = None
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(uploaded_file.read())
-            tmp_path = tmp.name
-
         st.info("⏳ Procesando archivo PDF...")
-        df = extraer_datos_banamex_formato_final(tmp_path)
+        df = cached_extract(uploaded_file.getvalue(), extraer_datos_banamex_formato_final)
 
         if df is None or df.empty:
             st.warning("⚠ No se detectaron movimientos válidos en el archivo.")
@@ -185,9 +175,3 @@ else:
 
     except Exception as exc:
         st.error(f"❌ Ocurrió un error al extraer datos: {exc}")
-    finally:
-        if tmp_path and os.path.exists(tmp_path):
-            try:
-                os.remove(tmp_path)
-            except OSError:
-                pass
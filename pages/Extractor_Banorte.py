@@ -2,8 +2,6 @@ from __future__ import annotations
 
 import base64
 import mimetypes
-import os
-import tempfile
 from datetime import datetime
 from io import BytesIO
 from pathlib import Path
@@ -15,7 +13,9 @@ import streamlit as st
 from core.theme import apply_theme
 from core.auth import ensure_session_from_token, auth_query_params
 from core.custom_nav import render_brand_logout_nav
-from core.extractor_banorte import procesar_pdf
+from core.extractor_banorte import extraer_banorte
+from core.excel_export import frame_to_xlsx
+from core.statement_cache import cached_extract
 
 ASSETS_DIR = next((p for p in (Path("Assets"), Path("assets")) if p.exists()), Path("."))
 LEFT_LOGO = ASSETS_DIR / "logo.jpg"
@@ -48,21 +48,10 @@ def _totals(df: pd.DataFrame) -> dict[str, float]:
     return {"cargos": float(cargos), "abonos": float(abonos), "saldo": saldo_val}
 
 
-def _run_extractor(file_bytes: bytes, filename: str) -> tuple[pd.DataFrame, bytes | None, str]:
-    safe_name = Path(filename).name
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
-        tmp_pdf.write(file_bytes)
-        tmp_path = tmp_pdf.name
-    try:
-        xlsx_path, df = procesar_pdf(tmp_path)
-        excel_bytes = Path(xlsx_path).read_bytes() if xlsx_path and Path(xlsx_path).exists() else None
-        suggested = Path(xlsx_path).name if xlsx_path else Path(safe_name).with_suffix(".xlsx").name
-    finally:
-        try:
-            os.remove(tmp_path)
-        except OSError:
-            pass
-    return df, excel_bytes, suggested
+def _run_extractor(file_bytes: bytes, filename: str) -> tuple[pd.DataFrame, str]:
+    df = cached_extract(file_bytes, extraer_banorte)
+    suggested = Path(Path(filename).name).with_suffix(".xlsx").name
+    return df, suggested
 
 
 def _render_nav() -> None:
@@ -167,10 +156,10 @@ uploaded_file = st.file_uploader("", type=["pdf"], label_visibility="collapsed")
 if uploaded_file is None:
     st.info("Sube un PDF para comenzar.")
 else:
-    file_bytes = uploaded_file.read()
+    file_bytes = uploaded_file.getvalue()
     with st.spinner("Procesando PDF…"):
         try:
-            df, excel_bytes, suggested_name = _run_extractor(file_bytes, uploaded_file.name)
+            df, suggested_name = _run_extractor(file_bytes, uploaded_file.name)
         except Exception as exc:
             st.error("❌ Error al procesar el archivo.")
             st.exception(exc)
@@ -192,13 +181,7 @@ else:
             st.dataframe(df, use_container_width=True, height=520)
 
         # Persist Excel/CSV
-        if excel_bytes is None:
-            excel_bytes = BytesIO()
-            df.to_excel(excel_bytes, index=False, sheet_name="Banorte")
-            excel_bytes.seek(0)
-            excel_payload = excel_bytes.getvalue()
-        else:
-            excel_payload = excel_bytes
+        excel_payload = frame_to_xlsx(df, "Banorte")
 
         target_path = OUTPUT_DIR / suggested_name
         target_path.write_bytes(excel_payload)
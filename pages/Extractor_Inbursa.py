@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import io
 from datetime import datetime
 from pathlib import Path
 from urllib.parse import urlencode
@@ -12,6 +11,8 @@ from core.theme import apply_theme
 from core.auth import ensure_session_from_token, auth_query_params
 from core.custom_nav import render_brand_logout_nav
 from core.extractor_inbursa import extraer_inbursa
+from core.excel_export import frame_to_xlsx
+from core.statement_cache import cached_extract
 
 ASSETS_DIR = next((p for p in (Path("Assets"), Path("assets")) if p.exists()), Path("."))
 LOGO_LEFT = ASSETS_DIR / "logo.jpg"
@@ -71,7 +72,7 @@ uploaded = st.file_uploader("PDF de Inbursa", type=["pdf"])
 
 if uploaded:
     with st.spinner("Extrayendo movimientos..."):
-        df = extraer_inbursa(uploaded)
+        df = cached_extract(uploaded.getvalue(), extraer_inbursa)
 
     cargos_total = pd.to_numeric(df.get("Cargo"), errors="coerce").fillna(0).sum()
     abonos_total = pd.to_numeric(df.get("Abono"), errors="coerce").fillna(0).sum()
@@ -84,15 +85,12 @@ if uploaded:
     with st.expander("Ver movimientos extraídos"):
         st.dataframe(df, use_container_width=True)
 
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-        df.to_excel(writer, sheet_name="Inbursa", index=False)
-    buffer.seek(0)
+    excel_bytes = frame_to_xlsx(df, "Inbursa")
 
     fname = f"inbursa_{datetime.now():%Y%m%d_%H%M%S}.xlsx"
     st.download_button(
         "Descargar Excel",
-        data=buffer,
+        data=excel_bytes,
         file_name=fname,
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
     )
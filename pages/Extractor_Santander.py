@@ -2,10 +2,7 @@ from __future__ import annotations
 
 import base64
 import mimetypes
-import os
-import tempfile
 from datetime import datetime
-from io import BytesIO
 from pathlib import Path
 from urllib.parse import urlencode
 
@@ -16,6 +13,8 @@ from core.theme import apply_theme
 from core.auth import ensure_session_from_token, auth_query_params
 from core.custom_nav import render_brand_logout_nav
 from core.extractor_santander import extraer_santander
+from core.excel_export import frame_to_xlsx
+from core.statement_cache import cached_extract
 
 ASSETS_DIR = next((p for p in (Path("Assets"), Path("assets")) if p.exists()), Path("."))
 LEFT_LOGO = ASSETS_DIR / "logo.jpg"
@@ -41,11 +40,7 @@ def _img_to_data_uri(path: Path) -> str | None:
 
 
 def _df_to_excel_bytes(df: pd.DataFrame) -> bytes:
-    buffer = BytesIO()
-    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Santander")
-    buffer.seek(0)
-    return buffer.getvalue()
+    return frame_to_xlsx(df, "Santander")
 
 
 def _summary(df: pd.DataFrame) -> dict[str, float]:
@@ -145,14 +140,9 @@ uploaded = st.file_uploader("Sube el estado de cuenta en PDF", type=["pdf"])
 if uploaded is None:
     st.markdown("<div class='hint'>Sube un PDF para comenzar.</div>", unsafe_allow_html=True)
 else:
-    tmp_path = None
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(uploaded.read())
-            tmp_path = tmp.name
-
         with st.spinner("Procesando PDF..."):
-            df = extraer_santander(tmp_path)
+            df = cached_extract(uploaded.getvalue(), extraer_santander)
 
         if df.empty:
             st.warning("No se encontraron movimientos. Verifica que el PDF contenga lineas con fecha.")
@@ -197,9 +187,3 @@ else:
     except Exception as exc:
         st.error("Ocurrio un error durante la extraccion.")
         st.exception(exc)
-    finally:
-        if tmp_path and os.path.exists(tmp_path):
-            try:
-                os.remove(tmp_path)
-            except OSError:
-                pass
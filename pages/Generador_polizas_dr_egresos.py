@@ -2,17 +2,16 @@
 
 from __future__ import annotations
 
-import io
 from datetime import datetime
 from typing import Any, Optional
 from urllib.parse import urlencode
 
 import streamlit as st
 from core.theme import apply_theme
-from openpyxl import Workbook, load_workbook
 
 from core.auth import ensure_session_from_token, auth_query_params
 from core.custom_nav import handle_logout_request, render_brand_logout_nav
+from core.polizas import OUTPUT_FORMATS, Col, Partida, PolizaTemplate, build_polizas, output_file, read_rows
 
 try:
     from openpyxl.utils.datetime import from_excel as excel_serial_to_datetime  # type: ignore
@@ -136,116 +135,57 @@ def has_signal_for_row(D, E, G) -> bool:
     return any(x not in (None, "") for x in (D, E, G))
 
 
-def write_row(ws, r, B=None, C=None, D=None, E=None, F=None, G=None):
-    if B is not None:
-        ws[f"B{r}"] = B
-    if C is not None:
-        ws[f"C{r}"] = C
-    if D is not None:
-        ws[f"D{r}"] = D
-    if E is not None:
-        ws[f"E{r}"] = E
-    if F is not None:
-        ws[f"F{r}"] = F
-    if G is not None:
-        ws[f"G{r}"] = G
-
-
-def build_output_workbook_batch(ws_src, seq_start: int) -> Workbook:
-    wb_out = Workbook()
-    ws_out = wb_out.active
-    ws_out.title = "Hoja1"
-
-    last = ws_src.max_row
-    cursor = 3
-    seq = int(seq_start)
-
-    for r in range(2, last + 1):
-        A = ws_src[f"A{r}"].value
-        B = ws_src[f"B{r}"].value
-        C = ws_src[f"C{r}"].value
-        D = ws_src[f"D{r}"].value
-        E = ws_src[f"E{r}"].value
-        F = ws_src[f"F{r}"].value
-        G = ws_src[f"G{r}"].value
-        H = ws_src[f"H{r}"].value
-        I = ws_src[f"I{r}"].value
-        J = ws_src[f"J{r}"].value
-        K = ws_src[f"K{r}"].value
-        L = ws_src[f"L{r}"].value
-        M = ws_src[f"M{r}"].value
-        N = ws_src[f"N{r}"].value
-
-        if not has_signal_for_row(D, E, G) and not any(is_diff_zero(x) for x in (B, I, J, K, L, M)):
-            continue
+# Columna fuente -> (cuenta, descripción) de cada retención; sólo si la columna no es cero.
+RETENCIONES = (
+    ("I", "2103-0009-000000", "IVA Ret  x Serv Profesionales"),
+    ("J", "2103-0012-000000", "Retención de IVA 4%"),
+    ("K", "2103-0011-000000", "IVA Ret  x Arrendamiento"),
+    ("L", "2103-0008-000000", "ISR Ret  x Serv Profesionales"),
+    ("M", "2103-0010-000000", "ISR Ret x Arrendamiento"),
+)
+
+
+def _o_vacio(value: Any) -> Any:
+    return "" if value is None else value
+
+
+def _distinto_de_cero(letter: str):
+    return lambda row: is_diff_zero(row[letter])
+
+
+def _row_has_signal(row) -> bool:
+    return has_signal_for_row(row["D"], row["E"], row["G"])
 
-        ws_out[f"A{cursor}"] = "Dr"
-        ws_out[f"B{cursor}"] = seq
-        ws_out[f"C{cursor}"] = f"Provisión Egresos Fact. {'' if F is None else F}"
-        day = extract_day(A)
-        ws_out[f"D{cursor}"] = day if day is not None else "DIA_PENDIENTE"
-
-        row1 = cursor + 1
-        if has_signal_for_row(D, E, G):
-            write_row(
-                ws_out,
-                row1,
-                B=D,
-                C=0,
-                D=E if E is not None else "",
-                E=1,
-                F=G if G is not None else "",
-                G=0,
-            )
-            next_row = row1 + 1
-        else:
-            next_row = row1
-
-        write_row(
-            ws_out,
-            next_row,
-            B="1104-0001-000000",
-            C=0,
-            D="IVA por Acreditar",
-            E=1,
-            F=H if H is not None else "",
-            G=0,
-        )
-        next_row += 1
-
-        if is_diff_zero(I):
-            write_row(ws_out, next_row, B="2103-0009-000000", C=0, D="IVA Ret  x Serv Profesionales", E=1, F=0, G=I)
-            next_row += 1
-        if is_diff_zero(J):
-            write_row(ws_out, next_row, B="2103-0012-000000", C=0, D="Retención de IVA 4%", E=1, F=0, G=J)
-            next_row += 1
-        if is_diff_zero(K):
-            write_row(ws_out, next_row, B="2103-0011-000000", C=0, D="IVA Ret  x Arrendamiento", E=1, F=0, G=K)
-            next_row += 1
-        if is_diff_zero(L):
-            write_row(ws_out, next_row, B="2103-0008-000000", C=0, D="ISR Ret  x Serv Profesionales", E=1, F=0, G=L)
-            next_row += 1
-        if is_diff_zero(M):
-            write_row(ws_out, next_row, B="2103-0010-000000", C=0, D="ISR Ret x Arrendamiento", E=1, F=0, G=M)
-            next_row += 1
-        if is_diff_zero(B):
-            write_row(ws_out, next_row, B=B, C=0, D=C if C is not None else "", E=1, F=0, G=N if N is not None else "")
-            next_row += 1
-
-        ws_out[f"B{next_row}"] = "FIN_PARTIDAS"
-        cursor = next_row + 1
-        seq += 1
-
-    return wb_out
-
-
-def process_source_excel(file_bytes: bytes, seq_start: int):
-    wb_src = load_workbook(io.BytesIO(file_bytes), data_only=True)
-    ws_src = wb_src.active
-    wb_out = build_output_workbook_batch(ws_src, seq_start)
-    out = io.BytesIO()
-    wb_out.save(out)
-    return out.getvalue()
+
+def _incluir_fila(row) -> bool:
+    return _row_has_signal(row) or any(is_diff_zero(row[c]) for c in ("B", "I", "J", "K", "L", "M"))
+
+
+def _dia(value: Any) -> Any:
+    day = extract_day(value)
+    return day if day is not None else "DIA_PENDIENTE"
+
+
+DR_EGRESOS_TEMPLATE = PolizaTemplate(
+    tipo="Dr",
+    concepto=lambda row: f"Provisión Egresos Fact. {row.text('F')}",
+    dia=Col("A", _dia),
+    include=_incluir_fila,
+    partidas=(
+        Partida(Col("D"), Col("E", _o_vacio), cargo=Col("G", _o_vacio), when=_row_has_signal),
+        Partida("1104-0001-000000", "IVA por Acreditar", cargo=Col("H", _o_vacio)),
+        *(
+            Partida(cuenta, descripcion, abono=Col(letter), when=_distinto_de_cero(letter))
+            for letter, cuenta, descripcion in RETENCIONES
+        ),
+        Partida(Col("B"), Col("C", _o_vacio), abono=Col("N", _o_vacio), when=_distinto_de_cero("B")),
+    ),
+)
+
+
+def process_source_excel(file_bytes: bytes, seq_start: int, formato: str = "xlsx"):
+    data, _ = build_polizas(DR_EGRESOS_TEMPLATE, read_rows(file_bytes), seq_start, formato=formato)
+    return data
 
 
 st.title("📄 Pólizas Dr Egresos")
@@ -257,17 +197,20 @@ seq_start = st.number_input(
     step=1,
 )
 
+formato = st.selectbox("Formato de salida", list(OUTPUT_FORMATS), format_func=OUTPUT_FORMATS.get)
+
 uploaded = st.file_uploader("Selecciona tu archivo .xlsx", type=["xlsx"])
 
 if uploaded is not None:
     try:
-        out_bytes = process_source_excel(uploaded.read(), seq_start=int(seq_start))
+        out_bytes = process_source_excel(uploaded.read(), seq_start=int(seq_start), formato=formato)
+        file_name, mime = output_file("poliza_dr_egresos", formato)
         st.success("✅ Archivo generado correctamente.")
         st.download_button(
-            label="⬇️ Descargar Excel generado",
+            label="⬇️ Descargar archivo generado",
             data=out_bytes,
-            file_name="poliza_dr_egresos.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            file_name=file_name,
+            mime=mime,
         )
     except Exception as exc:
         st.error("Ocurrió un error al procesar el archivo.")
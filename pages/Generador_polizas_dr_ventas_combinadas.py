@@ -9,11 +9,23 @@ from urllib.parse import urlencode
 
 import streamlit as st
 from core.theme import apply_theme
-from openpyxl import Workbook, load_workbook
+from openpyxl import load_workbook
 from openpyxl.utils.datetime import from_excel
 
 from core.auth import ensure_session_from_token, auth_query_params
 from core.custom_nav import handle_logout_request, render_brand_logout_nav
+from core.polizas import (
+    AMOUNT_FORMAT,
+    OUTPUT_FORMATS,
+    Col,
+    Formula,
+    Partida,
+    PolizaTemplate,
+    build_polizas,
+    has_data,
+    output_file,
+    read_rows,
+)
 
 
 def _get_params() -> dict[str, str]:
@@ -110,63 +122,40 @@ def extract_day(value: Any):
     return value
 
 
-def fila_vacia(valores):
-    return all(v is None or (isinstance(v, str) and v.strip() == "") for v in valores)
-
-
-def write_block(
-    ws_out,
-    base_row,
-    src_A,
-    src_B,
-    src_C,
-    src_D,
-    src_E,
-    src_F,
-    consecutivo,
+def poliza_template(
     cod_ingresos="4101-001-000000",
     cod_iva_tras="2104-001-000000",
     cod_ingresos_alt="4101-002-000",
-):
-    r = base_row
-
-    ws_out.cell(row=r, column=1, value="Dr")
-    ws_out.cell(row=r, column=2, value=int(consecutivo))
-    ws_out.cell(row=r, column=3, value=f"Provisión Fact. {'' if src_D is None else src_D}")
-    ws_out.cell(row=r, column=4, value=extract_day(src_A))
-
-    ws_out.cell(row=r + 1, column=2, value=src_B)
-    ws_out.cell(row=r + 1, column=3, value=0)
-    ws_out.cell(row=r + 1, column=4, value=src_C)
-    ws_out.cell(row=r + 1, column=5, value=1)
-    ws_out.cell(row=r + 1, column=6, value=src_F)
-    ws_out.cell(row=r + 1, column=7, value=0)
-
-    ws_out.cell(row=r + 2, column=2, value=cod_ingresos)
-    ws_out.cell(row=r + 2, column=3, value=0)
-    ws_out.cell(row=r + 2, column=4, value="Ingresos al 16%")
-    ws_out.cell(row=r + 2, column=5, value=1)
-    ws_out.cell(row=r + 2, column=6, value=0)
-    ws_out.cell(row=r + 2, column=7, value=f"=G{r+4}/0.16")
-    ws_out.cell(row=r + 2, column=7).number_format = "0.00"
-
-    ws_out.cell(row=r + 3, column=2, value=cod_ingresos_alt)
-    ws_out.cell(row=r + 3, column=3, value=0)
-    ws_out.cell(row=r + 3, column=4, value="Ingresos al 0%")
-    ws_out.cell(row=r + 3, column=5, value=1)
-    ws_out.cell(row=r + 3, column=6, value=0)
-    ws_out.cell(row=r + 3, column=7, value=f"=F{r+1}-G{r+2}-G{r+4}")
-    ws_out.cell(row=r + 3, column=7).number_format = "0.00"
-
-    ws_out.cell(row=r + 4, column=2, value=cod_iva_tras)
-    ws_out.cell(row=r + 4, column=3, value=0)
-    ws_out.cell(row=r + 4, column=4, value="IVA trasladado no cobrado")
-    ws_out.cell(row=r + 4, column=5, value=1)
-    ws_out.cell(row=r + 4, column=6, value=0)
-    ws_out.cell(row=r + 4, column=7, value=src_E)
-    ws_out.cell(row=r + 4, column=7).number_format = "0.00"
-
-    ws_out.cell(row=r + 5, column=2, value="FIN_PARTIDAS")
+) -> PolizaTemplate:
+    return PolizaTemplate(
+        tipo="Dr",
+        concepto=lambda row: f"Provisión Fact. {row.text('D')}",
+        dia=Col("A", extract_day),
+        include=has_data("A", "B", "C", "D", "E", "F"),
+        partidas=(
+            Partida(Col("B"), Col("C"), cargo=Col("F"), key="cliente"),
+            Partida(
+                cod_ingresos,
+                "Ingresos al 16%",
+                abono=Formula("=G{iva}/0.16"),
+                abono_format=AMOUNT_FORMAT,
+                key="ingresos",
+            ),
+            Partida(
+                cod_ingresos_alt,
+                "Ingresos al 0%",
+                abono=Formula("=F{cliente}-G{ingresos}-G{iva}"),
+                abono_format=AMOUNT_FORMAT,
+            ),
+            Partida(
+                cod_iva_tras,
+                "IVA trasladado no cobrado",
+                abono=Col("E"),
+                abono_format=AMOUNT_FORMAT,
+                key="iva",
+            ),
+        ),
+    )
 
 
 def build_stacked_output(
@@ -175,55 +164,17 @@ def build_stacked_output(
     cod_ingresos="4101-001-000000",
     cod_iva_tras="2104-001-000000",
     cod_ingresos_alt="4101-002-000",
+    formato="xlsx",
 ) -> bytes:
-    wb_src = load_workbook(filename=BytesIO(src_bytes), data_only=True)
-    ws_src = wb_src.active
-
-    wb_out = Workbook()
-    ws_out = wb_out.active
-    ws_out.title = "Hoja1"
-
-    current = 3
-    max_row = ws_src.max_row
-    generadas = 0
-    consecutivo = int(consecutivo_inicial)
-
-    for r in range(2, max_row + 1):
-        A = ws_src.cell(row=r, column=1).value
-        B = ws_src.cell(row=r, column=2).value
-        C = ws_src.cell(row=r, column=3).value
-        D = ws_src.cell(row=r, column=4).value
-        E = ws_src.cell(row=r, column=5).value
-        F = ws_src.cell(row=r, column=6).value
-
-        if fila_vacia((A, B, C, D, E, F)):
-            continue
-
-        write_block(
-            ws_out,
-            current,
-            A,
-            B,
-            C,
-            D,
-            E,
-            F,
-            consecutivo,
-            cod_ingresos,
-            cod_iva_tras,
-            cod_ingresos_alt,
-        )
-        current += 6
-        consecutivo += 1
-        generadas += 1
-
+    data, generadas = build_polizas(
+        poliza_template(cod_ingresos, cod_iva_tras, cod_ingresos_alt),
+        read_rows(src_bytes),
+        consecutivo_inicial,
+        formato=formato,
+    )
     if generadas == 0:
         raise ValueError("No se encontraron filas con datos desde la fila 2 en las columnas A–F.")
-
-    buf = BytesIO()
-    wb_out.save(buf)
-    buf.seek(0)
-    return buf.getvalue()
+    return data
 
 
 def render_tab(
@@ -246,6 +197,12 @@ def render_tab(
         step=1,
         key=f"{key_prefix}_consec",
     )
+    formato = st.selectbox(
+        "Formato de salida",
+        list(OUTPUT_FORMATS),
+        format_func=OUTPUT_FORMATS.get,
+        key=f"{key_prefix}_formato",
+    )
 
     if uploaded:
         if st.button("Generar archivo apilado", key=f"{key_prefix}_btn"):
@@ -256,13 +213,15 @@ def render_tab(
                     cod_ingresos=cod_ingresos_override or "4101-001-000000",
                     cod_iva_tras=cod_iva_tras_override or "2104-001-000000",
                     cod_ingresos_alt=cod_ingresos_alt_override or "4101-002-000",
+                    formato=formato,
                 )
                 st.success(f"Archivo generado con todos los procesos apilados ({tab_label}).")
+                file_name, mime = output_file(f"Salidas_Apiladas_{tab_label}", formato)
                 st.download_button(
-                    "⬇️ Descargar Excel",
+                    "⬇️ Descargar archivo",
                     data=data,
-                    file_name=f"Salidas_Apiladas_{tab_label}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    file_name=file_name,
+                    mime=mime,
                     key=f"{key_prefix}_dl",
                 )
             except Exception as e:
@@ -9,11 +9,23 @@ from urllib.parse import urlencode
 
 import streamlit as st
 from core.theme import apply_theme
-from openpyxl import Workbook, load_workbook
+from openpyxl import load_workbook
 from openpyxl.utils.datetime import from_excel
 
 from core.auth import ensure_session_from_token, auth_query_params
 from core.custom_nav import handle_logout_request, render_brand_logout_nav
+from core.polizas import (
+    AMOUNT_FORMAT,
+    OUTPUT_FORMATS,
+    Col,
+    Formula,
+    Partida,
+    PolizaTemplate,
+    build_polizas,
+    has_data,
+    output_file,
+    read_rows,
+)
 
 
 def _get_params() -> dict[str, str]:
@@ -115,53 +127,31 @@ def extract_day(value):
     return value
 
 
-def fila_vacia(valores):
-    return all(v is None or (isinstance(v, str) and v.strip() == "") for v in valores)
-
-
-def write_block_sin7(
-    ws_out,
-    base_row,
-    src_A,
-    src_B,
-    src_C,
-    src_D,
-    src_E,
-    consecutivo,
+def poliza_template(
     cod_ingresos="4101-001-000000",
     cod_iva_tras="2104-001-000000",
-):
-    r = base_row
-
-    ws_out.cell(row=r, column=1, value="Dr")
-    ws_out.cell(row=r, column=2, value=int(consecutivo))
-    ws_out.cell(row=r, column=3, value=f"Provisión Fact. {'' if src_D is None else src_D}")
-    ws_out.cell(row=r, column=4, value=extract_day(src_A))
-
-    ws_out.cell(row=r + 1, column=2, value=src_B)
-    ws_out.cell(row=r + 1, column=3, value=0)
-    ws_out.cell(row=r + 1, column=4, value=src_C)
-    ws_out.cell(row=r + 1, column=5, value=1)
-    ws_out.cell(row=r + 1, column=6, value=src_E)
-    ws_out.cell(row=r + 1, column=7, value=0)
-
-    ws_out.cell(row=r + 2, column=2, value=cod_ingresos)
-    ws_out.cell(row=r + 2, column=3, value=0)
-    ws_out.cell(row=r + 2, column=4, value="Ingresos por coordinados 16%")
-    ws_out.cell(row=r + 2, column=5, value=1)
-    ws_out.cell(row=r + 2, column=6, value=0)
-    ws_out.cell(row=r + 2, column=7, value=f"=F{r+1}/1.16")
-    ws_out.cell(row=r + 2, column=7).number_format = "0.00"
-
-    ws_out.cell(row=r + 3, column=2, value=cod_iva_tras)
-    ws_out.cell(row=r + 3, column=3, value=0)
-    ws_out.cell(row=r + 3, column=4, value="IVA trasladado no cobrado")
-    ws_out.cell(row=r + 3, column=5, value=1)
-    ws_out.cell(row=r + 3, column=6, value=0)
-    ws_out.cell(row=r + 3, column=7, value=f"=F{r+1}/1.16*0.16")
-    ws_out.cell(row=r + 3, column=7).number_format = "0.00"
-
-    ws_out.cell(row=r + 4, column=2, value="FIN_PARTIDAS")
+) -> PolizaTemplate:
+    return PolizaTemplate(
+        tipo="Dr",
+        concepto=lambda row: f"Provisión Fact. {row.text('D')}",
+        dia=Col("A", extract_day),
+        include=has_data("A", "B", "C", "D", "E"),
+        partidas=(
+            Partida(Col("B"), Col("C"), cargo=Col("E"), key="cliente"),
+            Partida(
+                cod_ingresos,
+                "Ingresos por coordinados 16%",
+                abono=Formula("=F{cliente}/1.16"),
+                abono_format=AMOUNT_FORMAT,
+            ),
+            Partida(
+                cod_iva_tras,
+                "IVA trasladado no cobrado",
+                abono=Formula("=F{cliente}/1.16*0.16"),
+                abono_format=AMOUNT_FORMAT,
+            ),
+        ),
+    )
 
 
 def build_stacked_output_sin7(
@@ -169,52 +159,17 @@ def build_stacked_output_sin7(
     consecutivo_inicial: int,
     cod_ingresos="4101-001-000000",
     cod_iva_tras="2104-001-000000",
+    formato="xlsx",
 ) -> bytes:
-    wb_src = load_workbook(filename=BytesIO(src_bytes), data_only=True)
-    ws_src = wb_src.active
-
-    wb_out = Workbook()
-    ws_out = wb_out.active
-    ws_out.title = "Hoja1"
-
-    current = 3
-    max_row = ws_src.max_row
-    generadas = 0
-    consecutivo = int(consecutivo_inicial)
-
-    for r in range(2, max_row + 1):
-        A = ws_src.cell(row=r, column=1).value
-        B = ws_src.cell(row=r, column=2).value
-        C = ws_src.cell(row=r, column=3).value
-        D = ws_src.cell(row=r, column=4).value
-        E = ws_src.cell(row=r, column=5).value
-
-        if fila_vacia((A, B, C, D, E)):
-            continue
-
-        write_block_sin7(
-            ws_out,
-            current,
-            A,
-            B,
-            C,
-            D,
-            E,
-            consecutivo,
-            cod_ingresos,
-            cod_iva_tras,
-        )
-        current += 5
-        consecutivo += 1
-        generadas += 1
-
+    data, generadas = build_polizas(
+        poliza_template(cod_ingresos, cod_iva_tras),
+        read_rows(src_bytes),
+        consecutivo_inicial,
+        formato=formato,
+    )
     if generadas == 0:
         raise ValueError("No se encontraron filas con datos desde la fila 2 en las columnas A–E.")
-
-    buf = BytesIO()
-    wb_out.save(buf)
-    buf.seek(0)
-    return buf.getvalue()
+    return data
 
 
 def render_tab(tab_label, key_prefix, cod_ingresos_override=None, cod_iva_tras_override=None):
@@ -231,6 +186,12 @@ def render_tab(tab_label, key_prefix, cod_ingresos_override=None, cod_iva_tras_o
         step=1,
         key=f"{key_prefix}_consec",
     )
+    formato = st.selectbox(
+        "Formato de salida",
+        list(OUTPUT_FORMATS),
+        format_func=OUTPUT_FORMATS.get,
+        key=f"{key_prefix}_formato",
+    )
 
     if uploaded:
         if st.button("Generar archivo apilado", key=f"{key_prefix}_btn"):
@@ -240,13 +201,15 @@ def render_tab(tab_label, key_prefix, cod_ingresos_override=None, cod_iva_tras_o
                     consecutivo_inicial=consec_ini,
                     cod_ingresos=cod_ingresos_override or "4101-001-000000",
                     cod_iva_tras=cod_iva_tras_override or "2104-001-000000",
+                    formato=formato,
                 )
                 st.success(f"Archivo generado con todos los procesos apilados ({tab_label}).")
+                file_name, mime = output_file(f"Salidas_Apiladas_{tab_label}", formato)
                 st.download_button(
-                    "⬇️ Descargar Excel",
+                    "⬇️ Descargar archivo",
                     data=data,
-                    file_name=f"Salidas_Apiladas_{tab_label}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    file_name=file_name,
+                    mime=mime,
                     key=f"{key_prefix}_dl",
                 )
             except Exception as e:
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+from dataclasses import replace
 from datetime import datetime
 from io import BytesIO
 from typing import Any, Optional
@@ -9,11 +10,24 @@ from urllib.parse import urlencode
 
 import streamlit as st
 from core.theme import apply_theme
-from openpyxl import Workbook, load_workbook
+from openpyxl import load_workbook
 from openpyxl.utils.datetime import from_excel
 
 from core.auth import ensure_session_from_token, auth_query_params
 from core.custom_nav import handle_logout_request, render_brand_logout_nav
+from core.polizas import (
+    OUTPUT_FORMATS,
+    START_ROW,
+    Col,
+    Partida,
+    PolizaTemplate,
+    drop_zero_lines,
+    has_data,
+    output_file,
+    read_rows,
+    render_blocks,
+    write_output,
+)
 
 
 def _get_params() -> dict[str, str]:
@@ -115,10 +129,6 @@ def extract_day(value):
     return value
 
 
-def fila_vacia(valores):
-    return all(v is None or (isinstance(v, str) and v.strip() == "") for v in valores)
-
-
 def parse_number(x) -> Optional[float]:
     if x is None:
         return None
@@ -139,47 +149,11 @@ def number_format_from_decimals(decimals: int) -> str:
     return "0." + ("0" * decimals)
 
 
-def write_number(cell, value, decimals: int):
-    cell.value = value
-    cell.number_format = number_format_from_decimals(decimals)
-
-
-def is_zero_like(val) -> bool:
-    if val is None:
-        return True
-    if isinstance(val, (int, float)):
-        return abs(val) < 1e-9
-    return False
-
-
-def prune_zero_rows(ws_out, preserve_prefix: str = "1103-"):
-    row = 1
-    while row <= ws_out.max_row:
-        a = ws_out.cell(row=row, column=1).value
-        b = ws_out.cell(row=row, column=2).value
-        f = ws_out.cell(row=row, column=6).value
-        g = ws_out.cell(row=row, column=7).value
-
-        if a is None:
-            if not (isinstance(b, str) and b.startswith(preserve_prefix)):
-                if is_zero_like(f) and is_zero_like(g):
-                    ws_out.delete_rows(row, 1)
-                    continue
-        row += 1
-
-
-def write_block(
-    ws_out,
-    base_row,
-    src_A,
-    src_B,
-    src_C,
-    src_D,
-    src_E,
-    src_F,
-    src_G,
-    src_H,
-    consecutivo: int,
+def _importe(value) -> float:
+    return parse_number(value) or 0.0
+
+
+def poliza_template(
     cod_ingresos: str,
     cod_iva_tras: str,
     cod_iva_ret: str,
@@ -188,51 +162,22 @@ def write_block(
     desc_iva_ret: str,
     incluir_fila7: bool,
     decimales: int,
-) -> int:
-    r = base_row
-
-    ws_out.cell(row=r, column=1, value="Dr.")
-    ws_out.cell(row=r, column=2, value=int(consecutivo))
-    ws_out.cell(row=r, column=3, value=f"Provisión Fact. {'' if src_D is None else src_D}")
-    ws_out.cell(row=r, column=4, value=extract_day(src_A))
-
-    ws_out.cell(row=r + 1, column=2, value=src_B)
-    ws_out.cell(row=r + 1, column=3, value=0)
-    ws_out.cell(row=r + 1, column=4, value=src_C)
-    ws_out.cell(row=r + 1, column=5, value=1)
-    val_h = parse_number(src_H) or 0.0
-    write_number(ws_out.cell(row=r + 1, column=6), val_h, decimales)
-    write_number(ws_out.cell(row=r + 1, column=7), 0.0, decimales)
-
-    ws_out.cell(row=r + 2, column=2, value=cod_ingresos)
-    ws_out.cell(row=r + 2, column=3, value=0)
-    ws_out.cell(row=r + 2, column=4, value=desc_ingresos)
-    ws_out.cell(row=r + 2, column=5, value=1)
-    write_number(ws_out.cell(row=r + 2, column=6), 0.0, decimales)
-    val_e = parse_number(src_E) or 0.0
-    write_number(ws_out.cell(row=r + 2, column=7), val_e, decimales)
-
-    ws_out.cell(row=r + 3, column=2, value=cod_iva_tras)
-    ws_out.cell(row=r + 3, column=3, value=0)
-    ws_out.cell(row=r + 3, column=4, value=desc_iva_tras)
-    ws_out.cell(row=r + 3, column=5, value=1)
-    write_number(ws_out.cell(row=r + 3, column=6), 0.0, decimales)
-    val_f = parse_number(src_F) or 0.0
-    write_number(ws_out.cell(row=r + 3, column=7), val_f, decimales)
-
+) -> PolizaTemplate:
+    fmt = number_format_from_decimals(decimales)
+    partidas = [
+        Partida(Col("B"), Col("C"), cargo=Col("H", _importe), abono=0.0),
+        Partida(cod_ingresos, desc_ingresos, cargo=0.0, abono=Col("E", _importe)),
+        Partida(cod_iva_tras, desc_iva_tras, cargo=0.0, abono=Col("F", _importe)),
+    ]
     if incluir_fila7:
-        ws_out.cell(row=r + 4, column=2, value=cod_iva_ret)
-        ws_out.cell(row=r + 4, column=3, value=0)
-        ws_out.cell(row=r + 4, column=4, value=desc_iva_ret)
-        ws_out.cell(row=r + 4, column=5, value=1)
-        val_g = parse_number(src_G) or 0.0
-        write_number(ws_out.cell(row=r + 4, column=6), val_g, decimales)
-        write_number(ws_out.cell(row=r + 4, column=7), 0.0, decimales)
-        ws_out.cell(row=r + 5, column=2, value="FIN_PARTIDAS")
-        return 6
-    else:
-        ws_out.cell(row=r + 4, column=2, value="FIN_PARTIDAS")
-        return 5
+        partidas.append(Partida(cod_iva_ret, desc_iva_ret, cargo=Col("G", _importe), abono=0.0))
+    return PolizaTemplate(
+        tipo="Dr.",
+        concepto=lambda row: f"Provisión Fact. {row.text('D')}",
+        dia=Col("A", extract_day),
+        include=has_data("A", "B", "C", "D", "E"),
+        partidas=tuple(replace(p, cargo_format=fmt, abono_format=fmt) for p in partidas),
+    )
 
 
 def build_stacked_output(
@@ -248,67 +193,34 @@ def build_stacked_output(
     eliminar_filas_cero=False,
     decimales=2,
     sheet_title="Hoja1",
+    formato="xlsx",
 ) -> bytes:
-    wb_src = load_workbook(filename=BytesIO(src_bytes), data_only=True)
-    ws_src = wb_src.active
-
-    wb_out = Workbook()
-    ws_out = wb_out.active
-    ws_out.title = sheet_title
-
-    current = 3
-    max_row = ws_src.max_row
-    generadas = 0
-    consecutivo = int(consecutivo_inicial)
-
-    for r in range(2, max_row + 1):
-        A = ws_src.cell(row=r, column=1).value
-        B = ws_src.cell(row=r, column=2).value
-        C = ws_src.cell(row=r, column=3).value
-        D = ws_src.cell(row=r, column=4).value
-        E = ws_src.cell(row=r, column=5).value
-        F = ws_src.cell(row=r, column=6).value
-        G = ws_src.cell(row=r, column=7).value
-        H = ws_src.cell(row=r, column=8).value
-
-        if fila_vacia((A, B, C, D, E)):
-            continue
-
-        wrote = write_block(
-            ws_out,
-            base_row=current,
-            src_A=A,
-            src_B=B,
-            src_C=C,
-            src_D=D,
-            src_E=E,
-            src_F=F,
-            src_G=G,
-            src_H=H,
-            consecutivo=consecutivo,
-            cod_ingresos=cod_ingresos,
-            cod_iva_tras=cod_iva_tras,
-            cod_iva_ret=cod_iva_ret,
-            desc_ingresos=desc_ingresos,
-            desc_iva_tras=desc_iva_tras,
-            desc_iva_ret=desc_iva_ret,
-            incluir_fila7=incluir_fila7,
-            decimales=decimales,
-        )
-        current += wrote
-        consecutivo += 1
-        generadas += 1
-
+    template = poliza_template(
+        cod_ingresos,
+        cod_iva_tras,
+        cod_iva_ret,
+        desc_ingresos,
+        desc_iva_tras,
+        desc_iva_ret,
+        incluir_fila7,
+        decimales,
+    )
+    blocks = render_blocks(template, read_rows(src_bytes), consecutivo_inicial)
+    start_row = START_ROW
+    if eliminar_filas_cero:
+        # Sin partidas en cero ni FIN_PARTIDAS; la hoja empieza en la fila 1.
+        blocks = drop_zero_lines(blocks, preserve_prefix="1103-")
+        start_row = 1
+    data, generadas = write_output(
+        blocks,
+        formato,
+        sheet_title=sheet_title,
+        start_row=start_row,
+        decimals=decimales,
+    )
     if generadas == 0:
         raise ValueError("No se encontraron filas con datos desde la fila 2 en las columnas A–E.")
-
-    if eliminar_filas_cero:
-        prune_zero_rows(ws_out, preserve_prefix="1103-")
-
-    buf = BytesIO()
-    wb_out.save(buf)
-    buf.seek(0)
-    return buf.getvalue()
+    return data
 
 
 def render_tab(
@@ -330,6 +242,12 @@ def render_tab(
         step=1,
         key=f"consec_{tab_label}",
     )
+    formato = st.selectbox(
+        "Formato de salida",
+        list(OUTPUT_FORMATS),
+        format_func=OUTPUT_FORMATS.get,
+        key=f"formato_{tab_label}",
+    )
 
     with st.expander("⚙️ Opciones"):
         incluir_fila7 = st.checkbox(
@@ -406,13 +324,15 @@ def render_tab(
                     eliminar_filas_cero=eliminar_filas_cero,
                     decimales=decimales,
                     sheet_title=sheet_title,
+                    formato=formato,
                 )
                 st.success(f"Archivo generado con todos los procesos apilados ({tab_label}).")
+                file_name, mime = output_file(f"Salidas_Apiladas_{tab_label}", formato)
                 st.download_button(
-                    "⬇️ Descargar Excel",
+                    "⬇️ Descargar archivo",
                     data=data,
-                    file_name=f"Salidas_Apiladas_{tab_label}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    file_name=file_name,
+                    mime=mime,
                     key=f"dl_{tab_label}",
                 )
             except Exception as e:
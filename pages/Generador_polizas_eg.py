@@ -3,16 +3,15 @@
 from __future__ import annotations
 
 from datetime import datetime, date
-from io import BytesIO
 from urllib.parse import urlencode
 
 import streamlit as st
 from core.theme import apply_theme
-from openpyxl import Workbook, load_workbook
 from openpyxl.utils.datetime import from_excel as from_excel_serial
 
 from core.auth import ensure_session_from_token, auth_query_params
 from core.custom_nav import handle_logout_request, render_brand_logout_nav
+from core.polizas import OUTPUT_FORMATS, Col, Partida, PolizaTemplate, build_polizas, output_file, read_rows
 
 
 def _get_params() -> dict[str, str]:
@@ -99,6 +98,8 @@ consecutivo_inicial = st.number_input(
     step=1,
 )
 
+formato = st.selectbox("Formato de salida", list(OUTPUT_FORMATS), format_func=OUTPUT_FORMATS.get)
+
 uploaded = st.file_uploader("📎 Sube tu Excel fuente (.xlsx)", type=["xlsx"])
 
 
@@ -153,151 +154,65 @@ def to_number_if_possible(v):
     return v
 
 
-def write_row(ws, row, B=None, C=None, D=None, E=None, F=None, G=None):
-    if B is not None:
-        ws[f"B{row}"] = B
-    if C is not None:
-        ws[f"C{row}"] = C
-    if D is not None:
-        ws[f"D{row}"] = D
-    if E is not None:
-        ws[f"E{row}"] = E
-    if F is not None:
-        ws[f"F{row}"] = F
-    if G is not None:
-        ws[f"G{row}"] = G
-
-
-def generar_excel_salida(wb_src_bytes: bytes, consecutivo_b3_inicial: int) -> bytes:
-    wb_src = load_workbook(BytesIO(wb_src_bytes), data_only=True)
-    ws_src = wb_src.active
-
-    wb_dst = Workbook()
-    ws_dst = wb_dst.active
-
-    out_row = 3
-    consecutivo = int(consecutivo_b3_inicial)
-
-    max_row = ws_src.max_row if ws_src.max_row else 2
-    for r in range(2, max_row + 1):
-        A = ws_src[f"A{r}"].value
-        B = ws_src[f"B{r}"].value
-        C = ws_src[f"C{r}"].value
-        D = ws_src[f"D{r}"].value
-        E = ws_src[f"E{r}"].value
-        F = ws_src[f"F{r}"].value
-        G = ws_src[f"G{r}"].value
-        H = ws_src[f"H{r}"].value
-        N = ws_src[f"N{r}"].value
-        O = ws_src[f"O{r}"].value
-        P = ws_src[f"P{r}"].value
-        Q = ws_src[f"Q{r}"].value
-        R = ws_src[f"R{r}"].value
-
-        if all(v in (None, "") for v in (A, B, C, D, E, F, G, H, N, O, P, Q, R)):
-            continue
-
-        ws_dst[f"A{out_row}"] = "Eg"
-        ws_dst[f"B{out_row}"] = consecutivo
-        ws_dst[f"C{out_row}"] = f"Pago Fact. {'' if F is None else str(F)}"
-        ws_dst[f"D{out_row}"] = extract_day(A)
-
-        write_row(
-            ws_dst,
-            out_row + 1,
-            B="" if B is None else str(B),
-            C=0,
-            D="" if C is None else str(C),
-            E=1,
-            F=N,
-            G=0,
-        )
+SOURCE_COLUMNS = ("A", "B", "C", "D", "E", "F", "G", "H", "N", "O", "P", "Q", "R")
+
+
+def _texto(letter):
+    return lambda row: row.text(letter)
+
+
+def _tiene_datos(row) -> bool:
+    return not all(row[c] in (None, "") for c in SOURCE_COLUMNS)
+
+
+EG_TEMPLATE = PolizaTemplate(
+    tipo="Eg",
+    concepto=lambda row: f"Pago Fact. {row.text('F')}",
+    dia=Col("A", extract_day),
+    include=_tiene_datos,
+    partidas=(
+        Partida(_texto("B"), _texto("C"), cargo=Col("N")),
+        Partida(_texto("D"), _texto("E"), abono=Col("N")),
+        Partida(
+            "1106-0001-000000",
+            "IVA Acrediatable",
+            cargo=Col("H", to_number_if_possible),
+            when=lambda row: is_nonzero(row["H"]),
+        ),
+        Partida(
+            "1106-0002-000000",
+            "IVA por Acreditar",
+            abono=Col("H", to_number_if_possible),
+            when=lambda row: is_nonzero(row["H"]),
+        ),
+        Partida(Col("O"), Col("P"), cargo=Col("G", to_number_if_possible), when=lambda row: is_nonzero(row["O"])),
+        Partida(Col("Q"), Col("R"), abono=Col("G", to_number_if_possible), when=lambda row: is_nonzero(row["O"])),
+    ),
+    fin_partidas=lambda row: not_literal_zero(row["B"]),
+)
 
-        write_row(
-            ws_dst,
-            out_row + 2,
-            B="" if D is None else str(D),
-            C=0,
-            D="" if E is None else str(E),
-            E=1,
-            F=0,
-            G=N,
-        )
 
-        cursor = out_row + 3
-
-        if is_nonzero(H):
-            h_val = to_number_if_possible(H)
-            write_row(
-                ws_dst,
-                cursor,
-                B="1106-0001-000000",
-                C=0,
-                D="IVA Acrediatable",
-                E=1,
-                F=h_val,
-                G=0,
-            )
-            cursor += 1
-            write_row(
-                ws_dst,
-                cursor,
-                B="1106-0002-000000",
-                C=0,
-                D="IVA por Acreditar",
-                E=1,
-                F=0,
-                G=h_val,
-            )
-            cursor += 1
-
-        if is_nonzero(O):
-            g_val = to_number_if_possible(G)
-            write_row(
-                ws_dst,
-                cursor,
-                B=O,
-                C=0,
-                D=P,
-                E=1,
-                F=g_val,
-                G=0,
-            )
-            cursor += 1
-            write_row(
-                ws_dst,
-                cursor,
-                B=Q,
-                C=0,
-                D=R,
-                E=1,
-                F=0,
-                G=g_val,
-            )
-            cursor += 1
-
-        if not_literal_zero(B):
-            write_row(ws_dst, cursor, B="FIN_PARTIDAS")
-            cursor += 1
-
-        out_row = cursor
-        consecutivo += 1
-
-    bio = BytesIO()
-    wb_dst.save(bio)
-    bio.seek(0)
-    return bio.read()
+def generar_excel_salida(wb_src_bytes: bytes, consecutivo_b3_inicial: int, formato: str = "xlsx") -> bytes:
+    data, _ = build_polizas(
+        EG_TEMPLATE,
+        read_rows(wb_src_bytes),
+        consecutivo_b3_inicial,
+        sheet_title="Sheet",
+        formato=formato,
+    )
+    return data
 
 
 if uploaded:
     try:
-        out_bytes = generar_excel_salida(uploaded.read(), consecutivo_inicial)
-        st.success("✅ ¡Excel generado con éxito!")
+        out_bytes = generar_excel_salida(uploaded.read(), consecutivo_inicial, formato)
+        file_name, mime = output_file("Poliza_Generada", formato)
+        st.success("✅ ¡Archivo generado con éxito!")
         st.download_button(
-            label="⬇️ Descargar Excel generado",
+            label="⬇️ Descargar archivo generado",
             data=out_bytes,
-            file_name="Poliza_Generada.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            file_name=file_name,
+            mime=mime,
         )
     except Exception as e:
         st.error(f"❌ Ocurrió un error al procesar el archivo: {e}")
@@ -2,16 +2,26 @@
 
 from __future__ import annotations
 
-import io
 from datetime import datetime
 from urllib.parse import urlencode
 
 import streamlit as st
 from core.theme import apply_theme
-from openpyxl import Workbook, load_workbook
 
 from core.auth import ensure_session_from_token, auth_query_params
 from core.custom_nav import handle_logout_request, render_brand_logout_nav
+from core.polizas import (
+    AMOUNT_FORMAT,
+    OUTPUT_FORMATS,
+    Col,
+    Formula,
+    Partida,
+    PolizaTemplate,
+    build_polizas,
+    has_data,
+    output_file,
+    read_rows,
+)
 
 
 def _get_params() -> dict[str, str]:
@@ -121,71 +131,34 @@ def obtener_dia(valor):
     return valor
 
 
-def escribir_bloque_base(ws, base, A, B, C, D, E, F, G, b3_val, codigo_b6, codigo_b7):
-    ws[f"A{base}"] = "Ig"
-    ws[f"C{base}"] = f'Cobranza Fact. {D if D is not None else ""}'
-    ws[f"D{base}"] = obtener_dia(A)
-    ws[f"B{base}"] = b3_val
-
-    ws[f"B{base+1}"] = F
-    ws[f"D{base+1}"] = G
-
-    e_num = parse_number(E)
-    ws[f"F{base+1}"] = e_num
-    ws[f"F{base+1}"].number_format = "0.00"
-
-    ws[f"G{base+2}"] = e_num
-    ws[f"B{base+2}"] = B
-    ws[f"D{base+2}"] = C
-
-    ws[f"B{base+3}"] = codigo_b6
-    ws[f"B{base+4}"] = codigo_b7
-    ws[f"D{base+3}"] = "IVA por Trasladar"
-    ws[f"D{base+4}"] = "IVA Trasladado"
-
-    ws[f"F{base+3}"] = f"=F{base+1}/1.16*0.16"
-    ws[f"G{base+4}"] = f"=F{base+1}/1.16*0.16"
-    ws[f"F{base+3}"].number_format = "0.00"
-    ws[f"G{base+4}"].number_format = "0.00"
-
-    for cell in [f"C{base+1}", f"C{base+2}", f"C{base+3}", f"C{base+4}", f"G{base+1}", f"G{base+3}", f"F{base+2}", f"F{base+4}"]:
-        ws[cell] = 0
-    for cell in [f"E{base+1}", f"E{base+2}", f"E{base+3}", f"E{base+4}"]:
-        ws[cell] = 1
-    ws[f"B{base+5}"] = "FIN_PARTIDAS"
-
-
-def escribir_bloque_433(ws, *args):
-    return escribir_bloque_base(ws, *args, "2104-001-000", "2104-002-000")
-
-
-def escribir_bloque_434(ws, *args):
-    return escribir_bloque_base(ws, *args, "2104-001-0000", "2104-002-0000")
+def _cobro(*extra: Partida) -> PolizaTemplate:
+    return PolizaTemplate(
+        tipo="Ig",
+        concepto=lambda row: f"Cobranza Fact. {row.text('D')}",
+        dia=Col("A", obtener_dia),
+        include=has_data("A", "B", "C", "D", "E", "F", "G", blank_strings=False),
+        partidas=(
+            Partida(Col("F"), Col("G"), cargo=Col("E", parse_number), cargo_format=AMOUNT_FORMAT, key="cobro"),
+            Partida(Col("B"), Col("C"), abono=Col("E", parse_number)),
+            *extra,
+        ),
+    )
 
 
-def escribir_bloque_436(ws, *args):
-    return escribir_bloque_base(ws, *args, "2104-001-000000", "2104-002-000000")
+def plantilla_con_iva(codigo_b6: str, codigo_b7: str) -> PolizaTemplate:
+    return _cobro(
+        Partida(codigo_b6, "IVA por Trasladar", cargo=Formula("=F{cobro}/1.16*0.16"), cargo_format=AMOUNT_FORMAT),
+        Partida(codigo_b7, "IVA Trasladado", abono=Formula("=F{cobro}/1.16*0.16"), abono_format=AMOUNT_FORMAT),
+    )
 
 
-def procesar_base(rows, b3_inicial, writer_func):
-    dst_wb = Workbook()
-    ws = dst_wb.active
-    ws.title = "Hoja1"
-    start_row, block_height, idx = 3, 6, 0
+PLANTILLA_433 = plantilla_con_iva("2104-001-000", "2104-002-000")
+PLANTILLA_434 = plantilla_con_iva("2104-001-0000", "2104-002-0000")
+PLANTILLA_436 = plantilla_con_iva("2104-001-000000", "2104-002-000000")
 
-    for row in rows:
-        A, B, C, D, E, F, G = (list(row) + [None] * 7)[:7]
-        if all(v is None for v in [A, B, C, D, E, F, G]):
-            continue
-        base = start_row + idx * block_height
-        b3_val = int(b3_inicial) + idx
-        writer_func(ws, base, A, B, C, D, E, F, G, b3_val)
-        idx += 1
 
-    buf = io.BytesIO()
-    dst_wb.save(buf)
-    buf.seek(0)
-    return buf.getvalue(), idx
+def procesar_base(rows, b3_inicial, plantilla, formato="xlsx"):
+    return build_polizas(plantilla, rows, b3_inicial, formato=formato)
 
 
 def get_b3_inicial():
@@ -196,17 +169,36 @@ def get_uploaded_bytes():
     return st.session_state.get("uploaded_file_bytes", None)
 
 
-def set_result(label, filename, data_bytes, blocks):
+def get_formato():
+    return st.session_state.get("formato_salida", "xlsx")
+
+
+def set_result(label, stem, data_bytes, blocks):
+    filename, mime = output_file(stem, get_formato())
     st.session_state.update(
         {
             "result_label": label,
             "result_filename": filename,
+            "result_mime": mime,
             "result_bytes": data_bytes,
             "result_blocks": blocks,
         }
     )
 
 
+def generar(label, stem, plantilla):
+    formato = get_formato()
+    # Para el TXT se calculan las fórmulas en Python: de la fuente se toma el
+    # valor que Excel guardó, no la fórmula (el libro sí la conserva).
+    rows = read_rows(get_uploaded_bytes(), data_only=formato != "xlsx")
+    try:
+        data, n = procesar_base(rows, get_b3_inicial(), plantilla, formato)
+    except Exception as e:
+        st.error(f"Ocurrió un error: {e}")
+        return
+    set_result(label, stem, data, n)
+
+
 st.number_input(
     "Número de Poliza Siguiente:",
     key="b3_inicial",
@@ -215,6 +207,12 @@ st.number_input(
     step=1,
     format="%d",
 )
+st.selectbox(
+    "Formato de salida",
+    list(OUTPUT_FORMATS),
+    format_func=OUTPUT_FORMATS.get,
+    key="formato_salida",
+)
 
 uploaded_raw = st.file_uploader("Sube tu archivo Excel (xlsx)", type=["xlsx"], key="uploader_bottom")
 if uploaded_raw is not None:
@@ -223,20 +221,11 @@ if uploaded_raw is not None:
 if get_uploaded_bytes():
     c1, c2, c3 = st.columns(3)
     if c1.button("Generar 4-3-3"):
-        wb = load_workbook(io.BytesIO(get_uploaded_bytes()), data_only=False)
-        rows = list(wb.active.iter_rows(min_row=2, values_only=True))
-        data, n = procesar_base(rows, get_b3_inicial(), escribir_bloque_433)
-        set_result("4-3-3", "archivo_4-3-3.xlsx", data, n)
+        generar("4-3-3", "archivo_4-3-3", PLANTILLA_433)
     if c2.button("Generar 4-3-4"):
-        wb = load_workbook(io.BytesIO(get_uploaded_bytes()), data_only=False)
-        rows = list(wb.active.iter_rows(min_row=2, values_only=True))
-        data, n = procesar_base(rows, get_b3_inicial(), escribir_bloque_434)
-        set_result("4-3-4", "archivo_4-3-4.xlsx", data, n)
+        generar("4-3-4", "archivo_4-3-4", PLANTILLA_434)
     if c3.button("Generar 4-3-6"):
-        wb = load_workbook(io.BytesIO(get_uploaded_bytes()), data_only=False)
-        rows = list(wb.active.iter_rows(min_row=2, values_only=True))
-        data, n = procesar_base(rows, get_b3_inicial(), escribir_bloque_436)
-        set_result("4-3-6", "archivo_4-3-6.xlsx", data, n)
+        generar("4-3-6", "archivo_4-3-6", PLANTILLA_436)
 else:
     st.caption("👉 Adjunta tu archivo para habilitar los botones de generar.")
 
@@ -246,5 +235,5 @@ if "result_bytes" in st.session_state:
         label=f"📥 Descargar {st.session_state['result_label']}",
         data=st.session_state["result_bytes"],
         file_name=st.session_state["result_filename"],
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        mime=st.session_state["result_mime"],
     )
@@ -2,16 +2,26 @@
 
 from __future__ import annotations
 
-import io
 from datetime import datetime
 from urllib.parse import urlencode
 
 import streamlit as st
 from core.theme import apply_theme
-from openpyxl import Workbook, load_workbook
 
 from core.auth import ensure_session_from_token, auth_query_params
 from core.custom_nav import handle_logout_request, render_brand_logout_nav
+from core.polizas import (
+    AMOUNT_FORMAT,
+    OUTPUT_FORMATS,
+    Col,
+    Formula,
+    Partida,
+    PolizaTemplate,
+    build_polizas,
+    has_data,
+    output_file,
+    read_rows,
+)
 
 
 def _get_params() -> dict[str, str]:
@@ -121,54 +131,28 @@ def obtener_dia(valor):
     return valor
 
 
-def escribir_bloque_compacto(ws, base, A, B, C, D, E, F, G, b3_val, codes):
-    b6, b7, b8, b9 = codes
+def _cobro(*extra: Partida) -> PolizaTemplate:
+    return PolizaTemplate(
+        tipo="Ig",
+        concepto=lambda row: f"Cobranza Fact. {row.text('D')}",
+        dia=Col("A", obtener_dia),
+        include=has_data("A", "B", "C", "D", "E", "F", "G", blank_strings=False),
+        partidas=(
+            Partida(Col("F"), Col("G"), cargo=Col("E", parse_number), cargo_format=AMOUNT_FORMAT, key="cobro"),
+            Partida(Col("B"), Col("C"), abono=Col("E", parse_number)),
+            *extra,
+        ),
+    )
 
-    ws[f"A{base}"] = "Ig"
-    ws[f"C{base}"] = f'Cobranza Fact. {D if D is not None else ""}'
-    ws[f"D{base}"] = obtener_dia(A)
-    ws[f"B{base}"] = b3_val
-
-    ws[f"B{base+1}"] = F
-    ws[f"D{base+1}"] = G
-    e_num = parse_number(E)
-    ws[f"F{base+1}"] = e_num
-    ws[f"F{base+1}"].number_format = "0.00"
-
-    ws[f"G{base+2}"] = e_num
-    ws[f"B{base+2}"] = B
-    ws[f"D{base+2}"] = C
-
-    ws[f"B{base+3}"] = b6
-    ws[f"D{base+3}"] = "IVA por Trasladar"
-    ws[f"F{base+3}"] = f"=F{base+1}/1.16*0.16"
-    ws[f"F{base+3}"].number_format = "0.00"
-
-    ws[f"B{base+4}"] = b7
-    ws[f"D{base+4}"] = "IVA Trasladado"
-    ws[f"G{base+4}"] = f"=F{base+1}/1.16*0.16"
-    ws[f"G{base+4}"].number_format = "0.00"
-
-    ws[f"B{base+5}"] = b8
-    ws[f"D{base+5}"] = "COD Ingresos Coordinados Cobrados"
-    ws[f"F{base+5}"] = f"=F{base+1}/1.16"
-    ws[f"F{base+5}"].number_format = "0.00"
-
-    ws[f"B{base+6}"] = b9
-    ws[f"D{base+6}"] = "COA Ingresos Cobrados Coordinados"
-    ws[f"G{base+6}"] = f"=F{base+1}/1.16"
-    ws[f"G{base+6}"].number_format = "0.00"
-
-    ws[f"B{base+7}"] = "FIN_PARTIDAS"
-
-    for off in range(1, 7):
-        ws[f"C{base+off}"] = 0
-    for off in (1, 3, 5):
-        ws[f"G{base+off}"] = 0
-    for off in (2, 4, 6):
-        ws[f"F{base+off}"] = 0
-    for off in range(1, 7):
-        ws[f"E{base+off}"] = 1
+
+def plantilla_compacta(codes) -> PolizaTemplate:
+    b6, b7, b8, b9 = codes
+    return _cobro(
+        Partida(b6, "IVA por Trasladar", cargo=Formula("=F{cobro}/1.16*0.16"), cargo_format=AMOUNT_FORMAT),
+        Partida(b7, "IVA Trasladado", abono=Formula("=F{cobro}/1.16*0.16"), abono_format=AMOUNT_FORMAT),
+        Partida(b8, "COD Ingresos Coordinados Cobrados", cargo=Formula("=F{cobro}/1.16"), cargo_format=AMOUNT_FORMAT),
+        Partida(b9, "COA Ingresos Cobrados Coordinados", abono=Formula("=F{cobro}/1.16"), abono_format=AMOUNT_FORMAT),
+    )
 
 
 CODES_433 = (
@@ -190,41 +174,13 @@ CODES_436 = (
     "5101-002-000001",
 )
 
-
-def escribir_bloque_433(ws, base, A, B, C, D, E, F, G, b3_val):
-    return escribir_bloque_compacto(ws, base, A, B, C, D, E, F, G, b3_val, CODES_433)
-
-
-def escribir_bloque_434(ws, base, A, B, C, D, E, F, G, b3_val):
-    return escribir_bloque_compacto(ws, base, A, B, C, D, E, F, G, b3_val, CODES_434)
-
-
-def escribir_bloque_436(ws, base, A, B, C, D, E, F, G, b3_val):
-    return escribir_bloque_compacto(ws, base, A, B, C, D, E, F, G, b3_val, CODES_436)
+PLANTILLA_433 = plantilla_compacta(CODES_433)
+PLANTILLA_434 = plantilla_compacta(CODES_434)
+PLANTILLA_436 = plantilla_compacta(CODES_436)
 
 
-def procesar_base(rows, b3_inicial, writer_func):
-    dst_wb = Workbook()
-    ws = dst_wb.active
-    ws.title = "Hoja1"
-
-    start_row = 3
-    block_height = 8
-
-    idx = 0
-    for row in rows:
-        A, B, C, D, E, Fv, Gv = (list(row) + [None] * 7)[:7]
-        if all(v is None for v in [A, B, C, D, E, Fv, Gv]):
-            continue
-        base = start_row + idx * block_height
-        b3_val = int(b3_inicial) + idx
-        writer_func(ws, base, A, B, C, D, E, Fv, Gv, b3_val)
-        idx += 1
-
-    buf = io.BytesIO()
-    dst_wb.save(buf)
-    buf.seek(0)
-    return buf.getvalue(), idx
+def procesar_base(rows, b3_inicial, plantilla, formato="xlsx"):
+    return build_polizas(plantilla, rows, b3_inicial, formato=formato)
 
 
 def get_b3_inicial():
@@ -235,17 +191,36 @@ def get_uploaded_bytes():
     return st.session_state.get("uploaded_file_bytes", None)
 
 
-def set_result(label, filename, data_bytes, blocks):
+def get_formato():
+    return st.session_state.get("formato_salida", "xlsx")
+
+
+def set_result(label, stem, data_bytes, blocks):
+    filename, mime = output_file(stem, get_formato())
     st.session_state.update(
         {
             "result_label": label,
             "result_filename": filename,
+            "result_mime": mime,
             "result_bytes": data_bytes,
             "result_blocks": blocks,
         }
     )
 
 
+def generar(label, stem, plantilla):
+    formato = get_formato()
+    # Para el TXT se calculan las fórmulas en Python: de la fuente se toma el
+    # valor que Excel guardó, no la fórmula (el libro sí la conserva).
+    rows = read_rows(get_uploaded_bytes(), data_only=formato != "xlsx")
+    try:
+        data, n = procesar_base(rows, get_b3_inicial(), plantilla, formato)
+    except Exception as e:
+        st.error(f"Ocurrió un error: {e}")
+        return
+    set_result(label, stem, data, n)
+
+
 st.number_input(
     "Número de póliza siguiente",
     key="b3_inicial",
@@ -254,6 +229,12 @@ st.number_input(
     step=1,
     format="%d",
 )
+st.selectbox(
+    "Formato de salida",
+    list(OUTPUT_FORMATS),
+    format_func=OUTPUT_FORMATS.get,
+    key="formato_salida",
+)
 
 uploaded_raw = st.file_uploader("Sube tu archivo Excel (xlsx)", type=["xlsx"], key="uploader_bottom")
 if uploaded_raw is not None:
@@ -262,20 +243,11 @@ if uploaded_raw is not None:
 if get_uploaded_bytes():
     c1, c2, c3 = st.columns(3)
     if c1.button("Generar 4-3-3"):
-        wb = load_workbook(io.BytesIO(get_uploaded_bytes()), data_only=False)
-        rows = list(wb.active.iter_rows(min_row=2, values_only=True))
-        data, n = procesar_base(rows, get_b3_inicial(), escribir_bloque_433)
-        set_result("4-3-3", "archivo_4-3-3.xlsx", data, n)
+        generar("4-3-3", "archivo_4-3-3", PLANTILLA_433)
     if c2.button("Generar 4-3-4"):
-        wb = load_workbook(io.BytesIO(get_uploaded_bytes()), data_only=False)
-        rows = list(wb.active.iter_rows(min_row=2, values_only=True))
-        data, n = procesar_base(rows, get_b3_inicial(), escribir_bloque_434)
-        set_result("4-3-4", "archivo_4-3-4.xlsx", data, n)
+        generar("4-3-4", "archivo_4-3-4", PLANTILLA_434)
     if c3.button("Generar 4-3-6"):
-        wb = load_workbook(io.BytesIO(get_uploaded_bytes()), data_only=False)
-        rows = list(wb.active.iter_rows(min_row=2, values_only=True))
-        data, n = procesar_base(rows, get_b3_inicial(), escribir_bloque_436)
-        set_result("4-3-6", "archivo_4-3-6.xlsx", data, n)
+        generar("4-3-6", "archivo_4-3-6", PLANTILLA_436)
 else:
     st.caption("👉 Adjunta tu archivo para habilitar los botones de generar.")
 
@@ -285,5 +257,5 @@ if "result_bytes" in st.session_state:
         label=f"📥 Descargar {st.session_state['result_label']}",
         data=st.session_state["result_bytes"],
         file_name=st.session_state["result_filename"],
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        mime=st.session_state["result_mime"],
     )
@@ -2,16 +2,25 @@
 
 from __future__ import annotations
 
-import io
 from datetime import datetime
 from urllib.parse import urlencode
 
 import streamlit as st
 from core.theme import apply_theme
-from openpyxl import Workbook, load_workbook
 
 from core.auth import ensure_session_from_token, auth_query_params
 from core.custom_nav import handle_logout_request, render_brand_logout_nav
+from core.polizas import (
+    AMOUNT_FORMAT,
+    OUTPUT_FORMATS,
+    Col,
+    Partida,
+    PolizaTemplate,
+    build_polizas,
+    has_data,
+    output_file,
+    read_rows,
+)
 
 
 def _get_params() -> dict[str, str]:
@@ -121,51 +130,25 @@ def obtener_dia(valor):
     return valor
 
 
-def escribir_bloque_sin_iva(ws, base, A, B, C, D, E, F, G, b3_val):
-    ws[f"A{base}"] = "Ig"
-    ws[f"C{base}"] = f'Cobranza Fact. {D if D is not None else ""}'
-    ws[f"D{base}"] = obtener_dia(A)
-    ws[f"B{base}"] = b3_val
-
-    ws[f"B{base+1}"] = F
-    ws[f"D{base+1}"] = G
-    e_num = parse_number(E)
-    ws[f"F{base+1}"] = e_num
-    ws[f"F{base+1}"].number_format = "0.00"
-
-    ws[f"G{base+2}"] = e_num
-    ws[f"B{base+2}"] = B
-    ws[f"D{base+2}"] = C
-
-    for cell in [f"C{base+1}", f"C{base+2}", f"G{base+1}", f"F{base+2}"]:
-        ws[cell] = 0
-    for cell in [f"E{base+1}", f"E{base+2}"]:
-        ws[cell] = 1
-
-    ws[f"B{base+3}"] = "FIN_PARTIDAS"
+def _cobro(*extra: Partida) -> PolizaTemplate:
+    return PolizaTemplate(
+        tipo="Ig",
+        concepto=lambda row: f"Cobranza Fact. {row.text('D')}",
+        dia=Col("A", obtener_dia),
+        include=has_data("A", "B", "C", "D", "E", "F", "G", blank_strings=False),
+        partidas=(
+            Partida(Col("F"), Col("G"), cargo=Col("E", parse_number), cargo_format=AMOUNT_FORMAT, key="cobro"),
+            Partida(Col("B"), Col("C"), abono=Col("E", parse_number)),
+            *extra,
+        ),
+    )
 
 
-def procesar(rows, b3_inicial):
-    dst_wb = Workbook()
-    ws = dst_wb.active
-    ws.title = "Hoja1"
+PLANTILLA_SIN_IVA = _cobro()
 
-    start_row = 3
-    block_height = 4
-    idx = 0
-    for row in rows:
-        A, B, C, D, E, F, G = (list(row) + [None] * 7)[:7]
-        if all(v is None for v in [A, B, C, D, E, F, G]):
-            continue
-        base = start_row + idx * block_height
-        b3_val = int(b3_inicial) + idx
-        escribir_bloque_sin_iva(ws, base, A, B, C, D, E, F, G, b3_val)
-        idx += 1
 
-    buf = io.BytesIO()
-    dst_wb.save(buf)
-    buf.seek(0)
-    return buf.getvalue(), idx
+def procesar(rows, b3_inicial, formato="xlsx"):
+    return build_polizas(PLANTILLA_SIN_IVA, rows, b3_inicial, formato=formato)
 
 
 def get_b3_inicial():
@@ -184,21 +167,27 @@ st.number_input(
     step=1,
     format="%d",
 )
+formato = st.selectbox("Formato de salida", list(OUTPUT_FORMATS), format_func=OUTPUT_FORMATS.get)
 
 uploaded = st.file_uploader("Sube tu archivo Excel (xlsx)", type=["xlsx"], key="uploader_bottom")
 if uploaded is not None:
     st.session_state["uploaded_file_bytes"] = uploaded.getvalue()
 
 if get_uploaded_bytes():
-    wb = load_workbook(io.BytesIO(get_uploaded_bytes()), data_only=False)
-    rows = list(wb.active.iter_rows(min_row=2, values_only=True))
-    data_bytes, _ = procesar(rows, get_b3_inicial())
-
-    st.download_button(
-        label="📥 Descargar Excel",
-        data=data_bytes,
-        file_name="polizas_ig_sin_iva.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
+    # Para el TXT se calculan las fórmulas en Python: de la fuente se toma el
+    # valor que Excel guardó, no la fórmula (el libro sí la conserva).
+    rows = read_rows(get_uploaded_bytes(), data_only=formato != "xlsx")
+    try:
+        data_bytes, _ = procesar(rows, get_b3_inicial(), formato)
+    except Exception as e:
+        st.error(f"Ocurrió un error: {e}")
+    else:
+        file_name, mime = output_file("polizas_ig_sin_iva", formato)
+        st.download_button(
+            label="📥 Descargar archivo",
+            data=data_bytes,
+            file_name=file_name,
+            mime=mime,
+        )
 else:
     st.info("Sube un archivo .xlsx para comenzar.")
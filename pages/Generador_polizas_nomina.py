@@ -3,17 +3,26 @@
 from __future__ import annotations
 
 from datetime import date, datetime
-from io import BytesIO
 from urllib.parse import urlencode
 
 import streamlit as st
-from openpyxl import Workbook, load_workbook
+from openpyxl.utils import get_column_letter
 import re
 import unicodedata
 
 from core.theme import apply_theme
 from core.auth import ensure_session_from_token, auth_query_params
 from core.custom_nav import handle_logout_request, render_brand_logout_nav
+from core.polizas import (
+    OUTPUT_FORMATS,
+    Col,
+    Partida,
+    PolizaTemplate,
+    build_polizas,
+    output_file,
+    read_header,
+    read_rows,
+)
 
 
 def _get_params() -> dict[str, str]:
@@ -142,12 +151,11 @@ def _normalize_header(value) -> str:
     return text.upper()
 
 
-def _resolve_column(ws, default_letter: str | None, keywords: list[str]) -> str | None:
-    header_row = ws[1]
-    for cell in header_row:
-        header = _normalize_header(cell.value)
-        if header and all(keyword in header for keyword in keywords):
-            return cell.column_letter
+def _resolve_column(header, default_letter: str | None, keywords: list[str]) -> str | None:
+    for idx, value in enumerate(header, start=1):
+        text = _normalize_header(value)
+        if text and all(keyword in text for keyword in keywords):
+            return get_column_letter(idx)
     return default_letter
 
 
@@ -167,136 +175,95 @@ def _flag_marked(value) -> bool:
         return False
 
 
-def generar_provision(wb_src, consecutivo_inicial: int):
-    ws_src = wb_src.active
-
-    wb_new = Workbook()
-    ws_new = wb_new.active
-    ws_new.title = "Provisión Nómina"
-
-    next_row = 3
-    consecutivo = int(consecutivo_inicial)
-    max_row = ws_src.max_row
-
-    col_v = _resolve_column(ws_src, "V", ["RETEN", "ISR"])
-    col_w = _resolve_column(ws_src, None, ["ISR", "ASIMIL"])
-    col_isr_aguinaldo = _resolve_column(ws_src, None, ["ISR", "AGUINAL"])
-    col_x = _resolve_column(ws_src, "X", ["IMSS"])
-    col_y = _resolve_column(ws_src, "Y", ["INFONAVIT"])
-    col_subsidio_flag = _resolve_column(ws_src, None, ["SUBSIDIO", "CAUSADO"])
-    col_prima_dominical = _resolve_column(ws_src, None, ["PRIMA", "DOMINICAL"])
-
-    for src_row in range(2, max_row + 1):
-        k = ws_src[f"K{src_row}"].value
-        r = ws_src[f"R{src_row}"].value
-        s = ws_src[f"S{src_row}"].value
-        t = ws_src[f"T{src_row}"].value
-        u = ws_src[f"U{src_row}"].value
-        ret_isr_val = a_numero(ws_src[f"{col_v}{src_row}"].value) if col_v else 0
-        isr_asimilados_val = (
-            a_numero(ws_src[f"{col_w}{src_row}"].value) if col_w else 0
-        )
-        isr_aguinaldo_val = (
-            a_numero(ws_src[f"{col_isr_aguinaldo}{src_row}"].value) if col_isr_aguinaldo else 0
-        )
-        x = ws_src[f"{col_x}{src_row}"].value
-        y = ws_src[f"{col_y}{src_row}"].value
-        z = ws_src[f"Z{src_row}"].value
-        aa = ws_src[f"AA{src_row}"].value
-        prima_dominical_val = (
-            ws_src[f"{col_prima_dominical}{src_row}"].value if col_prima_dominical else 0
-        )
-        subsidio_flag_value = (
-            ws_src[f"{col_subsidio_flag}{src_row}"].value if col_subsidio_flag else None
-        )
-        has_subsidio_flag = _flag_marked(subsidio_flag_value)
-
-        m = ws_src[f"M{src_row}"].value
-        n = ws_src[f"N{src_row}"].value
-        o = ws_src[f"O{src_row}"].value
-        importe_prov = a_numero(m) + a_numero(o) - a_numero(n)
-
-        if not any(
-            [
-                es_diferente_cero(r),
-                es_diferente_cero(s),
-                es_diferente_cero(t),
-                es_diferente_cero(u),
-                es_diferente_cero(ret_isr_val),
-                es_diferente_cero(isr_asimilados_val),
-                es_diferente_cero(isr_aguinaldo_val),
-                es_diferente_cero(x),
-                es_diferente_cero(y),
-                es_diferente_cero(z),
-                es_diferente_cero(aa),
-                es_diferente_cero(prima_dominical_val),
-            ]
-        ):
-            continue
-
-        header_row = next_row
-        ws_new[f"A{header_row}"] = "Dr"
-        ws_new[f"B{header_row}"] = consecutivo
-        ws_new[f"C{header_row}"] = "Provisión Nomina"
-        ws_new[f"D{header_row}"] = obtener_dia(k)
-
-        next_row = header_row + 1
-
-        def _cargo_entry(code: str, descripcion: str, monto):
-            nonlocal next_row
-            ws_new[f"B{next_row}"] = code
-            ws_new[f"C{next_row}"] = 0
-            ws_new[f"D{next_row}"] = descripcion
-            ws_new[f"E{next_row}"] = 1
-            ws_new[f"F{next_row}"] = monto if monto is not None else 0
-            ws_new[f"G{next_row}"] = 0
-            next_row += 1
-
-        def _abono_entry(code: str, descripcion: str, monto):
-            nonlocal next_row
-            ws_new[f"B{next_row}"] = code
-            ws_new[f"C{next_row}"] = 0
-            ws_new[f"D{next_row}"] = descripcion
-            ws_new[f"E{next_row}"] = 1
-            ws_new[f"F{next_row}"] = 0
-            ws_new[f"G{next_row}"] = monto if monto is not None else 0
-            next_row += 1
-
-        if es_diferente_cero(r):
-            _cargo_entry("4102-002-000001", "Sueldos y Salarios", r)
-        if es_diferente_cero(s):
-            _cargo_entry("4102-002-000013", "Sueldo Asimilado a Salario", s)
-        if es_diferente_cero(t):
-            _cargo_entry("4102-002-000006", "Aguinaldo", t)
-        if es_diferente_cero(u):
-            _cargo_entry("4102-002-000012", "Comisiones", u)
-        if es_diferente_cero(prima_dominical_val):
-            _cargo_entry("4102-002-000012", "Prima Dominical", prima_dominical_val)
-        if has_subsidio_flag and es_diferente_cero(z):
-            _cargo_entry("1108-001-000000", "Subsidio para el Empleo", z)
-        isr_sueldos_val = max(ret_isr_val - isr_asimilados_val, 0.0)
-        if es_diferente_cero(isr_sueldos_val):
-            _abono_entry("2103-001-000000", "ISR Sueldos y Salario", isr_sueldos_val)
-        if es_diferente_cero(isr_aguinaldo_val):
-            _abono_entry("2103-001-000000", "ISR Aguinaldo", isr_aguinaldo_val)
-        if es_diferente_cero(isr_asimilados_val):
-            _abono_entry("2103-008-000000", "ISR x Asimilados a Salario", isr_asimilados_val)
-        if es_diferente_cero(x):
-            _abono_entry("2103-002-000000", "IMSS Trabajador", x)
-        if es_diferente_cero(y):
-            _abono_entry("2103-006-000000", "Credito Infonavit", y)
-        if has_subsidio_flag and es_diferente_cero(aa):
-            _abono_entry("1108-001-000000", "Subsidio para el Empleo", aa)
-        if es_diferente_cero(r):
-            _abono_entry("2105-001-000000", "Provisión de sueldos y salarios por pagar", importe_prov)
-        if es_diferente_cero(s):
-            _abono_entry("2105-002-000000", "Provisión de asimilados a salarios x pagar", importe_prov)
-
-        ws_new[f"B{next_row}"] = "FIN_PARTIDAS"
-        next_row += 1
-        consecutivo += 1
-
-    return wb_new
+def _columna(letter: str | None, convert=None, default=None):
+    """Valor de una columna que puede no existir en el archivo (``default``)."""
+
+    if letter is None:
+        return lambda row: default
+    return Col(letter, convert)
+
+
+def _monto(valor):
+    def monto(row):
+        value = valor(row)
+        return value if value is not None else 0
+
+    return monto
+
+
+def _no_cero(valor):
+    return lambda row: es_diferente_cero(valor(row))
+
+
+def poliza_template(header) -> PolizaTemplate:
+    col_v = _resolve_column(header, "V", ["RETEN", "ISR"])
+    col_w = _resolve_column(header, None, ["ISR", "ASIMIL"])
+    col_isr_aguinaldo = _resolve_column(header, None, ["ISR", "AGUINAL"])
+    col_x = _resolve_column(header, "X", ["IMSS"])
+    col_y = _resolve_column(header, "Y", ["INFONAVIT"])
+    col_subsidio_flag = _resolve_column(header, None, ["SUBSIDIO", "CAUSADO"])
+    col_prima_dominical = _resolve_column(header, None, ["PRIMA", "DOMINICAL"])
+
+    r, s, t, u = Col("R"), Col("S"), Col("T"), Col("U")
+    z, aa = Col("Z"), Col("AA")
+    x, y = _columna(col_x), _columna(col_y)
+    ret_isr = _columna(col_v, a_numero, 0)
+    isr_asimilados = _columna(col_w, a_numero, 0)
+    isr_aguinaldo = _columna(col_isr_aguinaldo, a_numero, 0)
+    prima_dominical = _columna(col_prima_dominical, default=0)
+    subsidio = _columna(col_subsidio_flag, _flag_marked, False)
+
+    def isr_sueldos(row):
+        return max(ret_isr(row) - isr_asimilados(row), 0.0)
+
+    def importe_prov(row):
+        return a_numero(row["M"]) + a_numero(row["O"]) - a_numero(row["N"])
+
+    def con_subsidio(valor):
+        return lambda row: subsidio(row) and es_diferente_cero(valor(row))
+
+    # (cuenta, descripción, monto, cuándo se incluye)
+    cargos = (
+        ("4102-002-000001", "Sueldos y Salarios", r, _no_cero(r)),
+        ("4102-002-000013", "Sueldo Asimilado a Salario", s, _no_cero(s)),
+        ("4102-002-000006", "Aguinaldo", t, _no_cero(t)),
+        ("4102-002-000012", "Comisiones", u, _no_cero(u)),
+        ("4102-002-000012", "Prima Dominical", prima_dominical, _no_cero(prima_dominical)),
+        ("1108-001-000000", "Subsidio para el Empleo", z, con_subsidio(z)),
+    )
+    abonos = (
+        ("2103-001-000000", "ISR Sueldos y Salario", isr_sueldos, _no_cero(isr_sueldos)),
+        ("2103-001-000000", "ISR Aguinaldo", isr_aguinaldo, _no_cero(isr_aguinaldo)),
+        ("2103-008-000000", "ISR x Asimilados a Salario", isr_asimilados, _no_cero(isr_asimilados)),
+        ("2103-002-000000", "IMSS Trabajador", x, _no_cero(x)),
+        ("2103-006-000000", "Credito Infonavit", y, _no_cero(y)),
+        ("1108-001-000000", "Subsidio para el Empleo", aa, con_subsidio(aa)),
+        ("2105-001-000000", "Provisión de sueldos y salarios por pagar", importe_prov, _no_cero(r)),
+        ("2105-002-000000", "Provisión de asimilados a salarios x pagar", importe_prov, _no_cero(s)),
+    )
+    disparadores = (r, s, t, u, ret_isr, isr_asimilados, isr_aguinaldo, x, y, z, aa, prima_dominical)
+
+    return PolizaTemplate(
+        tipo="Dr",
+        concepto="Provisión Nomina",
+        dia=Col("K", obtener_dia),
+        include=lambda row: any(es_diferente_cero(valor(row)) for valor in disparadores),
+        partidas=(
+            *(Partida(c, d, cargo=_monto(m), when=w) for c, d, m, w in cargos),
+            *(Partida(c, d, abono=_monto(m), when=w) for c, d, m, w in abonos),
+        ),
+    )
+
+
+def generar_provision(src_bytes: bytes, consecutivo_inicial: int, formato: str = "xlsx") -> bytes:
+    data, _ = build_polizas(
+        poliza_template(read_header(src_bytes)),
+        read_rows(src_bytes),
+        consecutivo_inicial,
+        sheet_title="Provisión Nómina",
+        formato=formato,
+    )
+    return data
 
 
 st.title("Generador de Provisión Nómina")
@@ -310,6 +277,7 @@ b3_val = st.number_input(
 
 st.write("Sube el archivo de nómina en Excel (ejemplo: `nomina_xml.xlsx`).")
 uploaded_file = st.file_uploader("Archivo de nómina", type=["xlsx"])
+formato = st.selectbox("Formato de salida", list(OUTPUT_FORMATS), format_func=OUTPUT_FORMATS.get)
 
 if uploaded_file is None:
     st.info("Sube un archivo para comenzar.")
@@ -317,33 +285,14 @@ else:
     st.success("Archivo cargado correctamente.")
     if st.button("Generar archivo de Provisión Nómina"):
         try:
-            wb_src = load_workbook(uploaded_file, data_only=True)
-            wb_new = generar_provision(wb_src, b3_val)
+            data = generar_provision(uploaded_file.getvalue(), b3_val, formato)
         except Exception as exc:
             st.error(f"No se pudo generar la provisión: {exc}")
         else:
-            buffer = BytesIO()
-            wb_new.save(buffer)
-            buffer.seek(0)
+            file_name, mime = output_file("provision_nomina", formato)
             st.download_button(
-                label="Descargar provision_nomina.xlsx",
-                data=buffer.getvalue(),
-                file_name="provision_nomina.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                label=f"Descargar {file_name}",
+                data=data,
+                file_name=file_name,
+                mime=mime,
             )
-def _normalize_header(value) -> str:
-    if value is None:
-        return ""
-    text = unicodedata.normalize("NFD", str(value))
-    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
-    text = re.sub(r"\s+", " ", text)
-    return text.upper()
-
-
-def _resolve_column(ws, default_letter: str, keywords: list[str]) -> str:
-    header_row = ws[1]
-    for cell in header_row:
-        header = _normalize_header(cell.value)
-        if header and all(keyword in header for keyword in keywords):
-            return cell.column_letter
-    return default_letter
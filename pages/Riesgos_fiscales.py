@@ -1,24 +1,24 @@
 ﻿from __future__ import annotations
 
-import io
-import re
-import xml.etree.ElementTree as ET
-from datetime import datetime
 from pathlib import Path
-from zipfile import BadZipFile, ZipFile
+from zipfile import BadZipFile
 
 import numpy as np
 import pandas as pd
 import streamlit as st
 from core.theme import apply_theme
-from openpyxl.styles import Alignment, Font
-from openpyxl.utils import get_column_letter
 
 from core.auth import ensure_session_from_token, persist_login
+from core.cfdi import Comprobante
+from core.cfdi_ingest import iter_zip_cfdi
+from core.cfdi_store import resolve_bytes
+from core.config import CFDI_STORE_PATH
 from core.custom_nav import handle_logout_request, render_brand_logout_nav
+from core.excel_export import DATE_FORMAT, SheetSpec, write_workbook
 from core.db import authenticate_portal_user, ensure_schema, get_conn
 from core.flash import consume_flash
 from core.login_ui import render_login_header, render_token_reset_section
+from core.riesgos import RiskParams, build_frame, evaluate
 from core.streamlit_compat import set_query_params
 
 # ===================== Config y controles de sesión =====================
@@ -208,113 +208,8 @@ with uploader_cols[1]:
     )
 st.markdown("</div>", unsafe_allow_html=True)
 
-# ===================== Columnas base =====================
-base_cols = [
-    "Fecha",
-    "RFC Emisor",
-    "Nombre Emisor",
-    "UUID",
-    "cfdi:Concepto Importe",
-    "cfdi:Traslado Importe",
-    "RegimenFiscalReceptor",
-]
-
-
-# ===================== Utilidades CFDI (XML) =====================
-def _detect_cfdi_ns(root: ET.Element) -> str:
-    if root.tag.startswith("{") and "}Comprobante" in root.tag:
-        return root.tag.split("}")[0][1:]
-    return "http://www.sat.gob.mx/cfd/4"
-
-
-def _norm_series(series: pd.Series) -> pd.Series:
-    return series.astype(str).str.strip().str.upper()
-
-
-def _norm_text(value: str) -> str:
-    return str(value).strip().upper()
-
-
-def _has_cuenta_predial(xml_bytes: bytes) -> bool:
-    root = ET.fromstring(xml_bytes)
-    ns = {"cfdi": _detect_cfdi_ns(root)}
-    return root.find(".//cfdi:Conceptos/cfdi:Concepto/cfdi:CuentaPredial", ns) is not None
-
-
-def _get_regimen_emisor(xml_bytes: bytes) -> str:
-    root = ET.fromstring(xml_bytes)
-    ns = {"cfdi": _detect_cfdi_ns(root)}
-    emisor = root.find("cfdi:Emisor", ns)
-    return (emisor.attrib.get("RegimenFiscal", "") if emisor is not None else "").strip()
-
-
-def _get_forma_pago(xml_bytes: bytes) -> str:
-    root = ET.fromstring(xml_bytes)
-    return root.attrib.get("FormaPago", "").strip()
-
-
-def _get_metodo_pago(xml_bytes: bytes) -> str:
-    root = ET.fromstring(xml_bytes)
-    return root.attrib.get("MetodoPago", "").strip()
-
-
-def _get_tipo_de_comprobante(xml_bytes: bytes) -> str:
-    root = ET.fromstring(xml_bytes)
-    return root.attrib.get("TipoDeComprobante", "").strip()
-
-
-def _get_domicilio_fiscal_receptor(xml_bytes: bytes) -> str:
-    root = ET.fromstring(xml_bytes)
-    ns = {"cfdi": _detect_cfdi_ns(root)}
-    receptor = root.find("cfdi:Receptor", ns)
-    return (receptor.attrib.get("DomicilioFiscalReceptor", "") if receptor is not None else "").strip()
-
-
-def _get_uso_cfdi(xml_bytes: bytes) -> str:
-    root = ET.fromstring(xml_bytes)
-    ns = {"cfdi": _detect_cfdi_ns(root)}
-    receptor = root.find("cfdi:Receptor", ns)
-    return (receptor.attrib.get("UsoCFDI", "") if receptor is not None else "").strip()
-
-
-def _get_moneda(xml_bytes: bytes) -> str:
-    root = ET.fromstring(xml_bytes)
-    return root.attrib.get("Moneda", "").strip()
-
-
-def _get_tipo_cambio(xml_bytes: bytes) -> str:
-    root = ET.fromstring(xml_bytes)
-    return root.attrib.get("TipoCambio", "").strip()
-
-
-def _fecha_solo_dia(value) -> str:
-    if isinstance(value, datetime):
-        return value.strftime("%Y-%m-%d")
-    s = str(value).strip()
-    if not s:
-        return s
-    if "T" in s:
-        return s.split("T", 1)[0]
-    m = re.match(r"^(\d{4}-\d{2}-\d{2})", s)
-    if m:
-        return m.group(1)
-    for fmt in ("%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d"):
-        try:
-            dt = datetime.strptime(s[:10], fmt)
-            return dt.strftime("%Y-%m-%d")
-        except Exception:
-            continue
-    return s[:10]
-
-
-def _parse_fecha(value) -> datetime | None:
-    try:
-        s = _fecha_solo_dia(value)
-        return datetime.strptime(s, "%Y-%m-%d")
-    except Exception:
-        return None
-
 
+# ===================== Tipo de cambio DOF =====================
 SINGLE_TC_PATH = Path("data/Tipo Cambio.xls")
 
 
@@ -393,23 +288,6 @@ def _read_tc_excel_fixed(path: Path) -> pd.Series | None:
 tc_series = _read_tc_excel_fixed(SINGLE_TC_PATH)
 
 
-def _tc_lookup(dttm: datetime) -> float | None:
-    if tc_series is None or dttm is None:
-        return None
-    val = tc_series.get(dttm.date())
-    return float(val) if pd.notna(val) else None
-
-
-def _tc_prev_lookup(dttm: datetime) -> float | None:
-    if tc_series is None or dttm is None:
-        return None
-    idx = tc_series.index
-    pos = np.searchsorted(idx, dttm.date(), side="left") - 1
-    if pos >= 0:
-        return float(tc_series.iloc[pos])
-    return None
-
-
 # ===================== Fechas Excel dd/mm/aaaa y escritura segura =====================
 def _ensure_excel_date_ddmmyyyy(df: pd.DataFrame, col: str = "Fecha") -> pd.DataFrame:
     if col not in df.columns:
@@ -424,49 +302,22 @@ def _ensure_excel_date_ddmmyyyy(df: pd.DataFrame, col: str = "Fecha") -> pd.Data
     return out
 
 
-def _write_sheet(writer, df: pd.DataFrame, sheet_name: str, title_text: str):
-    def _safe_sheet_name(name: str) -> str:
-        safe = re.sub(r"[:\\/?*\\[\\]]", "-", str(name)).strip() or "Hoja"
-        return safe[:31]
-
-    safe_name = _safe_sheet_name(sheet_name)
-
+def _sheet_spec(df: pd.DataFrame, sheet_name: str, title_text: str) -> SheetSpec:
     df_x = _ensure_excel_date_ddmmyyyy(df, "Fecha")
-    df_x.to_excel(writer, index=False, sheet_name=safe_name, startrow=2)
-
-    wb = writer.book
-    ws = wb[safe_name]
-
-    ws["A1"].value = title_text
-    ws["A1"].font = Font(bold=True, size=14)
-    ws["A1"].alignment = Alignment(horizontal="center")
-    last_col = max(1, df_x.shape[1])
-    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=last_col)
-    ws.freeze_panes = "A3"
-
-    last_col_letter = get_column_letter(last_col)
-    last_row = df_x.shape[0] + 3
-    ws.auto_filter.ref = f"A3:{last_col_letter}{last_row}"
-
-    for i, col in enumerate(df_x.columns, start=1):
-        max_len = max([len(str(col))] + [len(str(x)) for x in df_x[col].astype(str).fillna("")])
-        ws.column_dimensions[get_column_letter(i)].width = min(max_len + 2, 50)
-
-    if "Fecha" in df_x.columns:
-        fecha_idx = list(df_x.columns).index("Fecha") + 1
-        for row in ws.iter_rows(min_row=3, max_row=ws.max_row, min_col=fecha_idx, max_col=fecha_idx):
-            row[0].number_format = "DD/MM/YYYY"
-
-
-try:
-    from extractor import parse_cfdi_many
-except Exception:
-    def parse_cfdi_many(files):
-        return []
+    return SheetSpec(
+        sheet_name,
+        df_x,
+        column_formats={"Fecha": DATE_FORMAT},
+        title=title_text,
+        freeze_header=True,
+        autofilter=True,
+        autofit=True,
+    )
 
 
-valid_files: list[tuple[str, bytes]] = []
+valid_files: list[tuple[str, Comprobante]] = []
 bad_files: list[str] = []
+loose_xml: list[tuple[str, bytes]] = []
 if uploaded:
     for uf in uploaded:
         name = uf.name or "archivo"
@@ -478,29 +329,31 @@ if uploaded:
             lower_name = name.lower()
             if lower_name.endswith(".zip"):
                 found_xml = False
+                has_errors = False
                 try:
-                    with ZipFile(io.BytesIO(data)) as zf:
-                        for info in zf.infolist():
-                            if info.is_dir():
-                                continue
-                            if not info.filename.lower().endswith(".xml"):
-                                continue
-                            xml_bytes = zf.read(info)
-                            if not xml_bytes:
+                    for chunk in iter_zip_cfdi(data, store_path=CFDI_STORE_PATH):
+                        for doc in chunk:
+                            if doc.comp is None:
+                                has_errors = has_errors or doc.error is not None
                                 continue
-                            ET.fromstring(xml_bytes)
-                            valid_files.append((f"{name}:{info.filename}", xml_bytes))
+                            valid_files.append((f"{name}:{doc.filename}", doc.comp))
                             found_xml = True
                 except BadZipFile as exc:
                     raise ValueError("ZIP inválido") from exc
-                if not found_xml:
+                if has_errors or not found_xml:
                     raise ValueError("ZIP sin XML válidos")
             else:
-                ET.fromstring(data)
-                valid_files.append((name, data))
+                loose_xml.append((name, data))
         except Exception:
             bad_files.append(name)
 
+    # Los XML sueltos se resuelven juntos: una sola consulta y un solo commit al almacén.
+    for name, comp in resolve_bytes(CFDI_STORE_PATH, loose_xml):
+        if comp is None:
+            bad_files.append(name)
+        else:
+            valid_files.append((name, comp))
+
     if bad_files:
         st.markdown(
             f"<div class='small-error'>⚠️ No se pudo cargar {len(bad_files)} archivo(s): "
@@ -511,392 +364,19 @@ if uploaded:
 files = valid_files
 
 if files:
-    rows = parse_cfdi_many(files)
-
-    for row in rows or []:
-        if "Fecha" in row:
-            row["Fecha"] = _fecha_solo_dia(row["Fecha"])
+    params = RiskParams(
+        regimen_fiscal_correcto=regimen_fiscal_correcto,
+        cp=cp_val,
+        tc_series=tc_series,
+    )
+    frame = build_frame((comp for _, comp in files), params)
 
-    df = pd.DataFrame(rows, columns=base_cols) if rows else pd.DataFrame(columns=base_cols)
+    if not frame.empty:
+        resultados = evaluate(frame, params)
 
-    if not df.empty:
-        insert_pos = (
-            list(df.columns).index("RegimenFiscalReceptor") + 1
-            if "RegimenFiscalReceptor" in df.columns
-            else len(df.columns)
-        )
-        df.insert(insert_pos, "Régimen fiscal correcto", regimen_fiscal_correcto)
-        mismatches = pd.DataFrame()
-        if regimen_fiscal_correcto.strip():
-            mismatches = df[
-                _norm_series(df["RegimenFiscalReceptor"]) != _norm_series(df["Régimen fiscal correcto"])
-            ]
-
-        arrend_rows = []
-        for (fname, blob), row in zip(files, rows):
-            if _get_regimen_emisor(blob) == "606" and not _has_cuenta_predial(blob):
-                arrend_rows.append(row)
-        arrend_df = pd.DataFrame(arrend_rows, columns=base_cols) if arrend_rows else pd.DataFrame(columns=base_cols)
-
-        cols_efectivo = [
-            "Fecha",
-            "RFC Emisor",
-            "Nombre Emisor",
-            "UUID",
-            "cfdi:Concepto Importe",
-            "cfdi:Traslado Importe",
-            "FormaPago",
-        ]
-        efectivo_rows = []
-        for (fname, blob), row in zip(files, rows):
-            forma = _get_forma_pago(blob)
-            try:
-                total = float(row.get("cfdi:Concepto Importe", 0) or 0) + float(row.get("cfdi:Traslado Importe", 0) or 0)
-            except Exception:
-                total = 0.0
-            if forma == "01" and total > 2000:
-                efectivo_rows.append(
-                    {
-                        "Fecha": row.get("Fecha", ""),
-                        "RFC Emisor": row.get("RFC Emisor", ""),
-                        "Nombre Emisor": row.get("Nombre Emisor", ""),
-                        "UUID": row.get("UUID", ""),
-                        "cfdi:Concepto Importe": row.get("cfdi:Concepto Importe", 0),
-                        "cfdi:Traslado Importe": row.get("cfdi:Traslado Importe", 0),
-                        "FormaPago": forma,
-                    }
-                )
-        efectivo_df = pd.DataFrame(efectivo_rows, columns=cols_efectivo) if efectivo_rows else pd.DataFrame(columns=cols_efectivo)
-
-        cols_domcp = [
-            "Fecha",
-            "RFC Emisor",
-            "Nombre Emisor",
-            "UUID",
-            "cfdi:Concepto Importe",
-            "cfdi:Traslado Importe",
-            "DomicilioFiscalReceptor",
-            "CP",
-        ]
-        domcp_rows = []
-        if cp_val.strip():
-            for (fname, blob), row in zip(files, rows):
-                dom_rec = _get_domicilio_fiscal_receptor(blob)
-                if _norm_text(dom_rec) != _norm_text(cp_val):
-                    domcp_rows.append(
-                        {
-                            "Fecha": row.get("Fecha", ""),
-                            "RFC Emisor": row.get("RFC Emisor", ""),
-                            "Nombre Emisor": row.get("Nombre Emisor", ""),
-                            "UUID": row.get("UUID", ""),
-                            "cfdi:Concepto Importe": row.get("cfdi:Concepto Importe", 0),
-                            "cfdi:Traslado Importe": row.get("cfdi:Traslado Importe", 0),
-                            "DomicilioFiscalReceptor": dom_rec,
-                            "CP": cp_val,
-                        }
-                    )
-        domcp_df = pd.DataFrame(domcp_rows, columns=cols_domcp) if domcp_rows else pd.DataFrame(columns=cols_domcp)
-
-        cols_sin_ret = [
-            "Fecha",
-            "RFC Emisor",
-            "Nombre Emisor",
-            "UUID",
-            "cfdi:Concepto Importe",
-            "cfdi:Traslado Importe",
-            "RegimenFiscalEmisor",
-            "Retenciones",
-        ]
-        sin_ret_rows = []
-        for (fname, blob), row in zip(files, rows):
-            regimen_emisor = _get_regimen_emisor(blob)
-            if regimen_emisor != "626":
-                continue
-            root = ET.fromstring(blob)
-            ns = {"cfdi": _detect_cfdi_ns(root)}
-            impuestos = set()
-            for r in root.findall(".//cfdi:Impuestos/cfdi:Retenciones/cfdi:Retencion", ns):
-                imp = r.attrib.get("Impuesto", "").strip()
-                if imp:
-                    impuestos.add(imp)
-            for r in root.findall(".//cfdi:Conceptos/cfdi:Concepto/cfdi:Impuestos/cfdi:Retenciones/cfdi:Retencion", ns):
-                imp = r.attrib.get("Impuesto", "").strip()
-                if imp:
-                    impuestos.add(imp)
-            if not any(code in {"001", "002"} for code in impuestos):
-                sin_ret_rows.append(
-                    {
-                        "Fecha": row.get("Fecha", ""),
-                        "RFC Emisor": row.get("RFC Emisor", ""),
-                        "Nombre Emisor": row.get("Nombre Emisor", ""),
-                        "UUID": row.get("UUID", ""),
-                        "cfdi:Concepto Importe": row.get("cfdi:Concepto Importe", 0),
-                        "cfdi:Traslado Importe": row.get("cfdi:Traslado Importe", 0),
-                        "RegimenFiscalEmisor": regimen_emisor,
-                        "Retenciones": ", ".join(sorted(impuestos)) if impuestos else "SIN RETENCIONES",
-                    }
-                )
-        sin_ret_df = pd.DataFrame(sin_ret_rows, columns=cols_sin_ret) if sin_ret_rows else pd.DataFrame(columns=cols_sin_ret)
-
-        cols_uso = [
-            "Fecha",
-            "RFC Emisor",
-            "Nombre Emisor",
-            "UUID",
-            "cfdi:Concepto Importe",
-            "cfdi:Traslado Importe",
-            "UsoCFDI",
-        ]
-        uso_rows = []
-        for (fname, blob), row in zip(files, rows):
-            uso = _get_uso_cfdi(blob).upper()
-            if uso == "S01":
-                uso_rows.append(
-                    {
-                        "Fecha": row.get("Fecha", ""),
-                        "RFC Emisor": row.get("RFC Emisor", ""),
-                        "Nombre Emisor": row.get("Nombre Emisor", ""),
-                        "UUID": row.get("UUID", ""),
-                        "cfdi:Concepto Importe": row.get("cfdi:Concepto Importe", 0),
-                        "cfdi:Traslado Importe": row.get("cfdi:Traslado Importe", 0),
-                        "UsoCFDI": uso,
-                    }
-                )
-        uso_df = pd.DataFrame(uso_rows, columns=cols_uso) if uso_rows else pd.DataFrame(columns=cols_uso)
-
-        cols_tc = [
-            "Fecha",
-            "RFC Emisor",
-            "Nombre Emisor",
-            "UUID",
-            "cfdi:Concepto Importe",
-            "cfdi:Traslado Importe",
-            "Moneda",
-            "TipoCambioXML",
-            "TipoCambioDOF",
-            "TipoCambioDOFAnterior",
-            "Diferencia",
-        ]
-        tc_rows = []
-        for (fname, blob), row in zip(files, rows):
-            moneda = _get_moneda(blob).upper()
-            if moneda != "USD":
-                continue
-            fecha_dt = _parse_fecha(row.get("Fecha", ""))
-            ref_tc = _tc_lookup(fecha_dt)
-            ref_tc_prev = _tc_prev_lookup(fecha_dt)
-            xml_tc_raw = _get_tipo_cambio(blob)
-            try:
-                xml_tc = float(str(xml_tc_raw).replace(",", "")) if xml_tc_raw else None
-            except Exception:
-                xml_tc = None
-            include = False
-            if ref_tc is not None and xml_tc is not None:
-                include = abs(xml_tc - ref_tc) > 1e-6
-            elif ref_tc is not None and xml_tc is None:
-                include = True
-            if include:
-                tc_rows.append(
-                    {
-                        "Fecha": row.get("Fecha", ""),
-                        "RFC Emisor": row.get("RFC Emisor", ""),
-                        "Nombre Emisor": row.get("Nombre Emisor", ""),
-                        "UUID": row.get("UUID", ""),
-                        "cfdi:Concepto Importe": row.get("cfdi:Concepto Importe", 0),
-                        "cfdi:Traslado Importe": row.get("cfdi:Traslado Importe", 0),
-                        "Moneda": moneda,
-                        "TipoCambioXML": xml_tc,
-                        "TipoCambioDOF": ref_tc,
-                        "TipoCambioDOFAnterior": ref_tc_prev,
-                        "Diferencia": (
-                            None if (xml_tc is None or ref_tc is None) else round(xml_tc - ref_tc, 6)
-                        ),
-                    }
-                )
-        tc_df = pd.DataFrame(tc_rows, columns=cols_tc) if tc_rows else pd.DataFrame(columns=cols_tc)
-
-        usd_all_rows = []
-        for (fname, blob), row in zip(files, rows):
-            moneda = _get_moneda(blob).upper()
-            if moneda != "USD":
-                continue
-            fecha_dt = _parse_fecha(row.get("Fecha", ""))
-            ref_tc = _tc_lookup(fecha_dt)
-            ref_tc_prev = _tc_prev_lookup(fecha_dt)
-            xml_tc_raw = _get_tipo_cambio(blob)
-            try:
-                xml_tc = float(str(xml_tc_raw).replace(",", "")) if xml_tc_raw else None
-            except Exception:
-                xml_tc = None
-            dif = None if (xml_tc is None or ref_tc is None) else round(xml_tc - ref_tc, 6)
-            usd_all_rows.append(
-                {
-                    "Fecha": row.get("Fecha", ""),
-                    "RFC Emisor": row.get("RFC Emisor", ""),
-                    "Nombre Emisor": row.get("Nombre Emisor", ""),
-                    "UUID": row.get("UUID", ""),
-                    "cfdi:Concepto Importe": row.get("cfdi:Concepto Importe", 0),
-                    "cfdi:Traslado Importe": row.get("cfdi:Traslado Importe", 0),
-                    "Moneda": moneda,
-                    "TipoCambioXML": xml_tc,
-                    "TipoCambioDOF": ref_tc,
-                    "TipoCambioDOFAnterior": ref_tc_prev,
-                    "Diferencia": dif,
-                }
-            )
-        usd_all_df = pd.DataFrame(usd_all_rows, columns=cols_tc) if usd_all_rows else pd.DataFrame(columns=cols_tc)
-
-        cols_nc = [
-            "Fecha",
-            "RFC Emisor",
-            "Nombre Emisor",
-            "UUID",
-            "cfdi:Concepto Importe",
-            "cfdi:Traslado Importe",
-            "TipoDeComprobante",
-            "FormaPago",
-            "MetodoPago",
-        ]
-
-        def _norm_forma_pago(fp: str) -> str:
-            s = (fp or "").strip()
-            s = re.sub(r"^0+", "", s) or "0"
-            return s
-
-        nc_rows = []
-        for (fname, blob), row in zip(files, rows):
-            tipo = _get_tipo_de_comprobante(blob).upper()
-            if tipo != "E":
-                continue
-            forma = _norm_forma_pago(_get_forma_pago(blob))
-            metodo = _get_metodo_pago(blob).upper()
-            if (forma != "15") or (metodo != "PUE"):
-                nc_rows.append(
-                    {
-                        "Fecha": row.get("Fecha", ""),
-                        "RFC Emisor": row.get("RFC Emisor", ""),
-                        "Nombre Emisor": row.get("Nombre Emisor", ""),
-                        "UUID": row.get("UUID", ""),
-                        "cfdi:Concepto Importe": row.get("cfdi:Concepto Importe", 0),
-                        "cfdi:Traslado Importe": row.get("cfdi:Traslado Importe", 0),
-                        "TipoDeComprobante": tipo,
-                        "FormaPago": forma,
-                        "MetodoPago": metodo,
-                    }
-                )
-        nc_df = pd.DataFrame(nc_rows, columns=cols_nc) if nc_rows else pd.DataFrame(columns=cols_nc)
-
-        cols_pue99 = [
-            "Fecha",
-            "RFC Emisor",
-            "Nombre Emisor",
-            "UUID",
-            "cfdi:Concepto Importe",
-            "cfdi:Traslado Importe",
-            "FormaPago",
-            "MetodoPago",
-        ]
-        pue99_rows = []
-        for (fname, blob), row in zip(files, rows):
-            tipo = _get_tipo_de_comprobante(blob).upper()
-            if tipo != "I":
-                continue
-            metodo = _get_metodo_pago(blob).upper()
-            fp_raw = _get_forma_pago(blob)
-            fp_norm = re.sub(r"^0+", "", (fp_raw or "").strip()) or "0"
-            if metodo == "PUE" and fp_norm == "99":
-                pue99_rows.append(
-                    {
-                        "Fecha": row.get("Fecha", ""),
-                        "RFC Emisor": row.get("RFC Emisor", ""),
-                        "Nombre Emisor": row.get("Nombre Emisor", ""),
-                        "UUID": row.get("UUID", ""),
-                        "cfdi:Concepto Importe": row.get("cfdi:Concepto Importe", 0),
-                        "cfdi:Traslado Importe": row.get("cfdi:Traslado Importe", 0),
-                        "FormaPago": fp_norm,
-                        "MetodoPago": metodo,
-                    }
-                )
-        pue99_df = pd.DataFrame(pue99_rows, columns=cols_pue99) if pue99_rows else pd.DataFrame(columns=cols_pue99)
-
-        dfs = [
-            mismatches,
-            arrend_df,
-            efectivo_df,
-            domcp_df,
-            sin_ret_df,
-            uso_df,
-            tc_df,
-            usd_all_df,
-            nc_df,
-            pue99_df,
-        ]
-
-        if any(not df_part.empty for df_part in dfs):
+        if any(not df_part.empty for _, df_part in resultados):
             def _make_excel_bytes() -> bytes:
-                out = io.BytesIO()
-                with pd.ExcelWriter(out, engine="openpyxl") as writer:
-                    _write_sheet(
-                        writer,
-                        mismatches if not mismatches.empty else pd.DataFrame(columns=df.columns),
-                        "No Coinciden",
-                        "CFDI con diferente régimen fiscal",
-                    )
-                    _write_sheet(
-                        writer,
-                        arrend_df[base_cols] if not arrend_df.empty else pd.DataFrame(columns=base_cols),
-                        "Arrendamiento sin Predial",
-                        "CFDI de arrendamiento sin cuenta predial",
-                    )
-                    _write_sheet(
-                        writer,
-                        efectivo_df if not efectivo_df.empty else pd.DataFrame(columns=cols_efectivo),
-                        "Efectivo > 2000",
-                        "CFDI con gasto total en efectivo mayor de 2000 pesos",
-                    )
-                    _write_sheet(
-                        writer,
-                        domcp_df if not domcp_df.empty else pd.DataFrame(columns=cols_domcp),
-                        "Domicilio vs CP",
-                        "CFDI con diferente domicilio fiscal",
-                    )
-                    _write_sheet(
-                        writer,
-                        sin_ret_df if not sin_ret_df.empty else pd.DataFrame(columns=cols_sin_ret),
-                        "Sin Retenciones 001-002 (626)",
-                        "Régimen 626 sin retenciones",
-                    )
-                    _write_sheet(
-                        writer,
-                        uso_df if not uso_df.empty else pd.DataFrame(columns=cols_uso),
-                        "Uso CFDI S01 no deducible",
-                        "Uso CFDI S01 no deducible",
-                    )
-                    _write_sheet(
-                        writer,
-                        tc_df if not tc_df.empty else pd.DataFrame(columns=cols_tc),
-                        "Tipo de Cambio Diferente",
-                        "Tipo de cambio diferente",
-                    )
-                    _write_sheet(
-                        writer,
-                        usd_all_df if not usd_all_df.empty else pd.DataFrame(columns=cols_tc),
-                        "USD (Todos)",
-                        "CFDI en USD — Tipo de Cambio DOF",
-                    )
-                    _write_sheet(
-                        writer,
-                        nc_df if not nc_df.empty else pd.DataFrame(columns=cols_nc),
-                        "NC ≠ Condonación - PUE",
-                        "Notas de crédito con método de pago diferente a condonación y PUE",
-                    )
-                    _write_sheet(
-                        writer,
-                        pue99_df if not pue99_df.empty else pd.DataFrame(columns=cols_pue99),
-                        "PUE FP 99",
-                        "PUE con forma de pago por definir",
-                    )
-                return out.getvalue()
+                return write_workbook(_sheet_spec(df_part, rule.sheet, rule.title) for rule, df_part in resultados)
 
             st.download_button(
                 "Descargar Excel",
@@ -0,0 +1,50 @@
+"""Carga de las listas del SAT (Firmes / Exigibles) compartida por sus páginas de administración."""
+
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+from typing import Callable, Tuple
+
+import pandas as pd
+import streamlit as st
+
+from core.config import CFDI_STORE_PATH
+from core.sat_lists import BlacklistDiff, stored_cfdi_by_rfc
+
+
+def render_blacklist_diff(diff: BlacklistDiff) -> None:
+    if not diff.changed:
+        st.info("La nueva versión no agrega ni elimina RFC respecto a la anterior.")
+        return
+    st.write(f"RFC nuevos en la lista: **{len(diff.added):,}** · RFC que salieron: **{len(diff.removed):,}**")
+    if not diff.added:
+        return
+    cfdi_por_rfc = stored_cfdi_by_rfc(CFDI_STORE_PATH, diff.added)
+    nuevos = pd.DataFrame({"RFC": list(diff.added)})
+    nuevos["CFDI almacenados"] = nuevos["RFC"].map(cfdi_por_rfc).fillna(0).astype(int)
+    if cfdi_por_rfc:
+        st.warning(f"{len(cfdi_por_rfc):,} de los RFC nuevos ya emitieron CFDI procesados anteriormente.")
+        nuevos = nuevos.sort_values("CFDI almacenados", ascending=False, kind="mergesort")
+    st.dataframe(nuevos, hide_index=True, use_container_width=True, height=240)
+
+
+def store_upload_once(
+    uploaded,
+    state_prefix: str,
+    store: Callable[[object], Tuple[Path, BlacklistDiff]],
+) -> None:
+    """Guarda ``uploaded`` con ``store`` y muestra la diferencia contra la versión anterior.
+
+    El uploader conserva el archivo entre reruns: solo se guarda (y se compara)
+    cuando cambia su contenido, aunque el nombre y el tamaño coincidan.
+    """
+
+    upload_sig = hashlib.sha1(uploaded.getvalue()).hexdigest()
+    if st.session_state.get(f"{state_prefix}_upload_sig") != upload_sig:
+        target_path, diff = store(uploaded)
+        st.session_state[f"{state_prefix}_upload_sig"] = upload_sig
+        st.session_state[f"{state_prefix}_diff"] = (target_path.name, diff)
+    stored_name, diff = st.session_state[f"{state_prefix}_diff"]
+    st.success(f"Archivo guardado correctamente en {stored_name}.")
+    render_blacklist_diff(diff)
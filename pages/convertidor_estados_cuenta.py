@@ -15,6 +15,7 @@ from core.flash import consume_flash
 from core.login_ui import render_login_header, render_token_reset_section
 from core.streamlit_compat import rerun, set_query_params
 from core.custom_nav import handle_logout_request, render_brand_logout_nav
+from core.statement_batch import EXTRACTORS, build_workbook, iter_batch
 from ui.cards import link_card
 
 MODULE_TITLE = "Convertidor de estados de cuenta"
@@ -231,5 +232,61 @@ for start in range(0, total_slots, SLOTS_PER_ROW):
             else:
                 st.markdown('<div class="card placeholder-bank"></div>', unsafe_allow_html=True)
 
+st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
+st.subheader("Conversión por lote")
+st.caption(
+    "Sube varios PDF (o un ZIP) de distintos bancos: el banco se detecta con la primera página "
+    "y se genera un solo Excel con una hoja por cuenta y una hoja consolidada."
+)
+
+AUTO_BANK = "Detectar automáticamente"
+batch_files = st.file_uploader(
+    "Estados de cuenta (PDF o ZIP)",
+    type=["pdf", "zip"],
+    accept_multiple_files=True,
+    key="batch_statements",
+)
+batch_bank = st.selectbox("Banco", [AUTO_BANK, *EXTRACTORS], key="batch_bank")
+
+if batch_files and st.button("Convertir lote", type="primary"):
+    progress = st.progress(0.0, text="Procesando estados de cuenta...")
+
+    def _progress(done: int, total: int) -> None:
+        progress.progress(done / total if total else 1.0, text=f"Procesados {done} de {total}")
+
+    results = list(
+        iter_batch(
+            [(f.name, f.getvalue()) for f in batch_files],
+            bank=None if batch_bank == AUTO_BANK else batch_bank,
+            progress_cb=_progress,
+        )
+    )
+    progress.empty()
+
+    st.dataframe(
+        [
+            {
+                "Archivo": r.filename,
+                "Banco": r.bank or "-",
+                "Cuenta": r.account or "-",
+                "Movimientos": r.rows,
+                "Estado": r.error or "OK",
+            }
+            for r in results
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
+    if any(r.rows for r in results):
+        st.download_button(
+            "Descargar Excel",
+            data=build_workbook(results),
+            file_name="estados_de_cuenta_lote.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            use_container_width=True,
+        )
+    else:
+        st.warning("No se extrajeron movimientos de los archivos cargados.")
+
 st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
 st.markdown('<div class="footer">© 2025 Araiza Intelligence. Todos los derechos reservados.</div>', unsafe_allow_html=True)
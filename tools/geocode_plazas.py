@@ -0,0 +1,77 @@
+"""Llena ``plazas.lat/lon`` una sola vez con Google Places.
+
+La calculadora lee las coordenadas de la tabla (``core.rutas.load_plaza_coordinates``)
+y ya no consulta Places al detectar casetas; este job se corre fuera de línea
+cuando se cargan casetas nuevas. Las respuestas quedan además en la caché
+persistente de ``core.maps_cache``, así que repetirlo no vuelve a pagar.
+
+Las casetas de las rutas verificadas que no existen en ``plazas`` no tienen
+fila dónde guardar coordenadas: se geocodifican igual para dejarlas en la
+caché persistente, de donde ``core.rutas.plazas_from_polyline`` las toma.
+
+Uso: ``python -m tools.geocode_plazas [--todas] [--dry-run]``
+"""
+
+import argparse
+from contextlib import closing
+
+from core.db import get_conn
+from core.maps import GoogleMapsClient, GoogleMapsError
+from core.maps_cache import shared_store
+from core.rutas import geocode_plaza, load_plaza_coordinates, load_routes
+from core.utils import normalize_name
+
+
+def _pending_names(conn, todas: bool) -> list[str]:
+    where = "" if todas else " WHERE lat IS NULL OR lon IS NULL"
+    rows = conn.execute(f"SELECT DISTINCT nombre FROM plazas{where} ORDER BY nombre").fetchall()
+    return [r[0] for r in rows if r[0]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Geocodifica las casetas de la tabla plazas.")
+    parser.add_argument("--todas", action="store_true", help="Vuelve a geocodificar las que ya tienen coordenadas.")
+    parser.add_argument("--dry-run", action="store_true", help="Muestra el resultado sin escribir en la base.")
+    args = parser.parse_args()
+
+    try:
+        client = GoogleMapsClient(store=shared_store())
+    except GoogleMapsError as exc:
+        raise SystemExit(str(exc)) from exc
+
+    with closing(get_conn()) as conn:
+        names = _pending_names(conn, args.todas)
+        print(f"Casetas por geocodificar: {len(names)}")
+        lookup: dict[str, str] = {}
+        missing: list[str] = []
+        for nombre in names:
+            coords = geocode_plaza(client, nombre, plaza_lookup=lookup)
+            if coords is None:
+                missing.append(nombre)
+                print(f"  sin resultado: {nombre}")
+                continue
+            print(f"  {nombre}: {coords[0]:.6f}, {coords[1]:.6f}")
+            if not args.dry_run:
+                conn.execute("UPDATE plazas SET lat=?, lon=? WHERE nombre=?", (coords[0], coords[1], nombre))
+        if not args.dry_run:
+            conn.commit()
+
+    print(f"Geocodificadas: {len(names) - len(missing)}; sin resultado: {len(missing)}")
+
+    coordinates = load_plaza_coordinates()
+    sin_tabla = sorted(
+        {p for seq in load_routes().values() for p in seq if coordinates.get(p) is None},
+        key=normalize_name,
+    )
+    if sin_tabla:
+        print("Casetas de las rutas verificadas sin coordenadas en la tabla plazas (se consultan en la caché):")
+        for plaza in sin_tabla:
+            coords = geocode_plaza(client, plaza, plaza_lookup=lookup)
+            if coords is None:
+                print(f"  sin resultado: {plaza}")
+            else:
+                print(f"  {plaza}: {coords[0]:.6f}, {coords[1]:.6f}")
+
+
+if __name__ == "__main__":
+    main()